@@ -1,9 +1,18 @@
 """AI 功能 API"""
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-from typing import List
+import json
+from fastapi import APIRouter, Header, HTTPException, Query
+from typing import List, Optional
 from pydantic import BaseModel, Field
+from app.core.ai_cache import response_cache
 from app.core.ai_service import ai_service
+from app.core.batch_check import JobNotFound, batch_check_service
+from app.core.llm_scheduler import llm_scheduler
+from app.core.single_flight import single_flight
+from app.config import settings
+from app.core.stream_registry import ReplayStream, StreamNotFound, stream_registry
+from app.core.streaming import encode_sse, event_stream_response, sse_response, SSE_HEARTBEAT
+from app.core.summary_service import summary_service
+from app.models.ai import CacheMode
 
 router = APIRouter()
 
@@ -19,6 +28,7 @@ class TextToLatexRequest(BaseModel):
     """文本转 LaTeX 请求"""
     project_id: str
     text: str
+    cache: CacheMode = "default"
 
 
 class ContinueWritingRequest(BaseModel):
@@ -33,6 +43,16 @@ class CheckContentRequest(BaseModel):
     project_id: str
     content: str
     check_type: str = "all"
+    cache: CacheMode = "default"
+
+
+class CheckBatchRequest(BaseModel):
+    """批量检查请求"""
+    project_id: str
+    paths: List[str] = []
+    glob: Optional[str] = None
+    check_type: str = "all"
+    cache: CacheMode = "default"
 
 
 class SearchPapersRequest(BaseModel):
@@ -40,6 +60,7 @@ class SearchPapersRequest(BaseModel):
     project_id: str
     keywords: List[str]
     field: str = ""
+    cache: CacheMode = "default"
 
 
 class GenerateCodeRequest(BaseModel):
@@ -47,30 +68,49 @@ class GenerateCodeRequest(BaseModel):
     project_id: str
     description: str
     language: str = "python"
+    cache: CacheMode = "default"
+
+
+def _stream_response(
+    stream: ReplayStream,
+    after: int = 0,
+    accept_encoding: Optional[str] = None
+):
+    """订阅流并返回 SSE 响应，响应头 X-Stream-Id 为流 ID"""
+    return event_stream_response(
+        stream_registry.subscribe(stream, after, settings.STREAM_HEARTBEAT_SECONDS),
+        accept_encoding,
+        {"X-Stream-Id": stream.id}
+    )
 
 
 @router.post("/analyze-idea")
-async def analyze_idea(request: AnalyzeIdeaRequest):
+async def analyze_idea(
+    request: AnalyzeIdeaRequest,
+    accept_encoding: Optional[str] = Header(None)
+):
     """
-    分析 idea 可行性（流式响应）
+    分析 idea 可行性（SSE 流式响应）
 
     - **project_id**: 项目ID
     - **idea_content**: 创新点内容
     - **project_context**: 项目上下文（可选）
-    """
-    async def generate():
-        try:
-            async for chunk in ai_service.analyze_idea(
-                request.idea_content,
-                request.project_context
-            ):
-                yield f"data: {chunk}\n\n"
-        except Exception as e:
-            yield f"data: [ERROR] {str(e)}\n\n"
-        finally:
-            yield "data: [DONE]\n\n"
 
-    return StreamingResponse(generate(), media_type="text/plain")
+    项目参考资料中与 idea 最相关的片段会自动加入提示词，整体按 token 预算裁剪。
+
+    响应为 text/event-stream：默认事件的 data 为新增文本（约每 30ms 一条，带递增 id，客户端依次拼接），
+    续传时可能先收到一条 snapshot 事件（截至该 id 的完整文本，替换已有内容），
+    失败时发送 error 事件，最后总是发送 done 事件。
+
+    生成在服务端后台进行，连接断开不会中断；响应头 X-Stream-Id 为流 ID，
+    断线后用 `GET /streams/{stream_id}` 携带 Last-Event-ID 续传。
+    """
+    stream = stream_registry.start(ai_service.analyze_idea(
+        request.idea_content,
+        request.project_context,
+        request.project_id
+    ))
+    return _stream_response(stream, accept_encoding=accept_encoding)
 
 
 @router.post("/text-to-latex")
@@ -80,9 +120,10 @@ async def text_to_latex(request: TextToLatexRequest):
 
     - **project_id**: 项目ID
     - **text**: 待转换的文本
+    - **cache**: 缓存策略（default | bypass）
     """
     try:
-        result = await ai_service.text_to_latex(request.text)
+        result = await ai_service.text_to_latex(request.text, request.cache, request.project_id)
         return {
             "success": True,
             "result": result
@@ -92,27 +133,71 @@ async def text_to_latex(request: TextToLatexRequest):
 
 
 @router.post("/continue-writing")
-async def continue_writing(request: ContinueWritingRequest):
+async def continue_writing(
+    request: ContinueWritingRequest,
+    accept_encoding: Optional[str] = Header(None)
+):
     """
-    续写论文内容（流式响应）
+    续写论文内容（SSE 流式响应）
 
     - **project_id**: 项目ID
     - **current_content**: 当前内容
     - **file_context**: 文件上下文（可选）
+
+    长文档按 token 预算裁剪：保留末尾原文和前文概要，并加入项目相关资料。
+    响应格式和断线续传方式同 analyze-idea。
+    """
+    stream = stream_registry.start(ai_service.continue_writing(
+        request.current_content,
+        request.file_context,
+        request.project_id
+    ))
+    return _stream_response(stream, accept_encoding=accept_encoding)
+
+
+@router.get("/streams/{stream_id}")
+async def resume_stream(
+    stream_id: str,
+    last_event_id: Optional[int] = Query(None, description="已收到的最后一个事件 ID（优先使用 Last-Event-ID 请求头）"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """
+    续传流式响应（SSE）
+
+    - **stream_id**: 流 ID（流式接口响应头 X-Stream-Id）
+    - **Last-Event-ID**: 已收到的最后一个事件 ID，缺省时从头回放
+
+    先补发错过的事件，流仍在生成时继续实时输出。服务端只保留最近的若干帧：
+    续传位置已不在缓冲中时，补发一条 snapshot 事件（截至当前的完整文本）。
+    流结束后在 STREAM_REPLAY_TTL_SECONDS 内仍可回放。
+    """
+    try:
+        stream = stream_registry.get(stream_id)
+    except StreamNotFound:
+        raise HTTPException(status_code=404, detail=f"流不存在或已过期: {stream_id}")
+
+    after = last_event_id or 0
+    if last_event_id_header and last_event_id_header.strip().isdigit():
+        after = int(last_event_id_header)
+    return _stream_response(stream, after, accept_encoding)
+
+
+@router.delete("/streams/{stream_id}")
+async def cancel_stream(stream_id: str):
     """
-    async def generate():
-        try:
-            async for chunk in ai_service.continue_writing(
-                request.current_content,
-                request.file_context
-            ):
-                yield f"data: {chunk}\n\n"
-        except Exception as e:
-            yield f"data: [ERROR] {str(e)}\n\n"
-        finally:
-            yield "data: [DONE]\n\n"
+    取消进行中的流式生成（关闭上游调用）
 
-    return StreamingResponse(generate(), media_type="text/plain")
+    - **stream_id**: 流 ID
+    """
+    try:
+        stream_registry.get(stream_id)
+    except StreamNotFound:
+        raise HTTPException(status_code=404, detail=f"流不存在或已过期: {stream_id}")
+    return {
+        "success": True,
+        "cancelled": stream_registry.cancel(stream_id)
+    }
 
 
 @router.post("/check-content")
@@ -123,11 +208,16 @@ async def check_content(request: CheckContentRequest):
     - **project_id**: 项目ID
     - **content**: 待检查内容
     - **check_type**: 检查类型 (grammar, logic, all)
+    - **cache**: 缓存策略（default | bypass）
+
+    逻辑检查（logic、all）会附带项目的全文摘要作为背景。
     """
     try:
         diagnostics = await ai_service.check_content(
             request.content,
-            request.check_type
+            request.check_type,
+            request.cache,
+            request.project_id
         )
         return {
             "success": True,
@@ -137,6 +227,125 @@ async def check_content(request: CheckContentRequest):
         raise HTTPException(status_code=500, detail=f"检查失败: {str(e)}")
 
 
+@router.post("/check-batch")
+async def start_check_batch(request: CheckBatchRequest):
+    """
+    开始批量检查项目文件
+
+    - **project_id**: 项目ID
+    - **paths**: 文件相对路径列表
+    - **glob**: 相对项目根目录的 glob 模式，如 `主体/*.tex`、`**/*.md`（与 paths 取并集）
+    - **check_type**: 检查类型 (grammar, logic, all)
+    - **cache**: 缓存策略（default | bypass）
+
+    只检查 .md、.txt、.tex 文件，跳过隐藏文件。任务在后台运行，返回 job_id；
+    用 `GET /check-batch/{job_id}/events` 接收每个文件的诊断，`GET /check-batch/{job_id}` 查询进度。
+    未修改的内容块复用之前的检查结果。
+    """
+    if not request.paths and not request.glob:
+        raise HTTPException(status_code=400, detail="请指定 paths 或 glob")
+    try:
+        job = await batch_check_service.start(
+            request.project_id,
+            request.paths,
+            request.glob,
+            request.check_type,
+            request.cache
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "success": True,
+        **job.to_dict()
+    }
+
+
+@router.get("/check-batch/stats")
+async def get_check_batch_stats():
+    """
+    获取批量检查任务统计
+
+    返回 {started, completed, cancelled, failed, retained, active}：
+    累计开始/完成/取消/失败的任务数，当前保留（可查询和回放）的任务数和进行中的任务数
+    """
+    return batch_check_service.get_stats()
+
+
+@router.get("/check-batch/{job_id}")
+async def get_check_batch(job_id: str):
+    """
+    查询批量检查任务的状态和进度
+
+    - **job_id**: 任务 ID
+
+    status 为 running、completed、cancelled 或 failed；progress 包含文件数、块数、
+    已完成/复用/失败的块数（chunks_total 随文件读取完成逐步增加）。
+    """
+    try:
+        return batch_check_service.get(job_id).to_dict()
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"任务不存在或已过期: {job_id}")
+
+
+@router.get("/check-batch/{job_id}/events")
+async def check_batch_events(
+    job_id: str,
+    last_event_id: Optional[int] = Query(None, description="已收到的最后一个事件 ID（优先使用 Last-Event-ID 请求头）"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    accept_encoding: Optional[str] = Header(None)
+):
+    """
+    接收批量检查结果（SSE）
+
+    - **job_id**: 任务 ID
+    - **Last-Event-ID**: 已收到的最后一个事件 ID，缺省时从头回放
+
+    事件的 data 均为 JSON，带递增 id：
+    - file 事件：一个文件检查完成 {path, diagnostics, chunks, reused, failed, error}，
+      diagnostics 的行号相对于该文件
+    - progress 事件：每完成一个内容块发送一次进度
+    - done 事件：任务结束 {status, progress, error}（总是最后一条）
+
+    任务在 BATCH_CHECK_JOB_TTL_SECONDS 内可以重复回放。
+    """
+    try:
+        job = batch_check_service.get(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"任务不存在或已过期: {job_id}")
+
+    after = last_event_id or 0
+    if last_event_id_header and last_event_id_header.strip().isdigit():
+        after = int(last_event_id_header)
+
+    async def events():
+        async for event in batch_check_service.subscribe(job, after, settings.STREAM_HEARTBEAT_SECONDS):
+            if event is None:
+                yield SSE_HEARTBEAT
+                continue
+            yield encode_sse(json.dumps(event.data, ensure_ascii=False), event=event.type, event_id=event.seq)
+
+    return sse_response(events(), accept_encoding)
+
+
+@router.delete("/check-batch/{job_id}")
+async def cancel_check_batch(job_id: str):
+    """
+    取消进行中的批量检查任务
+
+    - **job_id**: 任务 ID
+    """
+    try:
+        batch_check_service.get(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"任务不存在或已过期: {job_id}")
+    return {
+        "success": True,
+        "cancelled": batch_check_service.cancel(job_id)
+    }
+
+
 @router.post("/search-papers")
 async def search_papers(request: SearchPapersRequest):
     """
@@ -145,11 +354,16 @@ async def search_papers(request: SearchPapersRequest):
     - **project_id**: 项目ID
     - **keywords**: 关键词列表
     - **field**: 研究领域（可选）
+    - **cache**: 缓存策略（default | bypass）
+
+    项目参考资料中与关键词相关的片段会自动加入提示词。
     """
     try:
         result = await ai_service.search_papers(
             request.keywords,
-            request.field
+            request.field,
+            request.cache,
+            request.project_id
         )
         return {
             "success": True,
@@ -167,11 +381,14 @@ async def generate_code(request: GenerateCodeRequest):
     - **project_id**: 项目ID
     - **description**: 代码描述
     - **language**: 编程语言（默认 python）
+    - **cache**: 缓存策略（default | bypass）
     """
     try:
         result = await ai_service.generate_code(
             request.description,
-            request.language
+            request.language,
+            request.cache,
+            request.project_id
         )
         return {
             "success": True,
@@ -179,3 +396,54 @@ async def generate_code(request: GenerateCodeRequest):
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"生成代码失败: {str(e)}")
+
+
+@router.get("/summaries")
+async def get_summaries(project_id: str):
+    """
+    获取项目的分层摘要
+
+    - **project_id**: 项目ID
+
+    返回全文摘要 document，以及 `主体`、`idea` 下每个文件的摘要和章节摘要（line 从 0 开始）。
+    摘要在后台按需生成，首次请求或文件修改后 refreshing 为 true，此时返回的是已有的结果。
+    """
+    try:
+        return summary_service.get_summaries(project_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    获取 AI 响应缓存及复用统计
+
+    顶层字段为响应缓存统计（内存/磁盘命中数、未命中数、跳过缓存次数、命中率），其余分项：
+    - check_chunks：增量内容检查中重新检查/复用的块数
+    - context：续写和 idea 分析组装的上下文 token 数（last 为最近一次的分项明细）
+    - summaries：章节摘要的生成/复用/失败次数
+    - single_flight：合并进行中调用的统计（joined 为复用进行中调用的次数）
+    - streams：可续传流的开始/续传/取消次数
+
+    模型调用排队见 /queue/stats，批量检查见 /check-batch/stats，后台任务见 /jobs/stats。
+    """
+    return {
+        **response_cache.get_stats(),
+        "check_chunks": ai_service.check_stats,
+        "context": ai_service.context_stats,
+        "summaries": summary_service.get_stats(),
+        "single_flight": single_flight.get_stats(),
+        "streams": stream_registry.get_stats()
+    }
+
+
+@router.get("/queue/stats")
+async def get_queue_stats():
+    """
+    获取模型调用排队统计
+
+    返回并发上限、进行中的调用数、各优先级（interactive > on_demand > background）的排队深度、
+    最近的等待时间分位数（毫秒）、平均调用耗时，以及准入/排队/限速/取消的累计次数
+    """
+    return llm_scheduler.get_stats()
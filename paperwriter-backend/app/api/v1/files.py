@@ -1,7 +1,36 @@
 """文件操作 API"""
-from fastapi import APIRouter, HTTPException, Query
-from app.models.file import FileRead, FileWrite, FileCreate, FileDelete
-from app.core.file_service import file_service
+import mimetypes
+from contextlib import aclosing
+from pathlib import PurePosixPath
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import AsyncGenerator, AsyncIterator, NoReturn, Optional
+from app.models.file import (
+    FileRead,
+    FileWrite,
+    FilePatch,
+    FileCreate,
+    FileDelete,
+    UploadInit
+)
+from app.core.file_service import (
+    ETagMismatch,
+    FileDeleted,
+    FileTooLarge,
+    UnsupportedFileType,
+    file_service
+)
+from app.core.pdf_service import pdf_service
+from app.core.upload_service import (
+    ChecksumMismatch,
+    UploadNotFound,
+    UploadOffsetMismatch,
+    upload_service
+)
+from app.utils.fs_scan import SortField, SortOrder
+from app.utils.http_utils import RangeNotSatisfiable, etag_matches, parse_range
+from app.utils.multipart_stream import MultipartEvent, iter_multipart
+from app.utils.text_patch import PatchConflict
 
 router = APIRouter()
 
@@ -9,23 +38,145 @@ router = APIRouter()
 @router.get("/list")
 async def list_files(
     project_id: str = Query(..., description="项目ID"),
-    folder_path: str = Query("", description="文件夹路径")
+    folder_path: str = Query("", description="文件夹路径"),
+    cursor: Optional[str] = Query(None, description="分页游标"),
+    limit: Optional[int] = Query(None, ge=1, le=5000, description="每页数量"),
+    sort: SortField = Query("name", description="排序字段"),
+    order: SortOrder = Query("asc", description="排序方向"),
+    pattern: Optional[str] = Query(None, description="文件名 glob 模式"),
+    extensions: Optional[str] = Query(None, description="扩展名过滤"),
+    depth: int = Query(1, ge=1, le=10, description="展开层数"),
+    details: bool = Query(False, description="是否返回大小和修改时间")
 ):
     """
     列出目录中的文件
 
     - **project_id**: 项目ID
     - **folder_path**: 文件夹相对路径（空字符串表示项目根目录）
+    - **cursor**: 上一页返回的 next_cursor
+    - **limit**: 每页数量（不传则返回全部）
+    - **sort**: 排序字段 (name, mtime, size)
+    - **order**: 排序方向 (asc, desc)
+    - **pattern**: 文件名 glob 模式，多个用逗号分隔，如 `*.pdf,draft*`
+    - **extensions**: 扩展名过滤，多个用逗号分隔，如 `.pdf,.tex`
+    - **depth**: 展开层数（1 表示只列当前目录，分页只作用于当前层）
+    - **details**: 是否返回大小和修改时间
     """
     try:
-        files = await file_service.list_files(project_id, folder_path)
-        return {"files": files}
+        files, next_cursor = await file_service.list_files(
+            project_id,
+            folder_path,
+            cursor=cursor,
+            limit=limit,
+            sort=sort,
+            order=order,
+            pattern=pattern,
+            extensions=[e.strip() for e in extensions.split(",") if e.strip()] if extensions else None,
+            depth=depth,
+            details=details
+        )
+        return {"files": files, "next_cursor": next_cursor}
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"列出文件失败: {str(e)}")
 
 
+@router.get("/search")
+async def search_files(
+    project_id: str = Query(..., description="项目ID"),
+    q: str = Query(..., min_length=1, description="查询字符串"),
+    limit: int = Query(20, ge=1, le=100, description="返回的文件数"),
+    offset: int = Query(0, ge=0, description="跳过的文件数"),
+    path: Optional[str] = Query(None, description="只检索该目录"),
+    extensions: Optional[str] = Query(None, description="扩展名过滤")
+):
+    """
+    全文检索项目文件
+
+    - **project_id**: 项目ID
+    - **q**: 查询字符串，空格分隔的多个词需同时出现；中文按任意片段匹配，英文支持前缀匹配
+    - **limit** / **offset**: 分页
+    - **path**: 只检索该目录，如 `主体`
+    - **extensions**: 扩展名过滤，多个用逗号分隔，如 `.tex,.md`
+
+    结果按相关度排序，每个文件附带命中位置（行号、列号从 0 开始）和片段；
+    PDF 按提取出的文本检索，命中位置额外带有页码 page。
+    首次检索时索引在后台构建，期间 indexing 为 true，结果可能不完整。
+    """
+    try:
+        return await file_service.search(
+            project_id,
+            q,
+            limit=limit,
+            offset=offset,
+            path_prefix=path,
+            extensions=[e.strip() for e in extensions.split(",") if e.strip()] if extensions else None
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"检索失败: {str(e)}")
+
+
+@router.get("/retrieve")
+async def retrieve_passages(
+    project_id: str = Query(..., description="项目ID"),
+    q: str = Query(..., min_length=1, description="查询文本"),
+    top_k: int = Query(5, ge=1, le=50, description="返回的片段数"),
+    min_score: float = Query(0.0, ge=-1.0, le=1.0, description="最低相似度")
+):
+    """
+    语义检索项目参考资料和笔记
+
+    - **project_id**: 项目ID
+    - **q**: 查询文本（可以是一段话）
+    - **top_k**: 返回的片段数
+    - **min_score**: 最低余弦相似度
+
+    检索范围由 RETRIEVAL_FOLDERS 配置（默认 `引用` 和 `idea`）。
+    每个结果包含 path、line（从 0 开始）、text、score，PDF 片段额外带有页码 page。
+    """
+    try:
+        return await file_service.retrieve(project_id, q, top_k, min_score)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"检索失败: {str(e)}")
+
+
+@router.get("/pdf")
+async def get_pdf_info(
+    project_id: str = Query(..., description="项目ID"),
+    file_path: str = Query(..., description="PDF 相对路径"),
+    include_text: bool = Query(False, description="是否返回全文")
+):
+    """
+    获取 PDF 的元数据、页码映射和文本
+
+    - **project_id**: 项目ID
+    - **file_path**: PDF 相对路径
+    - **include_text**: 是否返回全文
+
+    metadata 包含 title、authors、year、doi；page_lines[i] 为第 i+1 页在全文中的起始行号。
+    同一内容的 PDF 只解析一次，结果按内容哈希缓存。
+    """
+    try:
+        return await file_service.get_pdf_info(project_id, file_path, include_text)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"PDF 解析失败: {str(e)}")
+
+
 @router.post("/read")
 async def read_file(request: FileRead):
     """
@@ -33,12 +184,17 @@ async def read_file(request: FileRead):
 
     - **project_id**: 项目ID（从请求体获取）
     - **file_path**: 文件相对路径
+
+    返回的 etag 可作为 /patch 的 base_etag。
     """
     try:
+        # 先取 ETag 再读内容：期间若有写入，ETag 只会偏旧，补丁时返回 409 而不会误覆盖
+        _, stat_result = await file_service.stat_file(request.project_id, request.file_path)
         content = await file_service.read_file(request.project_id, request.file_path)
         return {
             "success": True,
-            "content": content
+            "content": content,
+            "etag": file_service.file_etag(stat_result)
         }
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="文件不存在")
@@ -46,6 +202,74 @@ async def read_file(request: FileRead):
         raise HTTPException(status_code=500, detail=f"读取文件失败: {str(e)}")
 
 
+@router.get("/content")
+async def get_file_content(
+    project_id: str = Query(..., description="项目ID"),
+    file_path: str = Query(..., description="文件相对路径"),
+    if_none_match: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+    range: Optional[str] = Header(None)
+):
+    """
+    流式读取文件内容（原始字节）
+
+    - **project_id**: 项目ID
+    - **file_path**: 文件相对路径
+
+    响应带强 ETag；If-None-Match 命中时返回 304。
+    支持单段 Range 请求（206），If-Range 与当前 ETag 不一致时返回完整内容。
+    """
+    try:
+        full_path, stat_result = await file_service.stat_file(project_id, file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    size = stat_result.st_size
+    etag = file_service.file_etag(stat_result)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "no-cache",
+    }
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    # text/* 类型由 Starlette 自动追加 charset=utf-8
+    media_type = mimetypes.guess_type(full_path.name)[0] or "application/octet-stream"
+
+    byte_range = None
+    if range and (if_range is None or if_range == etag):
+        try:
+            byte_range = parse_range(range, size)
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{size}"}
+            )
+
+    if byte_range is None:
+        return StreamingResponse(
+            file_service.iter_file(full_path),
+            media_type=media_type,
+            headers={**headers, "Content-Length": str(size)}
+        )
+
+    start, end = byte_range
+    return StreamingResponse(
+        file_service.iter_file(full_path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers={
+            **headers,
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Content-Length": str(end - start + 1)
+        }
+    )
+
+
 @router.post("/write")
 async def write_file(request: FileWrite):
     """
@@ -55,9 +279,13 @@ async def write_file(request: FileWrite):
     - **file_path**: 文件相对路径
     - **content**: 文件内容
     - **encoding**: 文件编码（默认utf-8）
+
+    连续快速保存同一文件时只落盘最后一次：被后续保存覆盖的请求返回 superseded 为 true
+    且 etag 为 null，之前拿到的 ETag 不再有效，下一次 /patch 需要先重新读取。
+    等待落盘期间文件被删除时返回 404。
     """
     try:
-        await file_service.write_file(
+        etag = await file_service.write_file(
             request.project_id,
             request.file_path,
             request.content,
@@ -65,12 +293,294 @@ async def write_file(request: FileWrite):
         )
         return {
             "success": True,
-            "message": "文件保存成功"
+            "message": "文件保存成功" if etag else "已被后续保存覆盖",
+            "etag": etag,
+            "superseded": etag is None
         }
+    except FileDeleted as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"写入文件失败: {str(e)}")
 
 
+@router.post("/patch")
+async def patch_file(request: FilePatch):
+    """
+    以补丁方式保存文件（只上传修改部分）
+
+    - **project_id**: 项目ID（从请求体获取）
+    - **file_path**: 文件相对路径
+    - **base_etag**: 补丁基于的文件 ETag（来自 /read、/write、/patch 或 /content）
+    - **edits**: 区间替换编辑 `[{from, to, text}]`，坐标基于基准内容
+    - **diff**: unified diff 文本（与 edits 二选一）
+    - **offset_unit**: edits 偏移量单位（utf16 | codepoint）
+
+    基准 ETag 已过期时返回 409，响应头 ETag 为当前版本，客户端应重新读取后再提交。
+    """
+    try:
+        etag, size = await file_service.patch_file(
+            request.project_id,
+            request.file_path,
+            request.base_etag,
+            edits=request.edits,
+            diff=request.diff,
+            offset_unit=request.offset_unit
+        )
+        return {
+            "success": True,
+            "message": "文件保存成功",
+            "etag": etag,
+            "size": size
+        }
+    except ETagMismatch as e:
+        raise HTTPException(
+            status_code=409,
+            detail=str(e),
+            headers={"ETag": e.current_etag}
+        )
+    except PatchConflict as e:
+        raise HTTPException(status_code=409, detail=f"补丁无法应用: {str(e)}")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"写入文件失败: {str(e)}")
+
+
+def _raise_upload_error(e: Exception) -> NoReturn:
+    """把上传异常转换为 HTTP 错误"""
+    if isinstance(e, UploadNotFound):
+        raise HTTPException(status_code=404, detail=str(e))
+    if isinstance(e, UploadOffsetMismatch):
+        # 客户端据此从已接收位置继续
+        raise HTTPException(
+            status_code=409,
+            detail=str(e),
+            headers={"Upload-Offset": str(e.received)}
+        )
+    if isinstance(e, ChecksumMismatch):
+        raise HTTPException(status_code=422, detail=str(e))
+    if isinstance(e, FileTooLarge):
+        raise HTTPException(status_code=413, detail=str(e))
+    if isinstance(e, UnsupportedFileType):
+        raise HTTPException(status_code=415, detail=str(e))
+    if isinstance(e, FileExistsError):
+        raise HTTPException(status_code=409, detail=str(e))
+    if isinstance(e, FileNotFoundError):
+        raise HTTPException(status_code=404, detail=str(e))
+    if isinstance(e, ValueError):
+        raise HTTPException(status_code=400, detail=str(e))
+    raise HTTPException(status_code=500, detail=f"上传文件失败: {str(e)}")
+
+
+async def _part_chunks(events: AsyncIterator[MultipartEvent]) -> AsyncGenerator[bytes, None]:
+    """
+    从 multipart 事件流中取出当前文件分段的内容
+
+    Raises:
+        ValueError: 事件流在分段结束之前中断（文件不完整，不会被保存）
+    """
+    async for event in events:
+        if event[0] == "file_data":
+            yield event[1]
+        elif event[0] == "file_end":
+            return
+    raise ValueError("上传的文件分段不完整")
+
+
+@router.put("/upload")
+async def upload_file(
+    request: Request,
+    project_id: str = Query(..., description="项目ID"),
+    file_path: str = Query(..., description="文件相对路径"),
+    overwrite: bool = Query(False, description="是否覆盖已有文件"),
+    content_length: Optional[int] = Header(None)
+):
+    """
+    上传单个文件（请求体为原始文件内容，支持 chunked 传输）
+
+    - **project_id**: 项目ID
+    - **file_path**: 目标文件相对路径
+    - **overwrite**: 目标已存在时是否覆盖
+
+    请求体直接流式写盘；超过 MAX_FILE_SIZE_MB 或项目剩余空间时立即中止并返回 413，
+    扩展名不在 ALLOWED_EXTENSIONS 中返回 415。
+    """
+    try:
+        result = await file_service.upload_file(
+            project_id,
+            file_path,
+            request.stream(),
+            overwrite=overwrite,
+            expected_size=content_length
+        )
+    except Exception as e:
+        _raise_upload_error(e)
+    return {"success": True, "file": result}
+
+
+@router.post("/upload")
+async def upload_files(
+    request: Request,
+    project_id: str = Query(..., description="项目ID"),
+    folder_path: str = Query("", description="目标文件夹路径"),
+    overwrite: bool = Query(False, description="是否覆盖已有文件")
+):
+    """
+    上传文件（multipart/form-data，可包含多个文件）
+
+    - **project_id**: 项目ID
+    - **folder_path**: 目标文件夹相对路径，文件名取自各分段的 filename
+    - **overwrite**: 目标已存在时是否覆盖
+
+    各文件分段边解析边写盘，限制与 PUT /upload 相同；
+    某个文件失败时请求以错误结束，之前已完成的文件会保留。
+    """
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        raise HTTPException(
+            status_code=415,
+            detail="请使用 multipart/form-data；上传原始文件内容请使用 PUT /upload"
+        )
+
+    uploaded = []
+    try:
+        events = iter_multipart(content_type, request.stream())
+        async with aclosing(events):
+            async for event in events:
+                if event[0] != "file_start":
+                    continue
+                # 只取文件名部分，忽略客户端带上的目录
+                filename = PurePosixPath(event[2].replace("\\", "/")).name
+                if not filename:
+                    raise ValueError("上传文件缺少文件名")
+                file_path = f"{folder_path.rstrip('/')}/{filename}" if folder_path else filename
+                uploaded.append(await file_service.upload_file(
+                    project_id,
+                    file_path,
+                    _part_chunks(events),
+                    overwrite=overwrite
+                ))
+    except Exception as e:
+        _raise_upload_error(e)
+
+    if not uploaded:
+        raise HTTPException(status_code=400, detail="请求中没有文件")
+    return {"success": True, "files": uploaded}
+
+
+@router.post("/uploads")
+async def create_upload(request: UploadInit):
+    """
+    创建可续传上传
+
+    - **project_id**: 项目ID
+    - **file_path**: 目标文件相对路径
+    - **size**: 文件总字节数（按 MAX_FILE_SIZE_MB 和项目剩余空间检查并预留）
+    - **checksum**: 文件 SHA-256，完成时校验（可选）
+    - **overwrite**: 目标已存在时是否覆盖
+
+    返回 upload_id，之后用 PUT /uploads/{upload_id}?offset=N 上传分块。
+    """
+    try:
+        return await upload_service.create(
+            request.project_id,
+            request.file_path,
+            request.size,
+            checksum=request.checksum,
+            overwrite=request.overwrite
+        )
+    except Exception as e:
+        _raise_upload_error(e)
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload_status(upload_id: str):
+    """
+    查询上传状态
+
+    断线后先查询 received，再从该偏移量继续上传。
+    """
+    try:
+        return await upload_service.status(upload_id)
+    except Exception as e:
+        _raise_upload_error(e)
+
+
+@router.put("/uploads/{upload_id}")
+async def upload_chunk(
+    request: Request,
+    upload_id: str,
+    offset: int = Query(..., ge=0, description="分块起始偏移量")
+):
+    """
+    上传分块（请求体为原始字节）
+
+    - **offset**: 分块在文件中的起始偏移量
+
+    与已接收部分重叠的字节会被跳过，重复提交同一分块是安全的；
+    offset 大于已接收字节数时返回 409，响应头 Upload-Offset 为已接收字节数。
+    """
+    try:
+        return await upload_service.write_chunk(upload_id, offset, request.stream())
+    except Exception as e:
+        _raise_upload_error(e)
+
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str):
+    """
+    完成上传
+
+    校验大小和 SHA-256 后原子移动到项目中；校验失败返回 422 并删除该上传。
+    """
+    try:
+        result = await upload_service.complete(upload_id)
+    except Exception as e:
+        _raise_upload_error(e)
+    return {"success": True, "file": result}
+
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str):
+    """取消上传并删除已接收的数据"""
+    try:
+        await upload_service.abort(upload_id)
+    except Exception as e:
+        _raise_upload_error(e)
+    return {"success": True, "message": "上传已取消"}
+
+
+@router.get("/usage")
+async def get_usage(project_id: str = Query(..., description="项目ID")):
+    """
+    项目空间占用
+
+    - **used**: 已用字节数
+    - **limit**: 上限字节数（MAX_PROJECT_SIZE_MB）
+    """
+    try:
+        return await file_service.get_usage(project_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/stats")
+async def get_write_stats():
+    """
+    写入统计
+
+    - **requested**: 保存请求次数
+    - **written**: 实际落盘次数
+    - **coalesced**: 合并窗口内被后续保存覆盖的写入次数
+    - **pdf**: PDF 提取统计（extracted、cache_hits、failed、pending）
+    """
+    return {**file_service.write_stats, "pdf": pdf_service.get_stats()}
+
+
 @router.post("/create")
 async def create_file(request: FileCreate):
     """
@@ -94,6 +604,8 @@ async def create_file(request: FileCreate):
         }
     except FileExistsError:
         raise HTTPException(status_code=409, detail="文件已存在")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"创建文件失败: {str(e)}")
 
@@ -114,5 +626,7 @@ async def delete_file(request: FileDelete):
         }
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="文件不存在")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"删除文件失败: {str(e)}")
@@ -0,0 +1,120 @@
+"""后台任务 API"""
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, ValidationError
+from app.core.job_queue import JobKind, JobNotFound, job_queue
+
+router = APIRouter()
+
+
+class SubmitJobRequest(BaseModel):
+    """提交后台任务请求"""
+    project_id: str
+    kind: JobKind
+    params: dict = {}
+
+
+@router.post("")
+async def submit_job(request: SubmitJobRequest):
+    """
+    提交后台 AI 任务
+
+    - **project_id**: 项目ID
+    - **kind**: 任务类型 (text_to_latex, search_papers, generate_code)
+    - **params**: 任务参数，字段与对应的同步接口相同，如 `{"description": "...", "language": "python"}`
+
+    立即返回 job_id，任务按提交顺序在后台执行，服务重启后未完成的任务会重新执行。
+    结束时向项目的 WebSocket 连接推送 `{"type": "job_complete", "job_id": "...", "status": "..."}`，
+    也可以轮询 `GET /jobs/{job_id}`。
+    """
+    try:
+        job = await job_queue.submit(request.project_id, request.kind, request.params)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "success": True,
+        **job
+    }
+
+
+@router.get("")
+async def list_jobs(
+    project_id: str,
+    limit: int = Query(50, ge=1, le=500, description="返回的任务数")
+):
+    """
+    列出项目最近提交的任务（按提交时间倒序，不含结果）
+
+    - **project_id**: 项目ID
+    """
+    return {
+        "jobs": await job_queue.list_jobs(project_id, limit)
+    }
+
+
+@router.get("/stats")
+async def get_job_stats():
+    """
+    获取后台任务统计
+
+    返回提交/恢复/完成/失败/取消/清理的累计任务数、执行中和排队中的任务数，以及数据库中各状态的任务数
+    """
+    return await job_queue.get_stats()
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """
+    查询任务状态
+
+    - **job_id**: 任务ID
+
+    status 为 pending、running、completed、failed 或 cancelled，失败时 error 为错误信息。
+    """
+    try:
+        return await job_queue.get(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"任务不存在或已被清理: {job_id}")
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str):
+    """
+    获取任务结果
+
+    - **job_id**: 任务ID
+
+    任务未完成时返回 409，失败时返回 500（detail 为错误信息）。
+    结果在 AI_JOB_RETENTION_SECONDS 内可以重复获取。
+    """
+    try:
+        job = await job_queue.get(job_id, with_result=True)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"任务不存在或已被清理: {job_id}")
+
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"任务失败: {job['error']}")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"任务未完成: {job['status']}")
+    return {
+        "success": True,
+        "result": job["result"]
+    }
+
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str):
+    """
+    取消排队中或执行中的任务
+
+    - **job_id**: 任务ID
+    """
+    try:
+        cancelled = await job_queue.cancel(job_id)
+    except JobNotFound:
+        raise HTTPException(status_code=404, detail=f"任务不存在或已被清理: {job_id}")
+    return {
+        "success": True,
+        "cancelled": cancelled
+    }
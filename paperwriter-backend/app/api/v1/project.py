@@ -1,7 +1,9 @@
 """项目管理 API"""
-from fastapi import APIRouter, HTTPException
+import json
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from typing import Optional
 from app.models.project import ProjectCreate, ProjectOpen, ProjectStructure
-from app.core.project_service import project_service
+from app.core.project_service import PROJECT_FOLDERS, project_service
 
 router = APIRouter()
 
@@ -32,19 +34,33 @@ async def open_project(request: ProjectOpen):
     打开现有项目
 
     - **project_id**: 项目ID
+
+    文件树来自内存索引，响应头带 ETag，可用于后续 /structure 请求的 If-None-Match；
+    响应中的 generation/seq 用于 /changes 增量同步
     """
     try:
-        structure = await project_service.get_project_tree(request.project_id)
-        validation = await project_service.validate_project(request.project_id)
-
-        if not validation["valid"]:
-            raise HTTPException(status_code=400, detail=validation.get("error"))
-
-        return {
-            "project_id": request.project_id,
-            "structure": structure,
-            "path": validation.get("path")
-        }
+        index = await project_service.get_tree_index(request.project_id)
+        missing = index.missing_folders(PROJECT_FOLDERS)
+
+        if missing:
+            raise HTTPException(status_code=400, detail=f"缺少目录: {', '.join(missing)}")
+
+        # 文件树已缓存为 JSON，直接拼接避免重新序列化
+        body = b"".join([
+            b'{"project_id":', json.dumps(request.project_id).encode("utf-8"),
+            b',"structure":', index.tree_json,
+            b',"path":', json.dumps(str(index.root), ensure_ascii=False).encode("utf-8"),
+            b',"generation":', json.dumps(index.generation).encode("utf-8"),
+            b',"seq":', str(index.seq).encode("utf-8"),
+            b"}"
+        ])
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={"ETag": index.etag}
+        )
+    except HTTPException:
+        raise
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="项目不存在")
     except Exception as e:
@@ -66,21 +82,59 @@ async def validate_project(project_id: str):
 
 
 @router.get("/structure")
-async def get_project_structure(project_id: str):
+async def get_project_structure(
+    project_id: str,
+    if_none_match: Optional[str] = Header(None)
+):
     """
     获取项目文件树结构
 
     - **project_id**: 项目ID
+
+    响应头带 ETag；请求头 If-None-Match 与当前版本一致时返回 304
     """
     try:
-        structure = await project_service.get_project_tree(project_id)
-        return structure
+        index = await project_service.get_tree_index(project_id)
+        headers = {"ETag": index.etag, "Cache-Control": "no-cache"}
+
+        if if_none_match == index.etag:
+            return Response(status_code=304, headers=headers)
+
+        return Response(
+            content=index.tree_json,
+            media_type="application/json",
+            headers=headers
+        )
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="项目不存在")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取项目结构失败: {str(e)}")
 
 
+@router.get("/changes")
+async def get_project_changes(
+    project_id: str,
+    since: int = Query(0, ge=0, description="客户端已同步到的变更序号"),
+    generation: Optional[str] = Query(None, description="客户端记录的索引代号")
+):
+    """
+    获取文件树增量变更
+
+    - **project_id**: 项目ID
+    - **since**: 返回序号大于该值的变更
+    - **generation**: 上次响应中的 generation；不一致时返回 reset
+
+    reset 为 true 时客户端需要重新获取 /structure
+    """
+    try:
+        index = await project_service.get_tree_index(project_id)
+        return index.changes_since(since, generation)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="项目不存在")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取文件树变更失败: {str(e)}")
+
+
 @router.post("/close")
 async def close_project(project_id: str):
     """
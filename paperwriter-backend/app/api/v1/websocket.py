@@ -1,36 +1,238 @@
 """WebSocket 实时检查端点"""
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from typing import Optional
+from typing import Any, Coroutine, Optional
+from contextlib import aclosing
 import json
 import asyncio
+import uuid
 from app.core.ai_service import ai_service
+from app.core.connection_manager import Connection, manager
+from app.core.project_service import project_service
+from app.core.stream_registry import ReplayStream, StreamNotFound, stream_registry
+from app.core.tree_index import TREE_TOPIC
 
 router = APIRouter()
 
 
-class WebSocketConnectionManager:
-    """WebSocket 连接管理器"""
+class RequestScheduler:
+    """
+    单个连接上的请求调度器
+
+    每条消息作为独立任务运行，长时间的流式请求不会阻塞后续消息；
+    任务可以按 request_id 取消，也可以被同类型的新请求替换。
+    """
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self.tasks: dict[str, asyncio.Task] = {}
+        # 可替换请求：类型 -> 当前进行中的 request_id
+        self.superseding: dict[str, str] = {}
+        # 流式请求：request_id -> 流 ID（显式取消时一并取消生成）
+        self.streams: dict[str, str] = {}
+
+    def send(self, message: dict, **options):
+        """发送消息（入队到本连接的发送队列）"""
+        self.connection.send(message, **options)
+
+    async def submit(
+        self,
+        request_id: str,
+        handler: Coroutine[Any, Any, None],
+        supersede: Optional[str] = None,
+        stream_id: Optional[str] = None
+    ):
+        """
+        提交请求任务
+
+        Args:
+            request_id: 请求ID
+            handler: 请求处理协程
+            supersede: 替换分组，同组新请求会取消旧请求
+            stream_id: 请求转发的流 ID，显式取消请求时一并取消生成
+        """
+        if supersede is not None:
+            previous = self.superseding.get(supersede)
+            if previous is not None:
+                await self.cancel(previous, reason="superseded")
+            self.superseding[supersede] = request_id
+        if request_id in self.tasks:
+            # 同一 request_id 的旧请求直接取消
+            await self.cancel(request_id, reason="superseded")
+
+        task = asyncio.create_task(self._run(request_id, handler))
+        self.tasks[request_id] = task
+        if stream_id is not None:
+            self.streams[request_id] = stream_id
+        task.add_done_callback(lambda _: self._forget(request_id, task, handler, supersede))
+
+    async def cancel(self, request_id: str, reason: str = "cancelled") -> bool:
+        """
+        取消请求任务并通知客户端
+
+        Args:
+            request_id: 请求ID
+            reason: 取消原因（cancelled | superseded）
+
+        Returns:
+            bool: 是否找到并取消了任务
+        """
+        task = self.tasks.get(request_id)
+        if task is None or task.done():
+            return False
+
+        task.cancel()
+        stream_id = self.streams.pop(request_id, None)
+        if stream_id is not None:
+            stream_registry.cancel(stream_id)
+        self.send({
+            "type": "cancelled",
+            "request_id": request_id,
+            "reason": reason
+        })
+        return True
 
-    def __init__(self):
-        self.active_connections: dict[str, WebSocket] = {}
+    async def _run(self, request_id: str, handler: Coroutine[Any, Any, None]):
+        try:
+            await handler
+        except Exception as e:
+            self.send({
+                "type": "error",
+                "request_id": request_id,
+                "message": str(e)
+            })
 
-    async def connect(self, websocket: WebSocket, project_id: str):
-        """接受连接"""
-        await websocket.accept()
-        self.active_connections[project_id] = websocket
+    def _forget(
+        self,
+        request_id: str,
+        task: asyncio.Task,
+        handler: Coroutine[Any, Any, None],
+        supersede: Optional[str]
+    ):
+        # 任务在开始执行前被取消时，处理协程从未运行，需要显式关闭
+        handler.close()
+        if self.tasks.get(request_id) is task:
+            del self.tasks[request_id]
+            self.streams.pop(request_id, None)
+        if supersede is not None and self.superseding.get(supersede) == request_id:
+            del self.superseding[supersede]
 
-    def disconnect(self, project_id: str):
-        """断开连接"""
-        if project_id in self.active_connections:
-            del self.active_connections[project_id]
+    async def close(self):
+        """连接关闭时取消所有进行中的请求（流式生成继续在后台进行，可在新连接上续传）"""
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
-    async def send_message(self, project_id: str, message: dict):
-        """发送消息"""
-        if project_id in self.active_connections:
-            await self.active_connections[project_id].send_json(message)
 
+async def _check_content(scheduler: RequestScheduler, request_id: str, data: dict):
+    """内容检查"""
+    diagnostics = await ai_service.check_content(
+        data.get("content", ""),
+        data.get("check_type", "all"),
+        data.get("cache", "default"),
+        scheduler.connection.project_id,
+        on_queued=_queue_reporter(scheduler, request_id)
+    )
+    # 客户端跟不上时只保留最新一次检查结果
+    scheduler.send({
+        "type": "diagnostics",
+        "request_id": request_id,
+        "data": [d.model_dump(by_alias=True) for d in diagnostics]
+    }, coalesce_key="diagnostics")
 
-manager = WebSocketConnectionManager()
+
+def _context_reporter(scheduler: RequestScheduler, request_id: str):
+    """返回上下文组装完成时推送 token 统计的回调"""
+    def report(context: dict):
+        scheduler.send({"type": "context", "request_id": request_id, **context})
+    return report
+
+
+def _queue_reporter(scheduler: RequestScheduler, request_id: str):
+    """返回模型调用需要排队时推送排队位置和预计等待时间的回调"""
+    def report(queued: dict):
+        # 同一请求的多次排队（如分块检查）只保留最新一条
+        scheduler.send(
+            {"type": "queued", "request_id": request_id, **queued},
+            coalesce_key=f"queued:{request_id}"
+        )
+    return report
+
+
+def _parse_seq(data: dict, key: str) -> int:
+    """
+    解析客户端提供的序号
+
+    Raises:
+        ValueError: 序号不是非负整数
+    """
+    value = data.get(key) or 0
+    try:
+        seq = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} 必须是非负整数: {value!r}") from None
+    if seq < 0:
+        raise ValueError(f"{key} 必须是非负整数: {value!r}")
+    return seq
+
+
+def _merge_stream(pending: dict, message: dict) -> dict:
+    """合并待发送的流式消息：增量依次拼接，快照替换之前的内容"""
+    if message.get("snapshot"):
+        return message
+    merged = {**message, "content": pending["content"] + message["content"]}
+    if pending.get("snapshot"):
+        merged["snapshot"] = True
+    return merged
+
+
+async def _stream(
+    scheduler: RequestScheduler,
+    request_id: str,
+    stream: ReplayStream,
+    after: int = 0
+):
+    """
+    转发可续传流的输出帧（从序号 after 之后开始）
+
+    生成在后台任务中进行，这里只是订阅：连接断开时生成不中断，显式取消时由调度器取消生成。
+    每帧是新增文本，客户端跟不上时新帧拼接到待发送的旧帧上。
+    """
+    scheduler.send({"type": "stream_started", "request_id": request_id, "stream_id": stream.id})
+    async with aclosing(stream_registry.subscribe(stream, after)) as frames:
+        async for frame in frames:
+            message = {
+                "type": "stream",
+                "request_id": request_id,
+                "stream_id": stream.id,
+                "seq": frame.seq,
+                "content": frame.text
+            }
+            if frame.snapshot:
+                message["snapshot"] = True
+            scheduler.send(message, coalesce_key=f"stream:{request_id}", merge=_merge_stream)
+
+    scheduler.send({"type": "complete", "request_id": request_id, "stream_id": stream.id})
+
+
+async def _resume(scheduler: RequestScheduler, request_id: str, stream: ReplayStream, data: dict):
+    """续传断线前的流：从客户端已收到的 last_seq 之后开始转发"""
+    await _stream(scheduler, request_id, stream, _parse_seq(data, "last_seq"))
+
+
+async def _subscribe_tree(
+    scheduler: RequestScheduler,
+    project_id: str,
+    request_id: str,
+    data: dict
+):
+    """订阅文件树变更：先补发 since 之后的变更，再持续推送"""
+    since = _parse_seq(data, "since")
+    index = await project_service.get_tree_index(project_id)
+    # 补发和订阅之间没有 await，保证不会漏掉中间的变更
+    backlog = index.changes_since(since, data.get("generation"))
+    scheduler.send({"type": "tree_changes", "request_id": request_id, **backlog})
+    scheduler.connection.subscriptions.add(TREE_TOPIC)
 
 
 @router.websocket("/stream")
@@ -41,90 +243,128 @@ async def websocket_realtime_check(
     """
     WebSocket 实时检查端点
 
-    客户端可以发送以下类型的消息：
-    - {"type": "check_content", "content": "...", "check_type": "all"}
-    - {"type": "analyze", "idea": "...", "context": "..."}
+    客户端可以发送以下类型的消息（request_id 可选，缺省时由服务端生成）：
+    - {"type": "check_content", "request_id": "...", "content": "...", "check_type": "all"}
+    - {"type": "analyze", "request_id": "...", "idea": "...", "context": "..."}
+    - {"type": "continue", "request_id": "...", "current_content": "...", "file_context": "..."}
+    - {"type": "resume", "request_id": "...", "stream_id": "...", "last_seq": 12}
+    - {"type": "cancel", "request_id": "..."}
+    - {"type": "subscribe_tree", "since": 0, "generation": "..."}
+    - {"type": "unsubscribe_tree"}
 
-    服务端响应：
+    每条请求独立执行，新的 check_content 会取消进行中的旧检查。
+    analyze/continue 的生成在服务端后台进行，连接断开后可以在新连接上用 resume
+    从 last_seq 之后续传（流结束后 STREAM_REPLAY_TTL_SECONDS 内仍可回放）；cancel 会取消生成。
+
+    服务端响应（均带有对应的 request_id）：
     - {"type": "diagnostics", "data": [...]}
-    - {"type": "stream", "content": "..."}
-    - {"type": "complete"}
+    - {"type": "context", "tokens": 1234, "budget": 6000, "exact": true, "parts": {...}}（analyze/continue 开始生成前）
+    - {"type": "queued", "priority": "interactive", "position": 3, "eta_seconds": 4.5}（模型调用需要排队时）
+    - {"type": "stream_started", "stream_id": "..."}（analyze/continue/resume 开始转发时）
+    - {"type": "stream", "stream_id": "...", "seq": 13, "content": "新增文本"}（snapshot 为 true 时 content 是截至 seq 的完整文本）
+    - {"type": "complete", "stream_id": "..."}
+    - {"type": "cancelled", "reason": "cancelled|superseded"}
     - {"type": "error", "message": "..."}
+
+    订阅文件树后推送（reset 为 true 时需要重新获取完整文件树）：
+    - {"type": "tree_changes", "generation": "...", "seq": 12, "reset": false, "changes": [...]}
+
+    后台任务（POST /jobs）结束时推送给项目的所有连接（结果通过 GET /jobs/{job_id}/result 获取）：
+    - {"type": "job_complete", "job_id": "...", "kind": "generate_code", "status": "completed|failed|cancelled", "error": null}
     """
-    await manager.connect(websocket, project_id)
+    connection = await manager.connect(websocket, project_id)
+    scheduler = RequestScheduler(connection)
 
     try:
         while True:
             # 接收客户端消息
             data = await websocket.receive_json()
+            if not isinstance(data, dict):
+                scheduler.send({"type": "error", "message": "消息必须是 JSON 对象"})
+                continue
             message_type = data.get("type")
+            request_id = str(data.get("request_id") or uuid.uuid4())
 
             if message_type == "check_content":
-                # 内容检查
-                content = data.get("content", "")
-                check_type = data.get("check_type", "all")
-
-                try:
-                    diagnostics = await ai_service.check_content(content, check_type)
-                    await manager.send_message(project_id, {
-                        "type": "diagnostics",
-                        "data": diagnostics
-                    })
-                except Exception as e:
-                    await manager.send_message(project_id, {
-                        "type": "error",
-                        "message": str(e)
-                    })
+                # 内容检查（新检查替换旧检查）
+                await scheduler.submit(
+                    request_id,
+                    _check_content(scheduler, request_id, data),
+                    supersede="check_content"
+                )
 
             elif message_type == "analyze":
                 # 分析 idea（流式）
-                idea = data.get("idea", "")
-                context = data.get("context", "")
+                stream = stream_registry.start(ai_service.analyze_idea(
+                    data.get("idea", ""),
+                    data.get("context", ""),
+                    project_id,
+                    on_context=_context_reporter(scheduler, request_id),
+                    on_queued=_queue_reporter(scheduler, request_id)
+                ))
+                await scheduler.submit(request_id, _stream(scheduler, request_id, stream), stream_id=stream.id)
+
+            elif message_type == "continue":
+                # 续写（流式）
+                stream = stream_registry.start(ai_service.continue_writing(
+                    data.get("current_content", ""),
+                    data.get("file_context", ""),
+                    project_id,
+                    on_context=_context_reporter(scheduler, request_id),
+                    on_queued=_queue_reporter(scheduler, request_id)
+                ))
+                await scheduler.submit(request_id, _stream(scheduler, request_id, stream), stream_id=stream.id)
 
+            elif message_type == "resume":
+                # 续传断线前的流
                 try:
-                    async for chunk in ai_service.analyze_idea(idea, context):
-                        await manager.send_message(project_id, {
-                            "type": "stream",
-                            "content": chunk
-                        })
-
-                    await manager.send_message(project_id, {"type": "complete"})
-                except Exception as e:
-                    await manager.send_message(project_id, {
+                    stream = stream_registry.get(str(data.get("stream_id", "")))
+                except StreamNotFound:
+                    scheduler.send({
                         "type": "error",
-                        "message": str(e)
+                        "request_id": request_id,
+                        "message": f"流不存在或已过期: {data.get('stream_id')}"
                     })
+                else:
+                    await scheduler.submit(
+                        request_id,
+                        _resume(scheduler, request_id, stream, data),
+                        stream_id=stream.id
+                    )
 
-            elif message_type == "continue":
-                # 续写（流式）
-                current_content = data.get("current_content", "")
-                file_context = data.get("file_context", "")
+            elif message_type == "subscribe_tree":
+                # 订阅文件树变更
+                await scheduler.submit(
+                    request_id,
+                    _subscribe_tree(scheduler, project_id, request_id, data)
+                )
 
-                try:
-                    async for chunk in ai_service.continue_writing(current_content, file_context):
-                        await manager.send_message(project_id, {
-                            "type": "stream",
-                            "content": chunk
-                        })
-
-                    await manager.send_message(project_id, {"type": "complete"})
-                except Exception as e:
-                    await manager.send_message(project_id, {
+            elif message_type == "unsubscribe_tree":
+                connection.subscriptions.discard(TREE_TOPIC)
+
+            elif message_type == "cancel":
+                # 取消进行中的请求
+                if not await scheduler.cancel(request_id):
+                    scheduler.send({
                         "type": "error",
-                        "message": str(e)
+                        "request_id": request_id,
+                        "message": f"No in-flight request: {request_id}"
                     })
 
             else:
-                await manager.send_message(project_id, {
+                scheduler.send({
                     "type": "error",
+                    "request_id": request_id,
                     "message": f"Unknown message type: {message_type}"
                 })
 
     except WebSocketDisconnect:
-        manager.disconnect(project_id)
+        await scheduler.close()
+        manager.disconnect(connection)
     except Exception as e:
-        await manager.send_message(project_id, {
+        scheduler.send({
             "type": "error",
             "message": str(e)
         })
-        manager.disconnect(project_id)
+        await scheduler.close()
+        manager.disconnect(connection)
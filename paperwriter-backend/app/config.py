@@ -18,14 +18,85 @@ class Settings(BaseSettings):
 
     # Project Configuration
     PROJECTS_ROOT: Path = Path("./projects")
+    DATA_ROOT: Path = Path("./data")  # 服务内部数据（AI 缓存、上传、索引、摘要、任务队列），不放在项目目录下
     MAX_PROJECT_SIZE_MB: int = 1000
+    TREE_INDEX_MAX_PROJECTS: int = 32  # 内存中保留文件树索引的项目数
+    TREE_WATCH_MODE: str = "auto"  # auto（watchfiles，不可用时轮询）| poll | off
+    TREE_POLL_INTERVAL_SECONDS: float = 5.0
+    TREE_CHANGELOG_SIZE: int = 1000  # 每个项目保留的文件树变更记录数
+    FILE_WRITE_COALESCE_MS: int = 200  # 同一文件两次落盘的最小间隔，窗口内的后续保存只落盘最新一次；0 表示逐次落盘
+    FILE_WRITE_FSYNC: bool = True  # 原子写入时是否 fsync
+    SEARCH_INDEX_MAX_PROJECTS: int = 16  # 同时打开全文索引的项目数
+    SEARCH_MAX_FILE_KB: int = 2048  # 超过该大小的文件只按路径索引
+    PDF_MAX_WORKERS: int = 2  # PDF 解析进程数
+    PDF_MAX_PAGES: int = 500  # 每个 PDF 最多提取的页数
+
+    # Semantic Retrieval
+    EMBEDDING_MODEL: str = "hashing"  # hashing（离线哈希向量）或 sentence-transformers 模型名/路径
+    EMBEDDING_DIM: int = 512  # 哈希向量维度
+    RETRIEVAL_FOLDERS: list[str] = ["引用", "idea"]  # 参与语义检索的项目目录
+    RETRIEVAL_PASSAGE_CHARS: int = 800  # 每个检索片段的最大字符数
+    RETRIEVAL_TOP_K: int = 5  # 注入 AI 提示词的片段数，0 表示不注入
+    RETRIEVAL_MIN_SCORE: float = 0.1  # 注入片段的最低相似度
+
+    # Section Summaries
+    SUMMARY_ENABLED: bool = True
+    SUMMARY_FOLDERS: list[str] = ["主体", "idea"]  # 生成分层摘要的项目目录
+    SUMMARY_SECTION_MAX_CHARS: int = 6000  # 超过该长度的章节拆开摘要
+    SUMMARY_MAX_CHARS: int = 150  # 章节摘要的目标字数（文件和全文摘要为两倍）
+    SUMMARY_REFRESH_DELAY_SECONDS: float = 30  # 文件修改后延迟多久刷新摘要
 
     # AI Configuration
     AI_TIMEOUT_SECONDS: int = 30
     AI_MAX_RETRIES: int = 3
+    AI_MAX_CONCURRENT_CALLS: int = 16  # DashScope 调用专用线程池大小
+    AI_STREAM_QUEUE_SIZE: int = 64  # 流式响应在线程与事件循环之间的缓冲块数
+    AI_STREAM_INCREMENTAL: bool = True  # 流式调用请求增量输出；关闭时上游每块是完整文本，由服务端转换为增量
+    STREAM_COALESCE_MS: int = 30  # 流式输出合并窗口（毫秒），窗口内的块合并为一条 SSE 事件/WebSocket 消息
+    STREAM_COALESCE_BYTES: int = 256  # 合并窗口内新增字节数达到该值时立即输出
+    STREAM_HEARTBEAT_SECONDS: float = 15  # SSE 空闲时发送心跳注释行的间隔
+    STREAM_GZIP_ENABLED: bool = False  # 客户端接受 gzip 时压缩 SSE 流
+    STREAM_REPLAY_MAX_CHUNKS: int = 1024  # 每个流保留的最近输出帧数，供断线续传补发
+    STREAM_REPLAY_TTL_SECONDS: int = 300  # 流结束后保留多久供续传
+    STREAM_REPLAY_MAX_STREAMS: int = 256  # 最多保留的流数（超出时淘汰最早结束的流）
+    STREAM_ORPHAN_TIMEOUT_SECONDS: int = 60  # 没有任何客户端订阅超过该时间时取消生成
+    AI_MAX_CONCURRENT_REQUESTS: int = 8  # 同时进行的模型调用上限（含流式），超出时按优先级排队
+    AI_PROJECT_RATE_PER_MINUTE: float = 60  # 每个项目每分钟可发起的模型调用数（令牌补充速度）
+    AI_PROJECT_BURST: int = 20  # 每个项目可积累的令牌数（允许的突发调用数）
+    AI_CONTEXT_TOKEN_BUDGET: int = 6000  # 续写、idea 分析时提示词上下文的 token 预算
+    AI_CONTEXT_MODEL_BUDGETS: dict[str, int] = {}  # 按模型覆盖预算，如 {"qwen-plus": 24000}
+
+    # AI Response Cache
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_MAX_ENTRIES: int = 1024
+    AI_CACHE_TTL_SECONDS: int = 86400
+    AI_CACHE_DISK_ENABLED: bool = False  # 磁盘层存放在 DATA_ROOT/ai_cache
+    AI_SINGLE_FLIGHT_ENABLED: bool = True  # 合并同一项目相同提示词的进行中调用（流式调用共享同一上游流）
+
+    # Incremental Content Check
+    CHECK_CHUNK_MIN_CHARS: int = 400
+    CHECK_CHUNK_MAX_CHARS: int = 3000
+    CHECK_MAX_CONCURRENT_CHUNKS: int = 4
+    CHECK_CACHE_MAX_ENTRIES: int = 4096
+    BATCH_CHECK_WORKERS: int = 4  # 批量检查任务同时检查的内容块数
+    BATCH_CHECK_MAX_FILES: int = 200  # 每个批量检查任务最多包含的文件数
+    BATCH_CHECK_JOB_TTL_SECONDS: int = 3600  # 批量检查任务结束后保留多久供查询进度和回放结果
+    BATCH_CHECK_MAX_JOBS: int = 64  # 最多保留的批量检查任务数（超出时淘汰最早结束的任务）
+
+    # Background Jobs
+    AI_JOB_WORKERS: int = 2  # 同时执行的后台 AI 任务数
+    AI_JOB_TIMEOUT_SECONDS: int = 300  # 单个后台任务（含重试）的最长执行时间
+    AI_JOB_RETENTION_SECONDS: int = 86400  # 结束的任务及结果保留多久（数据库在 DATA_ROOT/jobs）
+    AI_JOB_MAX_RETAINED: int = 1000  # 最多保留的结束任务数（超出时删除最早结束的任务）
+    AI_JOB_GC_INTERVAL_SECONDS: int = 600
+
+    # WebSocket Configuration
+    WS_SEND_QUEUE_SIZE: int = 256  # 每个连接的待发送消息上限
 
     # File Upload Configuration
     MAX_FILE_SIZE_MB: int = 100
+    UPLOAD_TTL_HOURS: int = 24  # 可续传上传无活动多久后清理
+    UPLOAD_GC_INTERVAL_SECONDS: int = 600
     ALLOWED_EXTENSIONS: list[str] = [
         ".pdf", ".txt", ".md", ".tex",
         ".py", ".js", ".ts", ".json"
@@ -38,11 +109,14 @@ class Settings(BaseSettings):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        # 确保 PROJECTS_ROOT 是绝对路径
+        # 确保 PROJECTS_ROOT、DATA_ROOT 是绝对路径
         if not self.PROJECTS_ROOT.is_absolute():
             self.PROJECTS_ROOT = Path(__file__).parent.parent / self.PROJECTS_ROOT
-        # 确保 projects 目录存在
+        if not self.DATA_ROOT.is_absolute():
+            self.DATA_ROOT = Path(__file__).parent.parent / self.DATA_ROOT
+        # 确保 projects、data 目录存在
         self.PROJECTS_ROOT.mkdir(parents=True, exist_ok=True)
+        self.DATA_ROOT.mkdir(parents=True, exist_ok=True)
 
 
 @lru_cache()
@@ -0,0 +1,199 @@
+"""AI 响应缓存 - 按内容寻址，内存 LRU + 可选磁盘层"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import aiofiles
+from app.config import settings
+
+
+class TTLCache:
+    """带容量上限和过期时间的内存 LRU 缓存"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存，命中时移到队尾；过期条目直接删除"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        """删除条目"""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ResponseCache:
+    """
+    AI 响应缓存
+
+    键为 (模型, 消息列表, 调用参数) 的 SHA-256，值为模型返回的文本。
+    内存层为 LRU，磁盘层（可选）存放在 DATA_ROOT 下，重启后仍可命中。
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        disk_dir: Optional[Path] = None
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(max_entries, ttl_seconds)
+        self.disk_dir = disk_dir
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+        }
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: List[Dict[str, str]],
+        params: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        计算缓存键
+
+        Args:
+            model: 模型名称
+            messages: 消息列表（包含系统提示词和用户提示词）
+            params: 调用参数
+
+        Returns:
+            str: 十六进制 SHA-256
+        """
+        payload = json.dumps(
+            {"model": model, "messages": messages, "params": params or {}},
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[str]: 命中时返回响应文本，否则为 None
+        """
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+
+        if self.disk_dir is not None:
+            value = await self._read_disk(key)
+            if value is not None:
+                self.stats["disk_hits"] += 1
+                self.memory.set(key, value)
+                return value
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 响应文本
+        """
+        self.memory.set(key, value)
+        if self.disk_dir is not None:
+            await self._write_disk(key, value)
+
+    def record_bypass(self) -> None:
+        """记录一次跳过缓存的请求"""
+        self.stats["bypassed"] += 1
+
+    async def _read_disk(self, key: str) -> Optional[str]:
+        path = self._disk_path(key)
+        try:
+            async with aiofiles.open(path, "r", encoding="utf-8") as f:
+                entry = json.loads(await f.read())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if entry.get("created_at", 0) + self.ttl_seconds < time.time():
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            return None
+
+        return entry.get("value")
+
+    async def _write_disk(self, key: str, value: str) -> None:
+        path = self._disk_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再替换，避免并发读取到半截内容
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        async with aiofiles.open(tmp_path, "w", encoding="utf-8") as f:
+            await f.write(json.dumps(
+                {"created_at": time.time(), "value": value},
+                ensure_ascii=False
+            ))
+        os.replace(tmp_path, path)
+
+    def get_stats(self) -> dict:
+        """
+        获取缓存统计
+
+        Returns:
+            dict: 命中/未命中计数、命中率和当前条目数
+        """
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_enabled": self.disk_dir is not None,
+        }
+
+
+# 全局缓存实例
+response_cache = ResponseCache(
+    max_entries=settings.AI_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.AI_CACHE_TTL_SECONDS,
+    disk_dir=settings.DATA_ROOT / "ai_cache" if settings.AI_CACHE_DISK_ENABLED else None
+)
@@ -1,7 +1,8 @@
 """AI 服务核心 - 集成通义千问"""
 import asyncio
 import json
-from typing import AsyncGenerator, List, Dict, Any
+from contextlib import aclosing
+from typing import AsyncGenerator, Callable, List, Dict, Any, Optional
 from tenacity import (
     retry,
     stop_after_attempt,
@@ -9,10 +10,26 @@ from tenacity import (
     retry_if_exception_type
 )
 import dashscope
-from dashscope import Generation
 from app.config import settings
-from app.models.ai import Diagnostic
-from app.utils.ai_utils import build_prompt, parse_ai_response
+from app.core.ai_cache import TTLCache, response_cache
+from app.core.context_builder import BuiltContext, context_builder
+from app.core.summary_service import summary_service
+from app.core.llm_client import llm_client
+from app.core.llm_scheduler import Priority, QueueListener, llm_scheduler
+from app.core.single_flight import single_flight
+from app.models.ai import CacheMode, Diagnostic
+from app.utils.ai_utils import build_prompt, cumulative_delta, parse_ai_response, shift_diagnostic
+from app.utils.text_chunks import TextChunk, split_chunks
+
+
+def _flight_key(project_id: Optional[str], key: str) -> str:
+    """
+    请求合并键：按项目区分
+
+    合并后的上游调用只按发起方的项目排队、限速，排队/上下文事件也只回调给发起方，
+    因此只合并同一项目的调用。
+    """
+    return f"{project_id or ''}:{key}"
 
 
 class AIService:
@@ -23,6 +40,21 @@ class AIService:
         self.model = settings.DASHSCOPE_MODEL
         if self.api_key:
             dashscope.api_key = self.api_key
+        # 分块检查结果：(模型, 检查类型, 块指纹) -> 以块首行为 0 的诊断列表
+        self._chunk_results = TTLCache(
+            settings.CHECK_CACHE_MAX_ENTRIES,
+            settings.AI_CACHE_TTL_SECONDS
+        )
+        self.check_stats = {
+            "chunks_checked": 0,
+            "chunks_reused": 0,
+        }
+        # 组装的提示词上下文：次数、累计 token 数、最近一次的明细
+        self.context_stats: Dict[str, Any] = {
+            "builds": 0,
+            "tokens": 0,
+            "last": None,
+        }
 
     @retry(
         stop=stop_after_attempt(settings.AI_MAX_RETRIES),
@@ -32,14 +64,22 @@ class AIService:
     async def _call_with_retry(
         self,
         messages: List[Dict[str, str]],
-        stream: bool = False
+        stream: bool = False,
+        project_id: Optional[str] = None,
+        priority: Priority = "on_demand",
+        on_queued: Optional[QueueListener] = None
     ) -> str | AsyncGenerator[str, None]:
         """
-        带重试的 AI 调用
+        带重试的 AI 调用（经过全局准入控制排队）
+
+        流式调用在开始迭代时才排队，名额一直占用到流结束。
 
         Args:
             messages: 消息列表
             stream: 是否流式输出
+            project_id: 项目ID，用于按项目限速和公平排队
+            priority: 优先级
+            on_queued: 需要排队时的回调，参数为 {priority, position, eta_seconds}
 
         Returns:
             str: AI 响应（非流式）
@@ -48,43 +88,170 @@ class AIService:
         if not self.api_key:
             raise ValueError("DASHSCOPE_API_KEY 未配置")
 
-        try:
-            response = Generation.call(
+        if stream:
+            return self._stream_response(llm_client.stream(
+                model=self.model,
+                messages=messages,
+                result_format='message',
+                incremental_output=settings.AI_STREAM_INCREMENTAL
+            ), project_id, priority, on_queued)
+
+        async with llm_scheduler.admit(project_id, priority, on_queued):
+            response = await llm_client.call(
                 model=self.model,
                 messages=messages,
-                stream=stream,
                 result_format='message'
             )
+        if response.status_code == 200:
+            return response.output.choices[0].message.content
+        else:
+            raise Exception(f"API 调用失败: {response.message}")
 
-            if stream:
-                return self._stream_response(response)
-            else:
-                if response.status_code == 200:
-                    return response.output.choices[0].message.content
-                else:
-                    raise Exception(f"API 调用失败: {response.message}")
-        except Exception as e:
-            raise
-
-    async def _stream_response(self, response) -> AsyncGenerator[str, None]:
-        """处理流式响应"""
-        for chunk in response:
-            if chunk.status_code == 200:
-                yield chunk.output.choices[0].message.content
+    async def _complete(
+        self,
+        messages: List[Dict[str, str]],
+        cache: CacheMode = "default",
+        project_id: Optional[str] = None,
+        priority: Priority = "on_demand",
+        on_queued: Optional[QueueListener] = None
+    ) -> str:
+        """
+        非流式调用（带响应缓存，命中缓存时不占用调用名额）
+
+        缓存未命中时，同一项目相同提示词的进行中调用合并为一次上游调用；
+        bypass 只跳过读缓存，仍会合并到进行中的调用（其结果同样是新生成的）。
+        不同项目的调用不合并，各自按项目排队、限速。
+
+        Args:
+            messages: 消息列表
+            cache: 缓存策略
+            project_id: 项目ID
+            priority: 优先级
+            on_queued: 需要排队时的回调
+
+        Returns:
+            str: AI 响应
+        """
+        key = response_cache.make_key(
+            self.model,
+            messages,
+            {"result_format": "message"}
+        )
+        if settings.AI_CACHE_ENABLED:
+            if cache == "bypass":
+                response_cache.record_bypass()
             else:
-                raise Exception(f"流式响应错误: {chunk.message}")
+                cached = await response_cache.get(key)
+                if cached is not None:
+                    return cached
+
+        async def call() -> str:
+            response = await self._call_with_retry(messages, False, project_id, priority, on_queued)
+            if settings.AI_CACHE_ENABLED:
+                await response_cache.set(key, response)
+            return response
+
+        if not settings.AI_SINGLE_FLIGHT_ENABLED:
+            return await call()
+        return await single_flight.do(_flight_key(project_id, key), call)
+
+    def _stream(
+        self,
+        messages: List[Dict[str, str]],
+        project_id: Optional[str] = None,
+        on_queued: Optional[QueueListener] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        流式调用（交互优先级，输出增量文本）
+
+        同一项目相同提示词的进行中流共享同一个上游流，中途加入的调用方先收到已生成的块。
+
+        Args:
+            messages: 消息列表
+            project_id: 项目ID
+            on_queued: 需要排队时的回调
+
+        Returns:
+            AsyncGenerator: 流式响应生成器
+        """
+        async def upstream() -> AsyncGenerator[str, None]:
+            stream = await self._call_with_retry(messages, True, project_id, "interactive", on_queued)
+            async with aclosing(stream):
+                async for chunk in stream:
+                    yield chunk
+
+        if not settings.AI_SINGLE_FLIGHT_ENABLED:
+            return upstream()
+        key = response_cache.make_key(
+            self.model,
+            messages,
+            {"result_format": "message", "stream": True}
+        )
+        return single_flight.stream(_flight_key(project_id, key), upstream)
+
+    async def _stream_response(
+        self,
+        responses,
+        project_id: Optional[str] = None,
+        priority: Priority = "interactive",
+        on_queued: Optional[QueueListener] = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        处理流式响应（先排队获取调用名额，流结束后释放）
+
+        只输出新增文本：增量模式下上游每块就是增量；完整文本模式下每块重复之前的全部输出，
+        转换为增量后再输出，传输量与回答长度成正比。
+        """
+        produced = ""
+        try:
+            async with llm_scheduler.admit(project_id, priority, on_queued):
+                async for chunk in responses:
+                    if chunk.status_code != 200:
+                        raise Exception(f"流式响应错误: {chunk.message}")
+                    content = chunk.output.choices[0].message.content or ""
+                    if settings.AI_STREAM_INCREMENTAL:
+                        delta = content
+                    else:
+                        delta, produced = cumulative_delta(produced, content), content
+                    if delta:
+                        yield delta
+        finally:
+            # 提前结束时立即关闭上游流，而不是等待垃圾回收
+            await responses.aclose()
+
+    def _record_context(
+        self,
+        context: BuiltContext,
+        on_context: Optional[Callable[[dict], None]] = None
+    ):
+        """记录上下文 token 统计，并回调给调用方"""
+        report = context.report()
+        self.context_stats["builds"] += 1
+        self.context_stats["tokens"] += report["tokens"]
+        self.context_stats["last"] = report
+        if on_context is not None:
+            on_context(report)
 
     async def analyze_idea(
         self,
         idea_content: str,
-        project_context: str = ""
+        project_context: str = "",
+        project_id: Optional[str] = None,
+        on_context: Optional[Callable[[dict], None]] = None,
+        on_queued: Optional[QueueListener] = None
     ) -> AsyncGenerator[str, None]:
         """
         分析 idea 可行性
 
+        提供 project_id 时，自动检索项目参考资料中与 idea 最相关的片段一并提供给模型；
+        idea、参考资料和项目上下文按模型的 token 预算裁剪。
+
         Args:
             idea_content: 创新点内容
             project_context: 项目上下文
+            project_id: 项目ID
+            on_context: 上下文组装完成后的回调，参数为 token 统计
+            on_queued: 需要排队时的回调，参数为 {priority, position, eta_seconds}
 
         Yields:
             str: 流式响应
@@ -100,11 +267,25 @@ class AIService:
 
 输出格式清晰，使用 markdown 排版。"""
 
+        context = await context_builder.for_idea(self.model, idea_content, project_context, project_id)
+        self._record_context(context, on_context)
+        references = context.get("项目参考资料")
+        reference_section = f"""项目参考资料（按相关度排序）：
+{references}
+
+""" if references else ""
+        paper_summary = context.get("论文摘要")
+        if paper_summary:
+            reference_section += f"""当前论文摘要：
+{paper_summary}
+
+"""
+
         user_prompt = f"""项目上下文：
-{project_context}
+{context.get("项目上下文")}
 
-研究想法：
-{idea_content}
+{reference_section}研究想法：
+{context.get("研究想法")}
 
 请分析这个研究想法的可行性。"""
 
@@ -113,15 +294,24 @@ class AIService:
             {"role": "user", "content": user_prompt}
         ]
 
-        async for chunk in self._call_with_retry(messages, stream=True):
-            yield chunk
+        stream = self._stream(messages, project_id, on_queued)
+        async with aclosing(stream):
+            async for chunk in stream:
+                yield chunk
 
-    async def text_to_latex(self, text: str) -> str:
+    async def text_to_latex(
+        self,
+        text: str,
+        cache: CacheMode = "default",
+        project_id: Optional[str] = None
+    ) -> str:
         """
         将纯文本转换为 LaTeX 格式
 
         Args:
             text: 纯文本内容
+            cache: 缓存策略
+            project_id: 项目ID
 
         Returns:
             str: LaTeX 格式内容
@@ -144,19 +334,27 @@ class AIService:
             {"role": "user", "content": user_prompt}
         ]
 
-        return await self._call_with_retry(messages, stream=False)
+        return await self._complete(messages, cache, project_id)
 
     async def continue_writing(
         self,
         current_content: str,
-        file_context: str = ""
+        file_context: str = "",
+        project_id: Optional[str] = None,
+        on_context: Optional[Callable[[dict], None]] = None,
+        on_queued: Optional[QueueListener] = None
     ) -> AsyncGenerator[str, None]:
         """
         续写论文内容
 
+        长文档只保留末尾原文和前文概要，连同文件上下文、项目相关资料一起裁剪到模型的 token 预算内。
+
         Args:
             current_content: 当前内容
             file_context: 文件上下文
+            project_id: 项目ID，提供时检索项目相关资料
+            on_context: 上下文组装完成后的回调，参数为 token 统计
+            on_queued: 需要排队时的回调，参数为 {priority, position, eta_seconds}
 
         Yields:
             str: 流式响应
@@ -170,36 +368,139 @@ class AIService:
 4. 避免重复已有内容
 5. 使用 markdown 格式输出"""
 
-        user_prompt = f"""文件上下文：{file_context}
-
-当前内容：
-{current_content}
+        context = await context_builder.for_writing(self.model, current_content, file_context, project_id)
+        self._record_context(context, on_context)
+        user_prompt = f"""{context.render()}
 
-请续写上述内容。"""
+请从当前内容的末尾续写。"""
 
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ]
 
-        async for chunk in self._call_with_retry(messages, stream=True):
-            yield chunk
+        stream = self._stream(messages, project_id, on_queued)
+        async with aclosing(stream):
+            async for chunk in stream:
+                yield chunk
 
     async def check_content(
         self,
         content: str,
-        check_type: str = "all"
+        check_type: str = "all",
+        cache: CacheMode = "default",
+        project_id: Optional[str] = None,
+        on_queued: Optional[QueueListener] = None
     ) -> List[Diagnostic]:
         """
-        检查内容问题
+        检查内容问题（增量）
+
+        内容按段落/章节分块，每块的诊断结果按块指纹缓存；只有变化过的块
+        才会调用模型，缓存结果按块当前所在行平移后合并。
+        逻辑检查时附带项目的全文摘要，让单块检查也能对照全文论证；
+        摘要只是参考，块结果的缓存键不包含摘要。
+        检查属于后台优先级，排在续写、转换等请求之后。
 
         Args:
             content: 待检查内容
             check_type: 检查类型 (grammar, logic, all)
+            cache: 缓存策略
+            project_id: 项目ID
+            on_queued: 需要排队时的回调，参数为 {priority, position, eta_seconds}
 
         Returns:
             List[Diagnostic]: 诊断信息列表
         """
+        chunks = [
+            chunk for chunk in split_chunks(
+                content,
+                settings.CHECK_CHUNK_MIN_CHARS,
+                settings.CHECK_CHUNK_MAX_CHARS
+            )
+            if chunk.text.strip()
+        ]
+        semaphore = asyncio.Semaphore(settings.CHECK_MAX_CONCURRENT_CHUNKS)
+        paper_summary = self.check_background(project_id, check_type)
+
+        async def check(chunk) -> List[Diagnostic]:
+            async with semaphore:
+                try:
+                    diagnostics, _ = await self.check_chunk(
+                        chunk, check_type, cache, paper_summary, project_id, on_queued
+                    )
+                except Exception:
+                    # 单块失败时返回空列表
+                    return []
+            return diagnostics
+
+        results = await asyncio.gather(*(check(chunk) for chunk in chunks))
+        return [diagnostic for result in results for diagnostic in result]
+
+    def check_background(self, project_id: Optional[str], check_type: str) -> str:
+        """逻辑检查（logic、all）附带的全文摘要，其他检查类型为空字符串"""
+        return summary_service.document_summary(project_id) if check_type in ("logic", "all") else ""
+
+    async def check_chunk(
+        self,
+        chunk: TextChunk,
+        check_type: str,
+        cache: CacheMode = "default",
+        paper_summary: str = "",
+        project_id: Optional[str] = None,
+        on_queued: Optional[QueueListener] = None
+    ) -> tuple[List[Diagnostic], bool]:
+        """
+        检查一个内容块，块指纹未变化时复用缓存结果（调用失败时抛出异常，且不写入缓存）
+
+        Args:
+            chunk: 内容块
+            check_type: 检查类型
+            cache: 缓存策略
+            paper_summary: 全文摘要（只作背景）
+            project_id: 项目ID
+            on_queued: 需要排队时的回调
+
+        Returns:
+            tuple[List[Diagnostic], bool]: (按块所在行平移后的诊断, 是否复用了缓存结果)
+        """
+        key = f"{self.model}:{check_type}:{chunk.fingerprint}"
+        diagnostics = None if cache == "bypass" else self._chunk_results.get(key)
+        reused = diagnostics is not None
+
+        if diagnostics is None:
+            diagnostics = await self._check_chunk(
+                chunk.text, check_type, cache, paper_summary, project_id, on_queued
+            )
+            self._chunk_results.set(key, diagnostics)
+            self.check_stats["chunks_checked"] += 1
+        else:
+            self.check_stats["chunks_reused"] += 1
+
+        return [shift_diagnostic(d, chunk.start_line) for d in diagnostics], reused
+
+    async def _check_chunk(
+        self,
+        content: str,
+        check_type: str,
+        cache: CacheMode = "default",
+        paper_summary: str = "",
+        project_id: Optional[str] = None,
+        on_queued: Optional[QueueListener] = None
+    ) -> List[Diagnostic]:
+        """
+        检查单个内容块（调用失败时抛出异常）
+
+        Args:
+            content: 内容块
+            check_type: 检查类型
+            cache: 缓存策略
+            paper_summary: 全文摘要（只作背景，不检查）
+            project_id: 项目ID
+            on_queued: 需要排队时的回调
+
+        Returns:
+            List[Diagnostic]: 行号相对于块首行的诊断信息
+        """
         system_prompt = f"""你是一位学术文本审阅专家。
 
 请检查以下内容的问题，按以下格式返回 JSON：
@@ -220,9 +521,14 @@ class AIService:
 
 只返回 JSON，不要其他内容。"""
 
+        summary_section = f"""全文摘要（仅作背景，用于判断本段与全文的逻辑是否一致，不要检查摘要本身）：
+{paper_summary}
+
+""" if paper_summary else ""
+
         user_prompt = f"""检查类型：{check_type}
 
-内容：
+{summary_section}内容（行号从 0 开始计数）：
 {content}"""
 
         messages = [
@@ -230,24 +536,27 @@ class AIService:
             {"role": "user", "content": user_prompt}
         ]
 
-        try:
-            response = await self._call_with_retry(messages, stream=False)
-            return parse_ai_response(response)
-        except Exception as e:
-            # 解析失败时返回空列表
-            return []
+        response = await self._complete(messages, cache, project_id, "background", on_queued)
+        return parse_ai_response(response)
 
     async def search_papers(
         self,
         keywords: List[str],
-        field: str = ""
+        field: str = "",
+        cache: CacheMode = "default",
+        project_id: Optional[str] = None
     ) -> str:
         """
         搜索相关文献
 
+        提供 project_id 时，先在项目参考资料中检索与关键词相关的片段，
+        让模型优先结合已有文献推荐，减少凭记忆编造。
+
         Args:
             keywords: 关键词列表
             field: 研究领域
+            cache: 缓存策略
+            project_id: 项目ID
 
         Returns:
             str: 搜索结果
@@ -262,10 +571,19 @@ class AIService:
 4. 核心贡献
 5. 与用户研究的关联
 
+如果提供了项目参考资料，优先结合这些资料推荐，注明哪些文献已在项目中，
+不要编造资料中不存在的信息。
+
 使用 markdown 格式输出。"""
 
+        references = await context_builder.references(project_id, " ".join([field, *keywords]))
+        reference_section = f"""
+
+项目参考资料（按相关度排序）：
+{references}""" if references else ""
+
         user_prompt = f"""研究领域：{field}
-关键词：{', '.join(keywords)}
+关键词：{', '.join(keywords)}{reference_section}
 
 请推荐相关论文。"""
 
@@ -274,12 +592,14 @@ class AIService:
             {"role": "user", "content": user_prompt}
         ]
 
-        return await self._call_with_retry(messages, stream=False)
+        return await self._complete(messages, cache, project_id)
 
     async def generate_code(
         self,
         description: str,
-        language: str = "python"
+        language: str = "python",
+        cache: CacheMode = "default",
+        project_id: Optional[str] = None
     ) -> str:
         """
         生成代码
@@ -287,6 +607,8 @@ class AIService:
         Args:
             description: 代码描述
             language: 编程语言
+            cache: 缓存策略
+            project_id: 项目ID
 
         Returns:
             str: 生成的代码
@@ -312,7 +634,7 @@ class AIService:
             {"role": "user", "content": user_prompt}
         ]
 
-        return await self._call_with_retry(messages, stream=False)
+        return await self._complete(messages, cache, project_id)
 
 
 # 全局服务实例
@@ -0,0 +1,327 @@
+"""批量内容检查 - 一次检查项目中的多个文件，按文件推送诊断结果，支持进度查询、取消和结果回放"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncGenerator, List, Literal, NamedTuple, Optional
+from app.config import settings
+from app.core.ai_service import ai_service
+from app.core.file_service import file_service
+from app.models.ai import CacheMode, Diagnostic
+from app.utils.text_chunks import TextChunk, split_chunks
+
+# 参与批量检查的文本文件
+BATCH_CHECK_EXTENSIONS = {".md", ".txt", ".tex"}
+
+JobStatus = Literal["running", "completed", "cancelled", "failed"]
+
+
+class JobNotFound(KeyError):
+    """任务不存在或已过期"""
+
+
+class JobEvent(NamedTuple):
+    """任务事件"""
+    seq: int  # 从 1 开始递增的序号，即 SSE 事件 ID
+    type: str  # file | progress | done
+    data: dict
+
+
+class _FileCheck:
+    """一个文件的检查状态"""
+
+    __slots__ = ("path", "results", "pending", "reused", "failed")
+
+    def __init__(self, path: str, chunks: List[TextChunk]):
+        self.path = path
+        # 按块顺序保存结果，文件内的诊断按行号先后输出
+        self.results: List[List[Diagnostic]] = [[] for _ in chunks]
+        self.pending = len(chunks)
+        self.reused = 0
+        self.failed = 0
+
+
+class BatchCheckJob:
+    """一次批量检查任务，事件全部保留，订阅者可以从任意位置回放"""
+
+    def __init__(self, job_id: str, project_id: str, files: List[str], check_type: str, cache: CacheMode):
+        self.id = job_id
+        self.project_id = project_id
+        self.files = files
+        self.check_type = check_type
+        self.cache = cache
+        self.status: JobStatus = "running"
+        self.error: Optional[str] = None
+        self.progress = {
+            "files_total": len(files),
+            "files_done": 0,
+            "chunks_total": 0,  # 随文件读取完成逐步增加
+            "chunks_done": 0,
+            "chunks_reused": 0,
+            "chunks_failed": 0,
+        }
+        self.events: List[JobEvent] = []
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    def emit(self, event_type: str, data: dict):
+        """追加一条事件并唤醒订阅者"""
+        self.events.append(JobEvent(len(self.events) + 1, event_type, data))
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self, timeout: Optional[float]) -> bool:
+        """等待新事件，超时返回 False"""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "project_id": self.project_id,
+            "status": self.status,
+            "check_type": self.check_type,
+            "files": self.files,
+            "progress": dict(self.progress),
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class BatchCheckService:
+    """
+    批量检查服务
+
+    - 并发读取文件并分块，所有文件的块进入同一个队列，由 workers 个协程检查（后台优先级排队）
+    - 与单文件检查共用块结果缓存，未修改的块直接复用
+    - 一个文件的块全部完成时推送该文件的诊断（file 事件），每完成一块推送进度（progress 事件），
+      结束时推送 done 事件；单块失败只计入 chunks_failed，不影响其他块
+    - 结束的任务保留 ttl 秒供查询和回放，最多保留 max_jobs 个
+    """
+
+    def __init__(self, workers: int, max_files: int, ttl_seconds: float, max_jobs: int):
+        self.workers = workers
+        self.max_files = max_files
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict[str, BatchCheckJob] = OrderedDict()
+        self.stats = {
+            "started": 0,
+            "completed": 0,
+            "cancelled": 0,
+            "failed": 0,
+        }
+
+    async def start(
+        self,
+        project_id: str,
+        paths: Optional[List[str]] = None,
+        pattern: Optional[str] = None,
+        check_type: str = "all",
+        cache: CacheMode = "default"
+    ) -> BatchCheckJob:
+        """
+        开始一个批量检查任务
+
+        Args:
+            project_id: 项目ID
+            paths: 文件相对路径
+            pattern: glob 模式，如 "主体/*.tex"
+            check_type: 检查类型
+            cache: 缓存策略
+
+        Returns:
+            BatchCheckJob: 新的任务
+
+        Raises:
+            FileNotFoundError: 项目或指定的文件不存在
+            ValueError: 非法路径，没有可检查的文件或文件数超过上限
+        """
+        files = await file_service.resolve_files(project_id, paths, pattern, BATCH_CHECK_EXTENSIONS)
+        if not files:
+            raise ValueError("没有可检查的文件")
+        if len(files) > self.max_files:
+            raise ValueError(f"文件数 {len(files)} 超过上限 {self.max_files}")
+
+        self._purge()
+        job = BatchCheckJob(uuid.uuid4().hex, project_id, files, check_type, cache)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job))
+        self.stats["started"] += 1
+        return job
+
+    async def _run(self, job: BatchCheckJob):
+        queue: asyncio.Queue = asyncio.Queue()
+        paper_summary = ai_service.check_background(job.project_id, job.check_type)
+
+        async def read(path: str):
+            try:
+                content = await file_service.read_file(job.project_id, path)
+            except Exception as e:
+                self._finish_file(job, _FileCheck(path, []), str(e))
+                return
+            chunks = split_chunks(content, settings.CHECK_CHUNK_MIN_CHARS, settings.CHECK_CHUNK_MAX_CHARS)
+            file = _FileCheck(path, chunks)
+            job.progress["chunks_total"] += len(chunks)
+            if not chunks:
+                self._finish_file(job, file)
+            for index, chunk in enumerate(chunks):
+                queue.put_nowait((file, index, chunk))
+
+        async def work():
+            while True:
+                file, index, chunk = await queue.get()
+                try:
+                    file.results[index], reused = await ai_service.check_chunk(
+                        chunk, job.check_type, job.cache, paper_summary, job.project_id
+                    )
+                    if reused:
+                        file.reused += 1
+                        job.progress["chunks_reused"] += 1
+                except Exception:
+                    file.failed += 1
+                    job.progress["chunks_failed"] += 1
+                file.pending -= 1
+                job.progress["chunks_done"] += 1
+                if not file.pending:
+                    self._finish_file(job, file)
+                job.emit("progress", dict(job.progress))
+                queue.task_done()
+
+        workers = [asyncio.create_task(work()) for _ in range(self.workers)]
+        try:
+            await asyncio.gather(*(read(path) for path in job.files))
+            await queue.join()
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.stats[job.status] += 1
+            job.finished_at = time.time()
+            job.emit("done", {"status": job.status, "progress": dict(job.progress), "error": job.error})
+            asyncio.get_running_loop().call_later(self.ttl_seconds, self._expire, job)
+
+    @staticmethod
+    def _finish_file(job: BatchCheckJob, file: _FileCheck, error: Optional[str] = None):
+        """推送一个文件的诊断"""
+        job.progress["files_done"] += 1
+        job.emit("file", {
+            "path": file.path,
+            "diagnostics": [
+                diagnostic.model_dump(by_alias=True)
+                for result in file.results for diagnostic in result
+            ],
+            "chunks": len(file.results),
+            "reused": file.reused,
+            "failed": file.failed,
+            "error": error,
+        })
+
+    def _expire(self, job: BatchCheckJob):
+        if self._jobs.get(job.id) is job:
+            del self._jobs[job.id]
+
+    def _purge(self):
+        """超出数量上限时淘汰最早结束的任务（进行中的任务不淘汰）"""
+        excess = len(self._jobs) - self.max_jobs + 1
+        if excess <= 0:
+            return
+        for job_id in [job.id for job in self._jobs.values() if job.done][:excess]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> BatchCheckJob:
+        """
+        获取任务
+
+        Raises:
+            JobNotFound: 任务不存在或已过期
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise JobNotFound(job_id)
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        取消进行中的任务（已在检查的块随之取消）
+
+        Returns:
+            bool: 是否找到并取消了进行中的任务
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return False
+        job.task.cancel()
+        return True
+
+    async def subscribe(
+        self,
+        job: BatchCheckJob,
+        after: int = 0,
+        heartbeat: Optional[float] = None
+    ) -> AsyncGenerator[Optional[JobEvent], None]:
+        """
+        订阅任务事件：先回放序号 after 之后的事件，再实时输出，done 事件之后结束
+
+        Args:
+            job: 任务
+            after: 客户端已收到的最后一条事件序号，0 表示从头开始
+            heartbeat: 空闲多久输出一次心跳（秒），None 表示不发心跳
+
+        Yields:
+            Optional[JobEvent]: 事件；None 表示心跳
+        """
+        while True:
+            while after < len(job.events):
+                after += 1
+                yield job.events[after - 1]
+            # done 事件是最后一条，输出后即结束
+            if after and job.events[after - 1].type == "done":
+                return
+            if not await job.wait(heartbeat):
+                yield None
+
+    def get_stats(self) -> dict:
+        """
+        获取统计
+
+        Returns:
+            dict: 开始/完成/取消/失败的任务数，以及当前保留和进行中的任务数
+        """
+        return {
+            **self.stats,
+            "retained": len(self._jobs),
+            "active": sum(1 for job in self._jobs.values() if not job.done),
+        }
+
+    async def shutdown(self):
+        """取消所有进行中的任务"""
+        tasks = [job.task for job in self._jobs.values() if not job.done]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# 全局批量检查服务实例
+batch_check_service = BatchCheckService(
+    workers=settings.BATCH_CHECK_WORKERS,
+    max_files=settings.BATCH_CHECK_MAX_FILES,
+    ttl_seconds=settings.BATCH_CHECK_JOB_TTL_SECONDS,
+    max_jobs=settings.BATCH_CHECK_MAX_JOBS
+)
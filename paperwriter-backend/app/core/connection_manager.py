@@ -0,0 +1,241 @@
+"""WebSocket 连接管理 - 支持同一项目多个连接的广播/单播"""
+import asyncio
+import uuid
+from collections import deque
+from typing import Callable, Optional
+from fastapi import WebSocket
+from app.config import settings
+
+# 合并函数：(队列中待发送的消息, 新消息) -> 合并后的消息
+MergeFunc = Callable[[dict, dict], dict]
+
+# 客户端过慢导致发送队列溢出时使用的关闭码（1013: Try Again Later）
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+
+class Connection:
+    """
+    单个 WebSocket 连接
+
+    消息先进入有界发送队列，由独立的发送任务写出，慢客户端不会阻塞其他连接。
+    队列中仍有同一合并键的待发送消息时，新消息直接合并进去（默认用新消息替换）；
+    队列已满时丢弃可丢弃消息，不可丢弃的消息放不下则断开该连接。
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        project_id: str,
+        max_queue: int,
+        on_close: Optional[Callable[["Connection"], None]] = None
+    ):
+        self.id = uuid.uuid4().hex
+        self.websocket = websocket
+        self.project_id = project_id
+        self.max_queue = max_queue
+        self.closed = False
+        # 已订阅的推送主题（如文件树变更）
+        self.subscriptions: set[str] = set()
+        self.stats = {
+            "sent": 0,
+            "coalesced": 0,
+            "dropped": 0,
+        }
+        self._queue: deque[list] = deque()  # [合并键, 消息]
+        self._pending: dict[str, list] = {}
+        self._ready = asyncio.Event()
+        self._on_close = on_close
+        self._sender: Optional[asyncio.Task] = None
+
+    def start(self):
+        """启动发送任务"""
+        self._sender = asyncio.create_task(self._send_loop())
+
+    def send(
+        self,
+        message: dict,
+        coalesce_key: Optional[str] = None,
+        merge: Optional[MergeFunc] = None,
+        droppable: bool = False
+    ) -> bool:
+        """
+        消息入队（不等待实际发送）
+
+        Args:
+            message: 消息内容
+            coalesce_key: 合并键，队列中同键的待发送消息会与新消息合并
+            merge: 合并函数，默认用新消息替换旧消息
+            droppable: 队列已满时是否允许丢弃
+
+        Returns:
+            bool: 消息是否已入队或合并
+        """
+        if self.closed:
+            return False
+
+        if coalesce_key is not None:
+            entry = self._pending.get(coalesce_key)
+            if entry is not None:
+                entry[1] = merge(entry[1], message) if merge else message
+                self.stats["coalesced"] += 1
+                return True
+
+        if len(self._queue) >= self.max_queue:
+            self.stats["dropped"] += 1
+            if not droppable:
+                # 客户端跟不上且消息不能丢，断开让客户端重连
+                self.close(SLOW_CLIENT_CLOSE_CODE)
+            return False
+
+        entry = [coalesce_key, message]
+        self._queue.append(entry)
+        if coalesce_key is not None:
+            self._pending[coalesce_key] = entry
+        self._ready.set()
+        return True
+
+    async def _send_loop(self):
+        try:
+            while True:
+                while not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+
+                entry = self._queue.popleft()
+                coalesce_key, message = entry
+                if coalesce_key is not None and self._pending.get(coalesce_key) is entry:
+                    del self._pending[coalesce_key]
+
+                await self.websocket.send_json(message)
+                self.stats["sent"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # 发送失败说明连接已失效
+            self.close()
+
+    def close(self, code: Optional[int] = None):
+        """
+        关闭连接并从管理器中移除
+
+        Args:
+            code: 需要主动关闭 socket 时使用的关闭码
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._pending.clear()
+
+        if self._sender is not None and self._sender is not asyncio.current_task():
+            self._sender.cancel()
+        if code is not None:
+            asyncio.create_task(self._close_socket(code))
+        if self._on_close is not None:
+            self._on_close(self)
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+class WebSocketConnectionManager:
+    """WebSocket 连接管理器 - 项目ID -> 连接ID -> 连接"""
+
+    def __init__(self, max_queue: int):
+        self.max_queue = max_queue
+        self.projects: dict[str, dict[str, Connection]] = {}
+        self.connections: dict[str, Connection] = {}
+
+    async def connect(self, websocket: WebSocket, project_id: str) -> Connection:
+        """
+        接受连接
+
+        Args:
+            websocket: WebSocket 对象
+            project_id: 项目ID
+
+        Returns:
+            Connection: 新连接
+        """
+        await websocket.accept()
+        connection = Connection(
+            websocket,
+            project_id,
+            self.max_queue,
+            on_close=self._remove
+        )
+        self.projects.setdefault(project_id, {})[connection.id] = connection
+        self.connections[connection.id] = connection
+        connection.start()
+        return connection
+
+    def disconnect(self, connection: Connection):
+        """断开连接"""
+        connection.close()
+
+    def _remove(self, connection: Connection):
+        self.connections.pop(connection.id, None)
+        project_connections = self.projects.get(connection.project_id)
+        if project_connections is not None:
+            project_connections.pop(connection.id, None)
+            if not project_connections:
+                del self.projects[connection.project_id]
+
+    def send_to(self, connection_id: str, message: dict, **options) -> bool:
+        """
+        单播消息
+
+        Args:
+            connection_id: 连接ID
+            message: 消息内容
+            **options: 透传给 Connection.send 的选项
+
+        Returns:
+            bool: 是否已入队
+        """
+        connection = self.connections.get(connection_id)
+        if connection is None:
+            return False
+        return connection.send(message, **options)
+
+    def broadcast(
+        self,
+        project_id: str,
+        message: dict,
+        exclude: Optional[str] = None,
+        topic: Optional[str] = None,
+        **options
+    ) -> int:
+        """
+        向项目的所有连接广播消息
+
+        Args:
+            project_id: 项目ID
+            message: 消息内容
+            exclude: 需要排除的连接ID
+            topic: 推送主题，指定时只发送给订阅了该主题的连接
+            **options: 透传给 Connection.send 的选项
+
+        Returns:
+            int: 成功入队的连接数
+        """
+        delivered = 0
+        for connection in list(self.projects.get(project_id, {}).values()):
+            if connection.id == exclude:
+                continue
+            if topic is not None and topic not in connection.subscriptions:
+                continue
+            if connection.send(message, **options):
+                delivered += 1
+        return delivered
+
+    def get_project_connections(self, project_id: str) -> list[Connection]:
+        """获取项目的所有连接"""
+        return list(self.projects.get(project_id, {}).values())
+
+
+# 全局连接管理器
+manager = WebSocketConnectionManager(max_queue=settings.WS_SEND_QUEUE_SIZE)
@@ -0,0 +1,292 @@
+"""提示词上下文组装 - 按模型的 token 预算裁剪文档、概要和项目资料"""
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+from app.config import settings
+from app.core.file_service import file_service
+from app.core.summary_service import section_title, summary_service, with_title
+from app.utils.text_chunks import HEADING_PATTERN, split_sections
+from app.utils.token_count import TokenCounter, get_token_counter
+
+logger = logging.getLogger(__name__)
+
+# 概要中每节保留的首句最大字符数
+_OUTLINE_SENTENCE_CHARS = 120
+
+_SENTENCE_END = re.compile(r"(?<=[。！？.!?])\s*")
+
+
+@dataclass
+class ContextPart:
+    """上下文中的一部分"""
+    title: str
+    text: str
+    share: float  # 预算份额，未用完的部分按列表顺序分给其他部分
+    keep: str = "head"  # 超出预算时保留开头（head）还是结尾（tail）
+    tokens: int = 0
+
+
+@dataclass
+class BuiltContext:
+    """组装好的上下文"""
+    parts: List[ContextPart] = field(default_factory=list)
+    budget: int = 0
+    exact: bool = False  # token 数是否由模型分词器精确计算
+
+    @property
+    def tokens(self) -> int:
+        return sum(part.tokens for part in self.parts)
+
+    def get(self, title: str) -> str:
+        """取某一部分的文本，不存在时返回空字符串"""
+        for part in self.parts:
+            if part.title == title:
+                return part.text
+        return ""
+
+    def render(self) -> str:
+        """按 "标题：\\n内容" 拼接非空部分"""
+        return "\n\n".join(f"{part.title}：\n{part.text}" for part in self.parts if part.text)
+
+    def report(self) -> dict:
+        """token 统计：{tokens, budget, exact, parts: {标题: token 数}}"""
+        return {
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "exact": self.exact,
+            "parts": {part.title: part.tokens for part in self.parts},
+        }
+
+
+def outline(content: str) -> str:
+    """
+    提取文档概要：每个章节的标题和首句
+
+    没有标题的文档按段落取首句。
+
+    Args:
+        content: 文档内容
+
+    Returns:
+        str: 每行一节的概要
+    """
+    entries: List[str] = []
+    heading: Optional[str] = None
+    sentence: Optional[str] = None
+
+    def flush():
+        if heading or sentence:
+            entries.append(" ".join(filter(None, [heading, sentence])))
+
+    for line in content.split("\n"):
+        stripped = line.strip()
+        if not stripped:
+            if heading is None and sentence is not None:
+                # 无标题文档：每段一条
+                flush()
+                sentence = None
+            continue
+        if HEADING_PATTERN.match(line):
+            flush()
+            heading, sentence = stripped, None
+        elif sentence is None:
+            sentence = _SENTENCE_END.split(stripped, maxsplit=1)[0][:_OUTLINE_SENTENCE_CHARS]
+
+    flush()
+    return "\n".join(entries)
+
+
+async def section_outline(content: str) -> str:
+    """
+    前文概要：已生成摘要的章节使用缓存的摘要，其余章节使用标题和首句
+
+    Args:
+        content: 文档内容
+
+    Returns:
+        str: 按章节顺序的概要
+    """
+    sections = [
+        section for section in split_sections(content, settings.SUMMARY_SECTION_MAX_CHARS)
+        if section.text.strip()
+    ]
+    summaries = await summary_service.cached_sections([section.text for section in sections])
+    entries = []
+    for section, summary in zip(sections, summaries):
+        if summary is None:
+            entries.append(outline(section.text))
+        else:
+            entries.append(with_title(section_title(section.text), summary, " "))
+    return "\n".join(entries)
+
+
+class ContextBuilder:
+    """
+    上下文组装器
+
+    把文档末尾（光标附近）、前文概要、客户端提供的上下文和项目相关资料
+    按份额分配到模型的 token 预算内，单次调用的输入成本不随论文长度增长。
+    """
+
+    def budget_for(self, model: str) -> int:
+        """模型的上下文 token 预算"""
+        return settings.AI_CONTEXT_MODEL_BUDGETS.get(model, settings.AI_CONTEXT_TOKEN_BUDGET)
+
+    def fit(self, parts: List[ContextPart], budget: int, counter: TokenCounter) -> List[ContextPart]:
+        """
+        把各部分裁剪到预算内
+
+        先按份额分配，再把未用完的预算按列表顺序分给仍需要的部分。
+
+        Args:
+            parts: 上下文各部分，靠前的优先获得剩余预算
+            budget: 总 token 预算
+            counter: token 计数器
+
+        Returns:
+            List[ContextPart]: 裁剪后的各部分（tokens 已填写）
+        """
+        # 每部分最多需要的 token 数（超过总预算的部分不必计数）
+        needs = [counter.truncate(part.text, budget, part.keep)[1] for part in parts]
+        allocation = [min(need, int(budget * part.share)) for need, part in zip(needs, parts)]
+        remaining = budget - sum(allocation)
+        for index, need in enumerate(needs):
+            extra = min(need - allocation[index], remaining)
+            if extra > 0:
+                allocation[index] += extra
+                remaining -= extra
+
+        for part, allowed in zip(parts, allocation):
+            part.text, part.tokens = counter.truncate(part.text, allowed, part.keep)
+        return parts
+
+    async def references(self, project_id: Optional[str], query: str, exclude: str = "") -> str:
+        """
+        检索项目参考资料和笔记中的相关片段
+
+        检索失败不影响 AI 调用，返回空字符串。
+
+        Args:
+            project_id: 项目ID，为空时不检索
+            query: 检索文本
+            exclude: 已在提示词中的文本，其中出现过的片段被跳过
+
+        Returns:
+            str: 编号的片段列表；没有相关片段时为空字符串
+        """
+        if not project_id or settings.RETRIEVAL_TOP_K <= 0 or not query.strip():
+            return ""
+        try:
+            retrieved = await file_service.retrieve(
+                project_id,
+                query,
+                top_k=settings.RETRIEVAL_TOP_K,
+                min_score=settings.RETRIEVAL_MIN_SCORE
+            )
+        except Exception:
+            logger.exception("参考资料检索失败: %s", project_id)
+            return ""
+
+        sections = []
+        for passage in retrieved["results"]:
+            if exclude and passage["text"][:200] in exclude:
+                continue
+            if "page" in passage:
+                location = f"{passage['path']} 第 {passage['page']} 页"
+            else:
+                location = f"{passage['path']} 第 {passage['line'] + 1} 行"
+            sections.append(f"[{len(sections) + 1}] {location}\n{passage['text']}")
+        return "\n\n".join(sections)
+
+    async def for_writing(
+        self,
+        model: str,
+        current_content: str,
+        file_context: str = "",
+        project_id: Optional[str] = None
+    ) -> BuiltContext:
+        """
+        组装续写上下文
+
+        光标位于 current_content 末尾：全文摘要、项目资料和文件上下文按份额封顶，其余预算留给文档；
+        文档放不下时保留末尾原文，更早的部分只保留章节摘要（尚未生成时用标题和首句）。
+
+        Args:
+            model: 模型名
+            current_content: 当前文档内容
+            file_context: 客户端提供的文件上下文
+            project_id: 项目ID，提供时检索项目相关资料
+
+        Returns:
+            BuiltContext: 依次包含 "文件上下文"、"项目相关资料"、"全文摘要"、"前文概要"、"当前内容" 五部分
+        """
+        budget = self.budget_for(model)
+        counter = get_token_counter(model)
+
+        # 用末尾一段作为检索查询
+        references = await self.references(project_id, current_content[-1000:], current_content)
+        extras = [
+            ContextPart("全文摘要", summary_service.document_summary(project_id), share=0.1),
+            ContextPart("项目相关资料", references, share=0.2),
+            ContextPart("文件上下文", file_context, share=0.15),
+        ]
+        for part in extras:
+            part.text, part.tokens = counter.truncate(part.text, int(budget * part.share), part.keep)
+        remaining = budget - sum(part.tokens for part in extras)
+
+        # 全文放得下时直接使用全文；否则末尾原文让出一部分预算给前文概要
+        tail, tail_tokens = counter.truncate(current_content, remaining, "tail")
+        summary, summary_tokens = "", 0
+        if len(tail) < len(current_content):
+            summary_budget = min(int(budget * 0.15), remaining // 3)
+            tail, _ = counter.truncate(current_content, remaining - summary_budget, "tail")
+            summary, summary_tokens = counter.truncate(
+                await section_outline(current_content[:len(current_content) - len(tail)]), summary_budget, "tail"
+            )
+            # 概要用不完的预算还给末尾原文
+            tail, tail_tokens = counter.truncate(current_content, remaining - summary_tokens, "tail")
+            summary, summary_tokens = counter.truncate(
+                await section_outline(current_content[:len(current_content) - len(tail)]), summary_tokens, "tail"
+            )
+
+        # 当前内容放在最后，紧挨续写指令
+        parts = [
+            *reversed(extras),
+            ContextPart("前文概要", summary, share=0.15, keep="tail", tokens=summary_tokens),
+            ContextPart("当前内容", tail, share=0.5, keep="tail", tokens=tail_tokens),
+        ]
+        return BuiltContext(parts=parts, budget=budget, exact=counter.exact)
+
+    async def for_idea(
+        self,
+        model: str,
+        idea_content: str,
+        project_context: str = "",
+        project_id: Optional[str] = None
+    ) -> BuiltContext:
+        """
+        组装 idea 分析上下文
+
+        Args:
+            model: 模型名
+            idea_content: 创新点内容
+            project_context: 客户端提供的项目上下文
+            project_id: 项目ID，提供时检索项目参考资料
+
+        Returns:
+            BuiltContext: 包含 "研究想法"、"项目参考资料"、"论文摘要"、"项目上下文" 四部分
+        """
+        budget = self.budget_for(model)
+        counter = get_token_counter(model)
+        parts = self.fit([
+            ContextPart("研究想法", idea_content, share=0.4),
+            ContextPart("项目参考资料", await self.references(project_id, idea_content), share=0.3),
+            ContextPart("论文摘要", summary_service.document_summary(project_id), share=0.1),
+            ContextPart("项目上下文", project_context, share=0.2),
+        ], budget, counter)
+        return BuiltContext(parts=parts, budget=budget, exact=counter.exact)
+
+
+# 全局组装器实例
+context_builder = ContextBuilder()
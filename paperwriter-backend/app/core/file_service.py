@@ -1,46 +1,158 @@
 """文件操作服务"""
 import aiofiles
+import asyncio
+import contextlib
+import os
+import shutil
+import stat
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import AsyncGenerator, AsyncIterator, Optional
 from app.config import settings
-from app.models.file import FileNode
+from app.core.pdf_service import pdf_service
+from app.core.project_quota import QuotaExceeded, project_quota
+from app.core.project_service import is_valid_project_id
+from app.core.retrieval_service import retrieval_service
+from app.core.search_index import search_index_service
+from app.core.summary_service import summary_service
+from app.core.tree_index import tree_index_service
+from app.models.file import FileNode, TextEdit
+from app.utils.atomic_write import atomic_write, fsync_directory, move_file, temp_path_for
+from app.utils.fs_scan import (
+    SortField,
+    SortOrder,
+    decode_cursor,
+    directory_size,
+    encode_cursor,
+    scan_directory
+)
+from app.utils.text_patch import OffsetUnit, apply_edits, apply_unified_diff
+
+
+class ETagMismatch(Exception):
+    """文件已被修改，与请求的基准 ETag 不一致"""
+
+    def __init__(self, current_etag: str):
+        super().__init__(f"文件已被修改，当前 ETag: {current_etag}")
+        self.current_etag = current_etag
+
+
+class FileTooLarge(Exception):
+    """上传超出单文件或项目空间上限"""
+
+
+class UnsupportedFileType(ValueError):
+    """扩展名不在 ALLOWED_EXTENSIONS 中"""
+
+
+def _file_size(path: Path) -> int:
+    """文件字节数，不存在时为 0"""
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _replace_file(path: Path, data: bytes, fsync: bool) -> tuple[int, os.stat_result]:
+    """原子替换文件，返回 (原文件字节数, 新 stat)"""
+    old_size = _file_size(path)
+    return old_size, atomic_write(path, data, fsync)
+
+
+class FileDeleted(FileNotFoundError):
+    """等待落盘的写入所在文件已被删除"""
+
+
+@dataclass
+class _PendingWrite:
+    """等待落盘的写入（同一文件只保留最新一次）"""
+    project_id: str
+    data: bytes
+    waiter: asyncio.Future
 
 
 class FileService:
-    """文件操作服务"""
+    """
+    文件操作服务
+
+    写入统一走原子写入（临时文件 + fsync + rename），同一文件的所有修改（保存、补丁、新建、
+    删除、上传覆盖）由文件锁串行化。
+
+    保存先立即落盘（前沿）；正在落盘或距上次落盘不足合并窗口时到达的保存进入待写入，
+    窗口到期后只落盘最新的一次。被后续保存覆盖的调用方得到 None（superseded），
+    只有内容真正落盘的调用方拿到 ETag。
+    """
 
-    def __init__(self):
+    def __init__(self, coalesce_window_ms: int = 0, fsync: bool = True):
         self.projects_root = settings.PROJECTS_ROOT
+        self.coalesce_window = coalesce_window_ms / 1000
+        self.fsync = fsync
+        # 每个文件一把锁，没有等待者时自动回收
+        self._locks: weakref.WeakValueDictionary[Path, asyncio.Lock] = weakref.WeakValueDictionary()
+        self._pending_writes: dict[Path, _PendingWrite] = {}
+        self._flush_tasks: set[asyncio.Task] = set()
+        # 最近落盘时间（monotonic），按时间顺序排列，只保留合并窗口内的记录
+        self._last_writes: OrderedDict[Path, float] = OrderedDict()
+        self.write_stats = {
+            "requested": 0,  # write_file 调用次数
+            "written": 0,  # 实际落盘次数（含补丁和新建）
+            "coalesced": 0,  # 被后续保存覆盖、未单独落盘的写入
+        }
+
+    def _file_lock(self, full_path: Path) -> asyncio.Lock:
+        """获取文件锁"""
+        lock = self._locks.get(full_path)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[full_path] = lock
+        return lock
+
+    async def _notify_change(self, project_id: str, full_path: Path, modified: bool = False):
+        """通知文件树、全文索引、语义索引、摘要和 PDF 提取路径已变更"""
+        await tree_index_service.notify_change(project_id, full_path, modified=modified)
+        search_index_service.notify_change(project_id, full_path)
+        retrieval_service.notify_change(project_id, full_path)
+        summary_service.notify_change(project_id, full_path)
+        if full_path.suffix.lower() == ".pdf":
+            pdf_service.schedule(project_id, full_path)
 
     def _get_project_path(self, project_id: str) -> Path:
         """获取项目路径"""
         project_path = self.projects_root / project_id
-        if not project_path.exists():
+        if not is_valid_project_id(project_id) or not project_path.exists():
             raise FileNotFoundError(f"项目不存在: {project_id}")
         return project_path
 
-    def _resolve_file_path(self, project_id: str, file_path: str) -> Path:
+    def _resolve_file_path(self, project_id: str, file_path: str, allow_root: bool = False) -> Path:
         """
         解析文件路径（安全检查）
 
         Args:
             project_id: 项目ID
             file_path: 文件相对路径
+            allow_root: 是否允许解析为项目根目录（只有列目录允许，写入和删除不允许）
 
         Returns:
             Path: 文件绝对路径
         """
         project_path = self._get_project_path(project_id)
+        project_root = project_path.resolve()
 
         # 规范化路径，防止路径遍历攻击
-        normalized = Path(file_path).resolve()
         try:
             # 确保文件在项目目录内
-            full_path = (project_path / normalized).resolve()
-            full_path.relative_to(project_path.resolve())
+            full_path = (project_path / file_path).resolve()
+            full_path.relative_to(project_root)
         except ValueError:
             raise ValueError(f"非法路径: {file_path}")
 
+        # "."、""、"a/.." 等指向项目根目录本身
+        if full_path == project_root and not allow_root:
+            raise ValueError(f"非法路径: {file_path}")
+
         return full_path
 
     async def read_file(self, project_id: str, file_path: str) -> str:
@@ -62,18 +174,156 @@ class FileService:
         if not full_path.is_file():
             raise ValueError(f"不是文件: {file_path}")
 
-        async with aiofiles.open(full_path, "r", encoding="utf-8") as f:
+        # 保留原始换行符（CRLF 不转换为 LF），与 /patch 的偏移量计算保持一致
+        async with aiofiles.open(full_path, "r", encoding="utf-8", newline="") as f:
             content = await f.read()
 
         return content
 
+    async def resolve_files(
+        self,
+        project_id: str,
+        paths: Optional[list[str]] = None,
+        pattern: Optional[str] = None,
+        extensions: Optional[set[str]] = None
+    ) -> list[str]:
+        """
+        解析文件集合：显式路径与 glob 模式匹配结果的并集
+
+        Args:
+            project_id: 项目ID
+            paths: 文件相对路径
+            pattern: 相对项目根目录的 glob 模式，如 "主体/*.tex"、"**/*.md"（跳过隐藏文件和目录）
+            extensions: 只保留这些扩展名（小写），None 表示不限
+
+        Returns:
+            list[str]: 去重后的文件相对路径（显式路径在前，匹配结果按路径排序）
+
+        Raises:
+            FileNotFoundError: 项目或显式指定的文件不存在
+            ValueError: 非法路径或模式，或显式指定的文件扩展名不在 extensions 中
+        """
+        project_root = self._get_project_path(project_id).resolve()
+        files: dict[str, None] = {}
+
+        for file_path in paths or []:
+            full_path = self._resolve_file_path(project_id, file_path)
+            if not full_path.is_file():
+                raise FileNotFoundError(f"文件不存在: {file_path}")
+            if extensions is not None and full_path.suffix.lower() not in extensions:
+                raise ValueError(f"不支持的文件类型: {file_path}")
+            files[full_path.relative_to(project_root).as_posix()] = None
+
+        if pattern:
+            if Path(pattern).is_absolute() or ".." in Path(pattern).parts:
+                raise ValueError(f"非法模式: {pattern}")
+
+            def match() -> list[str]:
+                matched = []
+                for full_path in project_root.glob(pattern):
+                    relative = full_path.relative_to(project_root)
+                    if any(part.startswith(".") for part in relative.parts):
+                        continue
+                    if extensions is not None and full_path.suffix.lower() not in extensions:
+                        continue
+                    # 符号链接可能指向项目之外
+                    if full_path.is_file() and full_path.resolve().is_relative_to(project_root):
+                        matched.append(relative.as_posix())
+                return sorted(matched)
+
+            for file_path in await asyncio.to_thread(match):
+                files.setdefault(file_path, None)
+
+        return list(files)
+
+    @staticmethod
+    def file_etag(stat_result: os.stat_result) -> str:
+        """
+        计算强 ETag（inode + 大小 + 纳秒级修改时间）
+
+        Args:
+            stat_result: 文件 stat 结果
+
+        Returns:
+            str: 带引号的 ETag
+        """
+        return (
+            f'"{stat_result.st_ino:x}-{stat_result.st_size:x}'
+            f'-{stat_result.st_mtime_ns:x}"'
+        )
+
+    async def stat_file(
+        self,
+        project_id: str,
+        file_path: str
+    ) -> tuple[Path, os.stat_result]:
+        """
+        获取文件路径和 stat 信息
+
+        Args:
+            project_id: 项目ID
+            file_path: 文件相对路径
+
+        Returns:
+            tuple[Path, os.stat_result]: (文件绝对路径, stat 结果)
+        """
+        full_path = self._resolve_file_path(project_id, file_path)
+
+        try:
+            stat_result = await asyncio.to_thread(os.stat, full_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"文件不存在: {file_path}")
+
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise ValueError(f"不是文件: {file_path}")
+
+        return full_path, stat_result
+
+    async def iter_file(
+        self,
+        full_path: Path,
+        start: int = 0,
+        end: Optional[int] = None,
+        chunk_size: int = 64 * 1024
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        分块读取文件
+
+        Args:
+            full_path: 文件绝对路径
+            start: 起始字节
+            end: 结束字节（包含），None 表示读到文件末尾
+            chunk_size: 每块字节数
+
+        Yields:
+            bytes: 文件内容块
+        """
+        async with aiofiles.open(full_path, "rb") as f:
+            await f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = chunk_size if remaining is None else min(chunk_size, remaining)
+                chunk = await f.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def _write_atomic(self, project_id: str, full_path: Path, data: bytes) -> os.stat_result:
+        """原子写入并更新项目占用（调用方需持有文件锁）"""
+        old_size, stat_result = await asyncio.to_thread(_replace_file, full_path, data, self.fsync)
+        self.write_stats["written"] += 1
+        project_quota.adjust(project_id, stat_result.st_size - old_size)
+        return stat_result
+
     async def write_file(
         self,
         project_id: str,
         file_path: str,
         content: str,
         encoding: str = "utf-8"
-    ) -> None:
+    ) -> Optional[str]:
         """
         写入文件内容
 
@@ -82,14 +332,409 @@ class FileService:
             file_path: 文件相对路径
             content: 文件内容
             encoding: 文件编码
+
+        Returns:
+            Optional[str]: 写入后的文件 ETag；落盘前被同一文件的后续保存覆盖时为 None
+
+        Raises:
+            FileDeleted: 等待落盘期间文件被删除
         """
         full_path = self._resolve_file_path(project_id, file_path)
+        data = content.encode(encoding)
+        self.write_stats["requested"] += 1
+
+        lock = self._file_lock(full_path)
+        pending = self._pending_writes.get(full_path)
+        delay = self._write_delay(full_path)
+        if pending is None and not lock.locked() and delay <= 0:
+            # 前沿：没有进行中的修改且距上次落盘已超过合并窗口，立即落盘
+            async with lock:
+                stat_result = await self._write_atomic(project_id, full_path, data)
+                self._record_write(full_path)
+            await self._notify_change(project_id, full_path, modified=True)
+            return self.file_etag(stat_result)
+
+        waiter = asyncio.get_running_loop().create_future()
+        if pending is not None:
+            # 已有待写入：用新内容替换，被替换的调用方不会落盘
+            self._supersede(pending)
+            pending.data = data
+            pending.waiter = waiter
+        else:
+            self._pending_writes[full_path] = _PendingWrite(project_id, data, waiter)
+            task = asyncio.create_task(self._delayed_flush(full_path, delay))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+        return await asyncio.shield(waiter)
+
+    def _write_delay(self, full_path: Path) -> float:
+        """距合并窗口结束还有多久（秒），不在窗口内时 <= 0"""
+        now = time.monotonic()
+        while self._last_writes:
+            oldest_path, oldest = next(iter(self._last_writes.items()))
+            if now - oldest < self.coalesce_window:
+                break
+            del self._last_writes[oldest_path]
+        last = self._last_writes.get(full_path)
+        return -1 if last is None else last + self.coalesce_window - now
+
+    def _record_write(self, full_path: Path):
+        if self.coalesce_window > 0:
+            self._last_writes[full_path] = time.monotonic()
+            self._last_writes.move_to_end(full_path)
+
+    def _supersede(self, pending: _PendingWrite):
+        """待写入被更新的内容替换，原调用方得到 None"""
+        if not pending.waiter.done():
+            pending.waiter.set_result(None)
+        self.write_stats["coalesced"] += 1
+
+    def _discard_pending(self, full_path: Path, recursive: bool = False):
+        """
+        丢弃路径（recursive 时包括其下所有文件）的待写入，等待者收到 FileDeleted（调用方需持有文件锁）
+        """
+        for path in list(self._pending_writes):
+            if path == full_path or (recursive and path.is_relative_to(full_path)):
+                pending = self._pending_writes.pop(path)
+                if not pending.waiter.done():
+                    pending.waiter.set_exception(FileDeleted(f"文件已被删除: {path.name}"))
+
+    async def _delayed_flush(self, full_path: Path, delay: float):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self._flush(full_path)
+
+    async def _flush(self, full_path: Path):
+        """把文件的待写入内容落盘，并把 ETag 交给最后一次保存的调用方"""
+        async with self._file_lock(full_path):
+            pending = self._pending_writes.pop(full_path, None)
+            if pending is None:
+                return
+            try:
+                stat_result = await self._write_atomic(pending.project_id, full_path, pending.data)
+                self._record_write(full_path)
+            except Exception as e:
+                if not pending.waiter.done():
+                    pending.waiter.set_exception(e)
+                return
+
+        await self._notify_change(pending.project_id, full_path, modified=True)
+        if not pending.waiter.done():
+            pending.waiter.set_result(self.file_etag(stat_result))
+
+    async def flush_all(self):
+        """立即落盘所有待写入内容（关闭服务时调用）"""
+        for full_path in list(self._pending_writes):
+            await self._flush(full_path)
+        for task in list(self._flush_tasks):
+            task.cancel()
+
+    async def patch_file(
+        self,
+        project_id: str,
+        file_path: str,
+        base_etag: str,
+        edits: Optional[list[TextEdit]] = None,
+        diff: Optional[str] = None,
+        offset_unit: OffsetUnit = "utf16"
+    ) -> tuple[str, int]:
+        """
+        以补丁方式修改文件
+
+        校验、应用和写回在文件锁内完成，基准 ETag 不是当前版本时拒绝写入。
+
+        Args:
+            project_id: 项目ID
+            file_path: 文件相对路径
+            base_etag: 补丁基于的文件 ETag
+            edits: 区间替换编辑列表（与 diff 二选一）
+            diff: unified diff 文本
+            offset_unit: edits 偏移量单位
 
-        # 确保父目录存在
+        Returns:
+            tuple[str, int]: (新的 ETag, 新的文件字节数)
+
+        Raises:
+            ETagMismatch: 文件已被修改
+            PatchConflict: 补丁无法应用到当前内容
+        """
+        full_path, _ = await self.stat_file(project_id, file_path)
+        # 先落盘合并窗口内的保存，使 ETag 校验基于最新内容
+        await self._flush(full_path)
+
+        async with self._file_lock(full_path):
+            stat_result = await asyncio.to_thread(os.stat, full_path)
+            current_etag = self.file_etag(stat_result)
+            if base_etag.removeprefix("W/") != current_etag:
+                raise ETagMismatch(current_etag)
+
+            # 按字节读取再解码，不做换行转换：偏移量基于磁盘上的原始内容，未编辑的 CRLF 原样保留
+            async with aiofiles.open(full_path, "rb") as f:
+                content = (await f.read()).decode("utf-8")
+
+            if diff is not None:
+                # 大文件逐行比对较耗 CPU，放到线程中执行
+                content = await asyncio.to_thread(apply_unified_diff, content, diff)
+            else:
+                content = apply_edits(
+                    content,
+                    [(edit.from_, edit.to, edit.text) for edit in edits],
+                    offset_unit
+                )
+
+            stat_result = await self._write_atomic(project_id, full_path, content.encode("utf-8"))
+
+        await self._notify_change(project_id, full_path, modified=True)
+        return self.file_etag(stat_result), stat_result.st_size
+
+    async def upload_file(
+        self,
+        project_id: str,
+        file_path: str,
+        chunks: AsyncIterator[bytes],
+        overwrite: bool = False,
+        expected_size: Optional[int] = None
+    ) -> dict:
+        """
+        流式上传文件
+
+        数据边接收边写入目标目录下的隐藏临时文件，单文件大小和项目空间按块检查，
+        超限立即中止并删除临时文件；接收完成后 fsync 并原子移动到目标路径。
+
+        Args:
+            project_id: 项目ID
+            file_path: 文件相对路径
+            chunks: 文件内容字节流
+            overwrite: 目标已存在时是否覆盖
+            expected_size: 预告的文件大小（如 Content-Length），用于提前拒绝
+
+        Returns:
+            dict: {path, size, etag}
+
+        Raises:
+            UnsupportedFileType: 扩展名不允许
+            FileExistsError: 目标已存在且不允许覆盖
+            FileTooLarge: 超出单文件或项目空间上限
+        """
+        full_path = self.validate_upload(project_id, file_path, overwrite, expected_size)
+        max_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+
+        await project_quota.usage(project_id, self._get_project_path(project_id))
         full_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = temp_path_for(full_path)
+        received = 0
+
+        try:
+            async with aiofiles.open(temp_path, "xb") as f:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if received + len(chunk) > max_bytes:
+                        raise FileTooLarge(f"文件超过 {settings.MAX_FILE_SIZE_MB}MB 上限")
+                    try:
+                        project_quota.reserve(project_id, len(chunk))
+                    except QuotaExceeded as e:
+                        raise FileTooLarge(str(e))
+                    received += len(chunk)
+                    await f.write(chunk)
+                await f.flush()
+                if self.fsync:
+                    await asyncio.to_thread(os.fsync, f.fileno())
+
+            return await self.install_file(project_id, file_path, temp_path, overwrite)
+        except BaseException:
+            project_quota.adjust(project_id, -received)
+            try:
+                temp_path.unlink()
+            except OSError:
+                pass
+            raise
+
+    def validate_upload(
+        self,
+        project_id: str,
+        file_path: str,
+        overwrite: bool = False,
+        size: Optional[int] = None
+    ) -> Path:
+        """
+        上传前检查扩展名、目标路径和文件大小
+
+        Args:
+            project_id: 项目ID
+            file_path: 文件相对路径
+            overwrite: 目标已存在时是否覆盖
+            size: 已知的文件大小
+
+        Returns:
+            Path: 目标文件绝对路径
+
+        Raises:
+            UnsupportedFileType: 扩展名不允许
+            FileExistsError: 目标已存在且不允许覆盖
+            FileTooLarge: 超出单文件上限
+        """
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension not in {ext.lower() for ext in settings.ALLOWED_EXTENSIONS}:
+            raise UnsupportedFileType(f"不支持的文件类型: {extension or file_path}")
+
+        full_path = self._resolve_file_path(project_id, file_path)
+        if full_path.exists() and (not overwrite or not full_path.is_file()):
+            raise FileExistsError(f"文件已存在: {file_path}")
+
+        if size is not None and size > settings.MAX_FILE_SIZE_MB * 1024 * 1024:
+            raise FileTooLarge(f"文件超过 {settings.MAX_FILE_SIZE_MB}MB 上限")
+
+        return full_path
+
+    async def install_file(
+        self,
+        project_id: str,
+        file_path: str,
+        source_path: Path,
+        overwrite: bool = False
+    ) -> dict:
+        """
+        把已写完并落盘的文件原子移动到项目中
+
+        source_path 与项目位于不同文件系统时先复制到目标旁的临时文件再 rename；
+        新内容占用的空间由调用方预留，这里只扣除被覆盖的旧文件。
+
+        Args:
+            project_id: 项目ID
+            file_path: 目标文件相对路径
+            source_path: 已写完的源文件
+            overwrite: 目标已存在时是否覆盖
 
-        async with aiofiles.open(full_path, "w", encoding=encoding) as f:
-            await f.write(content)
+        Returns:
+            dict: {path, size, etag}
+        """
+        project_path = self._get_project_path(project_id)
+        full_path = self._resolve_file_path(project_id, file_path)
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+
+        async with self._file_lock(full_path):
+            pending = self._pending_writes.get(full_path)
+            existed = full_path.exists() or pending is not None
+            if existed and not overwrite:
+                raise FileExistsError(f"文件已存在: {file_path}")
+            if pending is not None:
+                # 上传的内容比等待落盘的保存更新
+                del self._pending_writes[full_path]
+                self._supersede(pending)
+            old_size = await asyncio.to_thread(_file_size, full_path)
+            await asyncio.to_thread(move_file, source_path, full_path, self.fsync)
+            if self.fsync:
+                await asyncio.to_thread(fsync_directory, full_path.parent)
+            stat_result = await asyncio.to_thread(os.stat, full_path)
+
+        project_quota.adjust(project_id, -old_size)
+        self.write_stats["written"] += 1
+        await self._notify_change(project_id, full_path, modified=existed)
+        return {
+            "path": full_path.relative_to(project_path.resolve()).as_posix(),
+            "size": stat_result.st_size,
+            "etag": self.file_etag(stat_result),
+        }
+
+    async def get_pdf_info(
+        self,
+        project_id: str,
+        file_path: str,
+        include_text: bool = False
+    ) -> dict:
+        """
+        获取 PDF 的元数据和文本（首次访问时解析，之后读缓存）
+
+        Args:
+            project_id: 项目ID
+            file_path: PDF 相对路径
+            include_text: 是否返回全文
+
+        Returns:
+            dict: {hash, pages, page_lines, metadata, truncated[, text]}
+        """
+        full_path, _ = await self.stat_file(project_id, file_path)
+        if full_path.suffix.lower() != ".pdf":
+            raise ValueError(f"不是 PDF 文件: {file_path}")
+
+        result = await pdf_service.extract(full_path)
+        info = {key: value for key, value in result.items() if key not in ("version", "text")}
+        if include_text:
+            info["text"] = result["text"]
+        return info
+
+    async def search(
+        self,
+        project_id: str,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        path_prefix: Optional[str] = None,
+        extensions: Optional[list[str]] = None
+    ) -> dict:
+        """
+        全文检索项目文件
+
+        Args:
+            project_id: 项目ID
+            query: 查询字符串
+            limit: 返回的文件数
+            offset: 跳过的文件数
+            path_prefix: 只检索该目录
+            extensions: 只检索这些扩展名
+
+        Returns:
+            dict: 检索结果
+        """
+        project_path = self._get_project_path(project_id)
+        return await search_index_service.search(
+            project_id,
+            project_path,
+            query,
+            limit=limit,
+            offset=offset,
+            path_prefix=path_prefix,
+            extensions=extensions
+        )
+
+    async def retrieve(
+        self,
+        project_id: str,
+        query: str,
+        top_k: int = 5,
+        min_score: float = 0.0
+    ) -> dict:
+        """
+        语义检索项目参考资料和笔记
+
+        Args:
+            project_id: 项目ID
+            query: 查询文本
+            top_k: 返回的片段数
+            min_score: 最低相似度
+
+        Returns:
+            dict: 检索结果
+        """
+        if not query.strip():
+            raise ValueError("查询不能为空")
+        project_path = self._get_project_path(project_id)
+        return await retrieval_service.retrieve(project_id, project_path, query, top_k, min_score)
+
+    async def get_usage(self, project_id: str) -> dict:
+        """
+        获取项目空间占用
+
+        Returns:
+            dict: {used, limit}（字节）
+        """
+        project_path = self._get_project_path(project_id)
+        return {
+            "used": await project_quota.usage(project_id, project_path),
+            "limit": project_quota.max_bytes,
+        }
 
     async def create_file(
         self,
@@ -109,15 +754,17 @@ class FileService:
         """
         full_path = self._resolve_file_path(project_id, file_path)
 
-        if full_path.exists():
-            raise FileExistsError(f"文件已存在: {file_path}")
+        async with self._file_lock(full_path):
+            if full_path.exists() or full_path in self._pending_writes:
+                raise FileExistsError(f"文件已存在: {file_path}")
 
-        if file_type == "folder":
-            full_path.mkdir(parents=True, exist_ok=True)
-        else:
-            full_path.parent.mkdir(parents=True, exist_ok=True)
-            async with aiofiles.open(full_path, "w", encoding="utf-8") as f:
-                await f.write(content)
+            if file_type == "folder":
+                full_path.mkdir(parents=True, exist_ok=True)
+            else:
+                await self._write_atomic(project_id, full_path, content.encode("utf-8"))
+                self._record_write(full_path)
+
+        await self._notify_change(project_id, full_path)
 
     async def delete_file(self, project_id: str, file_path: str) -> None:
         """
@@ -129,31 +776,66 @@ class FileService:
         """
         full_path = self._resolve_file_path(project_id, file_path)
 
-        if not full_path.exists():
-            raise FileNotFoundError(f"文件不存在: {file_path}")
-
-        if full_path.is_file():
-            full_path.unlink()
-        elif full_path.is_dir():
-            shutil.rmtree(full_path)
+        async with self._file_lock(full_path), contextlib.AsyncExitStack() as child_locks:
+            if not full_path.exists() and full_path not in self._pending_writes:
+                raise FileNotFoundError(f"文件不存在: {file_path}")
+
+            if full_path.is_dir():
+                # 目录下正在落盘的文件持有各自的锁：全部取得后再删除，避免与 rmtree 交错
+                for path, lock in sorted(self._locks.items()):
+                    if path != full_path and path.is_relative_to(full_path):
+                        await child_locks.enter_async_context(lock)
+
+            # 等待落盘的保存不再写入，调用方收到 FileDeleted
+            self._discard_pending(full_path, recursive=full_path.is_dir())
+            if full_path.is_file():
+                size = full_path.stat().st_size
+                full_path.unlink()
+            elif full_path.is_dir():
+                size = await asyncio.to_thread(directory_size, str(full_path))
+                await asyncio.to_thread(shutil.rmtree, full_path)
+            else:
+                size = 0
+            project_quota.adjust(project_id, -size)
+
+        await self._notify_change(project_id, full_path)
 
     async def list_files(
         self,
         project_id: str,
-        folder_path: str = ""
-    ) -> list[FileNode]:
+        folder_path: str = "",
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        sort: SortField = "name",
+        order: SortOrder = "asc",
+        pattern: Optional[str] = None,
+        extensions: Optional[list[str]] = None,
+        depth: int = 1,
+        details: bool = False
+    ) -> tuple[list[FileNode], Optional[str]]:
         """
         列出目录中的文件
 
         Args:
             project_id: 项目ID
             folder_path: 文件夹相对路径
+            cursor: 分页游标（上一页返回的 next_cursor）
+            limit: 每页数量，None 表示不分页
+            sort: 排序字段 (name, mtime, size)
+            order: 排序方向 (asc, desc)
+            pattern: 文件名 glob 模式，多个用逗号分隔
+            extensions: 扩展名过滤，如 [".pdf", ".tex"]
+            depth: 展开层数，1 表示只列当前目录
+            details: 是否返回大小和修改时间
 
         Returns:
-            list[FileNode]: 文件节点列表
+            tuple[list[FileNode], Optional[str]]: (文件节点列表, 下一页游标)
         """
         project_path = self._get_project_path(project_id)
-        full_path = project_path / folder_path if folder_path else project_path
+        full_path = (
+            self._resolve_file_path(project_id, folder_path, allow_root=True)
+            if folder_path else project_path
+        )
 
         if not full_path.exists():
             raise FileNotFoundError(f"目录不存在: {folder_path}")
@@ -161,22 +843,33 @@ class FileService:
         if not full_path.is_dir():
             raise ValueError(f"不是目录: {folder_path}")
 
-        files = []
-        for item in sorted(full_path.iterdir()):
-            # 跳过隐藏文件
-            if item.name.startswith("."):
-                continue
-
-            rel_path = item.relative_to(project_path)
-            files.append(FileNode(
-                name=item.name,
-                path=str(rel_path).replace("\\", "/"),
-                type="folder" if item.is_dir() else "file",
-                extension=item.suffix if item.is_file() else None
-            ))
-
-        return files
+        rel_prefix = full_path.relative_to(project_path.resolve()).as_posix() if folder_path else ""
+        if rel_prefix == ".":
+            rel_prefix = ""
+
+        items, next_key = await asyncio.to_thread(
+            scan_directory,
+            str(full_path),
+            rel_prefix,
+            depth=depth,
+            sort=sort,
+            order=order,
+            patterns=[p.strip() for p in pattern.split(",") if p.strip()] if pattern else None,
+            extensions={
+                ext.lower() if ext.startswith(".") else f".{ext.lower()}"
+                for ext in extensions
+            } if extensions else None,
+            details=details,
+            after=decode_cursor(cursor, sort) if cursor else None,
+            limit=limit
+        )
+
+        files = [FileNode.model_validate(item) for item in items]
+        return files, encode_cursor(sort, next_key) if next_key is not None else None
 
 
 # 全局服务实例
-file_service = FileService()
+file_service = FileService(
+    coalesce_window_ms=settings.FILE_WRITE_COALESCE_MS,
+    fsync=settings.FILE_WRITE_FSYNC
+)
@@ -0,0 +1,481 @@
+"""后台任务队列 - 耗时的 AI 调用在后台执行，状态持久化到 SQLite（重启后恢复），完成时通过 WebSocket 推送"""
+import asyncio
+import logging
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable, List, Literal, Optional
+from pydantic import BaseModel
+from app.config import settings
+from app.core.ai_service import ai_service
+from app.core.connection_manager import manager
+from app.models.ai import CacheMode
+
+logger = logging.getLogger(__name__)
+
+JobKind = Literal["text_to_latex", "search_papers", "generate_code"]
+# 任务状态：pending -> running -> completed | failed | cancelled（pending 也可以直接取消）
+JobStatus = Literal["pending", "running", "completed", "failed", "cancelled"]
+
+# 任务表结构版本，变化时重建
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_project ON jobs (project_id, created_at);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+"""
+
+# 查询任务状态时不返回结果正文
+_STATUS_COLUMNS = "id, project_id, kind, status, error, created_at, started_at, finished_at"
+
+
+class JobNotFound(KeyError):
+    """任务不存在或已被清理"""
+
+
+class TextToLatexParams(BaseModel):
+    """text_to_latex 任务参数"""
+    text: str
+    cache: CacheMode = "default"
+
+
+class SearchPapersParams(BaseModel):
+    """search_papers 任务参数"""
+    keywords: List[str]
+    field: str = ""
+    cache: CacheMode = "default"
+
+
+class GenerateCodeParams(BaseModel):
+    """generate_code 任务参数"""
+    description: str
+    language: str = "python"
+    cache: CacheMode = "default"
+
+
+# 任务类型 -> (参数模型, 执行函数)
+JOB_HANDLERS: dict[str, tuple[type[BaseModel], Callable[[str, BaseModel], Awaitable[str]]]] = {
+    "text_to_latex": (
+        TextToLatexParams,
+        lambda project_id, p: ai_service.text_to_latex(p.text, p.cache, project_id)
+    ),
+    "search_papers": (
+        SearchPapersParams,
+        lambda project_id, p: ai_service.search_papers(p.keywords, p.field, p.cache, project_id)
+    ),
+    "generate_code": (
+        GenerateCodeParams,
+        lambda project_id, p: ai_service.generate_code(p.description, p.language, p.cache, project_id)
+    ),
+}
+
+
+def _row_dict(row: sqlite3.Row) -> dict:
+    job = {key: row[key] for key in row.keys()}
+    job["job_id"] = job.pop("id")
+    return job
+
+
+class JobQueue:
+    """
+    后台任务队列
+
+    - 提交时写入 SQLite 并返回任务 ID，由 workers 个协程按提交顺序执行
+    - 重启后未完成的任务（pending，以及中断时正在执行的 running）重新排队
+    - 任务结束（完成/失败/取消）时向项目的所有 WebSocket 连接推送 job_complete 消息
+    - 结束的任务保留 retention 秒，且最多保留 max_retained 个，由定期清理删除
+    - 数据库读写在同一个线程中串行执行，不阻塞事件循环
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        workers: int,
+        timeout: float,
+        retention_seconds: float,
+        max_retained: int,
+        gc_interval: float
+    ):
+        self.db_path = db_path
+        self.workers = workers
+        self.timeout = timeout
+        self.retention_seconds = retention_seconds
+        self.max_retained = max_retained
+        self.gc_interval = gc_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-queue")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._running: dict[str, asyncio.Task] = {}
+        # 正在被 worker 领取的任务，以及领取期间收到的取消请求
+        self._claiming: set[str] = set()
+        self._cancel_requested: set[str] = set()
+        self._tasks: list[asyncio.Task] = []
+        self._closing = False
+        self.stats = {
+            "submitted": 0,
+            "recovered": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "evicted": 0,
+        }
+
+    # ---------- 数据库线程 ----------
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.executescript("DROP TABLE IF EXISTS jobs;")
+                conn.executescript(_SCHEMA)
+                conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+                conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _insert(self, job: dict):
+        conn = self._db()
+        conn.execute(
+            "INSERT INTO jobs (id, project_id, kind, params, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job["id"], job["project_id"], job["kind"], job["params"], "pending", job["created_at"])
+        )
+        conn.commit()
+
+    def _recover(self) -> list[str]:
+        """中断时正在执行的任务改回 pending，返回按提交顺序排列的待执行任务"""
+        conn = self._db()
+        conn.execute("UPDATE jobs SET status = 'pending', started_at = NULL WHERE status = 'running'")
+        conn.commit()
+        return [row[0] for row in conn.execute("SELECT id FROM jobs WHERE status = 'pending' ORDER BY created_at")]
+
+    def _claim(self, job_id: str, now: float) -> Optional[sqlite3.Row]:
+        """pending -> running，任务已被取消或清理时返回 None"""
+        conn = self._db()
+        cursor = conn.execute(
+            "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'pending'",
+            (now, job_id)
+        )
+        conn.commit()
+        if not cursor.rowcount:
+            return None
+        return conn.execute("SELECT id, project_id, kind, params FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def _finish(self, job_id: str, status: str, result: Optional[str], error: Optional[str], now: float):
+        conn = self._db()
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, result, error, now, job_id)
+        )
+        conn.commit()
+
+    def _cancel_pending(self, job_id: str, now: float) -> Optional[sqlite3.Row]:
+        """取消排队中的任务，返回任务行；任务不存在时抛出 JobNotFound"""
+        conn = self._db()
+        cursor = conn.execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'pending'",
+            (now, job_id)
+        )
+        conn.commit()
+        row = conn.execute(f"SELECT {_STATUS_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise JobNotFound(job_id)
+        return row if cursor.rowcount else None
+
+    def _select(self, job_id: str, with_result: bool) -> sqlite3.Row:
+        columns = f"{_STATUS_COLUMNS}, result" if with_result else _STATUS_COLUMNS
+        row = self._db().execute(f"SELECT {columns} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise JobNotFound(job_id)
+        return row
+
+    def _select_project(self, project_id: str, limit: int) -> list[sqlite3.Row]:
+        return self._db().execute(
+            f"SELECT {_STATUS_COLUMNS} FROM jobs WHERE project_id = ? ORDER BY created_at DESC LIMIT ?",
+            (project_id, limit)
+        ).fetchall()
+
+    def _evict(self, now: float) -> int:
+        """删除超过保留时间的结束任务，以及超出数量上限的最早结束的任务"""
+        conn = self._db()
+        expired = conn.execute(
+            "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (now - self.retention_seconds,)
+        ).rowcount
+        excess = conn.execute(
+            "DELETE FROM jobs WHERE id IN ("
+            "SELECT id FROM jobs WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_retained,)
+        ).rowcount
+        conn.commit()
+        return expired + excess
+
+    def _count(self) -> dict:
+        return dict(self._db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _run(self, func, *args) -> asyncio.Future:
+        """在数据库线程中执行"""
+        return asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    # ---------- 事件循环 ----------
+
+    async def submit(self, project_id: str, kind: str, params: dict) -> dict:
+        """
+        提交任务
+
+        Args:
+            project_id: 项目ID
+            kind: 任务类型（text_to_latex | search_papers | generate_code）
+            params: 任务参数，字段与对应的同步接口相同
+
+        Returns:
+            dict: 任务状态
+
+        Raises:
+            ValueError: 未知的任务类型或参数不合法
+        """
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"未知的任务类型: {kind}")
+        params_model, _ = JOB_HANDLERS[kind]
+        validated = params_model.model_validate(params)
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "project_id": project_id,
+            "kind": kind,
+            "params": validated.model_dump_json(),
+            "created_at": time.time(),
+        }
+        await self._run(self._insert, job)
+        self._queue.put_nowait(job["id"])
+        self.stats["submitted"] += 1
+        return await self.get(job["id"])
+
+    async def get(self, job_id: str, with_result: bool = False) -> dict:
+        """
+        获取任务状态
+
+        Args:
+            job_id: 任务ID
+            with_result: 是否附带结果正文
+
+        Returns:
+            dict: 任务状态（job_id, project_id, kind, status, error, created_at, started_at, finished_at）
+
+        Raises:
+            JobNotFound: 任务不存在或已被清理
+        """
+        return _row_dict(await self._run(self._select, job_id, with_result))
+
+    async def list_jobs(self, project_id: str, limit: int = 50) -> list[dict]:
+        """
+        列出项目最近提交的任务（不含结果正文）
+
+        Args:
+            project_id: 项目ID
+            limit: 返回的任务数
+
+        Returns:
+            list[dict]: 任务状态，按提交时间倒序
+        """
+        return [_row_dict(row) for row in await self._run(self._select_project, project_id, limit)]
+
+    async def cancel(self, job_id: str) -> bool:
+        """
+        取消排队中或执行中的任务
+
+        Returns:
+            bool: 是否取消了未结束的任务
+
+        Raises:
+            JobNotFound: 任务不存在或已被清理
+        """
+        row = await self._run(self._cancel_pending, job_id, time.time())
+        if row is not None:
+            self.stats["cancelled"] += 1
+            self._notify(row["project_id"], job_id, row["kind"], "cancelled")
+            return True
+
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+            return True
+        if job_id in self._claiming:
+            # 正在被 worker 领取，执行任务创建后立即取消
+            self._cancel_requested.add(job_id)
+            return True
+        return False
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self._claiming.add(job_id)
+            try:
+                row = await self._run(self._claim, job_id, time.time())
+            except Exception:
+                logger.exception("读取后台任务失败: %s", job_id)
+                row = None
+            finally:
+                self._claiming.discard(job_id)
+            cancel_requested = job_id in self._cancel_requested
+            self._cancel_requested.discard(job_id)
+            if row is None:
+                continue
+
+            task = asyncio.create_task(self._execute(row))
+            self._running[job_id] = task
+            if cancel_requested:
+                task.cancel()
+            try:
+                # 等待执行结束；worker 自身被取消（关闭服务）时也取消执行任务
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise
+            finally:
+                self._running.pop(job_id, None)
+
+    async def _execute(self, row: sqlite3.Row):
+        job_id, project_id, kind = row["id"], row["project_id"], row["kind"]
+        params_model, handler = JOB_HANDLERS[kind]
+        result = error = None
+        try:
+            params = params_model.model_validate_json(row["params"])
+            result = await asyncio.wait_for(handler(project_id, params), self.timeout)
+            status = "completed"
+        except asyncio.CancelledError:
+            if self._closing:
+                # 服务关闭：保持 running，重启后重新排队
+                raise
+            status = "cancelled"
+        except asyncio.TimeoutError:
+            status, error = "failed", f"任务超时（{self.timeout:g} 秒）"
+        except Exception as e:
+            logger.exception("后台任务执行失败: %s (%s)", job_id, kind)
+            status, error = "failed", str(e)
+
+        # 结果已确定，之后的取消请求不再生效
+        self._running.pop(job_id, None)
+        try:
+            await self._run(self._finish, job_id, status, result, error, time.time())
+        except Exception:
+            logger.exception("保存后台任务结果失败: %s", job_id)
+            return
+        self.stats[status] += 1
+        self._notify(project_id, job_id, kind, status, error)
+
+    @staticmethod
+    def _notify(project_id: str, job_id: str, kind: str, status: str, error: Optional[str] = None):
+        """向项目的所有连接推送任务结束消息（结果通过 GET /jobs/{job_id}/result 获取）"""
+        manager.broadcast(project_id, {
+            "type": "job_complete",
+            "job_id": job_id,
+            "kind": kind,
+            "status": status,
+            "error": error,
+        })
+
+    async def collect_garbage(self) -> int:
+        """
+        清理过期和超出数量上限的结束任务
+
+        Returns:
+            int: 删除的任务数
+        """
+        removed = await self._run(self._evict, time.time())
+        self.stats["evicted"] += removed
+        return removed
+
+    async def _gc_loop(self):
+        while True:
+            try:
+                await self.collect_garbage()
+            except Exception:
+                logger.exception("清理后台任务失败")
+            await asyncio.sleep(self.gc_interval)
+
+    async def _bootstrap(self):
+        try:
+            pending = await self._run(self._recover)
+        except Exception:
+            logger.exception("恢复后台任务失败")
+            pending = []
+        for job_id in pending:
+            self._queue.put_nowait(job_id)
+        self.stats["recovered"] = len(pending)
+        if pending:
+            logger.info("恢复后台任务: %d 个", len(pending))
+
+    def start(self):
+        """恢复未完成的任务，启动 worker 和定期清理"""
+        if self._tasks:
+            return
+        self._closing = False
+        # 先入队恢复的任务，之后新提交的任务排在后面
+        bootstrap = asyncio.create_task(self._bootstrap())
+
+        async def worker():
+            await bootstrap
+            await self._worker()
+
+        self._tasks = [bootstrap, asyncio.create_task(self._gc_loop())]
+        self._tasks += [asyncio.create_task(worker()) for _ in range(self.workers)]
+
+    async def get_stats(self) -> dict:
+        """
+        获取统计
+
+        Returns:
+            dict: 提交/恢复/完成/失败/取消/清理的任务数，执行中和排队中的任务数，以及数据库中各状态的任务数
+        """
+        return {
+            **self.stats,
+            "workers": self.workers,
+            "running": len(self._running),
+            "queued": self._queue.qsize(),
+            "stored": await self._run(self._count),
+        }
+
+    async def shutdown(self):
+        """停止 worker（执行中的任务保持 running，重启后重新排队）并关闭数据库"""
+        self._closing = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._executor.submit(self._close)
+        self._executor.shutdown(wait=True, cancel_futures=False)
+
+
+# 全局任务队列实例
+job_queue = JobQueue(
+    db_path=settings.DATA_ROOT / "jobs" / "jobs.sqlite3",
+    workers=settings.AI_JOB_WORKERS,
+    timeout=settings.AI_JOB_TIMEOUT_SECONDS,
+    retention_seconds=settings.AI_JOB_RETENTION_SECONDS,
+    max_retained=settings.AI_JOB_MAX_RETAINED,
+    gc_interval=settings.AI_JOB_GC_INTERVAL_SECONDS
+)
@@ -0,0 +1,138 @@
+"""LLM 传输层 - 将阻塞的 DashScope 调用移出事件循环"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import partial
+from typing import Any, AsyncGenerator
+from dashscope import Generation
+from app.config import settings
+
+
+class _StreamEnd:
+    """流结束标记"""
+
+
+class _StreamError:
+    """工作线程中抛出的异常，转交给事件循环侧重新抛出"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _discard_result(future: asyncio.Future) -> None:
+    """读取后台任务结果，避免 "exception was never retrieved" 警告"""
+    if not future.cancelled():
+        future.exception()
+
+
+class LLMClient:
+    """
+    DashScope 异步客户端
+
+    dashscope SDK 只提供同步接口（基于 requests），直接在 async 函数中调用
+    会阻塞整个 uvicorn worker。这里使用一个有界的专用线程池执行调用，
+    流式响应由工作线程逐块放入 asyncio.Queue，事件循环侧异步消费。
+    """
+
+    # 工作线程等待队列空位时检查停止标记的间隔（秒）
+    _PUT_POLL_INTERVAL = 0.1
+
+    def __init__(self, max_workers: int, queue_size: int):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="dashscope"
+        )
+
+    async def call(self, **kwargs) -> Any:
+        """
+        非流式调用
+
+        Args:
+            **kwargs: 透传给 Generation.call 的参数
+
+        Returns:
+            Any: DashScope 响应对象
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            partial(Generation.call, stream=False, **kwargs)
+        )
+
+    async def stream(self, **kwargs) -> AsyncGenerator[Any, None]:
+        """
+        流式调用
+
+        消费方停止迭代（正常结束、异常或任务取消）时会通知工作线程停止读取，
+        并关闭上游响应流。
+
+        Args:
+            **kwargs: 透传给 Generation.call 的参数
+
+        Yields:
+            Any: DashScope 流式响应块
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        def put(item: Any) -> bool:
+            """在工作线程中把数据放入队列，队列满时阻塞（背压）"""
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    future.result(timeout=self._PUT_POLL_INTERVAL)
+                    return True
+                except FutureTimeoutError:
+                    if stop.is_set():
+                        future.cancel()
+                        return False
+
+        def produce():
+            responses = None
+            try:
+                responses = Generation.call(stream=True, **kwargs)
+                for response in responses:
+                    if stop.is_set() or not put(response):
+                        break
+            except BaseException as e:
+                if not stop.is_set():
+                    put(_StreamError(e))
+                return
+            finally:
+                close = getattr(responses, "close", None)
+                if close is not None:
+                    # 关闭生成器会释放底层 HTTP 连接，上游不再继续推送
+                    close()
+            if not stop.is_set():
+                put(_StreamEnd())
+
+        producer = loop.run_in_executor(self._executor, produce)
+
+        try:
+            while True:
+                item = await queue.get()
+                if isinstance(item, _StreamEnd):
+                    break
+                if isinstance(item, _StreamError):
+                    raise item.error
+                yield item
+        finally:
+            stop.set()
+            # 清空队列，让可能阻塞在 put 上的工作线程尽快退出
+            while not queue.empty():
+                queue.get_nowait()
+            producer.add_done_callback(_discard_result)
+
+    def shutdown(self) -> None:
+        """关闭线程池"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 全局客户端实例
+llm_client = LLMClient(
+    max_workers=settings.AI_MAX_CONCURRENT_CALLS,
+    queue_size=settings.AI_STREAM_QUEUE_SIZE
+)
@@ -0,0 +1,242 @@
+"""LLM 准入控制 - 全局并发上限、按项目令牌桶限速、按优先级和项目公平排队"""
+import asyncio
+import math
+import statistics
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Literal, Optional
+from app.config import settings
+
+# 优先级从高到低：交互式流式 > 按需转换/生成 > 后台检查/摘要
+Priority = Literal["interactive", "on_demand", "background"]
+PRIORITIES: tuple[Priority, ...] = ("interactive", "on_demand", "background")
+
+# 排队通知回调，参数为 {priority, position, eta_seconds}
+QueueListener = Callable[[dict], None]
+
+
+class _Waiter:
+    """排队中的请求"""
+
+    __slots__ = ("project_id", "priority", "future")
+
+    def __init__(self, project_id: str, priority: Priority, future: asyncio.Future):
+        self.project_id = project_id
+        self.priority = priority
+        self.future = future
+
+
+class LLMScheduler:
+    """
+    LLM 调用准入控制
+
+    - 全局并发上限：同时进行的模型调用（含流式）不超过 max_concurrent
+    - 项目令牌桶：每个项目按 rate_per_minute 补充、最多积累 burst 个令牌，
+      on_demand 和 background 请求令牌不足时等待；interactive 请求不等待，
+      但同样扣减令牌（最多透支 burst 个），从而压低该项目后续的后台请求
+    - 排队顺序：先按优先级，同一优先级内各项目轮流，一个项目的突发请求不会饿死其他项目
+    - 排队时通过回调告知排队位置和预计等待时间
+    """
+
+    def __init__(self, max_concurrent: int, rate_per_minute: float, burst: int, window: int = 1000):
+        self.max_concurrent = max_concurrent
+        self.rate_per_second = rate_per_minute / 60
+        self.burst = burst
+        self.active = 0
+        self.stats = {
+            "admitted": 0,
+            "queued": 0,
+            "throttled": 0,
+            "cancelled": 0,
+        }
+        # 优先级 -> {项目ID: 排队请求}，同一优先级内按项目轮转
+        self._queues: dict[Priority, OrderedDict[str, deque[_Waiter]]] = {
+            priority: OrderedDict() for priority in PRIORITIES
+        }
+        # 项目ID -> [令牌数, 上次补充时间]
+        self._buckets: dict[str, list[float]] = {}
+        # 最近的等待时间（秒），按优先级
+        self._waits: dict[Priority, deque[float]] = {
+            priority: deque(maxlen=window) for priority in PRIORITIES
+        }
+        # 单次调用耗时的指数移动平均（秒），用于估算等待时间
+        self._service_time = 2.0
+
+    # ---------- 令牌桶 ----------
+
+    def _take_token(self, project_id: str, priority: Priority) -> float:
+        """
+        扣减一个令牌
+
+        Returns:
+            float: 需要等待的秒数；0 表示已扣减
+        """
+        now = time.monotonic()
+        bucket = self._buckets.get(project_id)
+        if bucket is None:
+            bucket = self._buckets[project_id] = [float(self.burst), now]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate_per_second)
+        bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        if priority == "interactive":
+            bucket[0] = max(bucket[0] - 1, -self.burst)
+            return 0
+        return (1 - bucket[0]) / self.rate_per_second
+
+    # ---------- 排队 ----------
+
+    def _queue_depth(self) -> int:
+        return sum(len(waiters) for queue in self._queues.values() for waiters in queue.values())
+
+    def _position(self, waiter: _Waiter) -> int:
+        """估算排在前面的请求数（同一优先级内按项目轮转）"""
+        ahead = 0
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            if priority != waiter.priority:
+                ahead += sum(len(waiters) for waiters in queue.values())
+                continue
+            own = queue.get(waiter.project_id)
+            index = own.index(waiter) if own else 0
+            ahead += index + sum(
+                min(len(waiters), index + 1)
+                for project_id, waiters in queue.items()
+                if project_id != waiter.project_id
+            )
+            break
+        return ahead
+
+    def _eta(self, position: int) -> float:
+        return round((position // self.max_concurrent + 1) * self._service_time, 1)
+
+    def _grant_next(self):
+        """把空出的并发名额交给下一个请求"""
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue:
+                project_id, waiters = next(iter(queue.items()))
+                waiter = waiters.popleft()
+                if waiters:
+                    queue.move_to_end(project_id)
+                else:
+                    del queue[project_id]
+                if waiter.future.done():
+                    continue
+                waiter.future.set_result(None)
+                self.active += 1
+                return
+
+    def _remove(self, waiter: _Waiter):
+        queue = self._queues[waiter.priority]
+        waiters = queue.get(waiter.project_id)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del queue[waiter.project_id]
+
+    def _release(self):
+        self.active -= 1
+        self._grant_next()
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        project_id: Optional[str],
+        priority: Priority = "on_demand",
+        on_queued: Optional[QueueListener] = None
+    ) -> AsyncIterator[None]:
+        """
+        获取一次模型调用的执行名额，退出时释放
+
+        Args:
+            project_id: 项目ID（为空时归入共享的匿名项目）
+            priority: 优先级
+            on_queued: 需要排队时的回调，参数为 {priority, position, eta_seconds}
+        """
+        started = time.monotonic()
+        key = project_id or ""
+
+        while (delay := self._take_token(key, priority)) > 0:
+            self.stats["throttled"] += 1
+            if on_queued is not None:
+                depth = self._queue_depth()
+                busy = depth or self.active >= self.max_concurrent
+                on_queued({
+                    "priority": priority,
+                    "position": depth,
+                    "eta_seconds": round(delay + (self._eta(depth) if busy else 0), 1),
+                })
+            await asyncio.sleep(delay)
+
+        if self.active < self.max_concurrent and not self._queue_depth():
+            self.active += 1
+        else:
+            waiter = _Waiter(key, priority, asyncio.get_running_loop().create_future())
+            self._queues[priority].setdefault(key, deque()).append(waiter)
+            self.stats["queued"] += 1
+            if on_queued is not None:
+                position = self._position(waiter)
+                on_queued({
+                    "priority": priority,
+                    "position": position,
+                    "eta_seconds": self._eta(position),
+                })
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                self.stats["cancelled"] += 1
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # 名额已分配但调用方已取消，交给下一个请求
+                    self._release()
+                else:
+                    self._remove(waiter)
+                raise
+
+        self._waits[priority].append(time.monotonic() - started)
+        self.stats["admitted"] += 1
+        call_started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - call_started)
+            self._release()
+
+    def get_stats(self) -> dict:
+        """
+        获取排队指标
+
+        Returns:
+            dict: 并发数、各优先级排队深度、等待时间分位数（毫秒）、累计计数
+        """
+        waits = {}
+        for priority, samples in self._waits.items():
+            if samples:
+                ordered = sorted(samples)
+                waits[priority] = {
+                    "p50_ms": round(statistics.median(ordered) * 1000, 1),
+                    "p95_ms": round(ordered[math.ceil(len(ordered) * 0.95) - 1] * 1000, 1),
+                    "max_ms": round(ordered[-1] * 1000, 1),
+                }
+        return {
+            **self.stats,
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "queue_depth": {
+                priority: sum(len(waiters) for waiters in queue.values())
+                for priority, queue in self._queues.items()
+            },
+            "wait": waits,
+            "service_time_ms": round(self._service_time * 1000, 1),
+        }
+
+
+# 全局调度器实例
+llm_scheduler = LLMScheduler(
+    max_concurrent=settings.AI_MAX_CONCURRENT_REQUESTS,
+    rate_per_minute=settings.AI_PROJECT_RATE_PER_MINUTE,
+    burst=settings.AI_PROJECT_BURST
+)
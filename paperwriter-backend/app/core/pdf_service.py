@@ -0,0 +1,234 @@
+"""PDF 提取服务 - 进程池解析，按内容哈希缓存"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+from app.config import settings
+from app.utils.atomic_write import atomic_write
+from app.utils.pdf_extract import extract_pdf
+
+logger = logging.getLogger(__name__)
+
+# 提取完成后的回调：(项目ID, 文件绝对路径)
+ExtractionListener = Callable[[str, Path], None]
+
+# 缓存结构版本，变化时旧缓存失效
+CACHE_VERSION = 1
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PdfService:
+    """
+    PDF 提取服务
+
+    解析在进程池中执行，不占用事件循环和线程池；结果以文件内容的 SHA-256 为键
+    缓存在 DATA_ROOT/pdf_cache 下，同一份 PDF（即使被复制或改名）只解析一次。
+    文件 (路径, mtime, 大小) 到哈希的映射保存在内存中，未修改的文件不会重复计算哈希。
+    """
+
+    def __init__(self, cache_dir: Path, max_workers: int, max_pages: int, max_hashes: int = 4096):
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.max_pages = max_pages
+        self.max_hashes = max_hashes
+        self.stats = {
+            "extracted": 0,
+            "cache_hits": 0,
+            "failed": 0,
+        }
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._hashes: OrderedDict[str, tuple[int, int, str]] = OrderedDict()
+        self._hash_lock = threading.Lock()
+        # 提取失败的文件：路径 -> (mtime_ns, size)，文件未修改时不再重试
+        self._failures: OrderedDict[str, tuple[int, int]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._scheduled: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._listeners: list[ExtractionListener] = []
+
+    def add_listener(self, listener: ExtractionListener):
+        """注册提取完成回调（用于更新全文索引等）"""
+        self._listeners.append(listener)
+
+    def _cache_path(self, content_hash: str) -> Path:
+        return self.cache_dir / content_hash[:2] / f"{content_hash}.json"
+
+    def content_hash(self, full_path: Path) -> str:
+        """
+        计算文件内容哈希（同步，应在工作线程中调用）
+
+        文件未修改时直接返回记住的哈希。
+        """
+        stat_result = os.stat(full_path)
+        key = str(full_path)
+        with self._hash_lock:
+            known = self._hashes.get(key)
+            if known and known[0] == stat_result.st_mtime_ns and known[1] == stat_result.st_size:
+                self._hashes.move_to_end(key)
+                return known[2]
+
+        content_hash = _sha256_file(full_path)
+        with self._hash_lock:
+            self._hashes[key] = (stat_result.st_mtime_ns, stat_result.st_size, content_hash)
+            self._hashes.move_to_end(key)
+            while len(self._hashes) > self.max_hashes:
+                self._hashes.popitem(last=False)
+        return content_hash
+
+    def load_cached(self, full_path: Path) -> Optional[dict]:
+        """
+        读取已缓存的提取结果（同步，应在工作线程中调用）
+
+        Returns:
+            Optional[dict]: 提取结果；尚未提取时返回 None
+        """
+        try:
+            content_hash = self.content_hash(full_path)
+            with open(self._cache_path(content_hash), "r", encoding="utf-8") as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if result.get("version") != CACHE_VERSION:
+            return None
+        return result
+
+    def extraction_failed(self, full_path: Path) -> bool:
+        """文件自上次提取失败以来是否未被修改（同步，应在工作线程中调用）"""
+        with self._hash_lock:
+            failed = self._failures.get(str(full_path))
+        if failed is None:
+            return False
+        try:
+            stat_result = os.stat(full_path)
+        except OSError:
+            return False
+        return failed == (stat_result.st_mtime_ns, stat_result.st_size)
+
+    def _record_failure(self, full_path: Path):
+        try:
+            stat_result = os.stat(full_path)
+        except OSError:
+            return
+        with self._hash_lock:
+            self._failures[str(full_path)] = (stat_result.st_mtime_ns, stat_result.st_size)
+            self._failures.move_to_end(str(full_path))
+            while len(self._failures) > self.max_hashes:
+                self._failures.popitem(last=False)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def extract(self, full_path: Path) -> dict:
+        """
+        获取 PDF 的提取结果，未缓存时在进程池中解析
+
+        并发请求同一份内容时共享同一次解析。
+
+        Args:
+            full_path: PDF 文件绝对路径
+
+        Returns:
+            dict: {hash, pages, text, page_lines, metadata, truncated}
+        """
+        cached = await asyncio.to_thread(self.load_cached, full_path)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+
+        content_hash = await asyncio.to_thread(self.content_hash, full_path)
+        future = self._inflight.get(content_hash)
+        if future is None:
+            future = asyncio.ensure_future(self._extract(full_path, content_hash))
+            self._inflight[content_hash] = future
+            future.add_done_callback(lambda _: self._inflight.pop(content_hash, None))
+        return await asyncio.shield(future)
+
+    async def _extract(self, full_path: Path, content_hash: str) -> dict:
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                self._get_executor(),
+                extract_pdf,
+                str(full_path),
+                self.max_pages
+            )
+        except Exception:
+            self.stats["failed"] += 1
+            self._record_failure(full_path)
+            raise
+
+        result = {"version": CACHE_VERSION, "hash": content_hash, **result}
+        cache_path = self._cache_path(content_hash)
+        await asyncio.to_thread(
+            atomic_write,
+            cache_path,
+            json.dumps(result, ensure_ascii=False).encode("utf-8"),
+            False
+        )
+        self.stats["extracted"] += 1
+        return result
+
+    def schedule(self, project_id: str, full_path: Path):
+        """
+        在后台提取 PDF（已缓存或已在排队时忽略），完成或失败后通知监听者
+
+        Args:
+            project_id: 项目ID
+            full_path: PDF 文件绝对路径
+        """
+        key = str(full_path)
+        if key in self._scheduled:
+            return
+        self._scheduled.add(key)
+
+        async def run():
+            try:
+                if not full_path.is_file():
+                    return
+                await self.extract(full_path)
+            except Exception:
+                # 失败也通知监听者，索引据此登记该文件，不再反复提取
+                logger.exception("PDF 提取失败: %s", full_path)
+            finally:
+                self._scheduled.discard(key)
+            for listener in self._listeners:
+                listener(project_id, full_path)
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def get_stats(self) -> dict:
+        """获取提取统计"""
+        return {**self.stats, "pending": len(self._scheduled)}
+
+    def shutdown(self):
+        """停止进程池"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局服务实例
+pdf_service = PdfService(
+    cache_dir=settings.DATA_ROOT / "pdf_cache",
+    max_workers=settings.PDF_MAX_WORKERS,
+    max_pages=settings.PDF_MAX_PAGES
+)
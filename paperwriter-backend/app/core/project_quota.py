@@ -0,0 +1,76 @@
+"""项目空间配额 - 增量维护项目占用字节数"""
+import asyncio
+from pathlib import Path
+from app.config import settings
+from app.utils.fs_scan import directory_size
+
+
+class QuotaExceeded(Exception):
+    """项目空间不足"""
+
+
+class ProjectQuota:
+    """
+    项目空间配额
+
+    首次使用时遍历一次项目目录得到占用字节数，之后由文件操作增量更新，
+    上传时按块预留空间，超出上限立即失败。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._usage: dict[str, int] = {}
+        self._loading: dict[str, asyncio.Task] = {}
+
+    async def usage(self, project_id: str, project_path: Path) -> int:
+        """
+        获取项目占用字节数（首次调用时遍历目录）
+
+        Args:
+            project_id: 项目ID
+            project_path: 项目目录
+
+        Returns:
+            int: 占用字节数
+        """
+        if project_id in self._usage:
+            return self._usage[project_id]
+
+        task = self._loading.get(project_id)
+        if task is None:
+            task = asyncio.create_task(asyncio.to_thread(directory_size, str(project_path)))
+            self._loading[project_id] = task
+        try:
+            size = await asyncio.shield(task)
+        finally:
+            if task.done() and self._loading.get(project_id) is task:
+                del self._loading[project_id]
+        # 并发调用共享同一次遍历，只有第一个返回的调用写入结果
+        return self._usage.setdefault(project_id, size)
+
+    def reserve(self, project_id: str, nbytes: int):
+        """
+        预留空间（需先调用 usage 加载）
+
+        Raises:
+            QuotaExceeded: 超出项目空间上限
+        """
+        used = self._usage.get(project_id, 0)
+        if used + nbytes > self.max_bytes:
+            raise QuotaExceeded(
+                f"超出项目空间上限 {self.max_bytes // (1024 * 1024)}MB"
+            )
+        self._usage[project_id] = used + nbytes
+
+    def adjust(self, project_id: str, delta: int):
+        """增量更新占用字节数（未加载的项目忽略，下次使用时重新遍历）"""
+        if project_id in self._usage:
+            self._usage[project_id] = max(0, self._usage[project_id] + delta)
+
+    def forget(self, project_id: str):
+        """丢弃项目的占用记录"""
+        self._usage.pop(project_id, None)
+
+
+# 全局配额实例
+project_quota = ProjectQuota(max_bytes=settings.MAX_PROJECT_SIZE_MB * 1024 * 1024)
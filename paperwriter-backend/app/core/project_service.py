@@ -5,8 +5,22 @@ from pathlib import Path
 from datetime import datetime
 from typing import Optional
 from app.config import settings
+from app.core.tree_index import ProjectTreeIndex, tree_index_service
 from app.models.project import FolderNode, ProjectStructure
 
+# 项目标准目录
+PROJECT_FOLDERS = ["idea", "主体", "引用", "代码"]
+
+
+def is_valid_project_id(project_id: str) -> bool:
+    """项目ID必须是项目根目录下的单级目录名，且不是隐藏目录"""
+    return (
+        bool(project_id)
+        and not project_id.startswith(".")
+        and "/" not in project_id
+        and "\\" not in project_id
+    )
+
 
 class ProjectService:
     """项目管理服务"""
@@ -44,8 +58,7 @@ class ProjectService:
         project_path.mkdir(parents=True, exist_ok=True)
 
         # 创建标准目录
-        folders = ["idea", "主体", "引用", "代码"]
-        for folder in folders:
+        for folder in PROJECT_FOLDERS:
             (project_path / folder).mkdir(exist_ok=True)
 
         # 创建初始化文件
@@ -74,77 +87,48 @@ class ProjectService:
             created_at=datetime.now()
         )
 
-    async def get_project_tree(
+    async def get_tree_index(
         self,
         project_id: str,
         project_path: Optional[Path] = None
-    ) -> FolderNode:
+    ) -> ProjectTreeIndex:
         """
-        获取项目文件树
+        获取项目文件树索引（首次访问时构建，之后增量更新）
 
         Args:
             project_id: 项目ID
             project_path: 项目路径（可选，默认根据ID查找）
 
         Returns:
-            FolderNode: 文件树根节点
+            ProjectTreeIndex: 文件树索引
         """
         if project_path is None:
+            if not is_valid_project_id(project_id):
+                raise FileNotFoundError(f"项目不存在: {project_id}")
             project_path = self.projects_root / project_id
 
         if not project_path.exists():
             raise FileNotFoundError(f"项目不存在: {project_id}")
 
-        return await self._build_tree(project_path, project_path)
+        return await tree_index_service.get(project_id, project_path)
 
-    async def _build_tree(
+    async def get_project_tree(
         self,
-        root_path: Path,
-        current_path: Path,
-        relative_path: str = ""
+        project_id: str,
+        project_path: Optional[Path] = None
     ) -> FolderNode:
         """
-        递归构建文件树
+        获取项目文件树
 
         Args:
-            root_path: 项目根路径
-            current_path: 当前路径
-            relative_path: 相对路径
+            project_id: 项目ID
+            project_path: 项目路径（可选，默认根据ID查找）
 
         Returns:
-            FolderNode: 文件树节点
+            FolderNode: 文件树根节点
         """
-        name = current_path.name
-        rel_path = f"{relative_path}/{name}" if relative_path else name
-
-        if current_path.is_file():
-            return FolderNode(
-                name=name,
-                path=rel_path.replace("\\", "/"),
-                type="file",
-                extension=current_path.suffix,
-                children=[]
-            )
-
-        # 文件夹：递归处理子项
-        children = []
-        try:
-            for item in sorted(current_path.iterdir()):
-                # 跳过隐藏文件
-                if item.name.startswith("."):
-                    continue
-                child = await self._build_tree(root_path, item, rel_path)
-                children.append(child)
-        except PermissionError:
-            pass
-
-        return FolderNode(
-            name=name,
-            path=rel_path.replace("\\", "/"),
-            type="folder",
-            extension=None,
-            children=children
-        )
+        index = await self.get_tree_index(project_id, project_path)
+        return FolderNode.model_validate(index.tree)
 
     async def validate_project(self, project_id: str) -> dict:
         """
@@ -158,17 +142,16 @@ class ProjectService:
         """
         project_path = self.projects_root / project_id
 
-        if not project_path.exists():
+        if not is_valid_project_id(project_id) or not project_path.exists():
             return {
                 "valid": False,
                 "error": "项目不存在"
             }
 
         # 检查必需的目录
-        required_folders = ["idea", "主体", "引用", "代码"]
         missing = []
 
-        for folder in required_folders:
+        for folder in PROJECT_FOLDERS:
             if not (project_path / folder).exists():
                 missing.append(folder)
 
@@ -0,0 +1,434 @@
+"""项目语义检索 - 参考资料和笔记分段向量化，向量矩阵以内存映射文件存储"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.config import settings
+from app.core.pdf_service import pdf_service
+from app.utils.atomic_write import atomic_write
+from app.utils.embedding import Embedder, load_embedder
+from app.utils.pdf_extract import page_of_line
+from app.utils.text_chunks import split_passages
+
+logger = logging.getLogger(__name__)
+
+# 参与语义检索的文档类型
+RETRIEVAL_EXTENSIONS = {".pdf", ".txt", ".md", ".tex"}
+
+# 索引结构版本，变化时重建
+INDEX_VERSION = 1
+
+# 距上次同步超过该秒数时，检索会在后台再同步一次，以发现外部编辑器的修改
+RESYNC_INTERVAL_SECONDS = 60
+
+# 首次建立索引时检索最多等待的秒数，超时则使用已建立的部分
+FIRST_SYNC_WAIT_SECONDS = 10
+
+
+class ProjectVectorIndex:
+    """
+    单个项目的向量索引
+
+    每个片段一行，向量矩阵存为 float32 原始文件并以 np.memmap 只读映射，
+    片段文本和文件签名存于 meta.json。同步只重新向量化有变化的文件，
+    未变化文件的行直接从旧矩阵复制。
+    写操作只在服务的写线程中执行；检索读取 (矩阵, 片段) 快照，可在任意线程并发执行。
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        root: Path,
+        index_dir: Path,
+        folders: list[str],
+        passage_chars: int,
+        max_file_bytes: int
+    ):
+        self.project_id = project_id
+        self.root = root
+        self.index_dir = index_dir
+        self.folders = folders
+        self.passage_chars = passage_chars
+        self.max_file_bytes = max_file_bytes
+        self.ready = False  # 首次同步是否完成
+        self.synced_at = 0.0  # 上次同步完成的时间（monotonic）
+        self.sync_scheduled = False
+        self.first_sync: Optional[asyncio.Future] = None
+        # 需要重新读取的文件（事件循环添加，写线程取走）
+        self.stale: set[str] = set()
+        # 尚未提取文本的 PDF（写线程追加，事件循环取出后安排提取）
+        self.pending_pdfs: deque[str] = deque()
+        # 文件签名：相对路径 -> [mtime_ns, size, 首行号, 行数]
+        self._files: dict[str, list[int]] = {}
+        self._vectors_name: Optional[str] = None
+        self._loaded = False
+        self._snapshot: tuple[np.ndarray, list[dict]] = (np.zeros((0, 0), dtype=np.float32), [])
+
+    @property
+    def passage_count(self) -> int:
+        return len(self._snapshot[1])
+
+    # ---------- 写线程 ----------
+
+    def _load(self, embedder: Embedder):
+        """读取磁盘上的索引（模型或版本不一致时忽略，下次同步重建）"""
+        self._loaded = True
+        self._snapshot = (np.zeros((0, embedder.dim), dtype=np.float32), [])
+        try:
+            meta = json.loads((self.index_dir / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if meta.get("version") != INDEX_VERSION or meta.get("embedder") != embedder.name:
+            return
+
+        passages = meta["passages"]
+        try:
+            matrix = self._open_vectors(meta["vectors"], len(passages), embedder.dim)
+        except (OSError, ValueError):
+            return
+        self._files = meta["files"]
+        self._vectors_name = meta["vectors"]
+        self._snapshot = (matrix, passages)
+
+    def _open_vectors(self, name: str, rows: int, dim: int) -> np.ndarray:
+        if rows == 0:
+            return np.zeros((0, dim), dtype=np.float32)
+        return np.memmap(self.index_dir / name, dtype=np.float32, mode="r", shape=(rows, dim))
+
+    def _walk(self) -> dict[str, os.stat_result]:
+        """遍历参与检索的目录，返回 {相对路径: stat}（跳过隐藏文件和目录）"""
+        found = {}
+        for folder in self.folders:
+            for dirpath, dirnames, filenames in os.walk(self.root / folder):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                rel_dir = Path(dirpath).relative_to(self.root).as_posix()
+                for name in filenames:
+                    if name.startswith(".") or os.path.splitext(name)[1].lower() not in RETRIEVAL_EXTENSIONS:
+                        continue
+                    try:
+                        found[f"{rel_dir}/{name}"] = os.stat(os.path.join(dirpath, name))
+                    except OSError:
+                        continue
+        return found
+
+    def _read_passages(self, rel_path: str, stat_result: os.stat_result) -> list[dict]:
+        """读取文件并切分片段；PDF 使用缓存的提取结果，尚未提取时返回空列表"""
+        full_path = self.root / rel_path
+        if rel_path.lower().endswith(".pdf"):
+            extraction = pdf_service.load_cached(full_path)
+            if extraction is None:
+                # 提取完成后 pdf_service 会通知，届时重新读取；已知提取失败的不再安排
+                if not pdf_service.extraction_failed(full_path):
+                    self.pending_pdfs.append(rel_path)
+                return []
+            return [
+                {
+                    "path": rel_path,
+                    "line": line,
+                    "page": page_of_line(extraction["page_lines"], line),
+                    "text": text,
+                }
+                for line, text in split_passages(extraction["text"], self.passage_chars)
+            ]
+
+        if stat_result.st_size > self.max_file_bytes:
+            return []
+        try:
+            with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+                content = f.read()
+        except OSError:
+            return []
+        return [
+            {"path": rel_path, "line": line, "text": text}
+            for line, text in split_passages(content, self.passage_chars)
+        ]
+
+    def sync(self, embedder: Embedder):
+        """与磁盘同步：新增或修改的文件重新向量化，删除的文件移除"""
+        self.sync_scheduled = False
+        if not self._loaded:
+            self._load(embedder)
+
+        stale, self.stale = self.stale, set()
+        found = self._walk()
+        unchanged = {
+            rel_path for rel_path, stat_result in found.items()
+            if rel_path not in stale
+            and (signature := self._files.get(rel_path)) is not None
+            and signature[0] == stat_result.st_mtime_ns
+            and signature[1] == stat_result.st_size
+        }
+        if len(unchanged) == len(found) == len(self._files):
+            self.synced_at = time.monotonic()
+            return
+
+        matrix, passages = self._snapshot
+        new_passages: list[dict] = []
+        new_files: dict[str, list[int]] = {}
+        blocks: list[np.ndarray] = []
+        for rel_path in sorted(found):
+            stat_result = found[rel_path]
+            if rel_path in unchanged:
+                _, _, first, count = self._files[rel_path]
+                file_passages = passages[first:first + count]
+                rows = np.asarray(matrix[first:first + count])
+            else:
+                file_passages = self._read_passages(rel_path, stat_result)
+                rows = embedder.embed([p["text"] for p in file_passages]) if file_passages else None
+            new_files[rel_path] = [stat_result.st_mtime_ns, stat_result.st_size, len(new_passages), len(file_passages)]
+            new_passages.extend(file_passages)
+            if rows is not None and len(rows):
+                blocks.append(rows)
+
+        new_matrix = np.concatenate(blocks) if blocks else np.zeros((0, embedder.dim), dtype=np.float32)
+        self._save(embedder, new_matrix, new_passages, new_files)
+        self.synced_at = time.monotonic()
+
+    def _save(self, embedder: Embedder, matrix: np.ndarray, passages: list[dict], files: dict[str, list[int]]):
+        """写入新的向量文件和元数据，再切换快照"""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        # 每次写入新文件名，正在检索的旧映射不受影响
+        vectors_name = f"vectors-{uuid.uuid4().hex[:8]}.f32"
+        atomic_write(self.index_dir / vectors_name, matrix.astype(np.float32, copy=False).tobytes(), fsync=False)
+        meta = {
+            "version": INDEX_VERSION,
+            "embedder": embedder.name,
+            "vectors": vectors_name,
+            "files": files,
+            "passages": passages,
+        }
+        atomic_write(self.index_dir / "meta.json", json.dumps(meta, ensure_ascii=False).encode("utf-8"), fsync=False)
+
+        self._files = files
+        self._vectors_name = vectors_name
+        self._snapshot = (self._open_vectors(vectors_name, len(passages), embedder.dim), passages)
+
+        for entry in os.listdir(self.index_dir):
+            if entry.startswith("vectors-") and entry != vectors_name:
+                try:
+                    os.remove(self.index_dir / entry)
+                except OSError:
+                    # Windows 上仍被映射的文件无法删除，下次写入时再清理
+                    pass
+
+    # ---------- 检索（任意线程） ----------
+
+    def search(self, query_vector: np.ndarray, top_k: int, min_score: float) -> list[dict]:
+        """
+        按余弦相似度返回最相关的片段
+
+        Args:
+            query_vector: 归一化的查询向量
+            top_k: 返回的片段数
+            min_score: 最低相似度
+
+        Returns:
+            list[dict]: [{path, line, [page,] text, score}]，按相似度降序
+        """
+        matrix, passages = self._snapshot
+        if not passages or top_k <= 0:
+            return []
+
+        scores = matrix @ query_vector
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {**passages[i], "score": round(float(scores[i]), 4)}
+            for i in top
+            if scores[i] >= min_score
+        ]
+
+
+class RetrievalService:
+    """
+    语义检索服务
+
+    项目首次检索时在后台建立向量索引（首次最多等待 FIRST_SYNC_WAIT_SECONDS），
+    之后文件写入和 PDF 提取完成都会通过 notify_change 触发增量同步。
+    嵌入模型在首次使用时加载，同步在单个写线程中串行执行。
+    """
+
+    def __init__(
+        self,
+        index_root: Path,
+        folders: list[str],
+        max_projects: int,
+        passage_chars: int,
+        max_file_bytes: int
+    ):
+        self.index_root = index_root
+        self.folders = folders
+        self.max_projects = max_projects
+        self.passage_chars = passage_chars
+        self.max_file_bytes = max_file_bytes
+        self._embedder: Optional[Embedder] = None
+        self._embedder_lock = threading.Lock()
+        self._indexes: OrderedDict[str, ProjectVectorIndex] = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-index")
+
+    @property
+    def embedder(self) -> Embedder:
+        """嵌入模型（首次访问时加载，应在工作线程中调用）"""
+        if self._embedder is None:
+            with self._embedder_lock:
+                if self._embedder is None:
+                    self._embedder = load_embedder(settings.EMBEDDING_MODEL, settings.EMBEDDING_DIM)
+        return self._embedder
+
+    def _sync(self, index: ProjectVectorIndex):
+        index.sync(self.embedder)
+
+    def get(self, project_id: str, project_path: Path) -> ProjectVectorIndex:
+        """
+        获取项目索引，首次访问时在后台同步
+
+        Args:
+            project_id: 项目ID
+            project_path: 项目路径
+
+        Returns:
+            ProjectVectorIndex: 项目索引
+        """
+        index = self._indexes.get(project_id)
+        if index is not None and index.root == project_path:
+            self._indexes.move_to_end(project_id)
+            if time.monotonic() - index.synced_at > RESYNC_INTERVAL_SECONDS:
+                self._schedule_sync(index)
+            return index
+
+        index = ProjectVectorIndex(
+            project_id,
+            project_path,
+            self.index_root / project_id,
+            self.folders,
+            self.passage_chars,
+            self.max_file_bytes
+        )
+        self._indexes[project_id] = index
+        self._indexes.move_to_end(project_id)
+        index.first_sync = self._schedule_sync(index)
+
+        while len(self._indexes) > self.max_projects:
+            self._indexes.popitem(last=False)
+
+        return index
+
+    def _schedule_sync(self, index: ProjectVectorIndex) -> Optional[asyncio.Future]:
+        """在写线程中排队一次同步（已排队且尚未开始时忽略）"""
+        if index.sync_scheduled:
+            return None
+        index.sync_scheduled = True
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._sync, index)
+
+        def finished(done: asyncio.Future):
+            if done.cancelled():
+                return
+            if done.exception() is not None:
+                logger.error("语义索引同步失败: %s", index.project_id, exc_info=done.exception())
+            index.ready = True
+            while index.pending_pdfs:
+                pdf_service.schedule(index.project_id, index.root / index.pending_pdfs.popleft())
+
+        future.add_done_callback(finished)
+        return future
+
+    def notify_change(self, project_id: str, full_path: Path):
+        """
+        通知路径变更（FileService 写入路径和 PDF 提取完成时调用）
+
+        项目索引尚未打开时忽略，下次打开时的同步会补上。
+
+        Args:
+            project_id: 项目ID
+            full_path: 变更的文件或目录绝对路径
+        """
+        index = self._indexes.get(project_id)
+        if index is None:
+            return
+        try:
+            rel_path = full_path.relative_to(index.root.resolve()).as_posix()
+        except ValueError:
+            return
+        if rel_path.split("/")[0] not in self.folders:
+            return
+        index.stale.add(rel_path)
+        self._schedule_sync(index)
+
+    async def retrieve(
+        self,
+        project_id: str,
+        project_path: Path,
+        query: str,
+        top_k: int,
+        min_score: float = 0.0
+    ) -> dict:
+        """
+        检索与查询最相关的片段
+
+        Args:
+            project_id: 项目ID
+            project_path: 项目路径
+            query: 查询文本
+            top_k: 返回的片段数
+            min_score: 最低相似度
+
+        Returns:
+            dict: {results, passages, indexing, took_ms}
+        """
+        started = time.perf_counter()
+        index = self.get(project_id, project_path)
+        if not index.ready and index.first_sync is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(index.first_sync), FIRST_SYNC_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            except Exception:
+                # 同步失败已在回调中打印，使用已有部分
+                pass
+
+        def search():
+            query_vector = self.embedder.embed([query])[0]
+            return index.search(query_vector, top_k, min_score)
+
+        results = await asyncio.to_thread(search)
+        return {
+            "results": results,
+            "passages": index.passage_count,
+            "indexing": not index.ready or index.sync_scheduled,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    async def wait_ready(self, project_id: str, project_path: Path) -> ProjectVectorIndex:
+        """等待项目索引完成同步（基准测试用）"""
+        index = self.get(project_id, project_path)
+        await asyncio.get_running_loop().run_in_executor(self._executor, lambda: None)
+        return index
+
+    def shutdown(self):
+        """停止写线程"""
+        self._indexes.clear()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+# 全局语义检索服务
+retrieval_service = RetrievalService(
+    index_root=settings.DATA_ROOT / "vector_index",
+    folders=settings.RETRIEVAL_FOLDERS,
+    max_projects=settings.SEARCH_INDEX_MAX_PROJECTS,
+    passage_chars=settings.RETRIEVAL_PASSAGE_CHARS,
+    max_file_bytes=settings.SEARCH_MAX_FILE_KB * 1024
+)
+
+# PDF 提取完成后重新读取该文件
+pdf_service.add_listener(retrieval_service.notify_change)
@@ -0,0 +1,510 @@
+"""项目全文检索 - SQLite FTS5 索引，后台构建，随文件写入增量更新"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+from app.config import settings
+from app.core.pdf_service import pdf_service
+from app.utils.pdf_extract import page_of_line
+from app.utils.text_search import build_match_query, find_hits, query_terms, segment
+
+logger = logging.getLogger(__name__)
+
+# PDF 使用提取出的文本建立索引
+PDF_EXTENSION = ".pdf"
+
+# 索引结构版本，变化时重建
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    ext TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(
+    name,
+    body,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+"""
+
+# 批量写入时每多少个文件提交一次，让检索尽早看到部分结果
+_COMMIT_BATCH = 200
+
+# 距上次全量同步超过该秒数时，检索会在后台再同步一次，以发现外部编辑器的修改
+RESYNC_INTERVAL_SECONDS = 60
+
+
+class ProjectSearchIndex:
+    """
+    单个项目的全文索引
+
+    写操作（sync / update_path / close）只在服务的写线程中执行，
+    检索使用独立的只读连接，可在任意线程并发执行（WAL 模式下不被写入阻塞）。
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        root: Path,
+        db_path: Path,
+        extensions: set[str],
+        max_file_bytes: int
+    ):
+        self.project_id = project_id
+        self.root = root
+        self.db_path = db_path
+        self.extensions = extensions
+        self.max_file_bytes = max_file_bytes
+        self.ready = False  # 首次全量同步是否完成
+        self.closed = False
+        self.synced_at = 0.0  # 上次全量同步完成的时间（monotonic）
+        self.sync_scheduled = False
+        # 尚未提取文本的 PDF（写线程追加，事件循环取出后安排提取）
+        self.pending_pdfs: deque[str] = deque()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    # ---------- 写线程 ----------
+
+    def _writer(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.executescript("DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS docs;")
+                conn.executescript(_SCHEMA)
+                conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+                conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _searchable(self, name: str) -> bool:
+        return os.path.splitext(name)[1].lower() in self.extensions
+
+    def _walk(self, rel_prefix: str) -> dict[str, os.stat_result]:
+        """遍历目录，返回 {相对路径: stat}（跳过隐藏文件和目录）"""
+        found = {}
+        start = self.root / rel_prefix if rel_prefix else self.root
+        for dirpath, dirnames, filenames in os.walk(start):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            rel_dir = Path(dirpath).relative_to(self.root).as_posix()
+            for name in filenames:
+                if name.startswith(".") or not self._searchable(name):
+                    continue
+                rel_path = name if rel_dir == "." else f"{rel_dir}/{name}"
+                try:
+                    found[rel_path] = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+        return found
+
+    def _index_file(self, conn: sqlite3.Connection, rel_path: str, stat_result: os.stat_result) -> bool:
+        """索引单个文件，内容未变化时跳过，返回是否写入"""
+        row = conn.execute(
+            "SELECT id, mtime_ns, size FROM files WHERE path = ?", (rel_path,)
+        ).fetchone()
+        if row and row[1] == stat_result.st_mtime_ns and row[2] == stat_result.st_size:
+            return False
+
+        if rel_path.lower().endswith(PDF_EXTENSION):
+            extraction = pdf_service.load_cached(self.root / rel_path)
+            if extraction is not None:
+                body = extraction["text"]
+            elif pdf_service.extraction_failed(self.root / rel_path):
+                # 提取失败且文件未修改：以空正文登记，同步时不再重复提取
+                body = ""
+            else:
+                # 提取完成后会再次通知更新，暂不登记
+                self.pending_pdfs.append(rel_path)
+                return False
+        else:
+            body = ""
+            if stat_result.st_size <= self.max_file_bytes:
+                try:
+                    with open(self.root / rel_path, "r", encoding="utf-8", errors="replace") as f:
+                        body = f.read()
+                except OSError:
+                    return False
+
+        if row:
+            file_id = row[0]
+            conn.execute(
+                "UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?",
+                (stat_result.st_mtime_ns, stat_result.st_size, file_id)
+            )
+            conn.execute("DELETE FROM docs WHERE rowid = ?", (file_id,))
+        else:
+            file_id = conn.execute(
+                "INSERT INTO files (path, ext, mtime_ns, size) VALUES (?, ?, ?, ?)",
+                (
+                    rel_path,
+                    os.path.splitext(rel_path)[1].lower(),
+                    stat_result.st_mtime_ns,
+                    stat_result.st_size
+                )
+            ).lastrowid
+        # 文件路径也参与检索（权重更高），按目录分隔符拆词
+        conn.execute(
+            "INSERT INTO docs (rowid, name, body) VALUES (?, ?, ?)",
+            (file_id, segment(rel_path.replace("/", " ")), segment(body))
+        )
+        return True
+
+    def _delete(self, conn: sqlite3.Connection, rel_path: str):
+        """删除文件或目录下的所有索引"""
+        prefix = rel_path + "/"
+        rows = conn.execute(
+            "SELECT id FROM files WHERE path = ? OR substr(path, 1, ?) = ?",
+            (rel_path, len(prefix), prefix)
+        ).fetchall()
+        for (file_id,) in rows:
+            conn.execute("DELETE FROM docs WHERE rowid = ?", (file_id,))
+            conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def sync(self, rel_prefix: str = ""):
+        """
+        与磁盘同步：新增/修改的文件重新索引，已删除的文件移除
+
+        按 mtime 和大小判断变化，未变化的文件只需一次 stat。
+
+        Args:
+            rel_prefix: 只同步该目录（空字符串表示整个项目）
+        """
+        conn = self._writer()
+        found = self._walk(rel_prefix)
+
+        pending = 0
+        for rel_path, stat_result in found.items():
+            if self.closed:
+                return
+            if self._index_file(conn, rel_path, stat_result):
+                pending += 1
+                if pending >= _COMMIT_BATCH:
+                    conn.commit()
+                    pending = 0
+
+        if rel_prefix:
+            prefix = rel_prefix + "/"
+            indexed = conn.execute(
+                "SELECT path FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+            ).fetchall()
+        else:
+            indexed = conn.execute("SELECT path FROM files").fetchall()
+        for (rel_path,) in indexed:
+            if rel_path not in found:
+                self._delete(conn, rel_path)
+        conn.commit()
+        if not rel_prefix:
+            self.synced_at = time.monotonic()
+
+    def update_path(self, rel_path: str):
+        """
+        增量更新单个路径（文件写入、创建、删除后调用）
+
+        Args:
+            rel_path: 相对项目根目录的路径
+        """
+        if self.closed:
+            return
+        conn = self._writer()
+        full_path = self.root / rel_path
+        try:
+            stat_result = os.stat(full_path)
+        except FileNotFoundError:
+            self._delete(conn, rel_path)
+            conn.commit()
+            return
+
+        if os.path.isdir(full_path):
+            self.sync(rel_path)
+        elif self._searchable(full_path.name):
+            self._index_file(conn, rel_path, stat_result)
+            conn.commit()
+
+    def close(self):
+        """关闭写连接"""
+        self.closed = True
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # ---------- 检索（任意线程） ----------
+
+    def search(
+        self,
+        terms: list[str],
+        limit: int = 20,
+        offset: int = 0,
+        path_prefix: Optional[str] = None,
+        extensions: Optional[set[str]] = None,
+        max_hits: int = 20
+    ) -> tuple[list[dict], bool]:
+        """
+        检索（同步，应在工作线程中调用）
+
+        Args:
+            terms: 查询词
+            limit: 返回的文件数
+            offset: 跳过的文件数
+            path_prefix: 只检索该目录
+            extensions: 只检索这些扩展名
+            max_hits: 每个文件最多返回的命中数
+
+        Returns:
+            tuple[list[dict], bool]: (结果列表, 是否还有更多结果)
+        """
+        match = build_match_query(terms)
+        if not match or not self.db_path.exists():
+            return [], False
+
+        sql = (
+            "SELECT f.path, bm25(docs, 5.0, 1.0) AS score "
+            "FROM docs JOIN files f ON f.id = docs.rowid "
+            "WHERE docs MATCH ?"
+        )
+        params: list = [match]
+        if path_prefix:
+            prefix = path_prefix.rstrip("/") + "/"
+            sql += " AND substr(f.path, 1, ?) = ?"
+            params += [len(prefix), prefix]
+        if extensions:
+            sql += f" AND f.ext IN ({','.join('?' * len(extensions))})"
+            params += sorted(extensions)
+        sql += " ORDER BY score LIMIT ? OFFSET ?"
+        params += [limit + 1, offset]
+
+        conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            # 索引尚未建表等情况
+            if "no such table" in str(e):
+                return [], False
+            raise
+        finally:
+            conn.close()
+
+        has_more = len(rows) > limit
+        results = []
+        for rel_path, score in rows[:limit]:
+            page_lines = None
+            if rel_path.lower().endswith(PDF_EXTENSION):
+                extraction = pdf_service.load_cached(self.root / rel_path)
+                if extraction is None:
+                    continue
+                content, page_lines = extraction["text"], extraction["page_lines"]
+            else:
+                try:
+                    with open(self.root / rel_path, "r", encoding="utf-8", errors="replace") as f:
+                        content = f.read(self.max_file_bytes)
+                except OSError:
+                    # 索引与磁盘暂时不一致（文件刚被删除），跳过
+                    continue
+            hits = find_hits(content, terms, max_hits=max_hits)
+            if page_lines is not None:
+                for hit in hits:
+                    hit["page"] = page_of_line(page_lines, hit["line"])
+            results.append({
+                "path": rel_path,
+                # bm25 越小越相关，取反后越大越相关
+                "score": round(-score, 6),
+                "hits": hits,
+                "snippet": hits[0]["snippet"] if hits else None,
+            })
+        return results, has_more
+
+
+class SearchIndexService:
+    """
+    全文检索服务
+
+    项目首次检索时打开索引并在后台与磁盘同步，同步期间的检索返回已索引部分并标记 indexing。
+    所有写操作在同一个写线程中串行执行，FileService 的写入路径通过 notify_change 增量更新。
+    """
+
+    def __init__(self, index_root: Path, max_projects: int, max_file_bytes: int):
+        self.index_root = index_root
+        self.max_projects = max_projects
+        self.max_file_bytes = max_file_bytes
+        self.extensions = {ext.lower() for ext in settings.ALLOWED_EXTENSIONS}
+        self._indexes: OrderedDict[str, ProjectSearchIndex] = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search-index")
+
+    def _run(self, func, *args) -> asyncio.Future:
+        """在写线程中执行，失败时记录错误日志"""
+        future = asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+        def report(done: asyncio.Future):
+            if not done.cancelled() and done.exception() is not None:
+                logger.error("全文索引更新失败", exc_info=done.exception())
+
+        future.add_done_callback(report)
+        return future
+
+    def _run_index(self, index: ProjectSearchIndex, func, *args) -> asyncio.Future:
+        """在写线程中更新索引，完成后为尚未提取文本的 PDF 安排提取"""
+        future = self._run(func, *args)
+
+        def extract_pending(_):
+            while index.pending_pdfs:
+                pdf_service.schedule(index.project_id, index.root / index.pending_pdfs.popleft())
+
+        future.add_done_callback(extract_pending)
+        return future
+
+    def get(self, project_id: str, project_path: Path) -> ProjectSearchIndex:
+        """
+        获取项目索引，首次访问时在后台同步
+
+        Args:
+            project_id: 项目ID
+            project_path: 项目路径
+
+        Returns:
+            ProjectSearchIndex: 项目索引
+        """
+        index = self._indexes.get(project_id)
+        if index is not None and index.root == project_path:
+            self._indexes.move_to_end(project_id)
+            if time.monotonic() - index.synced_at > RESYNC_INTERVAL_SECONDS:
+                self._schedule_sync(index)
+            return index
+
+        if index is not None:
+            self._run(index.close)
+        index = ProjectSearchIndex(
+            project_id,
+            project_path,
+            self.index_root / f"{project_id}.sqlite3",
+            self.extensions,
+            self.max_file_bytes
+        )
+        self._indexes[project_id] = index
+        self._indexes.move_to_end(project_id)
+        self._schedule_sync(index)
+
+        while len(self._indexes) > self.max_projects:
+            _, evicted = self._indexes.popitem(last=False)
+            self._run(evicted.close)
+
+        return index
+
+    def _schedule_sync(self, index: ProjectSearchIndex):
+        """在写线程中排队一次全量同步（已排队时忽略）"""
+        if index.sync_scheduled:
+            return
+        index.sync_scheduled = True
+
+        def finished(done: asyncio.Future):
+            index.sync_scheduled = False
+            if not done.cancelled() and done.exception() is None:
+                index.ready = True
+
+        self._run_index(index, index.sync).add_done_callback(finished)
+
+    def notify_change(self, project_id: str, full_path: Path):
+        """
+        通知路径变更（FileService 写入路径调用）
+
+        项目索引尚未打开时忽略，下次打开时的同步会补上。
+
+        Args:
+            project_id: 项目ID
+            full_path: 变更的文件或目录绝对路径
+        """
+        index = self._indexes.get(project_id)
+        if index is None:
+            return
+        try:
+            rel_path = full_path.relative_to(index.root.resolve()).as_posix()
+        except ValueError:
+            return
+        if rel_path != "." and not any(part.startswith(".") for part in rel_path.split("/")):
+            self._run_index(index, index.update_path, rel_path)
+
+    async def search(
+        self,
+        project_id: str,
+        project_path: Path,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        path_prefix: Optional[str] = None,
+        extensions: Optional[list[str]] = None
+    ) -> dict:
+        """
+        检索项目
+
+        Args:
+            project_id: 项目ID
+            project_path: 项目路径
+            query: 查询字符串，空格分隔的多个词之间为 AND
+            limit: 返回的文件数
+            offset: 跳过的文件数
+            path_prefix: 只检索该目录
+            extensions: 只检索这些扩展名
+
+        Returns:
+            dict: {query, results, has_more, indexing, took_ms}
+        """
+        terms = query_terms(query)
+        if not terms:
+            raise ValueError("查询不能为空")
+
+        started = time.perf_counter()
+        index = self.get(project_id, project_path)
+        results, has_more = await asyncio.to_thread(
+            index.search,
+            terms,
+            limit,
+            offset,
+            path_prefix,
+            {
+                ext.lower() if ext.startswith(".") else f".{ext.lower()}"
+                for ext in extensions
+            } if extensions else None
+        )
+        return {
+            "query": query,
+            "results": results,
+            "has_more": has_more,
+            "indexing": not index.ready,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    async def wait_ready(self, project_id: str, project_path: Path):
+        """等待项目索引完成首次同步（基准测试用）"""
+        index = self.get(project_id, project_path)
+        # 写线程串行执行，排在后面的空任务完成即表示之前的同步已结束
+        await self._run(lambda: None)
+        return index
+
+    def shutdown(self):
+        """关闭所有索引并停止写线程"""
+        for index in self._indexes.values():
+            index.closed = True
+            self._executor.submit(index.close)
+        self._indexes.clear()
+        self._executor.shutdown(wait=True, cancel_futures=False)
+
+
+# 全局检索服务
+search_index_service = SearchIndexService(
+    index_root=settings.DATA_ROOT / "search_index",
+    max_projects=settings.SEARCH_INDEX_MAX_PROJECTS,
+    max_file_bytes=settings.SEARCH_MAX_FILE_KB * 1024
+)
+
+# PDF 提取完成后更新对应项目的索引
+pdf_service.add_listener(search_index_service.notify_change)
@@ -0,0 +1,183 @@
+"""请求合并（single-flight）- 相同的进行中 AI 调用只向上游发起一次"""
+import asyncio
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, List, Optional
+
+
+class _Call:
+    """进行中的非流式调用"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Stream:
+    """进行中的流式调用：已产生的块和等待新块的订阅者"""
+
+    __slots__ = ("chunks", "done", "error", "subscribers", "task", "_changed")
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        """唤醒所有等待中的订阅者（每次换一个新的 Event，不影响其他订阅者的读取进度）"""
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+def _discard_result(task: asyncio.Task) -> None:
+    """读取任务结果，避免所有调用方都已离开时出现 "exception was never retrieved" 警告"""
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    """
+    进行中调用的合并器
+
+    - 非流式：相同键的并发调用共享同一个上游任务和结果（包括异常）
+    - 流式：相同键的并发调用共享同一个上游流，每个订阅者从头收到全部块，
+      中途加入的订阅者先补发已产生的块，再继续接收新块
+
+    所有调用方都离开（取消）后才取消上游；上游结束后键即释放，之后的调用重新发起。
+    """
+
+    def __init__(self):
+        self._calls: dict[str, _Call] = {}
+        self._streams: dict[str, _Stream] = {}
+        self.stats = {
+            "calls": 0,
+            "joined": 0,
+            "streams": 0,
+            "stream_joined": 0,
+        }
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[str]]) -> str:
+        """
+        执行非流式调用，相同键的进行中调用直接复用
+
+        Args:
+            key: 调用键（提示词哈希）
+            factory: 发起上游调用的函数，仅在没有进行中调用时执行
+
+        Returns:
+            str: 调用结果
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(_discard_result)
+            call.task.add_done_callback(lambda _: self._release(self._calls, key, call))
+            self.stats["calls"] += 1
+        else:
+            self.stats["joined"] += 1
+
+        call.waiters += 1
+        try:
+            # shield：单个调用方取消不影响其他调用方
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                call.task.cancel()
+                self._release(self._calls, key, call)
+
+    async def stream(
+        self,
+        key: str,
+        factory: Callable[[], AsyncIterator[str]]
+    ) -> AsyncGenerator[str, None]:
+        """
+        订阅流式调用，相同键的进行中流共享上游
+
+        Args:
+            key: 调用键（提示词哈希）
+            factory: 创建上游流的函数，仅在没有进行中的流时执行
+
+        Yields:
+            str: 从第一块开始的全部流式块
+        """
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = _Stream()
+            self._streams[key] = flight
+            flight.task = asyncio.create_task(self._produce(key, flight, factory))
+            self.stats["streams"] += 1
+        else:
+            self.stats["stream_joined"] += 1
+
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(flight.chunks):
+                    chunk = flight.chunks[index]
+                    index += 1
+                    yield chunk
+                elif flight.done:
+                    break
+                else:
+                    await flight.wait()
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if not flight.subscribers and not flight.done:
+                # 最后一个订阅者离开：关闭上游流
+                flight.task.cancel()
+                self._release(self._streams, key, flight)
+
+    async def _produce(
+        self,
+        key: str,
+        flight: _Stream,
+        factory: Callable[[], AsyncIterator[str]]
+    ):
+        """读取上游流并分发给订阅者"""
+        try:
+            async with aclosing(factory()) as chunks:
+                async for chunk in chunks:
+                    flight.chunks.append(chunk)
+                    flight.notify()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._release(self._streams, key, flight)
+            flight.notify()
+
+    @staticmethod
+    def _release(flights: dict, key: str, flight):
+        if flights.get(key) is flight:
+            del flights[key]
+
+    def get_stats(self) -> dict:
+        """
+        获取合并统计
+
+        Returns:
+            dict: 发起/合并的调用数和流数，以及当前进行中的数量
+        """
+        return {
+            **self.stats,
+            "in_flight": len(self._calls),
+            "streams_in_flight": len(self._streams),
+        }
+
+
+# 全局合并器实例
+single_flight = SingleFlight()
@@ -0,0 +1,253 @@
+"""可续传的 AI 流 - 生成在后台任务中进行，服务端保留有界的回放缓冲，客户端断线后可以续接"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterator, Optional
+from app.config import settings
+from app.core.streaming import MergeMode, StreamFrame, coalesce
+
+
+class StreamNotFound(KeyError):
+    """流不存在或已过期"""
+
+
+class ReplayStream:
+    """
+    一次可续传的流式生成
+
+    合并后的每一帧带递增序号，最近 max_chunks 帧保存在环形缓冲中；
+    text 是截至当前的完整文本，续传位置已被挤出缓冲时用它补发快照。
+    """
+
+    def __init__(self, stream_id: str, merge: MergeMode, max_chunks: int):
+        self.id = stream_id
+        self.merge = merge
+        self.frames: deque[StreamFrame] = deque(maxlen=max_chunks)
+        self.text = ""
+        self.seq = 0
+        self.done = False
+        self.cancelled = False
+        self.error: Optional[BaseException] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        self.detached = 0  # 订阅者全部离开的次数，用于识别过时的无人订阅检查
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def append(self, text: str):
+        """追加一帧并唤醒订阅者"""
+        self.seq += 1
+        self.text = text if self.merge == "replace" else self.text + text
+        self.frames.append(StreamFrame(self.seq, text))
+        self.notify()
+
+    def notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def missed(self, after: int) -> list[StreamFrame]:
+        """
+        序号 after 之后的帧
+
+        缓冲中已没有 after + 1 时：replace 模式下最新一帧本身就是完整文本，只补发它；
+        concat 模式补发一帧完整文本快照。
+        """
+        if after >= self.seq:
+            return []
+        if self.frames and self.frames[0].seq <= after + 1:
+            return [frame for frame in self.frames if frame.seq > after]
+        if self.merge == "replace":
+            return [self.frames[-1]]
+        return [StreamFrame(self.seq, self.text, snapshot=True)]
+
+    async def wait(self, timeout: Optional[float]) -> bool:
+        """等待新帧或结束，超时返回 False"""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class StreamRegistry:
+    """
+    可续传流的注册表
+
+    - 生成在独立任务中进行，客户端断开不会中断生成；只有显式取消，
+      或没有任何订阅者超过 orphan_timeout 秒时才取消上游
+    - 客户端用 SSE 的 Last-Event-ID 或 WebSocket 的 resume 消息续传，先补发错过的帧再继续实时输出
+    - 结束的流保留 ttl 秒供续传，最多保留 max_streams 个
+    """
+
+    def __init__(self, max_chunks: int, ttl_seconds: float, max_streams: int, orphan_timeout: float):
+        self.max_chunks = max_chunks
+        self.ttl_seconds = ttl_seconds
+        self.max_streams = max_streams
+        self.orphan_timeout = orphan_timeout
+        self._streams: OrderedDict[str, ReplayStream] = OrderedDict()
+        self.stats = {
+            "started": 0,
+            "resumed": 0,
+            "orphaned": 0,
+            "cancelled": 0,
+        }
+
+    def start(self, chunks: AsyncIterator[str], merge: MergeMode = "concat") -> ReplayStream:
+        """
+        在后台开始一次流式生成
+
+        Args:
+            chunks: 模型输出块（增量文本）
+            merge: 合并方式（concat | replace）
+
+        Returns:
+            ReplayStream: 新的流
+        """
+        self._purge()
+        stream = ReplayStream(uuid.uuid4().hex, merge, self.max_chunks)
+        self._streams[stream.id] = stream
+        stream.task = asyncio.create_task(self._produce(stream, chunks))
+        # 一直没有人订阅时同样按无人订阅处理
+        self._watch_orphan(stream)
+        self.stats["started"] += 1
+        return stream
+
+    async def _produce(self, stream: ReplayStream, chunks: AsyncIterator[str]):
+        try:
+            async with aclosing(coalesce(chunks, stream.merge)) as batches:
+                async for text in batches:
+                    stream.append(text)
+        except asyncio.CancelledError:
+            stream.cancelled = True
+        except Exception as e:
+            stream.error = e
+        finally:
+            stream.done = True
+            stream.finished_at = time.time()
+            stream.notify()
+            asyncio.get_running_loop().call_later(self.ttl_seconds, self._expire, stream)
+
+    def _expire(self, stream: ReplayStream):
+        if self._streams.get(stream.id) is stream:
+            del self._streams[stream.id]
+
+    def _purge(self):
+        """超出数量上限时淘汰最早结束的流（进行中的流不淘汰）"""
+        excess = len(self._streams) - self.max_streams + 1
+        if excess <= 0:
+            return
+        for stream_id in [s.id for s in self._streams.values() if s.done][:excess]:
+            del self._streams[stream_id]
+
+    def get(self, stream_id: str) -> ReplayStream:
+        """
+        获取流
+
+        Raises:
+            StreamNotFound: 流不存在或已过期
+        """
+        stream = self._streams.get(stream_id)
+        if stream is None:
+            raise StreamNotFound(stream_id)
+        return stream
+
+    def cancel(self, stream_id: str) -> bool:
+        """
+        取消进行中的流（关闭上游）
+
+        Returns:
+            bool: 是否找到并取消了进行中的流
+        """
+        stream = self._streams.get(stream_id)
+        if stream is None or stream.done:
+            return False
+        stream.task.cancel()
+        self.stats["cancelled"] += 1
+        return True
+
+    def _watch_orphan(self, stream: ReplayStream):
+        """orphan_timeout 秒后仍没有订阅者时取消生成"""
+        stream.detached += 1
+        asyncio.get_running_loop().call_later(self.orphan_timeout, self._check_orphan, stream, stream.detached)
+
+    def _check_orphan(self, stream: ReplayStream, detached: int):
+        if stream.detached == detached and not stream.subscribers and not stream.done:
+            stream.task.cancel()
+            self.stats["orphaned"] += 1
+
+    async def subscribe(
+        self,
+        stream: ReplayStream,
+        after: int = 0,
+        heartbeat: Optional[float] = None
+    ) -> AsyncGenerator[Optional[StreamFrame], None]:
+        """
+        订阅流：先补发序号 after 之后的帧，再实时输出
+
+        Args:
+            stream: 流
+            after: 客户端已收到的最后一帧序号，0 表示从头开始
+            heartbeat: 空闲多久输出一次心跳（秒），None 表示不发心跳
+
+        Yields:
+            Optional[StreamFrame]: 帧；None 表示心跳
+
+        Raises:
+            Exception: 生成失败时重新抛出上游异常
+            RuntimeError: 流已被取消
+        """
+        if after:
+            self.stats["resumed"] += 1
+        stream.subscribers += 1
+        try:
+            while True:
+                frames = stream.missed(after)
+                for frame in frames:
+                    after = frame.seq
+                    yield frame
+                if frames:
+                    continue
+                if stream.done:
+                    break
+                if not await stream.wait(heartbeat):
+                    yield None
+            if stream.error is not None:
+                raise stream.error
+            if stream.cancelled:
+                raise RuntimeError("生成已取消")
+        finally:
+            stream.subscribers -= 1
+            if not stream.subscribers and not stream.done:
+                self._watch_orphan(stream)
+
+    def get_stats(self) -> dict:
+        """
+        获取统计
+
+        Returns:
+            dict: 开始/续传/无人订阅被取消/显式取消的次数，以及当前保留和进行中的流数
+        """
+        return {
+            **self.stats,
+            "retained": len(self._streams),
+            "active": sum(1 for stream in self._streams.values() if not stream.done),
+        }
+
+    async def shutdown(self):
+        """取消所有进行中的流"""
+        tasks = [stream.task for stream in self._streams.values() if not stream.done]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# 全局注册表实例
+stream_registry = StreamRegistry(
+    max_chunks=settings.STREAM_REPLAY_MAX_CHUNKS,
+    ttl_seconds=settings.STREAM_REPLAY_TTL_SECONDS,
+    max_streams=settings.STREAM_REPLAY_MAX_STREAMS,
+    orphan_timeout=settings.STREAM_ORPHAN_TIMEOUT_SECONDS
+)
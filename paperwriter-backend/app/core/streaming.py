@@ -0,0 +1,243 @@
+"""流式输出层 - 按时间/大小窗口合并模型输出块，SSE 编码、心跳与可选 gzip"""
+import asyncio
+import time
+import zlib
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterator, Literal, NamedTuple, Optional
+from fastapi.responses import StreamingResponse
+from app.config import settings
+
+# 合并方式：concat 每块是增量文本，依次拼接（AI 流式输出均为增量）；
+# replace 每块是截至当前的完整文本，只保留最新一块
+MergeMode = Literal["replace", "concat"]
+
+
+class StreamFrame(NamedTuple):
+    """合并后的一帧输出"""
+    seq: int  # 从 1 开始递增的序号，即 SSE 事件 ID
+    text: str
+    snapshot: bool = False  # 是否为截至 seq 的完整文本（续传时缓冲已不完整）
+
+
+class _End:
+    """上游结束标记"""
+
+
+class _Failed:
+    """上游抛出的异常，转交给消费侧重新抛出"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+async def coalesce(
+    chunks: AsyncIterator[str],
+    merge: MergeMode = "concat",
+    window: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+    heartbeat: Optional[float] = None
+) -> AsyncGenerator[Optional[str], None]:
+    """
+    按时间/大小窗口合并流式块
+
+    窗口从合并批次的第一块开始计时，到期或新增字节数达到上限时输出一次；
+    上游结束时立即输出剩余内容。上游在独立任务中读取，输出慢时最多缓冲一个队列的块。
+
+    Args:
+        chunks: 上游流式块
+        merge: 合并方式（concat | replace）
+        window: 合并窗口（秒），默认 STREAM_COALESCE_MS
+        max_bytes: 每批新增字节数上限，默认 STREAM_COALESCE_BYTES
+        heartbeat: 空闲多久输出一次心跳（秒），None 表示不发心跳
+
+    Yields:
+        Optional[str]: 合并后的文本；None 表示心跳
+    """
+    window = settings.STREAM_COALESCE_MS / 1000 if window is None else window
+    max_bytes = settings.STREAM_COALESCE_BYTES if max_bytes is None else max_bytes
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.AI_STREAM_QUEUE_SIZE)
+
+    async def pump():
+        try:
+            async for chunk in chunks:
+                await queue.put(chunk)
+            await queue.put(_End())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(_Failed(e))
+        finally:
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    reader = asyncio.create_task(pump())
+    pending: Optional[str] = None
+    pending_bytes = 0
+    flushed_bytes = 0  # replace 模式下已输出文本的字节数
+    deadline = 0.0
+    try:
+        while True:
+            if pending is not None:
+                timeout = max(deadline - time.monotonic(), 0)
+            else:
+                timeout = heartbeat
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                if pending is not None:
+                    yield pending
+                    flushed_bytes += pending_bytes
+                    pending, pending_bytes = None, 0
+                else:
+                    yield None
+                continue
+
+            if isinstance(item, _End):
+                break
+            if isinstance(item, _Failed):
+                if pending is not None:
+                    yield pending
+                    pending = None
+                raise item.error
+
+            size = len(item.encode("utf-8"))
+            if pending is None:
+                deadline = time.monotonic() + window
+            if merge == "replace":
+                pending, pending_bytes = item, size - flushed_bytes
+            else:
+                pending = item if pending is None else pending + item
+                pending_bytes += size
+            if pending_bytes >= max_bytes:
+                yield pending
+                flushed_bytes += pending_bytes
+                pending, pending_bytes = None, 0
+
+        if pending is not None:
+            yield pending
+    finally:
+        reader.cancel()
+        try:
+            await reader
+        except (asyncio.CancelledError, Exception):
+            pass
+
+
+def encode_sse(data: str, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    """
+    编码一条 SSE 事件
+
+    多行数据按规范拆成多个 data 行（\\r\\n、\\r 统一视为换行），客户端按 "\\n" 拼回原文。
+
+    Args:
+        data: 事件数据
+        event: 事件类型，None 表示默认的 message
+        event_id: 事件 ID
+
+    Returns:
+        str: 以空行结尾的事件文本
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    for line in data.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        lines.append(f"data: {line}")
+    return "\n".join(lines) + "\n\n"
+
+
+# 心跳使用 SSE 注释行，客户端会忽略
+SSE_HEARTBEAT = ": ping\n\n"
+
+
+async def sse_events(frames: AsyncGenerator[Optional[StreamFrame], None]) -> AsyncGenerator[str, None]:
+    """
+    把输出帧转成 SSE 事件流
+
+    - 默认事件（message）：合并后的新增文本，id 为帧序号
+    - snapshot 事件：续传时补发的完整文本，id 为帧序号
+    - error 事件：生成失败的错误信息
+    - done 事件：流结束（总是最后一条）
+    - 心跳（frames 输出 None）：注释行，防止代理断开空闲连接
+
+    Args:
+        frames: 输出帧，None 表示心跳
+
+    Yields:
+        str: SSE 事件文本
+    """
+    try:
+        async with aclosing(frames):
+            async for frame in frames:
+                if frame is None:
+                    yield SSE_HEARTBEAT
+                    continue
+                yield encode_sse(
+                    frame.text,
+                    event="snapshot" if frame.snapshot else None,
+                    event_id=frame.seq
+                )
+    except Exception as e:
+        yield encode_sse(str(e), event="error")
+    yield encode_sse("", event="done")
+
+
+async def _gzip(events: AsyncIterator[str]) -> AsyncGenerator[bytes, None]:
+    """逐事件 gzip 压缩，每条事件后同步刷新，客户端可以立即解压"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async with aclosing(events):
+        async for event in events:
+            yield compressor.compress(event.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def sse_response(
+    events: AsyncGenerator[str, None],
+    accept_encoding: Optional[str] = None,
+    headers: Optional[dict] = None
+) -> StreamingResponse:
+    """
+    构造 text/event-stream 响应
+
+    STREAM_GZIP_ENABLED 开启且客户端接受 gzip 时压缩输出。
+
+    Args:
+        events: 编码好的 SSE 事件文本
+        accept_encoding: 请求的 Accept-Encoding 头
+        headers: 额外的响应头
+
+    Returns:
+        StreamingResponse: SSE 响应
+    """
+    headers = {
+        "Cache-Control": "no-cache",
+        # 禁止 nginx 等反向代理缓冲
+        "X-Accel-Buffering": "no",
+        **(headers or {}),
+    }
+    if settings.STREAM_GZIP_ENABLED and "gzip" in (accept_encoding or "").lower():
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+        return StreamingResponse(_gzip(events), media_type="text/event-stream", headers=headers)
+    return StreamingResponse(events, media_type="text/event-stream", headers=headers)
+
+
+def event_stream_response(
+    frames: AsyncGenerator[Optional[StreamFrame], None],
+    accept_encoding: Optional[str] = None,
+    headers: Optional[dict] = None
+) -> StreamingResponse:
+    """
+    构造 AI 流式输出的 SSE 响应（事件格式见 sse_events）
+
+    Args:
+        frames: 输出帧，None 表示心跳
+        accept_encoding: 请求的 Accept-Encoding 头
+        headers: 额外的响应头
+
+    Returns:
+        StreamingResponse: SSE 响应
+    """
+    return sse_response(sse_events(frames), accept_encoding, headers)
@@ -0,0 +1,402 @@
+"""论文分层摘要 - 章节摘要按内容哈希缓存，逐级汇总为文件摘要和全文摘要"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+from app.config import settings
+from app.core.llm_client import llm_client
+from app.core.llm_scheduler import llm_scheduler
+from app.core.project_service import is_valid_project_id
+from app.utils.atomic_write import atomic_write
+from app.utils.text_chunks import HEADING_PATTERN, split_sections
+
+logger = logging.getLogger(__name__)
+
+# 参与摘要的文档类型
+SUMMARY_EXTENSIONS = {".md", ".txt", ".tex"}
+
+# 提示词版本，变化时旧摘要失效
+PROMPT_VERSION = 1
+
+# 内容少于该字符数的章节不调用模型，直接使用原文
+_MIN_SECTION_CHARS = 200
+
+_SECTION_PROMPT = """你是学术论文编辑。请用不超过 {limit} 字概括下面这一节的要点，
+保留关键论点、方法、数据和结论，不要评价，不要添加原文没有的信息，只输出摘要正文。"""
+
+_ROLLUP_PROMPT = """你是学术论文编辑。下面是同一{scope}中各部分的摘要，请汇总为不超过 {limit} 字的整体摘要，
+说明整体结构和各部分之间的逻辑关系，只输出摘要正文。"""
+
+
+def _digest(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def section_title(text: str) -> str:
+    """章节标题：以标题行开头时取标题行，否则为空字符串"""
+    first_line = text.split("\n", 1)[0]
+    return first_line.strip() if HEADING_PATTERN.match(first_line) else ""
+
+
+def with_title(title: str, summary: str, separator: str = "\n") -> str:
+    """在摘要前加上章节标题（短章节直接使用原文，已包含标题时不重复）"""
+    if not title or summary.startswith(title):
+        return summary
+    return f"{title}{separator}{summary}"
+
+
+class _ProjectSummaries:
+    """单个项目的摘要状态"""
+
+    def __init__(self, project_id: str, root: Path):
+        self.project_id = project_id
+        self.root = root
+        # 文件相对路径 -> {summary, sections: [{title, line, summary}]}
+        self.files: dict[str, dict] = {}
+        self.document: Optional[str] = None
+        self.refreshed_at: Optional[float] = None
+        self.dirty = True
+        self.refresh_task: Optional[asyncio.Task] = None
+
+
+class SummaryService:
+    """
+    分层摘要服务
+
+    每个章节的摘要以 (模型, 提示词版本, 章节内容) 的哈希为键缓存在内存 LRU
+    和 DATA_ROOT/summary_cache 下；文件摘要由章节摘要汇总，全文摘要由文件摘要汇总，
+    键同样取自输入内容，章节不变时整条链路都命中缓存，不会调用模型。
+
+    项目在第一次读取摘要时登记，之后文件写入通过 notify_change 标记过期，
+    刷新在延迟 SUMMARY_REFRESH_DELAY_SECONDS 后作为后台任务执行，
+    所有项目的摘要调用共享一个并发为 1 的信号量，不与交互请求争抢模型。
+    读取摘要总是立即返回当前已有的结果，不等待刷新。
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        folders: list[str],
+        section_chars: int,
+        summary_chars: int,
+        refresh_delay: float,
+        max_entries: int = 4096
+    ):
+        self.cache_dir = cache_dir
+        self.folders = folders
+        self.section_chars = section_chars
+        self.summary_chars = summary_chars
+        self.refresh_delay = refresh_delay
+        self.max_entries = max_entries
+        self.model = settings.DASHSCOPE_MODEL
+        self.stats = {
+            "generated": 0,
+            "reused": 0,
+            "failed": 0,
+        }
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._memory_lock = threading.Lock()
+        self._projects: dict[str, _ProjectSummaries] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.SUMMARY_ENABLED and bool(settings.DASHSCOPE_API_KEY)
+
+    # ---------- 缓存 ----------
+
+    def _cache_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _remember(self, key: str, summary: str):
+        with self._memory_lock:
+            self._memory[key] = summary
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _load(self, key: str) -> Optional[str]:
+        """读取缓存的摘要（同步，应在工作线程中调用；内存未命中时读磁盘）"""
+        with self._memory_lock:
+            summary = self._memory.get(key)
+            if summary is not None:
+                self._memory.move_to_end(key)
+                return summary
+        try:
+            with open(self._cache_path(key), "r", encoding="utf-8") as f:
+                summary = json.load(f)["summary"]
+        except (OSError, ValueError, KeyError):
+            return None
+        self._remember(key, summary)
+        return summary
+
+    def _store(self, key: str, summary: str):
+        """写入摘要缓存（同步）"""
+        self._remember(key, summary)
+        atomic_write(
+            self._cache_path(key),
+            json.dumps({"summary": summary}, ensure_ascii=False).encode("utf-8"),
+            fsync=False
+        )
+
+    def section_key(self, text: str) -> str:
+        """章节摘要的缓存键"""
+        return _digest(self.model, str(PROMPT_VERSION), "section", text)
+
+    async def cached_sections(self, texts: List[str]) -> List[Optional[str]]:
+        """
+        批量查询章节摘要（只读缓存，不调用模型）
+
+        Args:
+            texts: 章节内容列表
+
+        Returns:
+            List[Optional[str]]: 对应的摘要；未生成时为 None
+        """
+        keys = [self.section_key(text) for text in texts]
+        return await asyncio.to_thread(lambda: [self._load(key) for key in keys])
+
+    # ---------- 生成 ----------
+
+    async def _generate(self, project_id: str, key: str, system_prompt: str, content: str) -> Optional[str]:
+        """调用模型生成摘要并缓存；已缓存时直接返回（后台优先级，排在交互请求之后）"""
+        cached = await asyncio.to_thread(self._load, key)
+        if cached is not None:
+            self.stats["reused"] += 1
+            return cached
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(1)
+        async with self._semaphore:
+            try:
+                async with llm_scheduler.admit(project_id, "background"):
+                    response = await llm_client.call(
+                        model=self.model,
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": content}
+                        ],
+                        result_format="message"
+                    )
+                if response.status_code != 200:
+                    raise Exception(response.message)
+                summary = response.output.choices[0].message.content.strip()
+            except Exception:
+                self.stats["failed"] += 1
+                logger.exception("生成摘要失败")
+                return None
+
+        await asyncio.to_thread(self._store, key, summary)
+        self.stats["generated"] += 1
+        return summary
+
+    async def _summarize_section(self, project_id: str, text: str) -> Optional[str]:
+        if len(text.strip()) < _MIN_SECTION_CHARS:
+            return text.strip()
+        return await self._generate(
+            project_id,
+            self.section_key(text),
+            _SECTION_PROMPT.format(limit=self.summary_chars),
+            text
+        )
+
+    async def _rollup(self, project_id: str, scope: str, parts: List[str]) -> Optional[str]:
+        if len(parts) == 1:
+            return parts[0]
+        content = "\n\n".join(parts)
+        return await self._generate(
+            project_id,
+            _digest(self.model, str(PROMPT_VERSION), scope, content),
+            _ROLLUP_PROMPT.format(scope=scope, limit=self.summary_chars * 2),
+            content
+        )
+
+    def _walk(self, root: Path) -> List[str]:
+        """列出参与摘要的文件（相对路径，按路径排序）"""
+        found = []
+        for folder in self.folders:
+            for dirpath, dirnames, filenames in os.walk(root / folder):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                rel_dir = Path(dirpath).relative_to(root).as_posix()
+                for name in filenames:
+                    if not name.startswith(".") and os.path.splitext(name)[1].lower() in SUMMARY_EXTENSIONS:
+                        found.append(f"{rel_dir}/{name}")
+        return sorted(found)
+
+    async def _summarize_file(self, project_id: str, root: Path, rel_path: str) -> Optional[dict]:
+        def read():
+            with open(root / rel_path, "r", encoding="utf-8", errors="replace") as f:
+                return f.read()
+
+        try:
+            content = await asyncio.to_thread(read)
+        except OSError:
+            return None
+
+        sections = []
+        for section in split_sections(content, self.section_chars):
+            if not section.text.strip():
+                continue
+            summary = await self._summarize_section(project_id, section.text)
+            if summary is None:
+                return None
+            sections.append({
+                "title": section_title(section.text),
+                "line": section.start_line,
+                "summary": summary,
+            })
+        if not sections:
+            return None
+
+        summary = await self._rollup(project_id, "文件", [
+            with_title(section["title"], section["summary"]) for section in sections
+        ])
+        if summary is None:
+            return None
+        return {"summary": summary, "sections": sections}
+
+    async def _refresh(self, project: _ProjectSummaries, delay: float):
+        """后台刷新项目摘要：只有内容变化的章节会调用模型"""
+        try:
+            await asyncio.sleep(delay)
+            while project.dirty:
+                project.dirty = False
+                files = {}
+                complete = True
+                for rel_path in await asyncio.to_thread(self._walk, project.root):
+                    result = await self._summarize_file(project.project_id, project.root, rel_path)
+                    if result is None:
+                        # 失败的文件保留旧摘要，下次刷新重试
+                        complete = False
+                        if rel_path in project.files:
+                            files[rel_path] = project.files[rel_path]
+                        continue
+                    files[rel_path] = result
+                project.files = files
+
+                if files:
+                    document = await self._rollup(project.project_id, "论文", [
+                        f"{rel_path}\n{result['summary']}" for rel_path, result in files.items()
+                    ])
+                    if document is not None:
+                        project.document = document
+                    else:
+                        complete = False
+                else:
+                    project.document = None
+                project.refreshed_at = time.time()
+                if not complete:
+                    # 下次读取摘要时再重试
+                    project.dirty = True
+                    break
+        finally:
+            project.refresh_task = None
+
+    def _schedule(self, project: _ProjectSummaries, delay: float):
+        if project.refresh_task is None and self.enabled:
+            project.refresh_task = asyncio.create_task(self._refresh(project, delay))
+
+    # ---------- 对外接口 ----------
+
+    def _project(self, project_id: str) -> _ProjectSummaries:
+        project = self._projects.get(project_id)
+        if project is None:
+            root = settings.PROJECTS_ROOT / project_id
+            if not is_valid_project_id(project_id) or not root.exists():
+                raise FileNotFoundError(f"项目不存在: {project_id}")
+            project = _ProjectSummaries(project_id, root)
+            self._projects[project_id] = project
+        return project
+
+    def notify_change(self, project_id: str, full_path: Path):
+        """
+        通知路径变更（FileService 写入路径调用）
+
+        只处理已登记的项目；刷新在延迟后执行，连续保存只触发一次。
+
+        Args:
+            project_id: 项目ID
+            full_path: 变更的文件或目录绝对路径
+        """
+        project = self._projects.get(project_id)
+        if project is None:
+            return
+        try:
+            rel_path = full_path.relative_to(project.root.resolve()).as_posix()
+        except ValueError:
+            return
+        if rel_path.split("/")[0] not in self.folders:
+            return
+        project.dirty = True
+        self._schedule(project, self.refresh_delay)
+
+    def get_summaries(self, project_id: str) -> dict:
+        """
+        获取项目当前的摘要（不等待生成）
+
+        首次调用时登记项目并立即在后台生成；摘要过期时安排延迟刷新。
+
+        Args:
+            project_id: 项目ID
+
+        Returns:
+            dict: {document, files, refreshing, refreshed_at}
+        """
+        project = self._project(project_id)
+        if project.dirty:
+            self._schedule(project, 0 if project.refreshed_at is None else self.refresh_delay)
+        return {
+            "document": project.document,
+            "files": project.files,
+            "refreshing": project.refresh_task is not None,
+            "refreshed_at": project.refreshed_at,
+        }
+
+    def document_summary(self, project_id: Optional[str]) -> str:
+        """
+        全文摘要（用于提示词），没有时返回空字符串
+
+        Args:
+            project_id: 项目ID，为空时返回空字符串
+        """
+        if not project_id or not settings.SUMMARY_ENABLED:
+            return ""
+        try:
+            return self.get_summaries(project_id)["document"] or ""
+        except FileNotFoundError:
+            return ""
+
+    def get_stats(self) -> dict:
+        """获取摘要生成统计"""
+        return {
+            **self.stats,
+            "projects": len(self._projects),
+            "refreshing": sum(1 for project in self._projects.values() if project.refresh_task is not None),
+        }
+
+    async def shutdown(self):
+        """取消进行中的刷新"""
+        tasks = [project.refresh_task for project in self._projects.values() if project.refresh_task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# 全局摘要服务
+summary_service = SummaryService(
+    cache_dir=settings.DATA_ROOT / "summary_cache",
+    folders=settings.SUMMARY_FOLDERS,
+    section_chars=settings.SUMMARY_SECTION_MAX_CHARS,
+    summary_chars=settings.SUMMARY_MAX_CHARS,
+    refresh_delay=settings.SUMMARY_REFRESH_DELAY_SECONDS
+)
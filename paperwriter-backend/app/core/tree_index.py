@@ -0,0 +1,527 @@
+"""项目文件树索引 - 内存缓存 + 文件监听增量更新"""
+import asyncio
+import json
+import os
+import stat
+import time
+import uuid
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Iterable, Optional
+from app.config import settings
+from app.core.connection_manager import manager
+
+# WebSocket 订阅主题：文件树变更
+TREE_TOPIC = "tree"
+
+
+def _scan_node(path: str, name: str, is_dir: bool, signatures: bool = False) -> dict:
+    """
+    扫描单个节点（在工作线程中执行）
+
+    使用 os.scandir 复用目录项中的类型信息，避免逐项 stat。
+    signatures 为 True 时为文件记录 (mtime_ns, size)，供轮询模式发现内容修改。
+    """
+    if not is_dir:
+        node = {
+            "name": name,
+            "type": "file",
+            "extension": os.path.splitext(name)[1],
+            "children": None
+        }
+        if signatures:
+            try:
+                info = os.stat(path)
+            except OSError:
+                pass
+            else:
+                node["signature"] = (info.st_mtime_ns, info.st_size)
+        return node
+
+    children = {}
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                # 跳过隐藏文件
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    entry_is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                children[entry.name] = _scan_node(entry.path, entry.name, entry_is_dir, signatures)
+    except (PermissionError, FileNotFoundError, NotADirectoryError):
+        pass
+
+    return {
+        "name": name,
+        "type": "folder",
+        "extension": None,
+        "children": children
+    }
+
+
+def _scan_path(path: str, name: str) -> Optional[dict]:
+    """扫描任意路径，路径不存在时返回 None"""
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        return None
+    return _scan_node(path, name, stat.S_ISDIR(mode))
+
+
+def _serialize(node: dict, path: str) -> dict:
+    """把内部节点转换为 FolderNode 结构"""
+    children = []
+    if node["children"] is not None:
+        for name in sorted(node["children"]):
+            child = node["children"][name]
+            children.append(_serialize(child, f"{path}/{name}"))
+
+    return {
+        "name": node["name"],
+        "path": path,
+        "type": node["type"],
+        "extension": node["extension"],
+        "children": children
+    }
+
+
+def _diff(old: Optional[dict], new: Optional[dict], path: str) -> list[dict]:
+    """
+    比较两个节点，生成变更列表
+
+    只在最上层的差异节点上产生 added/deleted，新增节点附带完整子树。
+    """
+    if old is None and new is None:
+        return []
+    if old is None:
+        return [{"op": "added", "path": path, "node": _serialize(new, path)}]
+    if new is None:
+        return [{"op": "deleted", "path": path}]
+    if old["type"] != new["type"]:
+        return [
+            {"op": "deleted", "path": path},
+            {"op": "added", "path": path, "node": _serialize(new, path)}
+        ]
+    if old["children"] is None:
+        return []
+
+    changes = []
+    for name in sorted(old["children"].keys() | new["children"].keys()):
+        changes.extend(_diff(
+            old["children"].get(name),
+            new["children"].get(name),
+            f"{path}/{name}"
+        ))
+    return changes
+
+
+def _modified_files(old: dict, new: dict, path: str) -> list[str]:
+    """
+    找出两次扫描之间签名变化的文件
+
+    只比较两边都带签名的文件；结构变化由 _diff 处理。
+    """
+    if old["type"] != new["type"]:
+        return []
+    if old["children"] is None:
+        if "signature" in old and "signature" in new and old["signature"] != new["signature"]:
+            return [path]
+        return []
+
+    modified = []
+    for name in sorted(old["children"].keys() & new["children"].keys()):
+        modified.extend(_modified_files(
+            old["children"][name],
+            new["children"][name],
+            f"{path}/{name}" if path else name
+        ))
+    return modified
+
+
+def _merge_changes(pending: dict, message: dict) -> dict:
+    """合并待发送的文件树变更推送"""
+    return {
+        **message,
+        "changes": pending["changes"] + message["changes"]
+    }
+
+
+class ProjectTreeIndex:
+    """
+    单个项目的文件树索引
+
+    首次访问时在工作线程中用 os.scandir 构建一次，之后由文件监听器和
+    FileService 的写入路径增量更新。序列化结果和 ETag 缓存到下一次变更为止。
+
+    每次变更分配单调递增的序号并写入有界变更日志，客户端可以按序号增量同步。
+    """
+
+    # 同一文件的重复修改记录（写入后监听器再次上报）在该时间内只记一次
+    _MODIFIED_DEDUP_SECONDS = 1.0
+
+    def __init__(self, project_id: str, root: Path, changelog_size: int = 1000):
+        self.project_id = project_id
+        self.root = root
+        self.version = 0  # 文件树结构版本（用于 ETag）
+        self.seq = 0  # 变更序号（结构变更和文件修改都会递增）
+        self.changes: deque[dict] = deque(maxlen=changelog_size)
+        # 进程内唯一的代号，保证重启后 ETag 和变更序号不会与旧版本冲突
+        self.generation = uuid.uuid4().hex[:8]
+        self._root_node: Optional[dict] = None
+        self._tree: Optional[dict] = None
+        self._tree_json: Optional[bytes] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self._stop = asyncio.Event()
+
+    @property
+    def etag(self) -> str:
+        """当前版本的 ETag"""
+        return f'"{self.generation}-{self.version}"'
+
+    async def build(self):
+        """完整扫描项目目录"""
+        self._root_node = await asyncio.to_thread(
+            _scan_node, str(self.root), self.root.name, True
+        )
+        self._invalidate()
+
+    def _invalidate(self):
+        self.version += 1
+        self._tree = None
+        self._tree_json = None
+
+    @property
+    def tree(self) -> dict:
+        """FolderNode 结构的文件树（缓存）"""
+        if self._tree is None:
+            self._tree = _serialize(self._root_node, self.root.name)
+        return self._tree
+
+    @property
+    def tree_json(self) -> bytes:
+        """序列化后的文件树（缓存）"""
+        if self._tree_json is None:
+            self._tree_json = json.dumps(self.tree, ensure_ascii=False).encode("utf-8")
+        return self._tree_json
+
+    def _record(self, changes: list[dict]):
+        """为变更分配序号、写入日志并推送给订阅的连接"""
+        if not changes:
+            return
+
+        now = time.monotonic()
+        recorded = []
+        for change in changes:
+            if change["op"] == "modified" and self.changes:
+                last = self.changes[-1]
+                if (
+                    last["op"] == "modified"
+                    and last["path"] == change["path"]
+                    and now - last["_at"] < self._MODIFIED_DEDUP_SECONDS
+                ):
+                    continue
+            self.seq += 1
+            entry = {"seq": self.seq, **change}
+            self.changes.append({**entry, "_at": now})
+            recorded.append(entry)
+
+        if recorded:
+            manager.broadcast(
+                self.project_id,
+                {
+                    "type": "tree_changes",
+                    "generation": self.generation,
+                    "seq": self.seq,
+                    "changes": recorded
+                },
+                topic=TREE_TOPIC,
+                coalesce_key="tree_changes",
+                merge=_merge_changes
+            )
+
+    def changes_since(self, since: int, generation: Optional[str] = None) -> dict:
+        """
+        获取指定序号之后的变更
+
+        序号早于日志保留范围、或代号不一致（服务重启、索引被淘汰后重建）时
+        返回 reset，客户端需要重新获取完整文件树。
+
+        Args:
+            since: 客户端已同步到的序号
+            generation: 客户端记录的索引代号
+
+        Returns:
+            dict: {generation, seq, reset, changes}
+        """
+        oldest = self.changes[0]["seq"] if self.changes else self.seq + 1
+        reset = (
+            (generation is not None and generation != self.generation)
+            or since > self.seq
+            or since < oldest - 1
+        )
+        changes = [] if reset else [
+            {k: v for k, v in change.items() if k != "_at"}
+            for change in self.changes if change["seq"] > since
+        ]
+        return {
+            "generation": self.generation,
+            "seq": self.seq,
+            "reset": reset,
+            "changes": changes
+        }
+
+    def missing_folders(self, folders: Iterable[str]) -> list[str]:
+        """
+        检查根目录下缺少的文件夹
+
+        Args:
+            folders: 必需的文件夹名称
+
+        Returns:
+            list[str]: 缺少的文件夹
+        """
+        children = self._root_node["children"]
+        return [
+            folder for folder in folders
+            if folder not in children or children[folder]["type"] != "folder"
+        ]
+
+    def relative_path(self, path: Path | str) -> Optional[str]:
+        """把绝对路径转换为相对项目根目录的路径，不在项目内时返回 None"""
+        try:
+            rel = Path(path).resolve().relative_to(self.root.resolve())
+        except ValueError:
+            return None
+        return rel.as_posix()
+
+    async def refresh_path(self, rel_path: str, modified: bool = False) -> bool:
+        """
+        重新扫描单个路径并更新索引
+
+        Args:
+            rel_path: 相对项目根目录的路径
+            modified: 路径对应的文件内容是否被修改
+
+        Returns:
+            bool: 文件树结构是否发生变化
+        """
+        parts = [part for part in Path(rel_path).parts if part not in ("", ".")]
+        if not parts or any(part.startswith(".") for part in parts):
+            return False
+
+        # 找到最近的已索引祖先目录
+        parent = self._root_node
+        depth = 0
+        for part in parts[:-1]:
+            child = parent["children"].get(part)
+            if child is None or child["type"] != "folder":
+                break
+            parent = child
+            depth += 1
+
+        # 祖先目录本身是新出现的：从最近的已知祖先开始扫描
+        name = parts[depth]
+        full_path = self.root.joinpath(*parts[:depth + 1])
+        node = await asyncio.to_thread(_scan_path, str(full_path), name)
+        current = parent["children"].get(name)
+        path = "/".join([self.root.name, *parts[:depth + 1]])
+        changes = _diff(current, node, path)
+
+        if not changes:
+            if modified and node is not None and node["type"] == "file":
+                self._record([{"op": "modified", "path": path}])
+            return False
+
+        if node is None:
+            del parent["children"][name]
+        else:
+            parent["children"][name] = node
+
+        self._invalidate()
+        self._record(changes)
+        return True
+
+    async def rescan(self) -> bool:
+        """
+        完整重新扫描并替换索引（轮询模式使用）
+
+        同时比较文件的 mtime 和大小，内容被修改的文件记录为 modified。
+        上次扫描没有签名的文件（首次扫描、或由写入路径刷新过）只记下签名。
+
+        Returns:
+            bool: 文件树结构是否发生变化
+        """
+        node = await asyncio.to_thread(_scan_node, str(self.root), self.root.name, True, True)
+        old = self._root_node
+        changes = _diff(old, node, self.root.name)
+        self._root_node = node
+        if changes:
+            self._invalidate()
+            self._record(changes)
+        for rel_path in _modified_files(old, node, ""):
+            await self.refresh_path(rel_path, modified=True)
+        return bool(changes)
+
+    def start_watcher(self, mode: str, poll_interval: float):
+        """
+        启动文件监听
+
+        Args:
+            mode: auto（优先使用 watchfiles）| poll | off
+            poll_interval: 轮询间隔（秒）
+        """
+        if mode == "off" or self._watcher is not None:
+            return
+        self._watcher = asyncio.create_task(self._watch(mode, poll_interval))
+
+    async def _watch(self, mode: str, poll_interval: float):
+        if mode == "auto":
+            try:
+                from watchfiles import Change, awatch
+            except ImportError:
+                awatch = None
+
+            if awatch is not None:
+                try:
+                    async for changes in awatch(self.root, stop_event=self._stop):
+                        modified = {
+                            self.relative_path(path)
+                            for change, path in changes if change == Change.modified
+                        }
+                        paths = {self.relative_path(path) for _, path in changes}
+                        for rel_path in _collapse(p for p in paths if p):
+                            await self.refresh_path(rel_path, rel_path in modified)
+                    return
+                except Exception:
+                    # 监听失败（如 inotify 句柄耗尽）时退回轮询
+                    pass
+
+        # 立即扫描一次，记下文件签名作为之后比较的基准
+        await self.rescan()
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                await self.rescan()
+
+    async def stop(self):
+        """停止文件监听"""
+        self._stop.set()
+        if self._watcher is not None:
+            # watchfiles 在线程中轮询 stop_event，等待其自行退出后再取消，
+            # 避免在监听线程仍在运行时强制中断
+            try:
+                await asyncio.wait_for(asyncio.shield(self._watcher), timeout=5)
+            except asyncio.TimeoutError:
+                self._watcher.cancel()
+            except Exception:
+                pass
+            self._watcher = None
+
+
+def _collapse(paths: Iterable[str]) -> list[str]:
+    """去掉已被祖先路径覆盖的路径"""
+    result = []
+    for path in sorted(paths):
+        if result and (path == result[-1] or path.startswith(result[-1] + "/")):
+            continue
+        result.append(path)
+    return result
+
+
+class TreeIndexService:
+    """文件树索引管理 - 按项目维护索引，超过上限时淘汰最久未使用的项目"""
+
+    def __init__(
+        self,
+        max_projects: int,
+        watch_mode: str,
+        poll_interval: float,
+        changelog_size: int
+    ):
+        self.max_projects = max_projects
+        self.changelog_size = changelog_size
+        self.watch_mode = watch_mode
+        self.poll_interval = poll_interval
+        self._indexes: OrderedDict[str, ProjectTreeIndex] = OrderedDict()
+        self._building: dict[str, asyncio.Task] = {}
+
+    async def get(self, project_id: str, project_path: Path) -> ProjectTreeIndex:
+        """
+        获取项目索引，首次访问时构建
+
+        Args:
+            project_id: 项目ID
+            project_path: 项目路径
+
+        Returns:
+            ProjectTreeIndex: 项目索引
+        """
+        index = self._indexes.get(project_id)
+        if index is not None and index.root == project_path:
+            self._indexes.move_to_end(project_id)
+            return index
+
+        # 并发的首次请求共享同一次构建
+        task = self._building.get(project_id)
+        if task is None:
+            task = asyncio.create_task(self._build(project_id, project_path))
+            self._building[project_id] = task
+            task.add_done_callback(lambda _: self._building.pop(project_id, None))
+        return await asyncio.shield(task)
+
+    async def _build(self, project_id: str, project_path: Path) -> ProjectTreeIndex:
+        index = ProjectTreeIndex(project_id, project_path, self.changelog_size)
+        await index.build()
+
+        previous = self._indexes.pop(project_id, None)
+        if previous is not None:
+            await previous.stop()
+        self._indexes[project_id] = index
+        index.start_watcher(self.watch_mode, self.poll_interval)
+
+        while len(self._indexes) > self.max_projects:
+            _, evicted = self._indexes.popitem(last=False)
+            await evicted.stop()
+
+        return index
+
+    async def notify_change(
+        self,
+        project_id: str,
+        full_path: Path,
+        modified: bool = False
+    ):
+        """
+        通知路径变更（FileService 写入路径调用）
+
+        项目索引尚未构建时忽略，下次访问时会完整扫描。
+
+        Args:
+            project_id: 项目ID
+            full_path: 变更的文件绝对路径
+            modified: 文件内容是否被修改
+        """
+        index = self._indexes.get(project_id)
+        if index is None:
+            return
+        rel_path = index.relative_path(full_path)
+        if rel_path:
+            await index.refresh_path(rel_path, modified)
+
+    async def shutdown(self):
+        """停止所有监听器"""
+        for index in self._indexes.values():
+            await index.stop()
+        self._indexes.clear()
+
+
+# 全局索引服务
+tree_index_service = TreeIndexService(
+    max_projects=settings.TREE_INDEX_MAX_PROJECTS,
+    watch_mode=settings.TREE_WATCH_MODE,
+    poll_interval=settings.TREE_POLL_INTERVAL_SECONDS,
+    changelog_size=settings.TREE_CHANGELOG_SIZE
+)
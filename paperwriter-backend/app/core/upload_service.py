@@ -0,0 +1,343 @@
+"""可续传上传服务 - 分块上传、断点续传、校验后原子入库"""
+import aiofiles
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+import weakref
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from app.config import settings
+from app.core.file_service import FileTooLarge, file_service
+from app.core.project_quota import QuotaExceeded, project_quota
+from app.utils.atomic_write import atomic_write
+
+logger = logging.getLogger(__name__)
+
+_UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadNotFound(Exception):
+    """上传不存在或已过期"""
+
+
+class UploadOffsetMismatch(Exception):
+    """分块偏移量与已接收字节数不连续"""
+
+    def __init__(self, received: int):
+        super().__init__(f"偏移量不连续，已接收 {received} 字节")
+        self.received = received
+
+
+class ChecksumMismatch(ValueError):
+    """文件校验和不一致"""
+
+
+def _sha256_file(path: Path) -> str:
+    """计算文件 SHA-256（同步，应在工作线程中调用）"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadService:
+    """
+    可续传上传服务
+
+    每个上传在 DATA_ROOT/uploads/<upload_id>/ 下保存 meta.json 和 data.part，
+    已接收字节数即 data.part 的大小，服务重启后仍可继续。
+    分块按偏移量写入：与已接收部分重叠的字节被跳过，重复提交同一分块是幂等的。
+    超过 TTL 没有活动的上传由后台任务清理。
+    """
+
+    def __init__(self, uploads_root: Path, ttl_seconds: int, gc_interval: int):
+        self.uploads_root = uploads_root
+        self.ttl_seconds = ttl_seconds
+        self.gc_interval = gc_interval
+        # 本进程内为上传预留的项目空间（upload_id -> (project_id, 字节数)）
+        self._reserved: dict[str, tuple[str, int]] = {}
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+        self._gc_task: Optional[asyncio.Task] = None
+
+    def _lock(self, upload_id: str) -> asyncio.Lock:
+        lock = self._locks.get(upload_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[upload_id] = lock
+        return lock
+
+    def _upload_dir(self, upload_id: str) -> Path:
+        if not _UPLOAD_ID_PATTERN.match(upload_id):
+            raise UploadNotFound(f"上传不存在: {upload_id}")
+        return self.uploads_root / upload_id
+
+    def _load(self, upload_id: str) -> tuple[dict, int, float]:
+        """读取上传元数据（同步），返回 (元数据, 已接收字节数, 最后活动时间)"""
+        upload_dir = self._upload_dir(upload_id)
+        try:
+            meta = json.loads((upload_dir / "meta.json").read_text(encoding="utf-8"))
+            data_stat = os.stat(upload_dir / "data.part")
+        except FileNotFoundError:
+            raise UploadNotFound(f"上传不存在: {upload_id}")
+        return meta, data_stat.st_size, max(data_stat.st_mtime, meta["created_at"])
+
+    def _status(self, meta: dict, received: int, last_active: float) -> dict:
+        return {
+            "upload_id": meta["upload_id"],
+            "project_id": meta["project_id"],
+            "file_path": meta["file_path"],
+            "size": meta["size"],
+            "received": received,
+            "complete": received == meta["size"],
+            "expires_at": last_active + self.ttl_seconds,
+        }
+
+    def _release(self, upload_id: str):
+        reserved = self._reserved.pop(upload_id, None)
+        if reserved is not None:
+            project_quota.adjust(reserved[0], -reserved[1])
+
+    async def create(
+        self,
+        project_id: str,
+        file_path: str,
+        size: int,
+        checksum: Optional[str] = None,
+        overwrite: bool = False
+    ) -> dict:
+        """
+        创建上传
+
+        声明的大小在创建时即按单文件和项目空间上限检查并预留。
+
+        Args:
+            project_id: 项目ID
+            file_path: 目标文件相对路径
+            size: 文件总字节数
+            checksum: 文件 SHA-256（十六进制），完成时校验
+            overwrite: 目标已存在时是否覆盖
+
+        Returns:
+            dict: 上传状态
+        """
+        file_service.validate_upload(project_id, file_path, overwrite, size)
+        # 确保项目占用已加载
+        await file_service.get_usage(project_id)
+        try:
+            project_quota.reserve(project_id, size)
+        except QuotaExceeded as e:
+            raise FileTooLarge(str(e))
+
+        upload_id = uuid.uuid4().hex
+        self._reserved[upload_id] = (project_id, size)
+        meta = {
+            "upload_id": upload_id,
+            "project_id": project_id,
+            "file_path": file_path,
+            "size": size,
+            "checksum": checksum.lower() if checksum else None,
+            "overwrite": overwrite,
+            "created_at": time.time(),
+        }
+
+        def init_dir():
+            upload_dir = self._upload_dir(upload_id)
+            upload_dir.mkdir(parents=True)
+            (upload_dir / "data.part").touch()
+            atomic_write(upload_dir / "meta.json", json.dumps(meta).encode("utf-8"), fsync=False)
+
+        try:
+            await asyncio.to_thread(init_dir)
+        except BaseException:
+            self._release(upload_id)
+            raise
+        return self._status(meta, 0, meta["created_at"])
+
+    async def status(self, upload_id: str) -> dict:
+        """查询上传状态"""
+        meta, received, last_active = await asyncio.to_thread(self._load, upload_id)
+        return self._status(meta, received, last_active)
+
+    async def write_chunk(
+        self,
+        upload_id: str,
+        offset: int,
+        chunks: AsyncIterator[bytes]
+    ) -> dict:
+        """
+        在指定偏移量写入分块
+
+        Args:
+            upload_id: 上传ID
+            offset: 分块在文件中的起始偏移量
+            chunks: 分块内容字节流
+
+        Returns:
+            dict: 上传状态
+
+        Raises:
+            UploadOffsetMismatch: 偏移量大于已接收字节数（中间有缺口）
+            ValueError: 数据超出声明的文件大小
+        """
+        async with self._lock(upload_id):
+            meta, received, _ = await asyncio.to_thread(self._load, upload_id)
+            if offset > received:
+                raise UploadOffsetMismatch(received)
+
+            size = meta["size"]
+            skip = received - offset
+            overflow = False
+            async with aiofiles.open(self._upload_dir(upload_id) / "data.part", "r+b") as f:
+                await f.seek(received)
+                async for chunk in chunks:
+                    if skip:
+                        # 跳过已接收过的重叠部分
+                        dropped = min(skip, len(chunk))
+                        chunk = chunk[dropped:]
+                        skip -= dropped
+                    if not chunk:
+                        continue
+                    if received + len(chunk) > size:
+                        chunk = chunk[:size - received]
+                        overflow = True
+                    await f.write(chunk)
+                    received += len(chunk)
+                    if overflow:
+                        break
+
+            if overflow:
+                raise ValueError(f"数据超出声明的文件大小 {size} 字节")
+            return self._status(meta, received, time.time())
+
+    async def complete(self, upload_id: str) -> dict:
+        """
+        完成上传：校验大小和校验和，原子移动到项目中
+
+        Returns:
+            dict: {path, size, etag}
+
+        Raises:
+            ValueError: 数据尚未接收完整
+            ChecksumMismatch: 校验和不一致（上传被删除，需要重新上传）
+        """
+        async with self._lock(upload_id):
+            meta, received, _ = await asyncio.to_thread(self._load, upload_id)
+            if received != meta["size"]:
+                raise ValueError(f"上传未完成: {received}/{meta['size']} 字节")
+
+            upload_dir = self._upload_dir(upload_id)
+            data_path = upload_dir / "data.part"
+            if meta["checksum"]:
+                actual = await asyncio.to_thread(_sha256_file, data_path)
+                if actual != meta["checksum"]:
+                    await self._remove(upload_id)
+                    raise ChecksumMismatch(f"校验和不一致: 期望 {meta['checksum']}，实际 {actual}")
+
+            project_id = meta["project_id"]
+            if upload_id not in self._reserved:
+                # 服务重启前创建的上传，入库时重新预留空间
+                await file_service.get_usage(project_id)
+                try:
+                    project_quota.reserve(project_id, meta["size"])
+                except QuotaExceeded as e:
+                    raise FileTooLarge(str(e))
+                self._reserved[upload_id] = (project_id, meta["size"])
+
+            def sync_data():
+                with open(data_path, "rb") as f:
+                    os.fsync(f.fileno())
+
+            if file_service.fsync:
+                await asyncio.to_thread(sync_data)
+            try:
+                result = await file_service.install_file(
+                    project_id,
+                    meta["file_path"],
+                    data_path,
+                    overwrite=meta["overwrite"]
+                )
+            except BaseException:
+                self._release(upload_id)
+                raise
+            # 空间已计入项目，不再释放
+            self._reserved.pop(upload_id, None)
+            await asyncio.to_thread(shutil.rmtree, upload_dir, True)
+            return result
+
+    async def abort(self, upload_id: str):
+        """取消上传"""
+        async with self._lock(upload_id):
+            await asyncio.to_thread(self._load, upload_id)
+            await self._remove(upload_id)
+
+    async def _remove(self, upload_id: str):
+        self._release(upload_id)
+        await asyncio.to_thread(shutil.rmtree, self._upload_dir(upload_id), True)
+
+    async def collect_garbage(self) -> int:
+        """
+        清理超过 TTL 没有活动的上传
+
+        Returns:
+            int: 清理的上传数
+        """
+        if not self.uploads_root.exists():
+            return 0
+
+        removed = 0
+        deadline = time.time() - self.ttl_seconds
+        for entry in await asyncio.to_thread(os.listdir, self.uploads_root):
+            if not _UPLOAD_ID_PATTERN.match(entry) or self._lock(entry).locked():
+                continue
+            try:
+                _, _, last_active = await asyncio.to_thread(self._load, entry)
+            except UploadNotFound:
+                # 元数据缺失的残留目录，按目录修改时间判断
+                try:
+                    last_active = (self.uploads_root / entry).stat().st_mtime
+                except FileNotFoundError:
+                    continue
+            except (OSError, ValueError, KeyError):
+                last_active = 0
+            if last_active < deadline:
+                await self._remove(entry)
+                removed += 1
+        return removed
+
+    async def _gc_loop(self):
+        while True:
+            try:
+                await self.collect_garbage()
+            except Exception:
+                logger.exception("清理过期上传失败")
+            await asyncio.sleep(self.gc_interval)
+
+    def start(self):
+        """启动过期上传清理任务"""
+        if self._gc_task is None:
+            self._gc_task = asyncio.create_task(self._gc_loop())
+
+    async def shutdown(self):
+        """停止清理任务"""
+        if self._gc_task is not None:
+            self._gc_task.cancel()
+            try:
+                await self._gc_task
+            except asyncio.CancelledError:
+                pass
+            self._gc_task = None
+
+
+# 全局服务实例
+upload_service = UploadService(
+    uploads_root=settings.DATA_ROOT / "uploads",
+    ttl_seconds=settings.UPLOAD_TTL_HOURS * 3600,
+    gc_interval=settings.UPLOAD_GC_INTERVAL_SECONDS
+)
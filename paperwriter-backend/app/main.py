@@ -3,7 +3,18 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from app.config import settings
-from app.api.v1 import project, files, health, ai, websocket
+from app.api.v1 import project, files, health, ai, jobs, websocket
+from app.core.batch_check import batch_check_service
+from app.core.file_service import file_service
+from app.core.job_queue import job_queue
+from app.core.llm_client import llm_client
+from app.core.pdf_service import pdf_service
+from app.core.retrieval_service import retrieval_service
+from app.core.search_index import search_index_service
+from app.core.stream_registry import stream_registry
+from app.core.summary_service import summary_service
+from app.core.tree_index import tree_index_service
+from app.core.upload_service import upload_service
 
 
 @asynccontextmanager
@@ -12,12 +23,26 @@ async def lifespan(app: FastAPI):
     # 启动时执行
     print(f"🚀 PaperWriter Backend 启动中...")
     print(f"📁 项目存储目录: {settings.PROJECTS_ROOT.absolute()}")
+    print(f"🗄️ 内部数据目录: {settings.DATA_ROOT.absolute()}")
     print(f"🤖 AI 模型: {settings.DASHSCOPE_MODEL}")
+    upload_service.start()
+    job_queue.start()
 
     yield
 
     # 关闭时执行
     print("👋 PaperWriter Backend 关闭中...")
+    await stream_registry.shutdown()
+    await batch_check_service.shutdown()
+    await job_queue.shutdown()
+    await upload_service.shutdown()
+    await summary_service.shutdown()
+    await file_service.flush_all()
+    await tree_index_service.shutdown()
+    search_index_service.shutdown()
+    retrieval_service.shutdown()
+    pdf_service.shutdown()
+    llm_client.shutdown()
 
 
 # 创建 FastAPI 应用
@@ -37,6 +62,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 流式接口通过响应头返回流 ID，用于断线续传
+    expose_headers=["X-Stream-Id"],
 )
 
 
@@ -65,6 +92,12 @@ app.include_router(
     tags=["ai"]
 )
 
+app.include_router(
+    jobs.router,
+    prefix="/api/v1/jobs",
+    tags=["jobs"]
+)
+
 app.include_router(
     websocket.router,
     prefix="/api/v1",
@@ -1,11 +1,18 @@
 """AI相关数据模型"""
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Literal, Optional
 
 
+# 缓存策略: default 先查缓存；bypass 跳过缓存直接调用模型（结果仍会刷新缓存）
+CacheMode = Literal["default", "bypass"]
+
+
 class Diagnostic(BaseModel):
     """诊断信息"""
-    from: dict = Field(..., description="错误起始位置 {line, ch}")
+    model_config = ConfigDict(populate_by_name=True)
+
+    # `from` 是 Python 关键字，字段名加下划线，序列化时通过别名输出为 "from"
+    from_: dict = Field(..., alias="from", description="错误起始位置 {line, ch}")
     to: dict = Field(..., description="错误结束位置 {line, ch}")
     severity: Literal["info", "warning", "error"] = Field(..., description="严重程度")
     message: str = Field(..., description="错误消息")
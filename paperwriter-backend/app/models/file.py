@@ -1,21 +1,67 @@
 """文件相关数据模型"""
-from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 
 class FileRead(BaseModel):
     """读取文件请求"""
+    project_id: str = Field(..., description="项目ID")
     file_path: str = Field(..., description="文件相对路径")
 
 
 class FileWrite(BaseModel):
     """写入文件请求"""
+    project_id: str = Field(..., description="项目ID")
     file_path: str = Field(..., description="文件相对路径")
     content: str = Field(..., description="文件内容")
     encoding: str = Field(default="utf-8", description="文件编码")
 
 
+class TextEdit(BaseModel):
+    """区间替换编辑（坐标基于基准内容）"""
+    model_config = ConfigDict(populate_by_name=True)
+
+    # `from` 是 Python 关键字，字段名加下划线，通过别名读取 "from"
+    from_: int = Field(..., alias="from", ge=0, description="起始偏移")
+    to: int = Field(..., ge=0, description="结束偏移（不包含）")
+    text: str = Field(default="", description="替换文本")
+
+
+class FilePatch(BaseModel):
+    """补丁写入请求（edits 与 diff 二选一）"""
+    project_id: str = Field(..., description="项目ID")
+    file_path: str = Field(..., description="文件相对路径")
+    base_etag: str = Field(..., description="补丁基于的文件 ETag")
+    edits: Optional[list[TextEdit]] = Field(None, description="区间替换编辑列表")
+    diff: Optional[str] = Field(None, description="unified diff 文本")
+    offset_unit: Literal["utf16", "codepoint"] = Field(
+        default="utf16",
+        description="edits 偏移量单位：utf16（JS 字符串下标）或 codepoint"
+    )
+
+    @model_validator(mode="after")
+    def check_patch(self) -> "FilePatch":
+        if (self.edits is None) == (self.diff is None):
+            raise ValueError("edits 和 diff 必须且只能提供一个")
+        return self
+
+
+class UploadInit(BaseModel):
+    """创建可续传上传请求"""
+    project_id: str = Field(..., description="项目ID")
+    file_path: str = Field(..., description="目标文件相对路径")
+    size: int = Field(..., ge=0, description="文件总字节数")
+    checksum: Optional[str] = Field(
+        None,
+        pattern=r"^[0-9a-fA-F]{64}$",
+        description="文件 SHA-256（十六进制），完成时校验"
+    )
+    overwrite: bool = Field(default=False, description="目标已存在时是否覆盖")
+
+
 class FileCreate(BaseModel):
     """创建文件请求"""
+    project_id: str = Field(..., description="项目ID")
     file_path: str = Field(..., description="文件相对路径")
     content: str = Field(default="", description="初始内容")
     file_type: str = Field(default="file", description="类型: 'file' | 'folder'")
@@ -23,6 +69,7 @@ class FileCreate(BaseModel):
 
 class FileDelete(BaseModel):
     """删除文件请求"""
+    project_id: str = Field(..., description="项目ID")
     file_path: str = Field(..., description="文件相对路径")
 
 
@@ -32,3 +79,10 @@ class FileNode(BaseModel):
     path: str
     type: str  # 'file' or 'folder'
     extension: str | None = None
+    size: int | None = None  # 字节数（details=true 或按 size 排序时返回）
+    mtime: float | None = None  # 修改时间戳（details=true 或按 mtime 排序时返回）
+    children: list["FileNode"] | None = None  # depth > 1 时展开的子节点
+
+
+# 更新前向引用
+FileNode.model_rebuild()
@@ -65,7 +65,7 @@ def parse_ai_response(response: str) -> List[Diagnostic]:
                     "info": "info"
                 }
                 diagnostics.append(Diagnostic(
-                    from={"line": issue.get("line", 0), "ch": 0},
+                    from_={"line": issue.get("line", 0), "ch": 0},
                     to={"line": issue.get("line", 0) + 1, "ch": 0},
                     severity=severity_map.get(issue.get("severity", "info"), "info"),
                     message=issue.get("message", "")
@@ -78,6 +78,47 @@ def parse_ai_response(response: str) -> List[Diagnostic]:
     return diagnostics
 
 
+def shift_diagnostic(diagnostic: Diagnostic, line_offset: int) -> Diagnostic:
+    """
+    平移诊断信息的行号
+
+    Args:
+        diagnostic: 诊断信息
+        line_offset: 行号偏移量
+
+    Returns:
+        Diagnostic: 平移后的新诊断信息
+    """
+    if line_offset == 0:
+        return diagnostic
+
+    return diagnostic.model_copy(update={
+        "from_": {**diagnostic.from_, "line": diagnostic.from_.get("line", 0) + line_offset},
+        "to": {**diagnostic.to, "line": diagnostic.to.get("line", 0) + line_offset},
+    })
+
+
+def cumulative_delta(previous: str, current: str) -> str:
+    """
+    把完整文本模式的流式块转换为增量
+
+    Args:
+        previous: 上一块的完整文本
+        current: 当前块的完整文本
+
+    Returns:
+        str: 新增的文本；上游改写了已输出的部分时，返回公共前缀之后的文本
+    """
+    if current.startswith(previous):
+        return current[len(previous):]
+    common = 0
+    for old, new in zip(previous, current):
+        if old != new:
+            break
+        common += 1
+    return current[common:]
+
+
 def extract_diagnostics_from_text(text: str) -> List[Diagnostic]:
     """
     从文本中提取诊断信息（备用方案）
@@ -98,7 +139,7 @@ def extract_diagnostics_from_text(text: str) -> List[Diagnostic]:
     for line_num, message in matches:
         severity = "error" if "error" in message.lower() else "warning"
         diagnostics.append(Diagnostic(
-            from={"line": int(line_num) - 1, "ch": 0},
+            from_={"line": int(line_num) - 1, "ch": 0},
             to={"line": int(line_num), "ch": 0},
             severity=severity,
             message=message.strip()
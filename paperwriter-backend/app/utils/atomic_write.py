@@ -0,0 +1,112 @@
+"""原子写入工具 - 临时文件 + fsync + rename"""
+import errno
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+
+def temp_path_for(path: Path) -> Path:
+    """
+    生成与目标文件同目录的临时文件路径
+
+    以点开头，文件树索引和目录列表会将其当作隐藏文件跳过。
+    """
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+
+
+def fsync_directory(directory: Path):
+    """同步目录项，保证 rename 在断电后仍然生效（不支持的平台忽略）"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: Path, data: bytes, fsync: bool = True) -> os.stat_result:
+    """
+    原子写入文件（同步，应在工作线程中调用）
+
+    先写同目录临时文件，fsync 后 rename 覆盖目标文件，
+    任何时刻读到的都是完整的旧内容或新内容。
+
+    Args:
+        path: 目标文件路径
+        data: 文件内容
+        fsync: 是否落盘（关闭后仍是原子替换，但断电可能丢失最近一次写入）
+
+    Returns:
+        os.stat_result: 写入后的文件 stat
+    """
+    temp_path = temp_path_for(path)
+    try:
+        f = open(temp_path, "xb")
+    except FileNotFoundError:
+        # 父目录不存在时才创建，避免每次保存都 mkdir
+        path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(temp_path, "xb")
+
+    try:
+        with f:
+            f.write(data)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        try:
+            # 保留原文件的权限位
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+    if fsync:
+        fsync_directory(path.parent)
+    return os.stat(path)
+
+
+def move_file(source: Path, target: Path, fsync: bool = True):
+    """
+    原子地把已写完的文件移动到目标位置（同步，应在工作线程中调用）
+
+    同一文件系统内直接 rename；跨文件系统（如 DATA_ROOT 与 PROJECTS_ROOT 挂载在不同磁盘）
+    时先复制到目标同目录的临时文件，fsync 后 rename 覆盖目标文件，再删除源文件。
+
+    Args:
+        source: 源文件
+        target: 目标文件路径
+        fsync: 复制时是否落盘
+    """
+    try:
+        os.replace(source, target)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    temp_path = temp_path_for(target)
+    try:
+        with open(source, "rb") as src, open(temp_path, "xb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+            dst.flush()
+            if fsync:
+                os.fsync(dst.fileno())
+        os.replace(temp_path, target)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    os.unlink(source)
@@ -0,0 +1,130 @@
+"""文本向量化 - 可替换的本地嵌入模型，默认使用离线可用的哈希向量"""
+import logging
+import math
+import re
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 英文/数字词与连续 CJK 字符串
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]{2,}|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+
+
+class Embedder(ABC):
+    """
+    嵌入模型接口
+
+    embed 返回 L2 归一化的 float32 矩阵，向量内积即余弦相似度。
+    name 标识模型和维度，变化时已建立的向量索引会重建。
+    """
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """模型标识"""
+
+    @property
+    @abstractmethod
+    def dim(self) -> int:
+        """向量维度"""
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """把文本列表转换为 (len(texts), dim) 的矩阵"""
+
+
+def _tokens(text: str) -> List[str]:
+    """切分特征词：英文按词，中文取单字和相邻两字"""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token[0].isascii():
+            tokens.append(token)
+        else:
+            tokens.extend(token)
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return tokens
+
+
+class HashingEmbedder(Embedder):
+    """
+    哈希向量化（无需模型文件，离线可用）
+
+    特征词经 CRC32 哈希到固定维度并带符号累加，词频取对数，
+    效果接近 TF 加权的词袋模型，适合作为没有安装嵌入模型时的回退。
+    """
+
+    def __init__(self, dim: int = 512):
+        self._dim = dim
+
+    @property
+    def name(self) -> str:
+        return f"hashing-v1-{self._dim}"
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token, count in Counter(_tokens(text)).items():
+                h = zlib.crc32(token.encode("utf-8"))
+                weight = 1.0 + math.log(count)
+                matrix[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return matrix
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """sentence-transformers 本地模型（需要安装 sentence-transformers）"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(model_name)
+        self._model_name = model_name
+        self._dim = self._model.get_sentence_embedding_dimension()
+
+    @property
+    def name(self) -> str:
+        return f"st-{self._model_name}-{self._dim}"
+
+    @property
+    def dim(self) -> int:
+        return self._dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self._model.encode(
+            texts,
+            batch_size=32,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.astype(np.float32, copy=False)
+
+
+def load_embedder(model: str, dim: int = 512) -> Embedder:
+    """
+    按配置加载嵌入模型
+
+    Args:
+        model: "hashing" 或 sentence-transformers 模型名/本地路径
+        dim: 哈希向量维度
+
+    Returns:
+        Embedder: 嵌入模型；加载失败时回退为哈希向量化
+    """
+    if model and model != "hashing":
+        try:
+            return SentenceTransformerEmbedder(model)
+        except Exception:
+            logger.warning("嵌入模型 %s 加载失败，使用哈希向量化", model, exc_info=True)
+    return HashingEmbedder(dim)
@@ -0,0 +1,181 @@
+"""目录扫描工具 - 基于 os.scandir 的分页、排序和过滤"""
+import base64
+import fnmatch
+import json
+import os
+from typing import List, Literal, Optional
+
+SortField = Literal["name", "mtime", "size"]
+SortOrder = Literal["asc", "desc"]
+
+
+def encode_cursor(sort: SortField, key: list) -> str:
+    """把排序字段和排序键编码为不透明游标"""
+    raw = json.dumps([sort, *key], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, sort: SortField) -> list:
+    """
+    解码游标
+
+    游标只能用于生成它时的排序字段，换用其他排序时视为非法。
+
+    Args:
+        cursor: 上一页返回的游标
+        sort: 当前请求的排序字段
+
+    Raises:
+        ValueError: 游标格式非法或与排序字段不匹配
+    """
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"非法游标: {cursor}")
+    if not isinstance(value, list) or len(value) != 3 or value[0] != sort:
+        raise ValueError(f"非法游标: {cursor}")
+    key = value[1:]
+    # 键的类型须与 _sort_key 一致，否则比较时会抛出 TypeError
+    first_type = str if sort == "name" else (int, float)
+    if not isinstance(key[0], first_type) or isinstance(key[0], bool) or not isinstance(key[1], str):
+        raise ValueError(f"非法游标: {cursor}")
+    return key
+
+
+def _matches(name: str, patterns: Optional[List[str]], extensions: Optional[set[str]]) -> bool:
+    if extensions and os.path.splitext(name)[1].lower() not in extensions:
+        return False
+    if patterns and not any(fnmatch.fnmatch(name, p) for p in patterns):
+        return False
+    return True
+
+
+def _sort_key(item: dict, sort: SortField) -> list:
+    # 排序键最后附加名称，保证键唯一，游标分页结果稳定
+    if sort == "name":
+        return [item["name"], item["name"]]
+    return [item[sort] or 0, item["name"]]
+
+
+def directory_size(path: str) -> int:
+    """
+    统计目录下所有文件的字节数（同步，应在工作线程中调用）
+
+    不跟随符号链接，无法访问的条目按 0 计。
+    """
+    total = 0
+    try:
+        entries = os.scandir(path)
+    except OSError:
+        return 0
+    with entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    total += directory_size(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                continue
+    return total
+
+
+def scan_directory(
+    path: str,
+    rel_prefix: str,
+    depth: int = 1,
+    sort: SortField = "name",
+    order: SortOrder = "asc",
+    patterns: Optional[List[str]] = None,
+    extensions: Optional[set[str]] = None,
+    details: bool = False,
+    after: Optional[list] = None,
+    limit: Optional[int] = None
+) -> tuple[List[dict], Optional[list]]:
+    """
+    扫描目录（同步，应在工作线程中调用）
+
+    文件类型直接取自 DirEntry，只有需要大小/修改时间时才 stat。
+    过滤条件只作用于文件，文件夹总是保留以便逐层展开。
+    分页只作用于当前层，depth > 1 时子目录内容完整返回。
+
+    Args:
+        path: 目录绝对路径
+        rel_prefix: 目录相对项目根目录的路径（空字符串表示根目录）
+        depth: 展开层数，1 表示只列当前目录
+        sort: 排序字段
+        order: 排序方向
+        patterns: 文件名 glob 模式
+        extensions: 扩展名集合（小写，带点）
+        details: 是否返回大小和修改时间
+        after: 上一页最后一项的排序键
+        limit: 每页数量，None 表示不分页
+
+    Returns:
+        tuple[List[dict], Optional[list]]: (FileNode 字典列表, 下一页游标键)
+    """
+    need_stat = details or sort != "name"
+    items = []
+
+    with os.scandir(path) as entries:
+        for entry in entries:
+            # 跳过隐藏文件
+            if entry.name.startswith("."):
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if not is_dir and not _matches(entry.name, patterns, extensions):
+                continue
+
+            size = mtime = None
+            if need_stat:
+                try:
+                    info = entry.stat()
+                except OSError:
+                    continue
+                size = None if is_dir else info.st_size
+                mtime = info.st_mtime
+
+            items.append({
+                "name": entry.name,
+                "path": f"{rel_prefix}/{entry.name}" if rel_prefix else entry.name,
+                "type": "folder" if is_dir else "file",
+                "extension": None if is_dir else os.path.splitext(entry.name)[1],
+                "size": size,
+                "mtime": mtime,
+                "_abs": entry.path,
+            })
+
+    reverse = order == "desc"
+    items.sort(key=lambda item: _sort_key(item, sort), reverse=reverse)
+
+    if after is not None:
+        if reverse:
+            items = [item for item in items if _sort_key(item, sort) < after]
+        else:
+            items = [item for item in items if _sort_key(item, sort) > after]
+
+    next_key = None
+    if limit is not None and len(items) > limit:
+        items = items[:limit]
+        next_key = _sort_key(items[-1], sort)
+
+    for item in items:
+        abs_path = item.pop("_abs")
+        if item["type"] == "folder" and depth > 1:
+            item["children"], _ = scan_directory(
+                abs_path,
+                item["path"],
+                depth=depth - 1,
+                sort=sort,
+                order=order,
+                patterns=patterns,
+                extensions=extensions,
+                details=details
+            )
+        else:
+            item["children"] = None
+
+    return items, next_key
@@ -0,0 +1,71 @@
+"""HTTP 工具函数 - ETag 与 Range 处理"""
+import re
+from typing import Optional
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(ValueError):
+    """Range 请求超出文件范围"""
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """
+    判断 If-None-Match 是否与当前 ETag 匹配
+
+    Args:
+        header: If-None-Match 请求头
+        etag: 当前 ETag（带引号）
+
+    Returns:
+        bool: 是否匹配
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    # 弱比较：忽略 W/ 前缀
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    解析单段 Range 请求头
+
+    多段 Range 或无法解析的格式按规范忽略，返回完整内容。
+
+    Args:
+        header: Range 请求头，如 "bytes=0-1023"、"bytes=1024-"、"bytes=-512"
+        size: 文件大小
+
+    Returns:
+        Optional[tuple[int, int]]: 闭区间 (start, end)；None 表示返回完整内容
+
+    Raises:
+        RangeNotSatisfiable: 范围超出文件大小
+    """
+    if not header:
+        return None
+
+    match = _RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # 后缀范围：最后 N 个字节
+        length = int(last)
+        # 空文件没有可返回的字节
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
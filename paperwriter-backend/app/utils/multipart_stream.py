@@ -0,0 +1,129 @@
+"""流式 multipart 解析 - 文件内容边解析边交给调用方，不在内存或临时目录中缓存"""
+from typing import AsyncGenerator, AsyncIterator, Union
+from multipart.multipart import MultipartParser, parse_options_header
+
+# 普通表单字段的大小上限，防止用超大字段占满内存
+MAX_FIELD_SIZE = 64 * 1024
+
+# 事件类型：
+#   ("field", 字段名, 值)
+#   ("file_start", 字段名, 文件名)
+#   ("file_data", 字节块)
+#   ("file_end",)
+MultipartEvent = Union[tuple[str, str, str], tuple[str, bytes], tuple[str]]
+
+
+class _PartCollector:
+    """把 MultipartParser 的同步回调收集为事件列表"""
+
+    def __init__(self, charset: str):
+        self.charset = charset
+        self.events: list = []
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._field_name = ""
+        self._is_file = False
+        self._field_data = bytearray()
+        self.in_part = False  # 是否有尚未结束的分段
+        self.ended = False  # 是否读到了结束边界
+
+    def on_part_begin(self):
+        self.in_part = True
+        self._disposition = b""
+        self._is_file = False
+        self._field_data = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if b"name" not in options:
+            raise ValueError("multipart 分段缺少 name")
+        self._field_name = options[b"name"].decode(self.charset, errors="replace")
+        if b"filename" in options:
+            self._is_file = True
+            filename = options[b"filename"].decode(self.charset, errors="replace")
+            self.events.append(("file_start", self._field_name, filename))
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._is_file:
+            self.events.append(("file_data", data[start:end]))
+            return
+        self._field_data += data[start:end]
+        if len(self._field_data) > MAX_FIELD_SIZE:
+            raise ValueError(f"表单字段过大: {self._field_name}")
+
+    def on_part_end(self):
+        self.in_part = False
+        if self._is_file:
+            self.events.append(("file_end",))
+        else:
+            value = self._field_data.decode(self.charset, errors="replace")
+            self.events.append(("field", self._field_name, value))
+
+    def on_end(self):
+        self.ended = True
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_end": self.on_end,
+        }
+
+
+async def iter_multipart(
+    content_type: str,
+    stream: AsyncIterator[bytes]
+) -> AsyncGenerator[MultipartEvent, None]:
+    """
+    流式解析 multipart/form-data 请求体
+
+    每读到一块请求体就解析并产出对应事件，文件内容以原始字节块产出，
+    由调用方决定写到哪里以及何时中止。
+
+    Args:
+        content_type: Content-Type 请求头
+        stream: 请求体字节流
+
+    Yields:
+        MultipartEvent: 解析事件
+
+    Raises:
+        ValueError: 请求体格式非法，或请求体在结束边界之前中断
+    """
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise ValueError("multipart 请求缺少 boundary")
+    charset = params.get(b"charset", b"utf-8").decode("latin-1")
+
+    collector = _PartCollector(charset)
+    parser = MultipartParser(boundary, collector.callbacks())
+
+    async for chunk in stream:
+        parser.write(chunk)
+        events, collector.events = collector.events, []
+        for event in events:
+            yield event
+
+    parser.finalize()
+    # 请求体被截断时分段没有结束，不能把已收到的部分当作完整文件
+    if collector.in_part or not collector.ended:
+        raise ValueError("multipart 请求体不完整：缺少结束边界")
@@ -0,0 +1,124 @@
+"""PDF 文本与元数据提取（在子进程中运行）"""
+import re
+from typing import Optional
+
+DOI_PATTERN = re.compile(r"\b(10\.\d{4,9}/[^\s\"<>]+)", re.IGNORECASE)
+YEAR_PATTERN = re.compile(r"\b(19[5-9]\d|20\d{2})\b")
+# PDF 日期格式 D:YYYYMMDDHHmmSS
+PDF_DATE_PATTERN = re.compile(r"^(?:D:)?(\d{4})")
+
+# 作者字段中常见的分隔符
+_AUTHOR_SPLIT = re.compile(r"\s*(?:;|,|\band\b|&|、|，)\s*")
+
+
+def _clean_doi(doi: str) -> str:
+    # 去掉句末标点等误匹配的尾部字符
+    return doi.rstrip(".,;)]}").lower()
+
+
+def _first_line(text: str, min_length: int = 8) -> Optional[str]:
+    for line in text.splitlines():
+        line = line.strip()
+        if len(line) >= min_length:
+            return line[:300]
+    return None
+
+
+def extract_pdf(path: str, max_pages: int = 500) -> dict:
+    """
+    提取 PDF 的文本、元数据和页码映射
+
+    函数只依赖参数和 pypdf，可在进程池中执行。
+
+    Args:
+        path: PDF 文件路径
+        max_pages: 最多提取的页数
+
+    Returns:
+        dict: {
+            pages: 总页数,
+            text: 全文（各页以换行连接）,
+            page_lines: 每页在全文中的起始行号（从 0 开始）,
+            metadata: {title, authors, year, doi},
+            truncated: 是否因页数上限被截断
+        }
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("PDF 提取需要安装 pypdf")
+
+    reader = PdfReader(path)
+    if reader.is_encrypted:
+        # 只尝试空密码
+        reader.decrypt("")
+
+    page_texts = []
+    page_lines = []
+    line_count = 0
+    for page in reader.pages[:max_pages]:
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            text = ""
+        text = text.replace("\x00", "").rstrip("\n")
+        page_lines.append(line_count)
+        page_texts.append(text)
+        line_count += text.count("\n") + 1
+
+    full_text = "\n".join(page_texts)
+
+    info = {}
+    try:
+        info = dict(reader.metadata or {})
+    except Exception:
+        pass
+
+    title = (info.get("/Title") or "").strip() or None
+    authors_raw = (info.get("/Author") or "").strip()
+    authors = [name for name in _AUTHOR_SPLIT.split(authors_raw) if name] if authors_raw else []
+
+    year = None
+    creation = str(info.get("/CreationDate") or "")
+    match = PDF_DATE_PATTERN.match(creation)
+    if match and 1950 <= int(match.group(1)) <= 2099:
+        year = int(match.group(1))
+
+    # DOI 优先取元数据，其次取前两页正文
+    doi = None
+    for candidate in (str(info.get("/doi") or info.get("/DOI") or ""), "\n".join(page_texts[:2])):
+        match = DOI_PATTERN.search(candidate)
+        if match:
+            doi = _clean_doi(match.group(1))
+            break
+
+    first_page = page_texts[0] if page_texts else ""
+    if title is None:
+        title = _first_line(first_page)
+    if year is None:
+        match = YEAR_PATTERN.search(first_page)
+        if match:
+            year = int(match.group(1))
+
+    return {
+        "pages": len(reader.pages),
+        "text": full_text,
+        "page_lines": page_lines,
+        "metadata": {
+            "title": title,
+            "authors": authors,
+            "year": year,
+            "doi": doi,
+        },
+        "truncated": len(reader.pages) > max_pages,
+    }
+
+
+def page_of_line(page_lines: list[int], line: int) -> int:
+    """根据行号查页码（从 1 开始）"""
+    page = 1
+    for index, start in enumerate(page_lines):
+        if start > line:
+            break
+        page = index + 1
+    return page
@@ -0,0 +1,208 @@
+"""文本分块工具 - 按段落/章节切分文档并计算指纹"""
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import List
+
+# LaTeX 章节命令或 Markdown 标题，出现时总是开始新块
+HEADING_PATTERN = re.compile(
+    r"^\s*(\\(part|chapter|section|subsection|subsubsection|paragraph)\*?\s*[\[{]|#{1,6}\s)"
+)
+
+# 内容定义的分块边界：段落指纹对该值取模为 0 时允许断开，
+# 使块边界只取决于附近段落本身，编辑一处不会让后续所有块错位
+BOUNDARY_MODULUS = 4
+
+
+@dataclass
+class TextChunk:
+    """文档分块"""
+    start_line: int  # 块首行在文档中的行号（从 0 开始）
+    line_count: int
+    text: str
+    fingerprint: str
+
+
+def fingerprint(text: str) -> str:
+    """计算文本指纹（SHA-256）"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def split_paragraphs(content: str) -> List[tuple[int, List[str]]]:
+    """
+    按空行和标题把文档切分为段落
+
+    段落后的空行归入该段落，保证所有段落拼接后覆盖原文的每一行。
+
+    Args:
+        content: 文档内容
+
+    Returns:
+        List[tuple[int, List[str]]]: (起始行号, 行列表)
+    """
+    paragraphs: List[tuple[int, List[str]]] = []
+    current: List[str] = []
+    start = 0
+    closed = False  # 当前段落已出现过 "正文 + 空行"
+
+    for index, line in enumerate(content.split("\n")):
+        if not line.strip():
+            if any(l.strip() for l in current):
+                closed = True
+        elif current and (closed or HEADING_PATTERN.match(line)):
+            paragraphs.append((start, current))
+            current, start, closed = [], index, False
+
+        current.append(line)
+
+    if current:
+        paragraphs.append((start, current))
+
+    return paragraphs
+
+
+def split_chunks(
+    content: str,
+    min_chars: int = 400,
+    max_chars: int = 3000
+) -> List[TextChunk]:
+    """
+    把文档切分为适合单次检查的块
+
+    标题总是开始新块；块长度达到 min_chars 后，在指纹满足条件的段落处断开；
+    达到 max_chars 时强制断开。
+
+    Args:
+        content: 文档内容
+        min_chars: 块的最小字符数
+        max_chars: 块的最大字符数
+
+    Returns:
+        List[TextChunk]: 分块列表，按行号顺序
+    """
+    chunks: List[TextChunk] = []
+    lines: List[str] = []
+    start = 0
+    size = 0
+
+    def flush():
+        nonlocal lines, size
+        if lines:
+            text = "\n".join(lines)
+            chunks.append(TextChunk(
+                start_line=start,
+                line_count=len(lines),
+                text=text,
+                fingerprint=fingerprint(text)
+            ))
+        lines, size = [], 0
+
+    for para_start, para_lines in split_paragraphs(content):
+        if lines and HEADING_PATTERN.match(para_lines[0]):
+            flush()
+        if not lines:
+            start = para_start
+
+        para_text = "\n".join(para_lines)
+        lines.extend(para_lines)
+        size += len(para_text) + 1
+
+        if size >= max_chars:
+            flush()
+        elif size >= min_chars and int(fingerprint(para_text)[:8], 16) % BOUNDARY_MODULUS == 0:
+            flush()
+
+    flush()
+    return chunks
+
+
+def split_passages(content: str, max_chars: int = 800) -> List[tuple[int, str]]:
+    """
+    把文档切分为用于语义检索的片段
+
+    标题总是开始新片段；片段超过 max_chars 的一半后在空行处断开，
+    否则在即将超过 max_chars 时断开；单行超长时按字符拆开。
+
+    Args:
+        content: 文档内容
+        max_chars: 片段的最大字符数
+
+    Returns:
+        List[tuple[int, str]]: (起始行号, 片段文本)，跳过空白片段
+    """
+    passages: List[tuple[int, str]] = []
+    lines: List[str] = []
+    start = 0
+    size = 0
+
+    def flush():
+        nonlocal lines, size
+        text = "\n".join(lines).strip()
+        if text:
+            passages.append((start, text))
+        lines, size = [], 0
+
+    for index, line in enumerate(content.split("\n")):
+        if not line.strip():
+            if size >= max_chars // 2:
+                flush()
+            elif lines:
+                lines.append(line)
+            continue
+
+        if lines and (HEADING_PATTERN.match(line) or size + len(line) > max_chars):
+            flush()
+        if len(line) > max_chars:
+            for offset in range(0, len(line), max_chars):
+                start, lines, size = index, [line[offset:offset + max_chars]], 1
+                flush()
+            continue
+        if not lines:
+            start = index
+        lines.append(line)
+        size += len(line) + 1
+
+    flush()
+    return passages
+
+
+def split_sections(content: str, max_chars: int = 6000) -> List[TextChunk]:
+    """
+    按标题把文档切分为章节
+
+    第一个标题之前的内容单独成节；超过 max_chars 的章节再按 split_chunks 切开。
+
+    Args:
+        content: 文档内容
+        max_chars: 章节的最大字符数
+
+    Returns:
+        List[TextChunk]: 章节列表，按行号顺序
+    """
+    sections: List[TextChunk] = []
+    lines: List[str] = []
+    start = 0
+
+    def flush():
+        text = "\n".join(lines)
+        if len(text) <= max_chars:
+            sections.append(TextChunk(
+                start_line=start,
+                line_count=len(lines),
+                text=text,
+                fingerprint=fingerprint(text)
+            ))
+            return
+        for chunk in split_chunks(text, max_chars // 2, max_chars):
+            chunk.start_line += start
+            sections.append(chunk)
+
+    for index, line in enumerate(content.split("\n")):
+        if lines and HEADING_PATTERN.match(line):
+            flush()
+            lines, start = [], index
+        lines.append(line)
+
+    if lines:
+        flush()
+    return sections
@@ -0,0 +1,151 @@
+"""文本补丁工具 - 应用区间编辑和 unified diff"""
+import bisect
+import re
+from typing import Iterable, List, Literal
+
+OffsetUnit = Literal["utf16", "codepoint"]
+
+_ASTRAL = re.compile("[\U00010000-\U0010FFFF]")
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchConflict(ValueError):
+    """补丁与基准内容不匹配"""
+
+
+def _utf16_to_codepoint(text: str, offsets: Iterable[int]) -> dict[int, int]:
+    """
+    把 UTF-16 码元偏移量转换为 Python 字符串下标
+
+    前端编辑器（JS 字符串）的偏移量以 UTF-16 码元计，
+    BMP 以外的字符（如 emoji）占两个码元。
+    """
+    # 每个 BMP 外字符在 UTF-16 中的起始偏移（第 k 个字符之前多出 k 个码元）
+    astral_starts = [match.start() + k for k, match in enumerate(_ASTRAL.finditer(text))]
+    total_units = len(text) + len(astral_starts)
+
+    result: dict[int, int] = {}
+    for offset in offsets:
+        before = bisect.bisect_left(astral_starts, offset)
+        if offset > total_units or (before and astral_starts[before - 1] + 1 == offset):
+            raise PatchConflict(f"偏移量 {offset} 超出范围或位于代理对中间")
+        result[offset] = offset - before
+    return result
+
+
+def apply_edits(
+    text: str,
+    edits: List[tuple[int, int, str]],
+    unit: OffsetUnit = "utf16"
+) -> str:
+    """
+    应用区间替换编辑
+
+    所有区间都以基准内容为坐标，且互不重叠。
+
+    Args:
+        text: 基准内容
+        edits: (起始偏移, 结束偏移, 替换文本) 列表
+        unit: 偏移量单位
+
+    Returns:
+        str: 编辑后的内容
+
+    Raises:
+        PatchConflict: 区间越界或重叠
+    """
+    if not edits:
+        return text
+
+    # UTF-16 编码长度与字符数不同说明存在 BMP 外字符，需要换算偏移量
+    if unit == "utf16" and len(text.encode("utf-16-le", "surrogatepass")) != 2 * len(text):
+        mapping = _utf16_to_codepoint(text, [o for start, end, _ in edits for o in (start, end)])
+        edits = [(mapping[start], mapping[end], insert) for start, end, insert in edits]
+
+    ordered = sorted(edits, key=lambda edit: (edit[0], edit[1]))
+    parts = []
+    position = 0
+    for start, end, insert in ordered:
+        if start < position or end < start or end > len(text):
+            raise PatchConflict(f"编辑区间非法或重叠: [{start}, {end})")
+        parts.append(text[position:start])
+        parts.append(insert)
+        position = end
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+def apply_unified_diff(text: str, diff: str) -> str:
+    """
+    应用 unified diff
+
+    上下文行和删除行必须与基准内容逐行一致（忽略行尾换行符的差异），否则视为冲突。
+    基准内容使用 CRLF 换行时，新增行也使用 CRLF。
+
+    Args:
+        text: 基准内容
+        diff: unified diff 文本（可包含 ---/+++ 文件头）
+
+    Returns:
+        str: 应用补丁后的内容
+
+    Raises:
+        PatchConflict: 补丁与基准内容不匹配
+    """
+    lines = text.splitlines(keepends=True)
+    crlf = bool(lines) and lines[0].endswith("\r\n")
+    result: List[str] = []
+    position = 0  # 已处理到的基准行号（从 0 开始）
+    diff_lines = diff.splitlines(keepends=True)
+    i = 0
+
+    while i < len(diff_lines):
+        line = diff_lines[i]
+        match = _HUNK_HEADER.match(line)
+        if match is None:
+            # 跳过文件头等非 hunk 内容
+            i += 1
+            continue
+
+        old_start = int(match.group(1))
+        # 行数为 0 时起始行号指向插入位置之前的一行
+        old_count = int(match.group(2)) if match.group(2) is not None else 1
+        hunk_start = old_start - 1 if old_count > 0 else old_start
+        if hunk_start < position or hunk_start > len(lines):
+            raise PatchConflict(f"hunk 位置非法: {line.strip()}")
+
+        result.extend(lines[position:hunk_start])
+        position = hunk_start
+        i += 1
+
+        while i < len(diff_lines) and not diff_lines[i].startswith("@@"):
+            hunk_line = diff_lines[i]
+            tag, body = hunk_line[:1], hunk_line[1:]
+            if tag == "\\":
+                # "\ No newline at end of file"：去掉上一行的换行符
+                if result and result[-1].endswith("\n") and diff_lines[i - 1][:1] in (" ", "+"):
+                    result[-1] = result[-1].removesuffix("\n").removesuffix("\r")
+                i += 1
+                continue
+            if tag in (" ", "-"):
+                if position >= len(lines) or lines[position].rstrip("\r\n") != body.rstrip("\r\n"):
+                    raise PatchConflict(f"第 {position + 1} 行与补丁上下文不一致")
+                if tag == " ":
+                    result.append(lines[position])
+                position += 1
+            elif tag == "+":
+                if crlf and body.endswith("\n") and not body.endswith("\r\n"):
+                    body = body[:-1] + "\r\n"
+                result.append(body)
+            elif hunk_line.strip() == "":
+                # 部分工具会把空的上下文行输出为真正的空行
+                if position >= len(lines) or lines[position].strip():
+                    raise PatchConflict(f"第 {position + 1} 行与补丁上下文不一致")
+                result.append(lines[position])
+                position += 1
+            else:
+                raise PatchConflict(f"无法解析的补丁行: {hunk_line.rstrip()}")
+            i += 1
+
+    result.extend(lines[position:])
+    return "".join(result)
@@ -0,0 +1,90 @@
+"""全文检索文本处理 - 中文分字、查询构造、命中定位"""
+import re
+from typing import List
+
+# CJK 字符（含日文假名、韩文）逐字切分，其余文本交给 FTS5 unicode61 分词
+_CJK_PATTERN = re.compile(r"([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff])")
+
+# 查询词中的 FTS5 语法字符，按普通分隔符处理
+_QUERY_SPLIT = re.compile(r"[\s\"]+")
+
+
+def segment(text: str) -> str:
+    """
+    把 CJK 字符用空格隔开，使 unicode61 分词器按单字建立索引
+
+    中文没有空格分词，整段汉字会被当成一个词；按单字索引后，
+    查询时把连续汉字作为短语匹配，任意长度的中文片段都能命中。
+    """
+    return _CJK_PATTERN.sub(r" \1 ", text)
+
+
+def query_terms(query: str) -> List[str]:
+    """拆分查询词（按空白分隔，去掉空项和重复项）"""
+    terms = []
+    for term in _QUERY_SPLIT.split(query):
+        if term and term.lower() not in (t.lower() for t in terms):
+            terms.append(term)
+    return terms
+
+
+def build_match_query(terms: List[str]) -> str:
+    """
+    构造 FTS5 MATCH 表达式：每个查询词作为一个短语，多个词之间为 AND
+
+    以非中文结尾的词按前缀匹配，输入 "meth" 也能命中 "method"。
+
+    Args:
+        terms: 查询词列表
+
+    Returns:
+        str: MATCH 表达式；没有可检索内容时返回空字符串
+    """
+    phrases = []
+    for term in terms:
+        tokens = segment(term).split()
+        if tokens:
+            phrase = '"' + " ".join(tokens) + '"'
+            if not _CJK_PATTERN.fullmatch(tokens[-1]):
+                phrase += " *"
+            phrases.append(phrase)
+    return " AND ".join(phrases)
+
+
+def find_hits(content: str, terms: List[str], max_hits: int = 20, context: int = 40) -> List[dict]:
+    """
+    定位查询词在内容中的出现位置（不区分大小写）
+
+    Args:
+        content: 文件内容
+        terms: 查询词列表
+        max_hits: 最多返回的命中数
+        context: 片段中命中位置前后保留的字符数
+
+    Returns:
+        List[dict]: [{line, column, length, snippet}]，行号和列号从 0 开始
+    """
+    lowered_terms = [term.lower() for term in terms if term]
+    hits = []
+    for line_no, line in enumerate(content.splitlines()):
+        lowered = line.lower()
+        for term in lowered_terms:
+            start = lowered.find(term)
+            while start != -1:
+                begin = max(0, start - context)
+                end = min(len(line), start + len(term) + context)
+                snippet = line[begin:end].strip()
+                if begin > 0:
+                    snippet = "…" + snippet
+                if end < len(line):
+                    snippet = snippet + "…"
+                hits.append({
+                    "line": line_no,
+                    "column": start,
+                    "length": len(term),
+                    "snippet": snippet,
+                })
+                if len(hits) >= max_hits:
+                    return hits
+                start = lowered.find(term, start + len(term))
+    return hits
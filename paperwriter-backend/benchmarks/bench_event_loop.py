@@ -0,0 +1,129 @@
+"""事件循环阻塞基准测试
+
+在本地模拟 DashScope 服务上同时发起 N 个流式生成请求（/api/v1/ai/analyze-idea），
+同时持续探测无关接口 /api/v1/health，统计其延迟分位数。
+
+用法（在 paperwriter-backend 目录下）:
+    python benchmarks/bench_event_loop.py                # 线程池传输层
+    python benchmarks/bench_event_loop.py --inline       # 旧实现：在事件循环中直接调用 SDK
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+backend_root = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+os.environ.setdefault("DASHSCOPE_API_KEY", "benchmark")
+# 每个请求都要真实调用上游：关闭合并进行中的相同调用，放开并发上限
+os.environ.setdefault("AI_SINGLE_FLIGHT_ENABLED", "false")
+os.environ.setdefault("AI_MAX_CONCURRENT_REQUESTS", "1000")
+
+import dashscope  # noqa: E402
+from dashscope import Generation  # noqa: E402
+from fake_dashscope import FakeDashScope, start_server  # noqa: E402
+
+
+class InlineLLMClient:
+    """旧实现：在事件循环线程上直接调用同步 SDK"""
+
+    async def call(self, **kwargs):
+        return Generation.call(stream=False, **kwargs)
+
+    async def stream(self, **kwargs):
+        for response in Generation.call(stream=True, **kwargs):
+            yield response
+
+
+def stream_generation(port: int) -> int:
+    """发起一次流式生成请求并读完响应，返回收到的字节数"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    body = json.dumps({"project_id": "bench", "idea_content": "基准测试"})
+    conn.request("POST", "/api/v1/ai/analyze-idea", body, {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    received = 0
+    while True:
+        data = response.read(1024)
+        if not data:
+            break
+        received += len(data)
+    conn.close()
+    return received
+
+
+def probe_health(port: int, stop: threading.Event, interval: float) -> list[float]:
+    """循环请求健康检查接口，返回每次请求的延迟（毫秒）"""
+    latencies = []
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    while not stop.is_set():
+        start = time.perf_counter()
+        conn.request("GET", "/api/v1/health")
+        conn.getresponse().read()
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(interval)
+    conn.close()
+    return latencies
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=50, help="并发流式生成数")
+    parser.add_argument("--chunks", type=int, default=40, help="每次生成的块数")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="模拟服务每块间隔（秒）")
+    parser.add_argument("--probe-interval", type=float, default=0.01, help="健康检查探测间隔（秒）")
+    parser.add_argument("--inline", action="store_true", help="使用旧的事件循环内同步调用作为对照")
+    parser.add_argument("--fake-port", type=int, default=18081)
+    parser.add_argument("--app-port", type=int, default=18080)
+    args = parser.parse_args()
+
+    fake = FakeDashScope(chunks=args.chunks, chunk_delay=args.chunk_delay)
+    fake.start(args.fake_port)
+    dashscope.base_http_api_url = f"http://127.0.0.1:{args.fake_port}/api/v1"
+
+    from app.main import app
+    import app.core.ai_service as ai_service_module
+    if args.inline:
+        ai_service_module.llm_client = InlineLLMClient()
+
+    start_server(app, args.app_port)
+
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=args.streams + 1) as pool:
+        probe = pool.submit(probe_health, args.app_port, stop, args.probe_interval)
+        # 先采集空载基线
+        time.sleep(0.5)
+        started = time.perf_counter()
+        streams = [pool.submit(stream_generation, args.app_port) for _ in range(args.streams)]
+        total_bytes = sum(f.result() for f in streams)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        latencies = probe.result()
+
+    mode = "inline (旧实现)" if args.inline else "thread pool"
+    print(f"模式: {mode}")
+    print(f"并发流: {args.streams}  总耗时: {elapsed:.2f}s  接收字节: {total_bytes}")
+    print(f"/api/v1/health 请求数: {len(latencies)}")
+    print(
+        f"延迟 ms  p50={statistics.median(latencies):.2f}  "
+        f"p95={percentile(latencies, 95):.2f}  "
+        f"p99={percentile(latencies, 99):.2f}  "
+        f"max={max(latencies):.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""补丁写入基准测试
+
+对比整文件保存（/api/v1/files/write）与补丁保存（/api/v1/files/patch）
+在不同文档大小下的请求体字节数和服务端 CPU 时间。
+每次保存模拟一次典型编辑：在文档中部改动一句话。
+
+用法（在 paperwriter-backend 目录下）:
+    python benchmarks/bench_patch_write.py
+    python benchmarks/bench_patch_write.py --sizes 10,100,1000 --rounds 50
+"""
+import argparse
+import difflib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+backend_root = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_root))
+
+os.environ.setdefault("DASHSCOPE_API_KEY", "benchmark")
+os.environ.setdefault("PROJECTS_ROOT", tempfile.mkdtemp(prefix="bench_patch_"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+
+PROJECT_ID = "bench"
+FILE_PATH = "主体/main.tex"
+PARAGRAPH = "第 {} 段：这是一段用于基准测试的正文内容，包含中文和 English words 以及公式 $E=mc^2$。\n"
+
+
+def make_document(size_kb: int) -> str:
+    """生成约 size_kb KB 的文档（每行内容不同，贴近真实文稿）"""
+    repeat = max(1, size_kb * 1024 // len(PARAGRAPH.format(0).encode("utf-8")))
+    return "".join(PARAGRAPH.format(i) for i in range(repeat))
+
+
+def edit_document(content: str, round_no: int) -> tuple[str, dict]:
+    """在文档中部插入一句话，返回 (新内容, 区间编辑)"""
+    middle = content.rfind("\n", 0, len(content) // 2) + 1
+    insert = f"第 {round_no} 次修改。"
+    return content[:middle] + insert + content[middle:], {"from": middle, "to": middle, "text": insert}
+
+
+def timed_post(client: TestClient, url: str, body: bytes) -> tuple[float, dict]:
+    """发送请求，返回 (服务端 CPU 毫秒, 响应 JSON)"""
+    start = time.process_time()
+    response = client.post(url, content=body, headers={"Content-Type": "application/json"})
+    elapsed = (time.process_time() - start) * 1000
+    response.raise_for_status()
+    return elapsed, response.json()
+
+
+def bench_size(client: TestClient, size_kb: int, rounds: int) -> dict:
+    content = make_document(size_kb)
+    _, result = timed_post(client, "/api/v1/files/write", json.dumps({
+        "project_id": PROJECT_ID, "file_path": FILE_PATH, "content": content
+    }).encode("utf-8"))
+    etag = result["etag"]
+
+    stats = {mode: {"bytes": [], "cpu": []} for mode in ("write", "edits", "diff")}
+    for round_no in range(rounds):
+        for mode in ("write", "edits", "diff"):
+            new_content, edit = edit_document(content, round_no)
+            if mode == "write":
+                url = "/api/v1/files/write"
+                payload = {"project_id": PROJECT_ID, "file_path": FILE_PATH, "content": new_content}
+            elif mode == "edits":
+                url = "/api/v1/files/patch"
+                payload = {"project_id": PROJECT_ID, "file_path": FILE_PATH,
+                           "base_etag": etag, "edits": [edit]}
+            else:
+                url = "/api/v1/files/patch"
+                diff = "".join(difflib.unified_diff(
+                    content.splitlines(keepends=True),
+                    new_content.splitlines(keepends=True),
+                    n=3
+                ))
+                payload = {"project_id": PROJECT_ID, "file_path": FILE_PATH,
+                           "base_etag": etag, "diff": diff}
+
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            cpu, result = timed_post(client, url, body)
+            stats[mode]["bytes"].append(len(body))
+            stats[mode]["cpu"].append(cpu)
+            content, etag = new_content, result["etag"]
+
+    return {
+        mode: {
+            "bytes": int(statistics.mean(values["bytes"])),
+            "cpu_ms": statistics.median(values["cpu"]),
+        }
+        for mode, values in stats.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="补丁写入基准测试")
+    parser.add_argument("--sizes", default="10,100,1000,5000", help="文档大小（KB），逗号分隔")
+    parser.add_argument("--rounds", type=int, default=20, help="每种大小的保存次数")
+    args = parser.parse_args()
+
+    Path(os.environ["PROJECTS_ROOT"], PROJECT_ID, "主体").mkdir(parents=True, exist_ok=True)
+
+    print(f"{'大小':>8} {'方式':>6} {'请求字节':>12} {'CPU ms(中位数)':>16}")
+    with TestClient(app) as client:
+        for size_kb in [int(s) for s in args.sizes.split(",")]:
+            result = bench_size(client, size_kb, args.rounds)
+            for mode, values in result.items():
+                print(f"{size_kb:>6}KB {mode:>6} {values['bytes']:>12} {values['cpu_ms']:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
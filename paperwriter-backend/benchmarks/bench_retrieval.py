@@ -0,0 +1,110 @@
+"""语义检索基准测试
+
+生成包含约 N 个检索片段的参考资料目录，建立向量索引后测量 /api/v1/files/retrieve 的延迟分位数。
+默认使用哈希向量化（EMBEDDING_MODEL=hashing），不需要下载模型。
+
+用法（在 paperwriter-backend 目录下）:
+    python benchmarks/bench_retrieval.py
+    python benchmarks/bench_retrieval.py --passages 20000 --queries 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+backend_root = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_root))
+
+os.environ.setdefault("DASHSCOPE_API_KEY", "benchmark")
+os.environ.setdefault("PROJECTS_ROOT", tempfile.mkdtemp(prefix="bench_retrieval_"))
+
+import httpx  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.core.retrieval_service import retrieval_service  # noqa: E402
+from app.main import app  # noqa: E402
+
+PROJECT_ID = "bench"
+CHINESE_WORDS = [
+    "研究", "方法", "实验", "结果", "模型", "数据", "分析", "理论", "系统", "算法",
+    "网络", "学习", "优化", "性能", "结构", "设计", "评估", "框架", "特征", "训练",
+]
+ENGLISH_WORDS = [
+    "transformer", "attention", "gradient", "baseline", "dataset", "benchmark",
+    "convolution", "embedding", "regression", "inference", "sampling", "latency",
+]
+PASSAGES_PER_FILE = 10
+
+
+def make_paragraph(rng: random.Random) -> str:
+    words = [rng.choice(CHINESE_WORDS) for _ in range(rng.randint(210, 340))]
+    for _ in range(rng.randint(2, 6)):
+        words.insert(rng.randrange(len(words)), f" {rng.choice(ENGLISH_WORDS)} ")
+    return "".join(words) + "。"
+
+
+def generate_project(root: Path, passages: int, seed: int = 42):
+    rng = random.Random(seed)
+    folder = root / "引用"
+    folder.mkdir(parents=True, exist_ok=True)
+    for i in range(passages // PASSAGES_PER_FILE):
+        # 段落之间用空行分隔，每段略超过片段长度的一半，切分后一段一个片段
+        text = "\n\n".join(make_paragraph(rng) for _ in range(PASSAGES_PER_FILE))
+        (folder / f"ref{i:05d}.md").write_text(text, encoding="utf-8")
+
+
+async def run(passages: int, queries: int, top_k: int):
+    project_path = settings.PROJECTS_ROOT / PROJECT_ID
+    if not project_path.exists():
+        started = time.perf_counter()
+        generate_project(project_path, passages)
+        print(f"生成约 {passages} 个片段: {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    index = await retrieval_service.wait_ready(PROJECT_ID, project_path)
+    print(f"建立向量索引（{index.passage_count} 个片段）: {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(7)
+    query_set = [
+        "".join(rng.choice(CHINESE_WORDS) for _ in range(rng.randint(3, 8))) + " " + rng.choice(ENGLISH_WORDS)
+        for _ in range(queries)
+    ]
+
+    latencies = []
+    server_times = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for query in query_set:
+            started = time.perf_counter()
+            response = await client.get("/api/v1/files/retrieve", params={
+                "project_id": PROJECT_ID, "q": query, "top_k": top_k
+            })
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+            server_times.append(response.json()["took_ms"])
+
+    latencies.sort()
+    server_times.sort()
+    print(f"查询 {len(latencies)} 次（top_k={top_k}）:")
+    print(f"  p50 {statistics.median(latencies):.1f} ms")
+    print(f"  p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms")
+    print(f"  max {latencies[-1]:.1f} ms")
+    print(f"  服务端检索耗时（took_ms）p50 {statistics.median(server_times):.1f} ms, "
+          f"p95 {server_times[int(len(server_times) * 0.95) - 1]:.1f} ms")
+    retrieval_service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语义检索基准测试")
+    parser.add_argument("--passages", type=int, default=5000, help="片段数")
+    parser.add_argument("--queries", type=int, default=200, help="查询次数")
+    parser.add_argument("--top-k", type=int, default=5, help="每次返回的片段数")
+    args = parser.parse_args()
+    asyncio.run(run(args.passages, args.queries, args.top_k))
+
+
+if __name__ == "__main__":
+    main()
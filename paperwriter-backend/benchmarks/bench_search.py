@@ -0,0 +1,108 @@
+"""全文检索基准测试
+
+生成一个包含 N 个文本文件的项目，构建全文索引后测量 /api/v1/files/search 的延迟分位数。
+词表很小，几乎每个查询词都出现在所有文件中，属于排序开销最大的情况。
+
+用法（在 paperwriter-backend 目录下）:
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --files 10000 --queries 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+backend_root = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_root))
+
+os.environ.setdefault("DASHSCOPE_API_KEY", "benchmark")
+os.environ.setdefault("PROJECTS_ROOT", tempfile.mkdtemp(prefix="bench_search_"))
+
+import httpx  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.core.search_index import search_index_service  # noqa: E402
+from app.main import app  # noqa: E402
+
+PROJECT_ID = "bench"
+CHINESE_WORDS = [
+    "研究", "方法", "实验", "结果", "模型", "数据", "分析", "理论", "系统", "算法",
+    "网络", "学习", "优化", "性能", "结构", "设计", "评估", "框架", "特征", "训练",
+]
+ENGLISH_WORDS = [
+    "transformer", "attention", "gradient", "baseline", "dataset", "benchmark",
+    "convolution", "embedding", "regression", "inference", "sampling", "latency",
+]
+EXTENSIONS = [".tex", ".md", ".txt", ".py"]
+
+
+def make_line(rng: random.Random) -> str:
+    words = [rng.choice(CHINESE_WORDS) for _ in range(rng.randint(4, 12))]
+    words.insert(rng.randrange(len(words)), rng.choice(ENGLISH_WORDS))
+    return "".join(words) + "。\n"
+
+
+def generate_project(root: Path, files: int, lines: int, seed: int = 42):
+    rng = random.Random(seed)
+    for i in range(files):
+        folder = root / f"dir{i % 100:02d}"
+        folder.mkdir(parents=True, exist_ok=True)
+        text = "".join(make_line(rng) for _ in range(lines))
+        (folder / f"file{i:05d}{EXTENSIONS[i % len(EXTENSIONS)]}").write_text(text, encoding="utf-8")
+
+
+async def run(files: int, lines: int, queries: int, limit: int):
+    project_path = settings.PROJECTS_ROOT / PROJECT_ID
+    if not project_path.exists():
+        started = time.perf_counter()
+        generate_project(project_path, files, lines)
+        print(f"生成 {files} 个文件: {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    await search_index_service.wait_ready(PROJECT_ID, project_path)
+    print(f"构建索引: {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(7)
+    query_set = (
+        [rng.choice(CHINESE_WORDS) for _ in range(queries // 3)]
+        + [rng.choice(ENGLISH_WORDS)[:5] for _ in range(queries // 3)]
+        + [f"{rng.choice(CHINESE_WORDS)} {rng.choice(ENGLISH_WORDS)}" for _ in range(queries - 2 * (queries // 3))]
+    )
+
+    latencies = []
+    server_times = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for query in query_set:
+            started = time.perf_counter()
+            response = await client.get("/api/v1/files/search", params={
+                "project_id": PROJECT_ID, "q": query, "limit": limit
+            })
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+            server_times.append(response.json()["took_ms"])
+
+    latencies.sort()
+    print(f"查询 {len(latencies)} 次（limit={limit}）:")
+    print(f"  p50 {statistics.median(latencies):.1f} ms")
+    print(f"  p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms")
+    print(f"  max {latencies[-1]:.1f} ms")
+    print(f"  服务端检索耗时（took_ms）p50 {statistics.median(server_times):.1f} ms")
+    search_index_service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全文检索基准测试")
+    parser.add_argument("--files", type=int, default=10000, help="文件数")
+    parser.add_argument("--lines", type=int, default=20, help="每个文件的行数")
+    parser.add_argument("--queries", type=int, default=150, help="查询次数")
+    parser.add_argument("--limit", type=int, default=20, help="每次返回的文件数")
+    args = parser.parse_args()
+    asyncio.run(run(args.files, args.lines, args.queries, args.limit))
+
+
+if __name__ == "__main__":
+    main()
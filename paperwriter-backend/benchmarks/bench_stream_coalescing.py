@@ -0,0 +1,95 @@
+"""流式输出合并基准测试
+
+在本地模拟 DashScope 服务上同时发起 N 个流式生成请求（/api/v1/ai/analyze-idea），
+统计客户端收到的 SSE 事件数（帧数）、字节数和服务端 CPU 时间。
+
+服务端 CPU = 进程 CPU 时间 - 客户端线程 CPU 时间（包含模拟 DashScope 服务，两种模式相同）。
+
+用法（在 paperwriter-backend 目录下）:
+    python benchmarks/bench_stream_coalescing.py               # 30ms / 256B 合并窗口
+    python benchmarks/bench_stream_coalescing.py --per-token   # 对照：每个上游块一帧
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+backend_root = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_root))
+sys.path.insert(0, str(Path(__file__).parent))
+
+os.environ.setdefault("DASHSCOPE_API_KEY", "benchmark")
+# 每个请求都要真实调用上游：关闭合并进行中的相同调用，放开并发上限
+os.environ.setdefault("AI_SINGLE_FLIGHT_ENABLED", "false")
+os.environ.setdefault("AI_MAX_CONCURRENT_REQUESTS", "1000")
+
+
+def stream_generation(port: int, index: int) -> dict:
+    """发起一次流式生成请求并读完响应，返回帧数、字节数和本线程 CPU 时间"""
+    cpu_start = time.thread_time()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    body = json.dumps({"project_id": f"bench-{index}", "idea_content": f"基准测试 {index}"})
+    conn.request("POST", "/api/v1/ai/analyze-idea", body, {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    received = b""
+    while True:
+        data = response.read1(65536)
+        if not data:
+            break
+        received += data
+    conn.close()
+    text = received.decode("utf-8")
+    return {
+        "frames": text.count("\nid: ") + text.startswith("id: "),
+        "bytes": len(received),
+        "cpu": time.thread_time() - cpu_start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=20, help="并发流式生成数")
+    parser.add_argument("--chunks", type=int, default=400, help="每次生成的上游块数")
+    parser.add_argument("--chunk-delay", type=float, default=0.003, help="模拟服务每块间隔（秒）")
+    parser.add_argument("--per-token", action="store_true", help="对照：关闭合并，每个上游块发送一帧")
+    parser.add_argument("--fake-port", type=int, default=18083)
+    parser.add_argument("--app-port", type=int, default=18082)
+    args = parser.parse_args()
+
+    if args.per_token:
+        os.environ["STREAM_COALESCE_MS"] = "0"
+        os.environ["STREAM_COALESCE_BYTES"] = "1"
+
+    import dashscope
+    from fake_dashscope import FakeDashScope, start_server
+
+    fake = FakeDashScope(chunks=args.chunks, chunk_text="字", chunk_delay=args.chunk_delay, latency=0)
+    fake.start(args.fake_port)
+    dashscope.base_http_api_url = f"http://127.0.0.1:{args.fake_port}/api/v1"
+
+    from app.main import app
+    start_server(app, args.app_port)
+
+    cpu_start = time.process_time()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.streams) as pool:
+        results = list(pool.map(lambda i: stream_generation(args.app_port, i), range(args.streams)))
+    elapsed = time.perf_counter() - started
+    server_cpu = time.process_time() - cpu_start - sum(r["cpu"] for r in results)
+
+    frames = sum(r["frames"] for r in results)
+    mode = "per-token (旧实现)" if args.per_token else "coalesced"
+    print(f"模式: {mode}")
+    print(f"并发流: {args.streams}  每流上游块数: {args.chunks}  总耗时: {elapsed:.2f}s")
+    print(f"总帧数: {frames}  每流帧数(中位数): {statistics.median(r['frames'] for r in results):.0f}")
+    print(f"帧/秒: {frames / elapsed:.0f}  接收字节: {sum(r['bytes'] for r in results)}")
+    print(f"服务端 CPU: {server_cpu:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
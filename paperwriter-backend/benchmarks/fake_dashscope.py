@@ -0,0 +1,83 @@
+"""本地模拟 DashScope 服务 - 供基准测试和 tests/test_stream_linear.py 使用
+
+按 DashScope 文本生成接口的协议返回结果：
+- 请求头带 X-DashScope-SSE: enable 时以 SSE 流式返回
+- 否则返回一次性 JSON 响应
+"""
+import asyncio
+import json
+import threading
+import time
+import uuid
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+
+class FakeDashScope:
+    """模拟 DashScope 服务"""
+
+    def __init__(
+        self,
+        chunks: int = 40,
+        chunk_text: str = "模拟输出",
+        chunk_delay: float = 0.02,
+        latency: float = 0.2
+    ):
+        self.chunks = chunks
+        self.chunk_text = chunk_text
+        self.chunk_delay = chunk_delay
+        self.latency = latency
+        self.app = Starlette(routes=[
+            Route("/{path:path}", self.generation, methods=["POST"])
+        ])
+
+    def _body(self, content: str, finish_reason: str) -> dict:
+        return {
+            "output": {
+                "choices": [{
+                    "finish_reason": finish_reason,
+                    "message": {"role": "assistant", "content": content}
+                }]
+            },
+            "usage": {"input_tokens": 10, "output_tokens": len(content)},
+            "request_id": str(uuid.uuid4())
+        }
+
+    async def generation(self, request: Request):
+        payload = await request.json()
+        incremental = payload.get("parameters", {}).get("incremental_output", False)
+
+        if request.headers.get("X-DashScope-SSE") != "enable":
+            await asyncio.sleep(self.latency)
+            content = self.chunk_text * self.chunks
+            return JSONResponse(self._body(content, "stop"))
+
+        async def events():
+            produced = ""
+            for i in range(self.chunks):
+                await asyncio.sleep(self.chunk_delay)
+                produced += self.chunk_text
+                content = self.chunk_text if incremental else produced
+                finish_reason = "stop" if i == self.chunks - 1 else "null"
+                data = json.dumps(self._body(content, finish_reason), ensure_ascii=False)
+                yield f"id:{i + 1}\nevent:result\n:HTTP_STATUS/200\ndata:{data}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    def start(self, port: int) -> uvicorn.Server:
+        """在后台线程中启动服务"""
+        return start_server(self.app, port)
+
+
+def start_server(app, port: int) -> uvicorn.Server:
+    """在后台线程中启动 ASGI 应用，返回 uvicorn Server 实例"""
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
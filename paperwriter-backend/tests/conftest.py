@@ -0,0 +1,155 @@
+"""测试公共配置 - 在导入应用之前指定独立的存储目录，并提供模型调用替身"""
+import asyncio
+import os
+import tempfile
+import types
+from pathlib import Path
+
+# Settings 在导入时读取环境变量，必须先于任何 app 模块导入
+os.environ["DASHSCOPE_API_KEY"] = "test"
+os.environ["PROJECTS_ROOT"] = tempfile.mkdtemp(prefix="paperwriter-test-")
+os.environ["DATA_ROOT"] = tempfile.mkdtemp(prefix="paperwriter-data-")
+os.environ["TREE_WATCH_MODE"] = "off"
+os.environ["SUMMARY_ENABLED"] = "false"
+os.environ["FILE_WRITE_FSYNC"] = "false"
+os.environ["AI_CACHE_DISK_ENABLED"] = "false"
+
+import pytest  # noqa: E402
+from app.config import settings  # noqa: E402
+
+
+def llm_response(content: str, status_code: int = 200):
+    """构造 DashScope 非流式响应"""
+    message = types.SimpleNamespace(content=content)
+    return types.SimpleNamespace(
+        status_code=status_code,
+        message="error" if status_code != 200 else "",
+        output=types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+    )
+
+
+def parse_sse(body: str) -> list[dict]:
+    """解析 SSE 响应体，返回 [{id, event, data}]（忽略心跳注释行）"""
+    events = []
+    for block in body.split("\n\n"):
+        event = {"id": None, "event": "message", "data": []}
+        for line in block.split("\n"):
+            if line.startswith("id: "):
+                event["id"] = int(line[4:])
+            elif line.startswith("event: "):
+                event["event"] = line[7:]
+            elif line.startswith("data: "):
+                event["data"].append(line[6:])
+        if event["data"]:
+            event["data"] = "\n".join(event["data"])
+            events.append(event)
+    return events
+
+
+def receive_until(ws, message_type: str, request_id: str) -> list[dict]:
+    """接收消息直到指定请求出现 message_type 类型的消息"""
+    messages = []
+    while True:
+        message = ws.receive_json()
+        messages.append(message)
+        if message.get("request_id") == request_id and message["type"] in (message_type, "error"):
+            return messages
+
+
+def make_pdf(path: Path, pages: list[str], info: dict | None = None):
+    """写入一个最小的文本 PDF（pages 为各页 ASCII 文本；info 为文档信息，如 Title、Author）"""
+    def escape(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = []
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects.append("<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(pages)} >>")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, text in enumerate(pages):
+        lines = "".join(f"({escape(line)}) Tj T* " for line in text.split("\n"))
+        stream = f"BT /F1 12 Tf 14 TL 72 720 Td {lines}ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_ids[i] + 1} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    trailer = ""
+    if info:
+        entries = " ".join(f"/{key} ({escape(value)})" for key, value in info.items())
+        objects.append(f"<< {entries} >>")
+        trailer = f" /Info {len(objects)} 0 R"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R{trailer} >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    path.write_bytes(out)
+
+
+@pytest.fixture
+def project_dir() -> tuple[str, Path]:
+    """在 PROJECTS_ROOT 下创建一个空项目，返回 (project_id, 项目路径)"""
+    path = Path(tempfile.mkdtemp(prefix="project-", dir=settings.PROJECTS_ROOT))
+    return path.name, path
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """
+    替换 llm_client 的模型调用
+
+    返回的对象：
+    - reply(messages) -> str：决定非流式调用的回答，默认回显最后一条消息
+    - calls：记录每次非流式调用的 messages
+    - streams：记录每次流式调用的 messages
+    - stream_chunks：流式回答的各块（增量文本；未请求 incremental_output 时按完整文本返回）
+    - delay：每次调用/每块之前等待的秒数
+    """
+    from app.core.llm_client import llm_client
+
+    fake = types.SimpleNamespace(
+        calls=[],
+        streams=[],
+        reply=lambda messages: messages[-1]["content"],
+        stream_chunks=["你好", "，", "世界"],
+        delay=0.0,
+    )
+
+    async def call(**kwargs):
+        fake.calls.append(kwargs["messages"])
+        if fake.delay:
+            await asyncio.sleep(fake.delay)
+        return llm_response(fake.reply(kwargs["messages"]))
+
+    async def stream(**kwargs):
+        fake.streams.append(kwargs["messages"])
+        text = ""
+        for chunk in fake.stream_chunks:
+            if fake.delay:
+                await asyncio.sleep(fake.delay)
+            text += chunk
+            yield llm_response(chunk if kwargs.get("incremental_output") else text)
+
+    monkeypatch.setattr(llm_client, "call", call)
+    monkeypatch.setattr(llm_client, "stream", stream)
+    return fake
+
+
+@pytest.fixture(scope="session")
+def client():
+    """
+    整个测试会话共用的 TestClient
+
+    应用关闭时会停止各服务的线程池，之后无法再次启动，因此只进入一次生命周期。
+    """
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,103 @@
+"""AI 响应缓存测试 - LRU 与过期、内容寻址的键、磁盘层以及确定性接口的缓存命中"""
+import json
+import time
+import types
+
+import pytest
+
+from app.core import ai_cache as ai_cache_module
+from app.core.ai_cache import ResponseCache, TTLCache
+from app.core.ai_service import ai_service
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动拨动的时钟（只替换缓存模块中的 time，不影响事件循环）"""
+    now = {"t": 1000.0}
+    monkeypatch.setattr(ai_cache_module, "time", types.SimpleNamespace(
+        monotonic=lambda: now["t"],
+        time=lambda: now["t"]
+    ))
+    return now
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_ttl_cache_expires_entries(clock):
+    cache = TTLCache(max_entries=10, ttl_seconds=5)
+    cache.set("a", 1)
+    clock["t"] += 4
+    assert cache.get("a") == 1
+    clock["t"] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_make_key_is_content_addressed():
+    messages = [{"role": "user", "content": "你好"}]
+    key = ResponseCache.make_key("qwen", messages, {"b": 1, "a": 2})
+    assert key == ResponseCache.make_key("qwen", [dict(m) for m in messages], {"a": 2, "b": 1})
+    assert key != ResponseCache.make_key("qwen-plus", messages, {"a": 2, "b": 1})
+    assert key != ResponseCache.make_key("qwen", [{"role": "user", "content": "你好！"}], {"a": 2, "b": 1})
+    assert key != ResponseCache.make_key("qwen", messages, {"a": 2, "b": 3})
+
+
+async def test_memory_hits_and_stats():
+    cache = ResponseCache(max_entries=10, ttl_seconds=60)
+    assert await cache.get("k") is None
+    await cache.set("k", "值")
+    assert await cache.get("k") == "值"
+    stats = cache.get_stats()
+    assert (stats["memory_hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+    assert stats["disk_enabled"] is False
+
+
+async def test_disk_layer_survives_restart_and_expires(tmp_path, clock):
+    cache = ResponseCache(max_entries=10, ttl_seconds=60, disk_dir=tmp_path)
+    await cache.set("ab" + "0" * 62, "持久化")
+    assert [p.name for p in (tmp_path / "ab").iterdir()] == ["ab" + "0" * 62 + ".json"]
+
+    # 新实例（模拟重启）从磁盘命中，并回填内存层
+    restarted = ResponseCache(max_entries=10, ttl_seconds=60, disk_dir=tmp_path)
+    assert await restarted.get("ab" + "0" * 62) == "持久化"
+    assert await restarted.get("ab" + "0" * 62) == "持久化"
+    assert (restarted.stats["disk_hits"], restarted.stats["memory_hits"]) == (1, 1)
+
+    clock["t"] += 61
+    expired = ResponseCache(max_entries=10, ttl_seconds=60, disk_dir=tmp_path)
+    assert await expired.get("ab" + "0" * 62) is None
+    assert not (tmp_path / "ab" / ("ab" + "0" * 62 + ".json")).exists()
+
+
+async def test_corrupt_disk_entry_is_a_miss(tmp_path):
+    cache = ResponseCache(max_entries=10, ttl_seconds=60, disk_dir=tmp_path)
+    (tmp_path / "cd").mkdir()
+    (tmp_path / "cd" / ("cd" + "1" * 62 + ".json")).write_text("{半截", encoding="utf-8")
+    assert await cache.get("cd" + "1" * 62) is None
+
+
+async def test_deterministic_endpoint_uses_cache(fake_llm):
+    text = f"缓存测试 {time.time_ns()}"
+    first = await ai_service.text_to_latex(text)
+    assert await ai_service.text_to_latex(text) == first
+    assert len(fake_llm.calls) == 1
+
+    # bypass 跳过读缓存，重新调用模型
+    await ai_service.text_to_latex(text, "bypass")
+    assert len(fake_llm.calls) == 2
+
+
+def test_cache_stats_route(client):
+    stats = client.get("/api/v1/ai/cache/stats").json()
+    for section in ("check_chunks", "context", "summaries", "single_flight", "streams"):
+        assert section in stats
+    assert json.dumps(stats)
@@ -0,0 +1,101 @@
+"""批量检查测试 - 按文件推送诊断、块结果复用、事件回放、取消以及统计接口"""
+import json
+
+import pytest
+
+from tests.conftest import parse_sse
+
+ISSUE = json.dumps({"issues": [{"line": 0, "severity": "warning", "message": "问题"}]}, ensure_ascii=False)
+
+
+@pytest.fixture
+def project(project_dir, fake_llm):
+    project_id, path = project_dir
+    (path / "主体").mkdir()
+    # 内容带项目ID，块结果缓存不会命中其他测试的检查结果
+    (path / "主体" / "a.md").write_text(f"第一段内容 {project_id}。\n", encoding="utf-8")
+    (path / "主体" / "b.tex").write_text(f"第二段内容 {project_id}。\n", encoding="utf-8")
+    (path / "主体" / "c.py").write_text("print(1)\n", encoding="utf-8")
+    (path / "主体" / ".hidden.md").write_text("隐藏\n", encoding="utf-8")
+    fake_llm.reply = lambda messages: ISSUE
+    return project_id
+
+
+def _run(client, project_id, **body) -> tuple[dict, list[dict]]:
+    """开始批量检查并接收全部事件"""
+    response = client.post("/api/v1/ai/check-batch", json={"project_id": project_id, **body})
+    assert response.status_code == 200, response.text
+    job = response.json()
+    events = parse_sse(client.get(f"/api/v1/ai/check-batch/{job['job_id']}/events").text)
+    return job, events
+
+
+def test_batch_check_reports_each_file(client, project, fake_llm):
+    job, events = _run(client, project, glob="主体/*", check_type="grammar")
+    assert job["files"] == ["主体/a.md", "主体/b.tex"]
+
+    files = {e["data"]["path"]: e["data"] for e in map(_decode, events) if e["event"] == "file"}
+    assert set(files) == {"主体/a.md", "主体/b.tex"}
+    for result in files.values():
+        assert [d["message"] for d in result["diagnostics"]] == ["问题"]
+        assert result["error"] is None
+
+    done = _decode(events[-1])
+    assert done["event"] == "done"
+    assert done["data"]["status"] == "completed"
+    assert done["data"]["progress"]["files_done"] == 2
+    assert [e["id"] for e in events] == list(range(1, len(events) + 1))
+    assert len(fake_llm.calls) == 2
+
+    # 内容未变化的块复用之前的结果，不再调用模型
+    _, events = _run(client, project, paths=["主体/a.md", "主体/b.tex"], check_type="grammar")
+    progress = _decode(events[-1])["data"]["progress"]
+    assert progress["chunks_reused"] == progress["chunks_total"] == 2
+    assert len(fake_llm.calls) == 2
+
+
+def test_batch_check_replays_after_last_event_id(client, project):
+    job, events = _run(client, project, paths=["主体/a.md"], check_type="grammar", cache="bypass")
+    replayed = parse_sse(client.get(
+        f"/api/v1/ai/check-batch/{job['job_id']}/events",
+        headers={"Last-Event-ID": "1"}
+    ).text)
+    assert replayed == events[1:]
+
+    status = client.get(f"/api/v1/ai/check-batch/{job['job_id']}").json()
+    assert status["status"] == "completed"
+
+
+def test_batch_check_cancel(client, project, fake_llm):
+    fake_llm.delay = 5
+    job = client.post("/api/v1/ai/check-batch", json={
+        "project_id": project, "paths": ["主体/a.md"], "cache": "bypass"
+    }).json()
+    assert client.delete(f"/api/v1/ai/check-batch/{job['job_id']}").json()["cancelled"] is True
+    events = parse_sse(client.get(f"/api/v1/ai/check-batch/{job['job_id']}/events").text)
+    assert _decode(events[-1])["data"]["status"] == "cancelled"
+    assert client.delete(f"/api/v1/ai/check-batch/{job['job_id']}").json()["cancelled"] is False
+
+
+@pytest.mark.parametrize("body, status", [
+    ({}, 400),
+    ({"paths": ["../x.md"]}, 400),
+    ({"paths": ["主体/missing.md"]}, 404),
+    ({"glob": "主体/*.py"}, 400),
+])
+def test_batch_check_rejects_bad_requests(client, project, body, status):
+    assert client.post("/api/v1/ai/check-batch", json={"project_id": project, **body}).status_code == status
+
+
+def test_batch_check_stats_route(client, project):
+    before = client.get("/api/v1/ai/check-batch/stats").json()
+    _run(client, project, paths=["主体/a.md"], check_type="grammar")
+    after = client.get("/api/v1/ai/check-batch/stats").json()
+    assert after["started"] == before["started"] + 1
+    assert after["completed"] == before["completed"] + 1
+    assert "batch_checks" not in client.get("/api/v1/ai/cache/stats").json()
+    assert client.get("/api/v1/ai/check-batch/missing").status_code == 404
+
+
+def _decode(event: dict) -> dict:
+    return {**event, "data": json.loads(event["data"])}
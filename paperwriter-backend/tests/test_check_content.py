@@ -0,0 +1,118 @@
+"""增量内容检查测试 - 分块覆盖原文、内容定义的块边界、未变化块复用以及诊断行号平移"""
+import json
+import time
+
+import pytest
+
+from app.config import settings
+from app.core.ai_service import ai_service
+from app.utils.text_chunks import split_chunks, split_paragraphs
+
+CONTENT_MARKER = "内容（行号从 0 开始计数）：\n"
+
+
+def _document(sections: int, tag: str) -> str:
+    return "\n\n".join(
+        f"# 第{i}节 {tag}\n\n第{i}节的正文，说明一些内容。\n第二行。"
+        for i in range(sections)
+    )
+
+
+def _reply(messages) -> str:
+    """每块报告一个问题：位于块首行，消息为块首行文本"""
+    first_line = messages[-1]["content"].split(CONTENT_MARKER, 1)[1].split("\n", 1)[0]
+    return json.dumps({"issues": [{"line": 0, "severity": "info", "message": first_line}]}, ensure_ascii=False)
+
+
+@pytest.fixture
+def checker(monkeypatch, fake_llm):
+    # 每节远小于最小块长度：只在标题处分块，每节正好一块
+    monkeypatch.setattr(settings, "CHECK_CHUNK_MIN_CHARS", 1000)
+    monkeypatch.setattr(settings, "CHECK_CHUNK_MAX_CHARS", 4000)
+    fake_llm.reply = _reply
+    return fake_llm
+
+
+def test_paragraphs_and_chunks_cover_every_line():
+    content = _document(5, "覆盖") + "\n\n末尾没有换行"
+    paragraphs = split_paragraphs(content)
+    assert "\n".join(line for _, lines in paragraphs for line in lines) == content
+    chunks = split_chunks(content, 20, 400)
+    assert "\n".join(chunk.text for chunk in chunks) == content
+    for chunk in chunks:
+        assert chunk.text == "\n".join(content.split("\n")[chunk.start_line:chunk.start_line + chunk.line_count])
+
+
+def test_headings_always_start_a_chunk():
+    content = _document(4, "标题")
+    starts = [chunk.text.split("\n", 1)[0] for chunk in split_chunks(content, 1, 10_000)]
+    assert starts == [f"# 第{i}节 标题" for i in range(4)]
+
+
+def test_max_chars_forces_a_split():
+    content = "\n\n".join("很长的段落" * 20 for _ in range(6))
+    chunks = split_chunks(content, 10_000, 300)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        # 在段落之间断开：块最多超出上限一个段落（100 字）
+        assert len(chunk.text) <= 300 + 100 + 2
+
+
+def test_edit_only_changes_nearby_chunks():
+    paragraphs = [f"第{i}段：" + "内容" * (20 + i % 7) for i in range(60)]
+    before = split_chunks("\n\n".join(paragraphs), 100, 3000)
+    paragraphs[30] += "（修改）"
+    after = split_chunks("\n\n".join(paragraphs), 100, 3000)
+    unchanged = {chunk.fingerprint for chunk in before} & {chunk.fingerprint for chunk in after}
+    assert len(unchanged) >= len(before) - 2
+
+
+async def test_unchanged_chunks_are_reused(checker):
+    tag = str(time.time_ns())
+    content = _document(6, tag)
+    diagnostics = await ai_service.check_content(content, "grammar")
+    assert len(checker.calls) == 6
+    assert len(diagnostics) == 6
+    lines = content.split("\n")
+    for diagnostic in diagnostics:
+        assert lines[diagnostic.from_["line"]] == diagnostic.message
+
+    # 修改第 3 节：只重新检查这一块
+    edited = content.replace("第3节的正文", "第3节修改后的正文")
+    await ai_service.check_content(edited, "grammar")
+    assert len(checker.calls) == 7
+
+    # 在开头插入两行：全部复用，诊断行号随块平移
+    shifted = f"前言 {tag}\n\n" + content
+    diagnostics = await ai_service.check_content(shifted, "grammar")
+    assert len(checker.calls) == 8  # 只有新增的前言块
+    assert len(diagnostics) == 7
+    lines = shifted.split("\n")
+    for diagnostic in diagnostics:
+        assert lines[diagnostic.from_["line"]] == diagnostic.message
+
+
+async def test_bypass_rechecks_every_chunk(checker):
+    content = _document(3, str(time.time_ns()))
+    await ai_service.check_content(content, "grammar")
+    await ai_service.check_content(content, "grammar", cache="bypass")
+    assert len(checker.calls) == 6
+
+
+async def test_failed_chunk_does_not_drop_others(checker):
+    content = _document(3, str(time.time_ns()))
+
+    def reply(messages):
+        if "第1节" in messages[-1]["content"]:
+            raise RuntimeError("模型错误")
+        return _reply(messages)
+
+    checker.reply = reply
+    diagnostics = await ai_service.check_content(content, "grammar")
+    assert len(diagnostics) == 2
+    assert not any("第1节" in d.message for d in diagnostics)
+
+    # 失败的块不写入缓存，下次重新检查
+    checker.reply = _reply
+    diagnostics = await ai_service.check_content(content, "grammar")
+    assert len(diagnostics) == 3
@@ -0,0 +1,134 @@
+"""WebSocket 连接管理测试 - 项目内广播、单播、主题订阅、发送队列合并与溢出处理"""
+import asyncio
+
+import pytest
+
+from app.core.connection_manager import SLOW_CLIENT_CLOSE_CODE, WebSocketConnectionManager
+
+
+class FakeWebSocket:
+    """记录发送内容的 WebSocket 替身；blocked 时 send_json 一直等待（模拟慢客户端）"""
+
+    def __init__(self):
+        self.sent: list[dict] = []
+        self.closed_with = None
+        self.unblocked = asyncio.Event()
+        self.unblocked.set()
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message: dict):
+        await self.unblocked.wait()
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+    def block(self):
+        self.unblocked.clear()
+
+
+@pytest.fixture
+async def manager():
+    manager = WebSocketConnectionManager(max_queue=3)
+    yield manager
+    for connection in list(manager.connections.values()):
+        connection.close()
+
+
+async def _flush():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_broadcast_reaches_only_the_project(manager):
+    a1, a2, b = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    first = await manager.connect(a1, "a")
+    await manager.connect(a2, "a")
+    await manager.connect(b, "b")
+
+    assert manager.broadcast("a", {"n": 1}) == 2
+    assert manager.broadcast("a", {"n": 2}, exclude=first.id) == 1
+    await _flush()
+    assert a1.sent == [{"n": 1}]
+    assert a2.sent == [{"n": 1}, {"n": 2}]
+    assert b.sent == []
+
+
+async def test_send_to_and_disconnect(manager):
+    ws = FakeWebSocket()
+    connection = await manager.connect(ws, "p")
+    assert manager.send_to(connection.id, {"hello": True}) is True
+    await _flush()
+    assert ws.sent == [{"hello": True}]
+
+    manager.disconnect(connection)
+    assert manager.send_to(connection.id, {}) is False
+    assert manager.projects == {} and manager.connections == {}
+    assert manager.broadcast("p", {}) == 0
+
+
+async def test_topic_broadcast_needs_subscription(manager):
+    subscribed, other = FakeWebSocket(), FakeWebSocket()
+    connection = await manager.connect(subscribed, "p")
+    await manager.connect(other, "p")
+    connection.subscriptions.add("tree")
+    assert manager.broadcast("p", {"tree": 1}, topic="tree") == 1
+    await _flush()
+    assert subscribed.sent == [{"tree": 1}]
+    assert other.sent == []
+
+
+async def test_pending_messages_with_same_key_are_coalesced(manager):
+    ws = FakeWebSocket()
+    ws.block()
+    connection = await manager.connect(ws, "p")
+    connection.send({"seq": 0})
+    await _flush()  # 发送任务取走第一条后阻塞在 send_json
+    for seq in range(1, 6):
+        connection.send({"seq": seq}, coalesce_key="progress")
+    connection.send(
+        {"text": "a"}, coalesce_key="stream",
+        merge=lambda old, new: {"text": old["text"] + new["text"]}
+    )
+    connection.send(
+        {"text": "b"}, coalesce_key="stream",
+        merge=lambda old, new: {"text": old["text"] + new["text"]}
+    )
+    ws.unblocked.set()
+    await _flush()
+    assert ws.sent == [{"seq": 0}, {"seq": 5}, {"text": "ab"}]
+    assert connection.stats["coalesced"] == 5
+
+
+async def test_overflow_drops_droppable_and_closes_on_required(manager):
+    ws = FakeWebSocket()
+    ws.block()
+    connection = await manager.connect(ws, "p")
+    connection.send({"seq": 0})
+    await _flush()
+    for seq in range(1, 4):
+        assert connection.send({"seq": seq}) is True
+    # 队列已满：可丢弃消息直接丢弃，连接保留
+    assert connection.send({"progress": 1}, droppable=True) is False
+    assert not connection.closed
+    # 不可丢弃的消息放不下：断开慢客户端，不阻塞其他连接
+    assert connection.send({"seq": 4}) is False
+    await _flush()
+    assert connection.closed
+    assert ws.closed_with == SLOW_CLIENT_CLOSE_CODE
+    assert connection.stats["dropped"] == 2
+    assert manager.connections == {}
+
+
+async def test_slow_client_does_not_delay_others(manager):
+    slow, fast = FakeWebSocket(), FakeWebSocket()
+    slow.block()
+    await manager.connect(slow, "p")
+    await manager.connect(fast, "p")
+    for seq in range(3):
+        manager.broadcast("p", {"seq": seq})
+    await _flush()
+    assert fast.sent == [{"seq": 0}, {"seq": 1}, {"seq": 2}]
+    assert slow.sent == []
@@ -0,0 +1,134 @@
+"""上下文组装测试 - token 计数与截断、预算分配、长文档的末尾原文与前文概要以及 token 统计上报"""
+import pytest
+
+from app.config import settings
+from app.core.ai_service import ai_service
+from app.core.context_builder import ContextPart, context_builder, outline
+from app.utils.token_count import TokenCounter, get_token_counter
+from tests.conftest import receive_until
+
+MODEL = "qwen-turbo"
+
+
+def _paper(sections: int) -> str:
+    return "\n\n".join(
+        f"# 第{i}章\n\n第{i}章的第一句话。" + "这里是较长的正文内容，用来占据篇幅。" * 20
+        for i in range(sections)
+    )
+
+
+@pytest.fixture
+def estimate() -> TokenCounter:
+    """按字符估算的计数器（模型没有本地分词器）"""
+    counter = TokenCounter("estimate-only")
+    assert not counter.exact
+    return counter
+
+
+@pytest.fixture
+def budget(monkeypatch) -> int:
+    monkeypatch.setattr(settings, "AI_CONTEXT_TOKEN_BUDGET", 600)
+    monkeypatch.setattr(settings, "AI_CONTEXT_MODEL_BUDGETS", {})
+    return 600
+
+
+def test_estimated_count(estimate):
+    assert estimate.count("") == 0
+    assert estimate.count("你好") == 2  # 0.7 * 2 向上取整
+    assert estimate.count("abcdef") == 2
+    assert estimate.count("你好 world") == 4  # 1.4 + 6 / 3 向上取整
+
+
+@pytest.mark.parametrize("keep", ["head", "tail"])
+def test_truncate_keeps_lines_within_budget(estimate, keep):
+    text = "\n".join(f"第{i}行内容" for i in range(100))
+    kept, tokens = estimate.truncate(text, 50, keep)
+    # 按行累加计数，结果不低于整段计数
+    assert estimate.count(kept) <= tokens <= 50
+    assert (text.startswith(kept) if keep == "head" else text.endswith(kept))
+    assert estimate.truncate(text, 10_000, keep)[0] == text
+    assert estimate.truncate(text, 0, keep) == ("", 0)
+
+
+def test_truncate_splits_a_long_line(estimate):
+    kept, tokens = estimate.truncate("长" * 1000, 70, "tail")
+    assert kept == "长" * 100 and tokens == 70
+
+
+def test_outline():
+    content = "# 引言\n\n研究背景很重要。后续句子。\n\n## 方法\n我们提出新方法！细节。"
+    assert outline(content) == "# 引言 研究背景很重要。\n## 方法 我们提出新方法！"
+    assert outline("第一段。补充。\n\n第二段") == "第一段。\n第二段"
+
+
+def test_fit_redistributes_unused_budget(estimate):
+    parts = context_builder.fit([
+        ContextPart("短", "短文本", share=0.5),
+        ContextPart("长", "长" * 1000, share=0.5),
+    ], 100, estimate)
+    assert parts[0].text == "短文本"
+    # 第一部分用不完的预算分给第二部分
+    assert parts[1].tokens == 100 - parts[0].tokens
+
+
+def test_model_budget_override(monkeypatch, budget):
+    monkeypatch.setattr(settings, "AI_CONTEXT_MODEL_BUDGETS", {"qwen-plus": 24000})
+    assert context_builder.budget_for("qwen-plus") == 24000
+    assert context_builder.budget_for(MODEL) == budget
+
+
+async def test_short_document_is_kept_whole(budget):
+    content = _paper(1)
+    context = await context_builder.for_writing(MODEL, content)
+    assert context.get("当前内容") == content
+    assert context.get("前文概要") == ""
+    assert get_token_counter(MODEL).count(content) <= context.tokens <= budget
+
+
+async def test_long_document_keeps_tail_and_outline(budget):
+    content = _paper(30)
+    context = await context_builder.for_writing(MODEL, content, "其他文件" * 500)
+    assert context.tokens <= budget
+    tail = context.get("当前内容")
+    assert content.endswith(tail) and "第29章" in tail
+    summary = context.get("前文概要")
+    # 概要紧接在末尾原文之前，越靠后的章节越优先保留
+    assert "第1章 第1章的第一句话。" not in summary
+    assert summary.splitlines()[-1].startswith("# 第")
+    assert context.get("文件上下文")
+    assert list(context.report()["parts"]) == ["文件上下文", "项目相关资料", "全文摘要", "前文概要", "当前内容"]
+
+
+async def test_cost_is_bounded_by_budget(budget):
+    short = await context_builder.for_writing(MODEL, _paper(20))
+    long = await context_builder.for_writing(MODEL, _paper(200))
+    assert short.tokens <= budget and long.tokens <= budget
+    assert abs(long.tokens - short.tokens) < budget * 0.1
+
+
+async def test_idea_context_trims_client_context(budget):
+    context = await context_builder.for_idea(MODEL, "研究想法", "项目背景。" * 1000)
+    assert context.get("研究想法") == "研究想法"
+    assert context.tokens <= budget
+    assert context.get("项目上下文").startswith("项目背景。")
+
+
+async def test_continue_writing_reports_context(budget, fake_llm):
+    reports = []
+    content = _paper(30)
+    chunks = [chunk async for chunk in ai_service.continue_writing(content, on_context=reports.append)]
+    assert "".join(chunks) == "你好，世界"
+    assert reports[0]["budget"] == budget and reports[0]["tokens"] <= budget
+    prompt = fake_llm.streams[-1][-1]["content"]
+    assert content[-200:] in prompt
+    assert content[:200] not in prompt
+
+
+def test_ws_analyze_reports_context(client, project_dir, fake_llm):
+    project_id, _ = project_dir
+    with client.websocket_connect(f"/api/v1/stream?project_id={project_id}") as ws:
+        ws.send_json({"type": "analyze", "request_id": "a1", "idea": "想法", "context": "背景"})
+        messages = receive_until(ws, "complete", "a1")
+    context = next(m for m in messages if m["type"] == "context")
+    assert context["tokens"] > 0
+    assert set(context["parts"]) == {"研究想法", "项目参考资料", "论文摘要", "项目上下文"}
@@ -0,0 +1,132 @@
+"""流式文件读取测试 - Range 解析、强 ETag 与 304、单段 Range 响应以及 If-Range"""
+import pytest
+
+from app.utils.http_utils import RangeNotSatisfiable, etag_matches, parse_range
+
+CONTENT = "".join(f"第{i:04d}行\n" for i in range(20000)).encode("utf-8")
+
+
+@pytest.fixture
+def source(project_dir):
+    project_id, path = project_dir
+    (path / "主体").mkdir()
+    (path / "主体" / "main.tex").write_bytes(CONTENT)
+    return project_id, path / "主体" / "main.tex"
+
+
+def _get(client, project_id: str, headers: dict | None = None):
+    return client.get(
+        "/api/v1/files/content",
+        params={"project_id": project_id, "file_path": "主体/main.tex"},
+        headers=headers or {}
+    )
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=90-", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=50-1000", (50, 99)),
+    ("bytes=0-1,5-6", None),  # 多段范围：返回完整内容
+    ("items=0-1", None),
+    (None, None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=9-5", "bytes=-0"])
+def test_parse_range_not_satisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 100)
+
+
+@pytest.mark.parametrize("header", ["bytes=-10", "bytes=0-", "bytes=0-0"])
+def test_parse_range_empty_file(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 0)
+
+
+def test_etag_matches():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches("*", '"b"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"b"')
+
+
+def test_full_read_and_304(client, source):
+    project_id, _ = source
+    response = _get(client, project_id)
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["content-length"] == str(len(CONTENT))
+    assert response.headers["accept-ranges"] == "bytes"
+    etag = response.headers["etag"]
+
+    response = _get(client, project_id, {"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # 与 /read 返回的 etag 一致
+    read = client.post("/api/v1/files/read", json={"project_id": project_id, "file_path": "主体/main.tex"})
+    assert read.json()["etag"] == etag
+
+
+def test_etag_changes_after_write(client, source):
+    project_id, path = source
+    etag = _get(client, project_id).headers["etag"]
+    client.post("/api/v1/files/write", json={
+        "project_id": project_id, "file_path": "主体/main.tex", "content": "新内容"
+    })
+    response = _get(client, project_id, {"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.content == "新内容".encode("utf-8")
+    assert response.headers["etag"] != etag
+
+
+def test_range_requests(client, source):
+    project_id, _ = source
+    # 跨越多个读取块的范围
+    response = _get(client, project_id, {"Range": "bytes=100-70099"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:70100]
+    assert response.headers["content-range"] == f"bytes 100-70099/{len(CONTENT)}"
+    assert response.headers["content-length"] == "70000"
+
+    response = _get(client, project_id, {"Range": "bytes=-16"})
+    assert response.content == CONTENT[-16:]
+
+    response = _get(client, project_id, {"Range": f"bytes={len(CONTENT)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_suffix_range_on_empty_file(client, project_dir):
+    project_id, path = project_dir
+    (path / "空.tex").write_bytes(b"")
+    response = client.get(
+        "/api/v1/files/content",
+        params={"project_id": project_id, "file_path": "空.tex"},
+        headers={"Range": "bytes=-10"}
+    )
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */0"
+
+
+def test_if_range_mismatch_returns_full_content(client, source):
+    project_id, _ = source
+    etag = _get(client, project_id).headers["etag"]
+    response = _get(client, project_id, {"Range": "bytes=0-9", "If-Range": etag})
+    assert response.status_code == 206
+    response = _get(client, project_id, {"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_missing_file_and_escape(client, project_dir):
+    project_id, _ = project_dir
+    response = client.get("/api/v1/files/content", params={"project_id": project_id, "file_path": "无.tex"})
+    assert response.status_code == 404
+    response = client.get("/api/v1/files/content", params={"project_id": project_id, "file_path": "../x"})
+    assert response.status_code == 400
@@ -0,0 +1,140 @@
+"""保存合并与文件修改的串行化"""
+import asyncio
+import pytest
+from app.core.file_service import FileDeleted, FileService
+
+
+@pytest.fixture
+def service():
+    return FileService(coalesce_window_ms=100, fsync=False)
+
+
+async def test_single_write_is_flushed_immediately(service, project_dir):
+    project_id, path = project_dir
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    etag = await service.write_file(project_id, "a.txt", "hello")
+    assert etag is not None
+    assert loop.time() - started < service.coalesce_window
+    assert (path / "a.txt").read_text() == "hello"
+
+
+async def test_burst_only_writes_last_and_superseded_get_no_etag(service, project_dir):
+    project_id, path = project_dir
+    first = await service.write_file(project_id, "a.txt", "v0")
+
+    # 合并窗口内连续保存：只有最后一次落盘并拿到 ETag
+    results = await asyncio.gather(
+        service.write_file(project_id, "a.txt", "X"),
+        service.write_file(project_id, "a.txt", "Y"),
+    )
+    assert results[0] is None
+    assert results[1] is not None and results[1] != first
+    assert (path / "a.txt").read_text() == "Y"
+    assert service.write_stats["coalesced"] == 1
+    assert service.write_stats["written"] == 2
+
+
+async def test_superseded_writer_cannot_patch_with_other_writers_etag(service, project_dir):
+    from app.core.file_service import ETagMismatch
+    from app.models.file import TextEdit
+
+    project_id, path = project_dir
+    base = await service.write_file(project_id, "a.txt", "base")
+    a, b = await asyncio.gather(
+        service.write_file(project_id, "a.txt", "XXXX"),
+        service.write_file(project_id, "a.txt", "YY"),
+    )
+    assert a is None
+    # A 只有保存之前的 ETag，补丁必须被拒绝
+    edit = TextEdit.model_validate({"from": 0, "to": 1, "text": "Z"})
+    with pytest.raises(ETagMismatch):
+        await service.patch_file(project_id, "a.txt", base, edits=[edit])
+    await service.patch_file(project_id, "a.txt", b, edits=[edit])
+    assert (path / "a.txt").read_text() == "ZY"
+
+
+async def test_delete_discards_pending_write(service, project_dir):
+    project_id, path = project_dir
+    await service.write_file(project_id, "a.txt", "v0")
+    pending = asyncio.create_task(service.write_file(project_id, "a.txt", "v1"))
+    await asyncio.sleep(0.01)
+
+    await service.delete_file(project_id, "a.txt")
+    with pytest.raises(FileDeleted):
+        await pending
+    # 窗口结束后也不会重新出现
+    await asyncio.sleep(service.coalesce_window * 2)
+    assert not (path / "a.txt").exists()
+
+
+async def test_delete_directory_discards_pending_writes_below(service, project_dir):
+    project_id, path = project_dir
+    (path / "dir").mkdir()
+    await service.write_file(project_id, "dir/a.txt", "v0")
+    pending = asyncio.create_task(service.write_file(project_id, "dir/a.txt", "v1"))
+    await asyncio.sleep(0.01)
+
+    await service.delete_file(project_id, "dir")
+    with pytest.raises(FileDeleted):
+        await pending
+    await asyncio.sleep(service.coalesce_window * 2)
+    assert not (path / "dir").exists()
+
+
+async def test_delete_directory_waits_for_flush_below(service, project_dir, monkeypatch):
+    project_id, path = project_dir
+    (path / "dir").mkdir()
+    writing, release = asyncio.Event(), asyncio.Event()
+    write_atomic = service._write_atomic
+
+    async def slow_write(*args):
+        writing.set()
+        await release.wait()
+        return await write_atomic(*args)
+
+    monkeypatch.setattr(service, "_write_atomic", slow_write)
+    write = asyncio.create_task(service.write_file(project_id, "dir/a.txt", "v0"))
+    await writing.wait()
+
+    # 子文件正在落盘：删除目录要等它完成，不能与 rmtree 交错
+    delete = asyncio.create_task(service.delete_file(project_id, "dir"))
+    await asyncio.sleep(0.05)
+    assert not delete.done()
+    release.set()
+    assert await write is not None
+    await delete
+    assert not (path / "dir").exists()
+
+
+async def test_create_waits_for_pending_write(service, project_dir):
+    project_id, _ = project_dir
+    await service.write_file(project_id, "a.txt", "v0")
+    pending = asyncio.create_task(service.write_file(project_id, "a.txt", "v1"))
+    await asyncio.sleep(0.01)
+    with pytest.raises(FileExistsError):
+        await service.create_file(project_id, "a.txt", "new")
+    assert await pending is not None
+
+
+async def test_install_supersedes_pending_write(service, project_dir, tmp_path):
+    project_id, path = project_dir
+    await service.write_file(project_id, "a.txt", "v0")
+    pending = asyncio.create_task(service.write_file(project_id, "a.txt", "v1"))
+    await asyncio.sleep(0.01)
+
+    upload = path / ".upload.tmp"
+    upload.write_text("uploaded")
+    result = await service.install_file(project_id, "a.txt", upload, overwrite=True)
+    assert await pending is None
+    await asyncio.sleep(service.coalesce_window * 2)
+    assert (path / "a.txt").read_text() == "uploaded"
+    assert result["etag"]
+
+
+async def test_window_zero_writes_every_save(project_dir):
+    service = FileService(coalesce_window_ms=0, fsync=False)
+    project_id, path = project_dir
+    etags = [await service.write_file(project_id, "a.txt", f"v{i}") for i in range(3)]
+    assert None not in etags
+    assert service.write_stats["written"] == 3
@@ -0,0 +1,107 @@
+"""目录扫描测试 - 游标分页、排序、过滤和逐层展开"""
+import os
+
+import pytest
+
+from app.utils.fs_scan import decode_cursor, encode_cursor, scan_directory
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for name, size in [("b.md", 30), ("a.tex", 10), ("d.pdf", 10), ("c.md", 20)]:
+        (tmp_path / name).write_bytes(b"x" * size)
+    (tmp_path / ".hidden.md").write_text("隐藏")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "inner.md").write_text("内容")
+    return tmp_path
+
+
+def _pages(path, limit: int, **options) -> list[list[str]]:
+    """按游标逐页扫描，返回每页的名称"""
+    pages, after = [], None
+    while True:
+        items, next_key = scan_directory(str(path), "", after=after, limit=limit, **options)
+        pages.append([item["name"] for item in items])
+        if next_key is None:
+            return pages
+        sort = options.get("sort", "name")
+        after = decode_cursor(encode_cursor(sort, next_key), sort)
+
+
+def test_pages_cover_every_entry_once(folder):
+    assert _pages(folder, 2) == [["a.tex", "b.md"], ["c.md", "d.pdf"], ["sub"]]
+    assert _pages(folder, 2, order="desc") == [["sub", "d.pdf"], ["c.md", "b.md"], ["a.tex"]]
+
+
+def test_size_ties_are_ordered_by_name(folder):
+    pages = _pages(folder, 1, sort="size", extensions={".tex", ".pdf", ".md"})
+    # 文件夹没有大小，按 0 排在最前
+    assert sum(pages, []) == ["sub", "a.tex", "d.pdf", "c.md", "b.md"]
+
+
+def test_cursor_is_stable_across_inserts(folder):
+    first, next_key = scan_directory(str(folder), "", limit=2)
+    assert [item["name"] for item in first] == ["a.tex", "b.md"]
+    # 翻页期间新增的文件：排在游标之前的不会出现，之后的正常出现，已返回的项不会重复
+    (folder / "a0.md").write_text("")
+    (folder / "c0.md").write_text("")
+    rest, _ = scan_directory(str(folder), "", after=next_key)
+    assert [item["name"] for item in rest] == ["c.md", "c0.md", "d.pdf", "sub"]
+
+
+def test_filters_apply_to_files_only(folder):
+    items, _ = scan_directory(str(folder), "", patterns=["b*", "c*"])
+    assert [item["name"] for item in items] == ["b.md", "c.md", "sub"]
+    items, _ = scan_directory(str(folder), "", extensions={".pdf"})
+    assert [item["name"] for item in items] == ["d.pdf", "sub"]
+
+
+def test_depth_expands_subfolders(folder):
+    items, _ = scan_directory(str(folder), "root", depth=2, details=True)
+    sub = next(item for item in items if item["name"] == "sub")
+    assert sub["path"] == "root/sub"
+    assert [child["path"] for child in sub["children"]] == ["root/sub/inner.md"]
+    assert next(item for item in items if item["name"] == "b.md")["size"] == 30
+    assert "_abs" not in sub
+
+
+@pytest.mark.parametrize("cursor", [
+    "!!!",
+    "e30=",
+    encode_cursor("name", ["only-one"]),
+    # 其他排序生成的游标
+    encode_cursor("size", [10, "a.tex"]),
+    encode_cursor("name", [10, "a.tex"]),
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError, match="非法游标"):
+        decode_cursor(cursor, "name")
+
+
+def test_list_api_paginates(client, project_dir):
+    project_id, path = project_dir
+    for name in ["a.md", "b.md", "c.md"]:
+        (path / name).write_text("")
+    names, cursor = [], None
+    while True:
+        params = {"project_id": project_id, "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/api/v1/files/list", params=params).json()
+        names += [node["name"] for node in body["files"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert names == ["a.md", "b.md", "c.md"]
+    assert client.get("/api/v1/files/list", params={"project_id": project_id, "cursor": "!!!"}).status_code == 400
+
+    # 按名称排序得到的游标不能用于按大小排序
+    cursor = client.get("/api/v1/files/list", params={"project_id": project_id, "limit": 1}).json()["next_cursor"]
+    response = client.get("/api/v1/files/list", params={"project_id": project_id, "cursor": cursor, "sort": "size"})
+    assert response.status_code == 400
+
+
+def test_mtime_sort(folder):
+    os.utime(folder / "c.md", (1, 1))
+    items, _ = scan_directory(str(folder), "", sort="mtime", extensions={".md"})
+    assert items[0]["name"] == "c.md"
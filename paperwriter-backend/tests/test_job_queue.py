@@ -0,0 +1,187 @@
+"""后台任务队列测试 - 按序执行、结束通知、取消、超时与失败、重启后恢复、清理以及任务接口"""
+import asyncio
+import time
+
+import pytest
+from pydantic import ValidationError
+
+from app.core.connection_manager import manager
+from app.core.job_queue import JobNotFound, JobQueue
+
+PARAMS = {"text": "待转换的文本", "cache": "bypass"}
+
+
+def _queue(tmp_path, **options) -> JobQueue:
+    return JobQueue(**{
+        "db_path": tmp_path / "jobs.sqlite3",
+        "workers": 1,
+        "timeout": 5,
+        "retention_seconds": 3600,
+        "max_retained": 100,
+        "gc_interval": 3600,
+        **options,
+    })
+
+
+@pytest.fixture
+def notifications(monkeypatch) -> list[dict]:
+    sent = []
+    monkeypatch.setattr(manager, "broadcast", lambda project_id, message, **kwargs: sent.append(message))
+    return sent
+
+
+@pytest.fixture
+async def queue(tmp_path, fake_llm, notifications):
+    queue = _queue(tmp_path)
+    queue.start()
+    yield queue
+    await queue.shutdown()
+
+
+async def _wait_status(queue: JobQueue, job_id: str, *statuses: str) -> dict:
+    deadline = time.monotonic() + 5
+    while True:
+        job = await queue.get(job_id, with_result=True)
+        if job["status"] in statuses or time.monotonic() > deadline:
+            return job
+        await asyncio.sleep(0.01)
+
+
+async def test_jobs_run_in_order_and_notify(queue, fake_llm, notifications):
+    fake_llm.reply = lambda messages: "LaTeX：" + messages[-1]["content"].rsplit("\n", 1)[-1]
+    first = await queue.submit("p", "text_to_latex", {**PARAMS, "text": "第一段"})
+    second = await queue.submit("p", "text_to_latex", {**PARAMS, "text": "第二段"})
+    assert first["status"] == "pending" and "result" not in first
+
+    job = await _wait_status(queue, second["job_id"], "completed")
+    assert job["result"] == "LaTeX：第二段"
+    assert (await queue.get(first["job_id"], with_result=True))["result"] == "LaTeX：第一段"
+    assert [n["job_id"] for n in notifications] == [first["job_id"], second["job_id"]]
+    assert notifications[0] == {
+        "type": "job_complete", "job_id": first["job_id"], "kind": "text_to_latex",
+        "status": "completed", "error": None,
+    }
+    assert [j["job_id"] for j in await queue.list_jobs("p")] == [second["job_id"], first["job_id"]]
+    assert queue.stats["completed"] == 2
+
+
+async def test_invalid_submissions(queue):
+    with pytest.raises(ValueError, match="未知的任务类型"):
+        await queue.submit("p", "translate", {})
+    with pytest.raises(ValidationError):
+        await queue.submit("p", "generate_code", {"language": "python"})
+    with pytest.raises(JobNotFound):
+        await queue.get("missing")
+
+
+async def test_cancel_pending_and_running(queue, fake_llm, notifications):
+    fake_llm.delay = 0.3
+    running = await queue.submit("p", "text_to_latex", PARAMS)
+    pending = await queue.submit("p", "text_to_latex", PARAMS)
+    await _wait_status(queue, running["job_id"], "running")
+
+    assert await queue.cancel(pending["job_id"]) is True
+    assert await queue.cancel(running["job_id"]) is True
+    assert (await _wait_status(queue, running["job_id"], "cancelled"))["status"] == "cancelled"
+    assert (await queue.get(pending["job_id"]))["status"] == "cancelled"
+    assert {n["status"] for n in notifications} == {"cancelled"}
+
+    # 已结束的任务不能再取消
+    assert await queue.cancel(pending["job_id"]) is False
+    with pytest.raises(JobNotFound):
+        await queue.cancel("missing")
+    assert len(fake_llm.calls) == 1
+
+
+async def test_failures_and_timeouts(tmp_path, fake_llm, notifications):
+    queue = _queue(tmp_path, timeout=0.1)
+    queue.start()
+    try:
+        def fail(messages):
+            raise RuntimeError("模型不可用")
+
+        fake_llm.reply = fail
+        failed = await queue.submit("p", "text_to_latex", PARAMS)
+        job = await _wait_status(queue, failed["job_id"], "failed")
+        assert "模型不可用" in job["error"]
+        assert notifications[-1]["error"] == job["error"]
+
+        fake_llm.reply = lambda messages: "结果"
+        fake_llm.delay = 1
+        slow = await queue.submit("p", "text_to_latex", PARAMS)
+        job = await _wait_status(queue, slow["job_id"], "failed")
+        assert job["error"] == "任务超时（0.1 秒）"
+        assert queue.stats["failed"] == 2
+    finally:
+        await queue.shutdown()
+
+
+async def test_unfinished_jobs_resume_after_restart(tmp_path, fake_llm, notifications):
+    fake_llm.delay = 0.3
+    queue = _queue(tmp_path)
+    queue.start()
+    running = await queue.submit("p", "text_to_latex", PARAMS)
+    pending = await queue.submit("p", "text_to_latex", PARAMS)
+    await _wait_status(queue, running["job_id"], "running")
+    await queue.shutdown()
+
+    # 关闭时执行中的任务保持 running，不算取消
+    assert notifications == []
+
+    fake_llm.delay = 0
+    restarted = _queue(tmp_path)
+    restarted.start()
+    try:
+        assert (await _wait_status(restarted, running["job_id"], "completed"))["result"]
+        assert (await _wait_status(restarted, pending["job_id"], "completed"))["status"] == "completed"
+        assert restarted.stats["recovered"] == 2
+        stats = await restarted.get_stats()
+        assert stats["stored"] == {"completed": 2}
+    finally:
+        await restarted.shutdown()
+
+
+async def test_garbage_collection(tmp_path, fake_llm, notifications):
+    queue = _queue(tmp_path, max_retained=2)
+    queue.start()
+    try:
+        jobs = [await queue.submit("p", "text_to_latex", PARAMS) for _ in range(3)]
+        await _wait_status(queue, jobs[-1]["job_id"], "completed")
+        fake_llm.delay = 1
+        unfinished = await queue.submit("p", "text_to_latex", {**PARAMS, "text": "未结束"})
+
+        # 超出数量上限时删除最早结束的任务，未结束的任务不受影响
+        assert await queue.collect_garbage() == 1
+        with pytest.raises(JobNotFound):
+            await queue.get(jobs[0]["job_id"])
+        await queue.get(unfinished["job_id"])
+
+        queue.retention_seconds = 0
+        assert await queue.collect_garbage() >= 2
+        assert queue.stats["evicted"] >= 3
+    finally:
+        await queue.shutdown()
+
+
+def test_jobs_routes(client, project_dir, fake_llm):
+    project_id, _ = project_dir
+    fake_llm.reply = lambda messages: "def main(): pass"
+    response = client.post("/api/v1/jobs", json={
+        "project_id": project_id, "kind": "generate_code", "params": {"description": "入口函数", "cache": "bypass"}
+    })
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+
+    deadline = time.monotonic() + 5
+    while client.get(f"/api/v1/jobs/{job_id}").json()["status"] != "completed" and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert "def main(): pass" in client.get(f"/api/v1/jobs/{job_id}/result").json()["result"]
+    assert [j["job_id"] for j in client.get("/api/v1/jobs", params={"project_id": project_id}).json()["jobs"]] == [job_id]
+    assert client.delete(f"/api/v1/jobs/{job_id}").json()["cancelled"] is False
+
+    assert client.get("/api/v1/jobs/missing").status_code == 404
+    assert client.get("/api/v1/jobs/missing/result").status_code == 404
+    response = client.post("/api/v1/jobs", json={"project_id": project_id, "kind": "generate_code", "params": {}})
+    assert response.status_code == 422
+    assert client.post("/api/v1/jobs", json={"project_id": project_id, "kind": "translate"}).status_code == 422
+    assert "stored" in client.get("/api/v1/jobs/stats").json()
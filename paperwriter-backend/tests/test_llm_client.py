@@ -0,0 +1,125 @@
+"""LLM 传输层测试 - 阻塞调用移出事件循环、流式背压、提前结束时停止工作线程并关闭上游"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core import llm_client as llm_client_module
+from app.core.llm_client import LLMClient
+
+
+class FakeGeneration:
+    """同步的 Generation 替身：非流式调用阻塞 delay 秒，流式调用逐块产出"""
+
+    def __init__(self, chunks: int = 5, delay: float = 0.0, fail_at: int | None = None):
+        self.chunks = chunks
+        self.delay = delay
+        self.fail_at = fail_at
+        self.produced = 0
+        self.closed = threading.Event()
+        self.threads: set[str] = set()
+
+    def call(self, stream: bool = False, **kwargs):
+        self.threads.add(threading.current_thread().name)
+        if not stream:
+            time.sleep(self.delay)
+            return kwargs["messages"]
+        return self._stream()
+
+    def _stream(self):
+        try:
+            for i in range(self.chunks):
+                if i == self.fail_at:
+                    raise RuntimeError("上游断开")
+                time.sleep(self.delay)
+                self.produced += 1
+                yield i
+        finally:
+            self.closed.set()
+
+
+@pytest.fixture
+def generation(monkeypatch):
+    fake = FakeGeneration()
+    monkeypatch.setattr(llm_client_module, "Generation", fake)
+    return fake
+
+
+@pytest.fixture
+async def llm():
+    llm = LLMClient(max_workers=2, queue_size=2)
+    yield llm
+    llm.shutdown()
+
+
+async def test_call_does_not_block_event_loop(llm, generation):
+    generation.delay = 0.2
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    assert await llm.call(messages=["问题"]) == ["问题"]
+    task.cancel()
+    assert ticks >= 10
+    assert all(name.startswith("dashscope") for name in generation.threads)
+
+
+async def test_stream_yields_every_chunk(llm, generation):
+    assert [chunk async for chunk in llm.stream(messages=[])] == [0, 1, 2, 3, 4]
+    assert generation.closed.wait(1)
+
+
+async def test_stream_propagates_upstream_error(llm, generation):
+    generation.fail_at = 2
+    received = []
+    with pytest.raises(RuntimeError, match="上游断开"):
+        async for chunk in llm.stream(messages=[]):
+            received.append(chunk)
+    assert received == [0, 1]
+
+
+async def test_early_exit_stops_worker_and_closes_upstream(llm, generation):
+    generation.chunks = 1000
+    generation.delay = 0.001
+    stream = llm.stream(messages=[])
+    async for chunk in stream:
+        if chunk == 2:
+            break
+    await stream.aclose()
+    # 工作线程在下一次放入队列时发现停止标记，关闭上游生成器
+    assert await asyncio.to_thread(generation.closed.wait, 2)
+    assert generation.produced < 20
+
+
+async def test_stream_backpressure_bounds_read_ahead(llm, generation):
+    generation.chunks = 100
+    stream = llm.stream(messages=[])
+    assert await stream.__anext__() == 0
+    await asyncio.sleep(0.1)
+    # 消费方暂停时，工作线程最多预读一个队列（2）加上正在放入的一块
+    assert generation.produced <= 5
+    await stream.aclose()
+    assert await asyncio.to_thread(generation.closed.wait, 2)
+
+
+async def test_cancelled_consumer_stops_stream(llm, generation):
+    generation.chunks = 1000
+    generation.delay = 0.005
+
+    async def consume():
+        async for _ in llm.stream(messages=[]):
+            pass
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert await asyncio.to_thread(generation.closed.wait, 2)
+    assert generation.produced < 1000
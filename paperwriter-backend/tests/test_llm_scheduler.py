@@ -0,0 +1,173 @@
+"""LLM 准入控制测试 - 全局并发上限、优先级、项目间轮转、令牌桶限速、排队通知以及取消"""
+import asyncio
+import time
+
+import pytest
+
+from app.core.llm_scheduler import LLMScheduler
+
+
+def _scheduler(max_concurrent: int = 1, rate_per_minute: float = 60_000, burst: int = 100) -> LLMScheduler:
+    return LLMScheduler(max_concurrent=max_concurrent, rate_per_minute=rate_per_minute, burst=burst)
+
+
+async def _hold(scheduler: LLMScheduler, release: asyncio.Event, project_id: str = "占位"):
+    async with scheduler.admit(project_id, "interactive"):
+        await release.wait()
+
+
+async def _queue_in_order(scheduler: LLMScheduler, requests: list[tuple[str, str]]) -> list[str]:
+    """先占满名额，再按顺序排入请求，释放后返回获得名额的顺序"""
+    order = []
+    release = asyncio.Event()
+
+    async def call(project_id: str, priority: str):
+        async with scheduler.admit(project_id, priority):
+            order.append(f"{project_id}:{priority}")
+
+    holder = asyncio.create_task(_hold(scheduler, release))
+    await asyncio.sleep(0)
+    tasks = []
+    for project_id, priority in requests:
+        tasks.append(asyncio.create_task(call(project_id, priority)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+async def test_concurrency_is_capped():
+    scheduler = _scheduler(max_concurrent=2)
+    peak = 0
+
+    async def call(i: int):
+        nonlocal peak
+        async with scheduler.admit(f"p{i % 3}"):
+            peak = max(peak, scheduler.active)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(call(i) for i in range(8)))
+    assert peak == 2
+    stats = scheduler.get_stats()
+    assert stats["active"] == 0
+    assert stats["admitted"] == 8 and stats["queued"] == 6
+    assert set(stats["wait"]) == {"on_demand"}
+
+
+async def test_higher_priority_goes_first():
+    order = await _queue_in_order(_scheduler(), [
+        ("a", "background"), ("a", "on_demand"), ("a", "interactive")
+    ])
+    assert order == ["a:interactive", "a:on_demand", "a:background"]
+
+
+async def test_projects_take_turns_within_a_priority():
+    # 项目 a 的突发请求不会让后到的项目 b 一直等待
+    order = await _queue_in_order(_scheduler(), [
+        ("a", "background"), ("a", "background"), ("a", "background"), ("b", "background")
+    ])
+    assert order == ["a:background", "b:background", "a:background", "a:background"]
+
+
+async def test_queue_position_is_reported():
+    scheduler = _scheduler()
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(scheduler, release))
+    await asyncio.sleep(0)
+
+    reports = []
+    waiters = [
+        asyncio.create_task(_hold(scheduler, release, "a")),
+        asyncio.create_task(_hold(scheduler, release, "a")),
+    ]
+    await asyncio.sleep(0)
+
+    async def reported():
+        async with scheduler.admit("b", "interactive", reports.append):
+            pass
+
+    waiters.append(asyncio.create_task(reported()))
+    await asyncio.sleep(0)
+    # a 的第二个请求排在 b 之后
+    assert reports == [{"priority": "interactive", "position": 1, "eta_seconds": 4.0}]
+    assert scheduler.get_stats()["queue_depth"]["interactive"] == 3
+
+    release.set()
+    await asyncio.gather(holder, *waiters)
+
+
+async def test_token_bucket_throttles_background_but_not_interactive():
+    # 每秒 10 个令牌，最多积累 1 个
+    scheduler = _scheduler(max_concurrent=10, rate_per_minute=600, burst=1)
+    reports = []
+
+    async with scheduler.admit("a", "background"):
+        pass
+    started = time.monotonic()
+    async with scheduler.admit("a", "background", reports.append):
+        pass
+    assert time.monotonic() - started >= 0.09
+    assert reports[0]["priority"] == "background" and reports[0]["eta_seconds"] > 0
+    assert scheduler.stats["throttled"] == 1
+
+    # 交互式请求不等待，但会透支令牌
+    started = time.monotonic()
+    async with scheduler.admit("a", "interactive"):
+        pass
+    assert time.monotonic() - started < 0.05
+    assert scheduler._buckets["a"][0] < 0
+
+    # 其他项目有自己的令牌桶
+    started = time.monotonic()
+    async with scheduler.admit("b", "background"):
+        pass
+    assert time.monotonic() - started < 0.05
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    scheduler = _scheduler()
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(scheduler, release))
+    await asyncio.sleep(0)
+
+    waiter = asyncio.create_task(_hold(scheduler, release, "a"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert scheduler.get_stats()["queue_depth"]["interactive"] == 0
+    assert scheduler.stats["cancelled"] == 1
+
+    release.set()
+    await holder
+    assert scheduler.active == 0
+
+
+async def test_cancel_after_grant_passes_slot_on():
+    scheduler = _scheduler()
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold(scheduler, release))
+    await asyncio.sleep(0)
+    cancelled = asyncio.create_task(_hold(scheduler, asyncio.Event(), "a"))
+    follower = asyncio.create_task(_hold(scheduler, asyncio.Event(), "b"))
+    await asyncio.sleep(0)
+
+    # 名额已分给 a，但 a 在恢复执行前被取消
+    release.set()
+    await asyncio.sleep(0)
+    assert holder.done()
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    await asyncio.sleep(0)
+    assert scheduler.active == 1 and not follower.done()
+    follower.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await follower
+    assert scheduler.active == 0
+
+
+def test_queue_stats_route(client):
+    stats = client.get("/api/v1/ai/queue/stats").json()
+    assert set(stats["queue_depth"]) == {"interactive", "on_demand", "background"}
+    assert stats["max_concurrent"] >= 1
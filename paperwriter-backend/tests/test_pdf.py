@@ -0,0 +1,137 @@
+"""PDF 提取测试 - 文本、元数据与页码映射，按内容哈希缓存，进程池解析以及检索中的页码"""
+import asyncio
+import shutil
+import time
+
+import pytest
+
+from app.core.pdf_service import PdfService
+from app.utils.pdf_extract import extract_pdf, page_of_line
+from tests.conftest import make_pdf
+
+PAGES = [
+    "Sparse Attention for Long Documents\nJane Doe\ndoi:10.1234/sparse.2021.",
+    "Method\nWe use block sparse attention.",
+    "Results\nThe model is fast.",
+]
+INFO = {"Author": "Jane Doe; John Roe", "CreationDate": "D:20210305120000"}
+
+
+@pytest.fixture
+async def service(tmp_path):
+    service = PdfService(cache_dir=tmp_path / "cache", max_workers=1, max_pages=100)
+    yield service
+    service.shutdown()
+
+
+def test_extract_text_metadata_and_pages(tmp_path):
+    make_pdf(tmp_path / "a.pdf", PAGES, INFO)
+    result = extract_pdf(str(tmp_path / "a.pdf"))
+    assert result["pages"] == 3
+    assert result["page_lines"] == [0, 3, 5]
+    assert result["text"].split("\n")[3] == "Method"
+    assert result["metadata"] == {
+        # 没有 Title 时取首页第一行
+        "title": "Sparse Attention for Long Documents",
+        "authors": ["Jane Doe", "John Roe"],
+        "year": 2021,
+        "doi": "10.1234/sparse.2021",
+    }
+    assert result["truncated"] is False
+
+    truncated = extract_pdf(str(tmp_path / "a.pdf"), max_pages=1)
+    assert (truncated["pages"], truncated["page_lines"], truncated["truncated"]) == (3, [0], True)
+
+
+def test_page_of_line():
+    assert [page_of_line([0, 3, 5], line) for line in range(7)] == [1, 1, 1, 2, 2, 3, 3]
+
+
+async def test_extraction_is_cached_by_content_hash(service, tmp_path):
+    make_pdf(tmp_path / "a.pdf", PAGES, INFO)
+    assert service.load_cached(tmp_path / "a.pdf") is None
+
+    # 并发请求共享同一次解析
+    first, second = await asyncio.gather(
+        service.extract(tmp_path / "a.pdf"),
+        service.extract(tmp_path / "a.pdf")
+    )
+    assert first == second
+    assert service.stats["extracted"] == 1
+
+    # 复制或改名后内容不变，直接命中缓存
+    shutil.copy(tmp_path / "a.pdf", tmp_path / "副本.pdf")
+    assert (await service.extract(tmp_path / "副本.pdf"))["hash"] == first["hash"]
+    assert service.stats == {"extracted": 1, "cache_hits": 1, "failed": 0}
+
+    # 缓存落盘：新实例（模拟重启）不再解析
+    restarted = PdfService(cache_dir=service.cache_dir, max_workers=1, max_pages=100)
+    assert restarted.load_cached(tmp_path / "a.pdf")["text"] == first["text"]
+
+
+async def test_invalid_pdf_fails(service, tmp_path):
+    (tmp_path / "bad.pdf").write_bytes(b"not a pdf")
+    with pytest.raises(Exception):
+        await service.extract(tmp_path / "bad.pdf")
+    assert service.stats["failed"] == 1
+    assert service.load_cached(tmp_path / "bad.pdf") is None
+    assert service.extraction_failed(tmp_path / "bad.pdf")
+
+    # 文件修改后可以再次尝试
+    (tmp_path / "bad.pdf").write_bytes(b"still not a pdf")
+    assert not service.extraction_failed(tmp_path / "bad.pdf")
+
+
+async def test_schedule_notifies_listeners(service, tmp_path):
+    make_pdf(tmp_path / "a.pdf", PAGES)
+    notified = asyncio.Event()
+    service.add_listener(lambda project_id, path: notified.set())
+    service.schedule("p", tmp_path / "a.pdf")
+    service.schedule("p", tmp_path / "a.pdf")  # 已在排队，忽略
+    assert service.get_stats()["pending"] == 1
+    await asyncio.wait_for(notified.wait(), 10)
+    assert service.get_stats()["pending"] == 0
+    assert service.stats["extracted"] == 1
+
+
+def test_pdf_info_route(client, project_dir):
+    project_id, path = project_dir
+    (path / "引用").mkdir()
+    make_pdf(path / "引用" / "paper.pdf", PAGES, {**INFO, "Title": "Sparse Attention"})
+    (path / "引用" / "broken.pdf").write_bytes(b"%PDF-broken")
+    (path / "引用" / "notes.md").write_text("笔记", encoding="utf-8")
+
+    params = {"project_id": project_id, "file_path": "引用/paper.pdf"}
+    info = client.get("/api/v1/files/pdf", params=params).json()
+    assert info["metadata"]["title"] == "Sparse Attention"
+    assert info["pages"] == 3 and "text" not in info
+    info = client.get("/api/v1/files/pdf", params={**params, "include_text": True}).json()
+    assert info["text"].startswith("Sparse Attention for Long Documents")
+
+    assert client.get("/api/v1/files/pdf", params={**params, "file_path": "引用/notes.md"}).status_code == 400
+    assert client.get("/api/v1/files/pdf", params={**params, "file_path": "引用/broken.pdf"}).status_code == 422
+    assert client.get("/api/v1/files/pdf", params={**params, "file_path": "引用/无.pdf"}).status_code == 404
+
+
+def test_uploaded_pdf_becomes_searchable_with_pages(client, project_dir, tmp_path):
+    project_id, _ = project_dir
+    params = {"project_id": project_id, "q": "sparse"}
+    # 先打开索引，上传后的 PDF 由提取完成的通知增量加入
+    assert client.get("/api/v1/files/search", params=params).json()["results"] == []
+
+    make_pdf(tmp_path / "upload.pdf", PAGES)
+    response = client.put(
+        "/api/v1/files/upload",
+        params={"project_id": project_id, "file_path": "引用/upload.pdf"},
+        content=(tmp_path / "upload.pdf").read_bytes()
+    )
+    assert response.status_code == 200
+
+    deadline = time.monotonic() + 10
+    while True:
+        results = client.get("/api/v1/files/search", params=params).json()["results"]
+        if results or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert [r["path"] for r in results] == ["引用/upload.pdf"]
+    assert [(hit["line"], hit["page"]) for hit in results[0]["hits"]] == [(0, 1), (2, 1), (4, 2)]
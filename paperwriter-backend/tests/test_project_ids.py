@@ -0,0 +1,57 @@
+"""项目ID与内部数据目录测试 - 内部存储不在项目根目录下，非法项目ID视为项目不存在"""
+import pytest
+
+from app.config import settings
+from app.core.file_service import file_service
+from app.core.job_queue import job_queue
+from app.core.pdf_service import pdf_service
+from app.core.project_service import is_valid_project_id, project_service
+from app.core.retrieval_service import retrieval_service
+from app.core.search_index import search_index_service
+from app.core.summary_service import summary_service
+from app.core.upload_service import upload_service
+
+
+def test_internal_stores_live_under_data_root():
+    stores = [
+        job_queue.db_path,
+        pdf_service.cache_dir,
+        retrieval_service.index_root,
+        search_index_service.index_root,
+        summary_service.cache_dir,
+        upload_service.uploads_root,
+    ]
+    for path in stores:
+        assert path.is_relative_to(settings.DATA_ROOT)
+        assert not path.is_relative_to(settings.PROJECTS_ROOT)
+
+
+@pytest.mark.parametrize("project_id, valid", [
+    ("project-20240101-论文", True),
+    ("", False),
+    (".", False),
+    ("..", False),
+    (".uploads", False),
+    ("a/b", False),
+    ("a\\b", False),
+])
+def test_is_valid_project_id(project_id, valid):
+    assert is_valid_project_id(project_id) is valid
+
+
+@pytest.mark.parametrize("project_id", [".hidden", "..", "../paperwriter-test"])
+async def test_services_reject_invalid_project_ids(project_id):
+    # 即使项目根目录下存在同名的隐藏目录也不能当作项目访问
+    (settings.PROJECTS_ROOT / ".hidden").mkdir(exist_ok=True)
+    (settings.PROJECTS_ROOT / ".hidden" / "a.txt").write_text("内部数据", encoding="utf-8")
+
+    with pytest.raises(FileNotFoundError):
+        await file_service.read_file(project_id, "a.txt")
+    with pytest.raises(FileNotFoundError):
+        await project_service.get_tree_index(project_id)
+    assert (await project_service.validate_project(project_id))["valid"] is False
+
+
+def test_api_rejects_hidden_project(client):
+    response = client.post("/api/v1/files/read", json={"project_id": ".hidden", "file_path": "a.txt"})
+    assert response.status_code == 404
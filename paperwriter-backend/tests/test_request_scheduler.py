@@ -0,0 +1,141 @@
+"""WebSocket 请求调度测试 - 请求并发执行、同类请求替换、按 request_id 取消以及连接关闭"""
+import asyncio
+import types
+
+import pytest
+
+from app.api.v1.websocket import RequestScheduler
+from tests.conftest import receive_until
+
+
+async def _drain(scheduler: RequestScheduler):
+    """等待所有请求结束，并让任务结束回调执行完"""
+    while scheduler.tasks:
+        await asyncio.wait(list(scheduler.tasks.values()))
+        await asyncio.sleep(0)
+
+
+@pytest.fixture
+def scheduler():
+    sent = []
+    connection = types.SimpleNamespace(send=lambda message, **options: sent.append(message))
+    scheduler = RequestScheduler(connection)
+    scheduler.sent = sent
+    return scheduler
+
+
+async def test_requests_run_concurrently(scheduler):
+    order = []
+
+    async def handler(name: str, delay: float):
+        await asyncio.sleep(delay)
+        order.append(name)
+
+    await scheduler.submit("slow", handler("slow", 0.1))
+    await scheduler.submit("fast", handler("fast", 0.01))
+    await _drain(scheduler)
+    assert order == ["fast", "slow"]
+    assert scheduler.tasks == {}
+
+
+async def test_new_request_supersedes_same_group(scheduler):
+    finished = []
+
+    async def handler(name: str):
+        await asyncio.sleep(0.05)
+        finished.append(name)
+
+    await scheduler.submit("a", handler("a"), supersede="check")
+    await scheduler.submit("b", handler("b"), supersede="check")
+    await scheduler.submit("c", handler("c"), supersede="other")
+    await _drain(scheduler)
+    assert sorted(finished) == ["b", "c"]
+    assert scheduler.sent == [{"type": "cancelled", "request_id": "a", "reason": "superseded"}]
+    assert scheduler.superseding == {}
+
+
+async def test_same_request_id_replaces_previous(scheduler):
+    finished = []
+
+    async def handler(name: str):
+        await asyncio.sleep(0.02)
+        finished.append(name)
+
+    await scheduler.submit("a", handler("first"))
+    await scheduler.submit("a", handler("second"))
+    await _drain(scheduler)
+    assert finished == ["second"]
+
+
+async def test_cancel_by_request_id(scheduler):
+    started = asyncio.Event()
+
+    async def handler():
+        started.set()
+        await asyncio.sleep(10)
+
+    await scheduler.submit("a", handler())
+    await started.wait()
+    assert await scheduler.cancel("a") is True
+    await asyncio.sleep(0)
+    assert scheduler.sent == [{"type": "cancelled", "request_id": "a", "reason": "cancelled"}]
+    assert await scheduler.cancel("a") is False
+    assert await scheduler.cancel("missing") is False
+
+
+async def test_cancel_before_start_closes_handler(scheduler):
+    ran = False
+
+    async def handler():
+        nonlocal ran
+        ran = True
+
+    await scheduler.submit("a", handler())
+    await scheduler.cancel("a")
+    await _drain(scheduler)
+    assert not ran
+    assert scheduler.tasks == {}
+
+
+async def test_handler_error_is_reported_per_request(scheduler):
+    async def handler():
+        raise ValueError("坏请求")
+
+    await scheduler.submit("a", handler())
+    await asyncio.sleep(0)
+    assert scheduler.sent == [{"type": "error", "request_id": "a", "message": "坏请求"}]
+
+
+async def test_close_cancels_everything(scheduler):
+    cancelled = 0
+
+    async def handler():
+        nonlocal cancelled
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled += 1
+            raise
+
+    for request_id in ("a", "b", "c"):
+        await scheduler.submit(request_id, handler())
+    await asyncio.sleep(0)
+    await scheduler.close()
+    assert cancelled == 3
+
+
+def test_ws_check_supersedes_and_cancel(client, project_dir, fake_llm):
+    project_id, _ = project_dir
+    fake_llm.delay = 0.3
+    with client.websocket_connect(f"/api/v1/stream?project_id={project_id}") as ws:
+        ws.send_json({"type": "check_content", "request_id": "c1", "content": "第一次", "cache": "bypass"})
+        ws.send_json({"type": "check_content", "request_id": "c2", "content": "第二次", "cache": "bypass"})
+        messages = receive_until(ws, "diagnostics", "c2")
+        assert {"type": "cancelled", "request_id": "c1", "reason": "superseded"} in messages
+        assert not any(m["type"] == "diagnostics" and m["request_id"] == "c1" for m in messages)
+
+        ws.send_json({"type": "analyze", "request_id": "a1", "idea": "想法"})
+        receive_until(ws, "stream_started", "a1")
+        ws.send_json({"type": "cancel", "request_id": "a1"})
+        messages = receive_until(ws, "cancelled", "a1")
+        assert messages[-1]["reason"] == "cancelled"
@@ -0,0 +1,137 @@
+"""可续传上传测试 - 按偏移量的幂等分块、缺口与越界、校验和、空间预留以及过期清理"""
+import errno
+import hashlib
+import json
+import os
+import time
+
+import pytest
+
+from app.config import settings
+from app.core.project_quota import project_quota
+from app.core.upload_service import upload_service
+
+DATA = bytes(range(256)) * 400  # 102400 字节
+
+
+@pytest.fixture
+def upload(client, project_dir):
+    """创建一个带校验和的上传，返回 (project_id, 项目路径, upload_id)"""
+    project_id, path = project_dir
+    response = client.post("/api/v1/files/uploads", json={
+        "project_id": project_id,
+        "file_path": "引用/bundle.pdf",
+        "size": len(DATA),
+        "checksum": hashlib.sha256(DATA).hexdigest().upper()
+    })
+    assert response.status_code == 200
+    status = response.json()
+    assert (status["received"], status["complete"]) == (0, False)
+    return project_id, path, status["upload_id"]
+
+
+def _put(client, upload_id: str, offset: int, data: bytes):
+    return client.put(f"/api/v1/files/uploads/{upload_id}", params={"offset": offset}, content=data)
+
+
+def test_resume_with_overlapping_chunks(client, upload):
+    project_id, path, upload_id = upload
+    assert _put(client, upload_id, 0, DATA[:40000]).json()["received"] == 40000
+
+    # 断线重连：查询已接收字节数，重叠重发同一分块也是安全的
+    assert client.get(f"/api/v1/files/uploads/{upload_id}").json()["received"] == 40000
+    assert _put(client, upload_id, 0, DATA[:40000]).json()["received"] == 40000
+    assert _put(client, upload_id, 30000, DATA[30000:80000]).json()["received"] == 80000
+
+    # 有缺口：409，响应头告知已接收位置
+    response = _put(client, upload_id, 90000, DATA[90000:])
+    assert response.status_code == 409
+    assert response.headers["upload-offset"] == "80000"
+
+    # 未接收完整时不能完成
+    assert client.post(f"/api/v1/files/uploads/{upload_id}/complete").status_code == 400
+
+    status = _put(client, upload_id, 80000, DATA[80000:]).json()
+    assert status["complete"] is True
+    response = client.post(f"/api/v1/files/uploads/{upload_id}/complete")
+    assert response.status_code == 200
+    assert (path / "引用" / "bundle.pdf").read_bytes() == DATA
+    assert client.get(f"/api/v1/files/uploads/{upload_id}").status_code == 404
+    assert client.get("/api/v1/files/usage", params={"project_id": project_id}).json()["used"] == len(DATA)
+
+
+def test_complete_across_filesystems(client, upload, monkeypatch):
+    project_id, path, upload_id = upload
+    replace = os.replace
+
+    def cross_device(source, target):
+        # 模拟 DATA_ROOT 与 PROJECTS_ROOT 挂载在不同文件系统
+        if str(source).startswith(str(settings.DATA_ROOT)) and str(target).startswith(str(path)):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        replace(source, target)
+
+    monkeypatch.setattr(os, "replace", cross_device)
+    assert _put(client, upload_id, 0, DATA).json()["complete"] is True
+    response = client.post(f"/api/v1/files/uploads/{upload_id}/complete")
+    assert response.status_code == 200
+    assert (path / "引用" / "bundle.pdf").read_bytes() == DATA
+    # 复制用的临时文件已被 rename，暂存目录已清理
+    assert [p.name for p in (path / "引用").iterdir()] == ["bundle.pdf"]
+    assert not list((settings.DATA_ROOT / "uploads").glob(f"{upload_id}*"))
+
+
+def test_data_beyond_declared_size_is_rejected(client, upload):
+    _, _, upload_id = upload
+    response = _put(client, upload_id, 0, DATA + b"extra")
+    assert response.status_code == 400
+    assert client.get(f"/api/v1/files/uploads/{upload_id}").json()["received"] == len(DATA)
+
+
+def test_checksum_mismatch_discards_upload(client, upload):
+    project_id, path, upload_id = upload
+    corrupted = bytearray(DATA)
+    corrupted[500] ^= 0xFF
+    _put(client, upload_id, 0, bytes(corrupted))
+    response = client.post(f"/api/v1/files/uploads/{upload_id}/complete")
+    assert response.status_code == 422
+    assert not (path / "引用" / "bundle.pdf").exists()
+    assert client.get(f"/api/v1/files/uploads/{upload_id}").status_code == 404
+    # 预留的空间随上传删除释放
+    assert client.get("/api/v1/files/usage", params={"project_id": project_id}).json()["used"] == 0
+
+
+def test_create_reserves_and_abort_releases_space(client, upload, monkeypatch):
+    project_id, _, upload_id = upload
+    assert client.get("/api/v1/files/usage", params={"project_id": project_id}).json()["used"] == len(DATA)
+
+    monkeypatch.setattr(project_quota, "max_bytes", len(DATA) + 10)
+    response = client.post("/api/v1/files/uploads", json={
+        "project_id": project_id, "file_path": "引用/second.pdf", "size": 100
+    })
+    assert response.status_code == 413
+
+    assert client.delete(f"/api/v1/files/uploads/{upload_id}").status_code == 200
+    assert client.get("/api/v1/files/usage", params={"project_id": project_id}).json()["used"] == 0
+    assert client.delete(f"/api/v1/files/uploads/{upload_id}").status_code == 404
+
+
+def test_invalid_upload_id(client):
+    assert client.get("/api/v1/files/uploads/../../etc").status_code == 404
+    assert client.get("/api/v1/files/uploads/" + "0" * 32).status_code == 404
+
+
+async def test_expired_uploads_are_collected(project_dir):
+    project_id, _ = project_dir
+    stale = await upload_service.create(project_id, "old.pdf", 10)
+    fresh = await upload_service.create(project_id, "new.pdf", 10)
+
+    stale_dir = upload_service.uploads_root / stale["upload_id"]
+    past = time.time() - upload_service.ttl_seconds - 60
+    os.utime(stale_dir / "data.part", (past, past))
+    meta = json.loads((stale_dir / "meta.json").read_text(encoding="utf-8"))
+    (stale_dir / "meta.json").write_text(json.dumps({**meta, "created_at": past}), encoding="utf-8")
+
+    assert await upload_service.collect_garbage() >= 1
+    assert not stale_dir.exists()
+    assert (await upload_service.status(fresh["upload_id"]))["received"] == 0
+    await upload_service.abort(fresh["upload_id"])
@@ -0,0 +1,151 @@
+"""语义检索测试 - 哈希向量化、片段切分、内存映射的向量索引、增量同步以及提示词注入"""
+import numpy as np
+import pytest
+
+from app.core.retrieval_service import ProjectVectorIndex
+from app.utils.embedding import Embedder, HashingEmbedder, load_embedder
+from app.utils.text_chunks import split_passages
+
+
+class CountingEmbedder(HashingEmbedder):
+    """记录向量化过的文本条数"""
+
+    def __init__(self, dim: int = 256):
+        super().__init__(dim)
+        self.embedded = 0
+
+    def embed(self, texts):
+        self.embedded += len(texts)
+        return super().embed(texts)
+
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "project"
+    (root / "引用").mkdir(parents=True)
+    (root / "idea").mkdir()
+    (root / "主体").mkdir()
+    (root / "引用" / "transformer.md").write_text(
+        "# Transformer\n\n自注意力机制让模型并行处理序列。\n\n# 位置编码\n\n正弦位置编码表示词的顺序。\n",
+        encoding="utf-8"
+    )
+    (root / "引用" / "cnn.txt").write_text("卷积神经网络通过局部感受野提取图像特征。\n", encoding="utf-8")
+    (root / "idea" / "notes.md").write_text("想法：用图神经网络建模分子结构。\n", encoding="utf-8")
+    # 不在 RETRIEVAL_FOLDERS 中的目录不参与检索
+    (root / "主体" / "draft.md").write_text("自注意力机制的草稿。\n", encoding="utf-8")
+    return root
+
+
+def _index(root, tmp_path) -> ProjectVectorIndex:
+    return ProjectVectorIndex("p", root, tmp_path / "vectors", ["引用", "idea"], 200, 1024 * 1024)
+
+
+def _top(index: ProjectVectorIndex, embedder, query: str, top_k: int = 1) -> list[dict]:
+    return index.search(embedder.embed([query])[0], top_k, 0.0)
+
+
+def test_hashing_embedder():
+    embedder = HashingEmbedder(128)
+    vectors = embedder.embed(["自注意力机制", "注意力机制的计算", "卷积网络", ""])
+    assert vectors.shape == (4, 128) and vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[:3], axis=1), 1.0)
+    assert not vectors[3].any()
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+    assert np.array_equal(embedder.embed(["自注意力机制"])[0], vectors[0])
+    # 模型无法加载时回退为哈希向量化
+    assert load_embedder("不存在的模型", 64).name == "hashing-v1-64"
+
+
+def test_embedder_interface_is_abstract():
+    class NoName(Embedder):
+        dim = 8
+
+        def embed(self, texts):
+            return np.zeros((len(texts), 8), dtype=np.float32)
+
+    with pytest.raises(TypeError):
+        Embedder()
+    # 缺少 name 的实现不能实例化
+    with pytest.raises(TypeError):
+        NoName()
+
+
+def test_split_passages():
+    content = "# 标题一\n第一段\n\n第二段\n# 标题二\n" + "长" * 250
+    passages = split_passages(content, 100)
+    assert passages[0] == (0, "# 标题一\n第一段\n\n第二段")
+    assert passages[1] == (4, "# 标题二")
+    # 单行超长时按字符拆开
+    assert {line for line, _ in passages[2:]} == {5}
+    assert all(len(text) <= 100 for _, text in passages[2:])
+    assert "".join(text for _, text in passages[2:]) == "长" * 250
+
+
+def test_sync_and_search(project, tmp_path):
+    embedder = CountingEmbedder()
+    index = _index(project, tmp_path)
+    index.sync(embedder)
+    assert index.passage_count == 4
+    assert isinstance(index._snapshot[0], np.memmap)
+
+    result = _top(index, embedder, "注意力机制")[0]
+    assert (result["path"], result["line"]) == ("引用/transformer.md", 0)
+    assert _top(index, embedder, "图神经网络 分子")[0]["path"] == "idea/notes.md"
+    results = _top(index, embedder, "卷积 图像", top_k=10)
+    assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
+    assert all(r["path"] != "主体/draft.md" for r in results)
+    assert index.search(embedder.embed(["卷积"])[0], 10, 0.99) == []
+
+
+def test_sync_only_embeds_changed_files(project, tmp_path):
+    embedder = CountingEmbedder()
+    index = _index(project, tmp_path)
+    index.sync(embedder)
+    assert embedder.embedded == 4
+
+    index.sync(embedder)
+    assert embedder.embedded == 4
+
+    (project / "引用" / "cnn.txt").write_text("循环神经网络处理时间序列。\n", encoding="utf-8")
+    (project / "idea" / "notes.md").unlink()
+    index.sync(embedder)
+    assert embedder.embedded == 5
+    assert index.passage_count == 3
+    assert _top(index, embedder, "循环神经网络")[0]["path"] == "引用/cnn.txt"
+    # 复制的旧行仍与片段对应
+    assert _top(index, embedder, "正弦位置编码")[0]["line"] == 4
+    assert len(list((tmp_path / "vectors").glob("vectors-*"))) == 1
+
+
+def test_index_survives_restart_and_rebuilds_on_model_change(project, tmp_path):
+    index = _index(project, tmp_path)
+    index.sync(CountingEmbedder())
+
+    embedder = CountingEmbedder()
+    restarted = _index(project, tmp_path)
+    restarted.sync(embedder)
+    assert embedder.embedded == 0
+    assert _top(restarted, embedder, "注意力机制")[0]["path"] == "引用/transformer.md"
+
+    other = CountingEmbedder(dim=64)
+    rebuilt = _index(project, tmp_path)
+    rebuilt.sync(other)
+    assert other.embedded == 4
+
+
+def test_retrieve_route_and_prompt_injection(client, project_dir, fake_llm):
+    project_id, path = project_dir
+    (path / "引用").mkdir()
+    (path / "引用" / "gnn.md").write_text("图神经网络通过消息传递聚合邻居节点信息。\n", encoding="utf-8")
+
+    result = client.get("/api/v1/files/retrieve", params={"project_id": project_id, "q": "消息传递 图神经网络"}).json()
+    assert result["passages"] == 1
+    assert result["results"][0]["path"] == "引用/gnn.md"
+
+    response = client.post("/api/v1/ai/search-papers", json={
+        "project_id": project_id, "keywords": ["图神经网络", "消息传递"], "cache": "bypass"
+    })
+    assert response.status_code == 200
+    prompt = fake_llm.calls[-1][-1]["content"]
+    assert "项目参考资料" in prompt
+    assert "引用/gnn.md 第 1 行" in prompt
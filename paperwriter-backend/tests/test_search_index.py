@@ -0,0 +1,155 @@
+"""全文检索测试 - FTS5 索引同步、增量更新、中文片段与英文前缀匹配、过滤以及检索接口"""
+import os
+import time
+
+import pytest
+
+from app.config import settings
+from app.core import search_index
+from app.core.pdf_service import PdfService
+from app.core.search_index import ProjectSearchIndex
+from app.utils.text_search import build_match_query, find_hits, query_terms
+
+
+@pytest.fixture
+def index(tmp_path):
+    root = tmp_path / "project"
+    (root / "主体").mkdir(parents=True)
+    (root / "代码").mkdir()
+    (root / "主体" / "intro.md").write_text(
+        "# 引言\n\n本文提出一种新的注意力机制。\nWe evaluate the method on ImageNet.\n",
+        encoding="utf-8"
+    )
+    (root / "主体" / "related.tex").write_text(
+        "\\section{相关工作}\n注意力机制最早用于机器翻译。\n", encoding="utf-8"
+    )
+    (root / "代码" / "train.py").write_text("def train(method):\n    return method\n", encoding="utf-8")
+    (root / "代码" / "weights.bin").write_bytes(b"attention")
+    (root / ".cache").mkdir()
+    (root / ".cache" / "hidden.md").write_text("注意力机制", encoding="utf-8")
+
+    index = ProjectSearchIndex(
+        "p", root, tmp_path / "index.sqlite3",
+        {ext.lower() for ext in settings.ALLOWED_EXTENSIONS}, 1024 * 1024
+    )
+    index.sync()
+    yield index
+    index.close()
+
+
+def _paths(index: ProjectSearchIndex, query: str, **options) -> list[str]:
+    results, _ = index.search(query_terms(query), **options)
+    return [result["path"] for result in results]
+
+
+def test_query_helpers():
+    assert query_terms("注意力  method 注意力") == ["注意力", "method"]
+    assert build_match_query([]) == ""
+    hits = find_hits("第一行\nfoo Method bar\n", ["method"])
+    assert hits == [{"line": 1, "column": 4, "length": 6, "snippet": hits[0]["snippet"]}]
+    assert "Method" in hits[0]["snippet"]
+
+
+def test_search_ranks_and_locates_hits(index):
+    results, has_more = index.search(query_terms("注意力机制"))
+    assert not has_more
+    assert {r["path"] for r in results} == {"主体/intro.md", "主体/related.tex"}
+    intro = next(r for r in results if r["path"] == "主体/intro.md")
+    assert intro["hits"][0]["line"] == 2
+    assert intro["hits"][0]["column"] == 8
+    assert "注意力机制" in intro["snippet"]
+    assert results[0]["score"] >= results[1]["score"]
+
+
+def test_chinese_fragments_and_english_prefixes(index):
+    assert set(_paths(index, "力机")) == {"主体/intro.md", "主体/related.tex"}
+    assert _paths(index, "机器翻译") == ["主体/related.tex"]
+    assert set(_paths(index, "meth")) == {"主体/intro.md", "代码/train.py"}
+    # 多个词之间为 AND
+    assert _paths(index, "注意力 ImageNet") == ["主体/intro.md"]
+    # 文件路径也参与检索
+    assert _paths(index, "train") == ["代码/train.py"]
+
+
+def test_filters_and_paging(index):
+    assert _paths(index, "注意力", extensions={".tex"}) == ["主体/related.tex"]
+    assert _paths(index, "method", path_prefix="代码") == ["代码/train.py"]
+    results, has_more = index.search(query_terms("注意力"), limit=1)
+    assert len(results) == 1 and has_more
+    assert _paths(index, "attention") == []  # 不在 ALLOWED_EXTENSIONS 中的文件不索引
+
+
+def test_incremental_updates(index):
+    conn = index._writer()
+    intro = index.root / "主体" / "intro.md"
+    # 未变化的文件不会重新写入
+    assert index._index_file(conn, "主体/intro.md", os.stat(intro)) is False
+
+    intro.write_text("卷积网络\n", encoding="utf-8")
+    index.update_path("主体/intro.md")
+    assert _paths(index, "注意力") == ["主体/related.tex"]
+    assert _paths(index, "卷积") == ["主体/intro.md"]
+
+    (index.root / "主体" / "新章节").mkdir()
+    (index.root / "主体" / "新章节" / "a.md").write_text("卷积核", encoding="utf-8")
+    index.update_path("主体/新章节")
+    assert set(_paths(index, "卷积")) == {"主体/intro.md", "主体/新章节/a.md"}
+
+    intro.unlink()
+    index.update_path("主体/intro.md")
+    assert _paths(index, "卷积") == ["主体/新章节/a.md"]
+
+
+async def test_failed_pdf_is_not_extracted_again(index, tmp_path, monkeypatch):
+    service = PdfService(cache_dir=tmp_path / "pdf_cache", max_workers=1, max_pages=10)
+    monkeypatch.setattr(search_index, "pdf_service", service)
+    broken = index.root / "主体" / "broken.pdf"
+    broken.write_bytes(b"%PDF-broken")
+    try:
+        index.sync()
+        assert list(index.pending_pdfs) == ["主体/broken.pdf"]
+        index.pending_pdfs.clear()
+        with pytest.raises(Exception):
+            await service.extract(broken)
+
+        # 提取失败后以空正文登记，再次同步不会重新安排提取
+        index.update_path("主体/broken.pdf")
+        index.sync()
+        assert not index.pending_pdfs
+        assert _paths(index, "broken") == []
+
+        # 文件修改后重新提取
+        broken.write_bytes(b"%PDF-broken again")
+        index.sync()
+        assert list(index.pending_pdfs) == ["主体/broken.pdf"]
+    finally:
+        service.shutdown()
+
+
+def test_search_route_follows_file_writes(client, project_dir):
+    project_id, path = project_dir
+    (path / "idea").mkdir()
+    (path / "idea" / "notes.md").write_text("研究想法：图神经网络\n", encoding="utf-8")
+
+    def search(q: str) -> dict:
+        deadline = time.monotonic() + 5
+        while True:
+            result = client.get("/api/v1/files/search", params={"project_id": project_id, "q": q}).json()
+            if not result["indexing"] or time.monotonic() > deadline:
+                return result
+            time.sleep(0.02)
+
+    result = search("神经网络")
+    assert [r["path"] for r in result["results"]] == ["idea/notes.md"]
+    assert "took_ms" in result
+
+    client.post("/api/v1/files/create", json={
+        "project_id": project_id, "file_path": "idea/more.md", "content": "神经网络的可解释性"
+    })
+    deadline = time.monotonic() + 5
+    while len(search("神经网络")["results"]) < 2 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert {r["path"] for r in search("神经网络")["results"]} == {"idea/notes.md", "idea/more.md"}
+
+    response = client.get("/api/v1/files/search", params={"project_id": project_id, "q": "   "})
+    assert response.status_code == 400
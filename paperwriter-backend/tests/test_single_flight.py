@@ -0,0 +1,121 @@
+"""请求合并测试 - 进行中调用共享、调用方取消、流式中途加入以及按项目区分"""
+import asyncio
+
+import pytest
+
+from app.core.ai_service import ai_service
+from app.core.single_flight import SingleFlight
+
+
+async def test_concurrent_calls_share_upstream():
+    flight = SingleFlight()
+    started = 0
+
+    async def call():
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.05)
+        return "结果"
+
+    results = await asyncio.gather(*(flight.do("k", call) for _ in range(5)))
+    assert results == ["结果"] * 5
+    assert started == 1
+    assert flight.get_stats()["joined"] == 4
+    assert flight.get_stats()["in_flight"] == 0
+
+    # 上游结束后键已释放，再次调用重新发起
+    await flight.do("k", call)
+    assert started == 2
+
+
+async def test_errors_are_shared():
+    flight = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("上游失败")
+
+    results = await asyncio.gather(flight.do("k", call), flight.do("k", call), return_exceptions=True)
+    assert [str(r) for r in results] == ["上游失败", "上游失败"]
+
+
+async def test_upstream_cancelled_only_when_all_callers_leave():
+    flight = SingleFlight()
+    upstream_cancelled = asyncio.Event()
+
+    async def call():
+        try:
+            await asyncio.sleep(0.1)
+            return "结果"
+        except asyncio.CancelledError:
+            upstream_cancelled.set()
+            raise
+
+    first = asyncio.create_task(flight.do("k", call))
+    second = asyncio.create_task(flight.do("k", call))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == "结果"
+    assert not upstream_cancelled.is_set()
+
+    first = asyncio.create_task(flight.do("k", call))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    await asyncio.wait_for(upstream_cancelled.wait(), 1)
+
+
+async def test_stream_late_joiner_receives_all_chunks():
+    flight = SingleFlight()
+    opened = 0
+    second_chunk = asyncio.Event()
+
+    async def upstream():
+        nonlocal opened
+        opened += 1
+        for chunk in ["a", "b", "c"]:
+            yield chunk
+            if chunk == "b":
+                second_chunk.set()
+            await asyncio.sleep(0.02)
+
+    async def collect():
+        return [chunk async for chunk in flight.stream("k", upstream)]
+
+    first = asyncio.create_task(collect())
+    await second_chunk.wait()
+    second = asyncio.create_task(collect())
+    assert await first == ["a", "b", "c"]
+    assert await second == ["a", "b", "c"]
+    assert opened == 1
+    assert flight.get_stats()["stream_joined"] == 1
+
+
+async def test_same_project_calls_are_merged(project_dir, fake_llm):
+    project_id, _ = project_dir
+    fake_llm.delay = 0.05
+    await asyncio.gather(*(
+        ai_service.text_to_latex("同一段文本", "bypass", project_id) for _ in range(3)
+    ))
+    assert len(fake_llm.calls) == 1
+
+
+async def test_calls_from_different_projects_are_not_merged(project_dir, fake_llm):
+    project_id, _ = project_dir
+    fake_llm.delay = 0.05
+    await asyncio.gather(
+        ai_service.text_to_latex("同一段文本", "bypass", project_id),
+        ai_service.text_to_latex("同一段文本", "bypass", "other-project")
+    )
+    assert len(fake_llm.calls) == 2
+
+
+@pytest.mark.parametrize("projects, expected", [(["p", "p"], 1), (["p", "q"], 2)])
+async def test_streams_are_merged_per_project(fake_llm, projects, expected):
+    fake_llm.delay = 0.02
+
+    async def collect(project_id):
+        return "".join([chunk async for chunk in ai_service._stream([{"role": "user", "content": "续写"}], project_id)])
+
+    results = await asyncio.gather(*(collect(project_id) for project_id in projects))
+    assert results == ["你好，世界"] * len(projects)
+    assert len(fake_llm.streams) == expected
@@ -0,0 +1,93 @@
+"""流式传输量线性测试
+
+在本地模拟 DashScope 服务上生成不同长度的回答，统计 SSE（/api/v1/ai/continue-writing）
+和 WebSocket（continue 消息）实际发送的字节数，检查每个输出字符的传输字节数不随回答长度增长。
+
+关闭合并窗口（每个上游块一帧）作为最坏情况；上游分别使用增量模式和完整文本模式
+（AI_STREAM_INCREMENTAL=false，服务端转换为增量）。
+"""
+import json
+import socket
+
+import dashscope
+import pytest
+
+from app.config import settings
+from benchmarks.fake_dashscope import FakeDashScope
+from tests.conftest import parse_sse
+
+# 回答的上游块数（每块一个字）
+LENGTHS = (50, 100, 200, 400)
+# 每个输出字符的传输字节数，最长与最短回答之比超过该值即判定为非线性
+MAX_RATIO_GROWTH = 1.5
+
+
+@pytest.fixture(scope="module")
+def fake_dashscope():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    fake = FakeDashScope(chunk_text="字", chunk_delay=0.001, latency=0)
+    server = fake.start(port)
+    fake.url = f"http://127.0.0.1:{port}/api/v1"
+    yield fake
+    server.should_exit = True
+
+
+@pytest.fixture
+def upstream(monkeypatch, fake_dashscope):
+    monkeypatch.setattr(dashscope, "base_http_api_url", fake_dashscope.url)
+    # 每个上游块单独成帧：不依赖合并窗口掩盖传输量
+    monkeypatch.setattr(settings, "STREAM_COALESCE_MS", 0)
+    monkeypatch.setattr(settings, "STREAM_COALESCE_BYTES", 1)
+    return fake_dashscope
+
+
+def sse_bytes(client, project_id: str, prompt: str) -> tuple[int, str]:
+    """发起一次 SSE 续写，返回 (响应字节数, 拼接后的文本)"""
+    response = client.post(
+        "/api/v1/ai/continue-writing",
+        json={"project_id": project_id, "current_content": prompt}
+    )
+    events = parse_sse(response.text)
+    assert events[-1]["event"] == "done"
+    text = "".join(event["data"] for event in events if event["event"] == "message")
+    return len(response.content), text
+
+
+def ws_bytes(client, project_id: str, prompt: str) -> tuple[int, str]:
+    """发起一次 WebSocket 续写，返回 (stream 消息字节数, 拼接后的文本)"""
+    total = 0
+    text = []
+    with client.websocket_connect(f"/api/v1/stream?project_id={project_id}") as websocket:
+        websocket.send_json({"type": "continue", "request_id": "linear", "current_content": prompt})
+        while True:
+            raw = websocket.receive_text()
+            message = json.loads(raw)
+            if message["type"] == "stream":
+                total += len(raw.encode("utf-8"))
+                text.append(message["content"])
+            elif message["type"] == "error":
+                pytest.fail(message["message"])
+            elif message["type"] == "complete":
+                break
+    return total, "".join(text)
+
+
+@pytest.mark.parametrize("request_stream", [sse_bytes, ws_bytes], ids=["sse", "ws"])
+@pytest.mark.parametrize("incremental", [True, False], ids=["incremental", "full-text"])
+def test_bytes_grow_linearly(client, project_dir, upstream, monkeypatch, request_stream, incremental):
+    project_id, _ = project_dir
+    monkeypatch.setattr(settings, "AI_STREAM_INCREMENTAL", incremental)
+
+    ratios = []
+    for n in LENGTHS:
+        upstream.chunks = n
+        sent, text = request_stream(client, project_id, f"linear-{incremental}-{n}")
+        assert text == "字" * n
+        ratios.append(sent / n)
+
+    assert ratios[-1] / ratios[0] <= MAX_RATIO_GROWTH, ratios
+    # 旧实现每块发送截至当前的完整文本：3 字节 * (1 + 2 + ... + n)
+    n = LENGTHS[-1]
+    assert sent < 3 * n * (n + 1) // 2
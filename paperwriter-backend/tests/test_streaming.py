@@ -0,0 +1,124 @@
+"""流式输出层测试 - 时间/大小窗口合并、心跳、上游失败、SSE 多行编码以及 gzip"""
+import asyncio
+import zlib
+
+import pytest
+
+from app.config import settings
+from app.core.streaming import StreamFrame, coalesce, encode_sse, sse_events
+from tests.conftest import parse_sse
+
+
+async def _chunks(items: list, delay: float = 0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+async def _collect(batches) -> list:
+    return [batch async for batch in batches]
+
+
+async def test_chunks_within_window_are_merged():
+    batches = await _collect(coalesce(_chunks(list("甲乙丙丁")), window=1, max_bytes=1024))
+    assert batches == ["甲乙丙丁"]
+
+
+async def test_window_expiry_flushes():
+    batches = await _collect(coalesce(_chunks(["甲", "乙", "丙"], delay=0.05), window=0.01, max_bytes=1024))
+    assert batches == ["甲", "乙", "丙"]
+
+
+async def test_size_limit_flushes_early():
+    # 每个汉字 3 字节，达到 6 字节即输出
+    batches = await _collect(coalesce(_chunks(list("甲乙丙丁戊")), window=10, max_bytes=6))
+    assert batches == ["甲乙", "丙丁", "戊"]
+
+
+async def test_replace_mode_keeps_latest_text():
+    batches = await _collect(coalesce(_chunks(["甲", "甲乙", "甲乙丙"]), merge="replace", window=1, max_bytes=1024))
+    assert batches == ["甲乙丙"]
+
+
+async def test_heartbeat_when_idle():
+    batches = await _collect(coalesce(_chunks(["甲"], delay=0.12), window=0.01, heartbeat=0.05))
+    assert batches[-1] == "甲"
+    assert batches[:-1] and all(batch is None for batch in batches[:-1])
+
+
+async def test_upstream_failure_flushes_pending_then_raises():
+    batches = []
+    with pytest.raises(RuntimeError, match="上游失败"):
+        async for batch in coalesce(_chunks(["甲", "乙", RuntimeError("上游失败")]), window=1):
+            batches.append(batch)
+    assert batches == ["甲乙"]
+
+
+async def test_upstream_is_closed_when_consumer_stops():
+    closed = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                yield "块"
+                await asyncio.sleep(0.01)
+        finally:
+            closed.set()
+
+    batches = coalesce(endless(), window=0.02)
+    assert await batches.__anext__()
+    await batches.aclose()
+    await asyncio.wait_for(closed.wait(), 1)
+
+
+def test_encode_sse_multiline():
+    assert encode_sse("甲\n乙\r\n丙\r丁", event_id=3) == "id: 3\ndata: 甲\ndata: 乙\ndata: 丙\ndata: 丁\n\n"
+    assert encode_sse("", event="done") == "event: done\ndata: \n\n"
+    assert parse_sse(encode_sse("第一行\n\n第三行", event_id=1))[0]["data"] == "第一行\n\n第三行"
+
+
+async def test_sse_events_heartbeat_snapshot_error_and_done():
+    async def frames():
+        yield StreamFrame(1, "甲")
+        yield None
+        yield StreamFrame(2, "甲乙", snapshot=True)
+        raise RuntimeError("生成失败")
+
+    body = "".join(await _collect(sse_events(frames())))
+    assert ": ping\n\n" in body
+    events = parse_sse(body)
+    assert [(e["event"], e["id"], e["data"]) for e in events] == [
+        ("message", 1, "甲"), ("snapshot", 2, "甲乙"), ("error", None, "生成失败"), ("done", None, "")
+    ]
+
+
+def test_route_streams_multiline_chunks_as_event_stream(client, project_dir, fake_llm):
+    project_id, _ = project_dir
+    fake_llm.stream_chunks = ["第一段\n\n", "第二", "段"]
+    response = client.post("/api/v1/ai/analyze-idea", json={"project_id": project_id, "idea_content": "想法"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    events = parse_sse(response.text)
+    text = "".join(e["data"] for e in events if e["event"] == "message")
+    assert text == "第一段\n\n第二段"
+    # 上游块间没有间隔，合并为一帧
+    assert len([e for e in events if e["event"] == "message"]) == 1
+    assert events[-1]["event"] == "done"
+
+
+def test_route_gzip(client, project_dir, fake_llm, monkeypatch):
+    project_id, _ = project_dir
+    monkeypatch.setattr(settings, "STREAM_GZIP_ENABLED", True)
+    with client.stream(
+        "POST", "/api/v1/ai/analyze-idea",
+        json={"project_id": project_id, "idea_content": "想法"},
+        headers={"Accept-Encoding": "gzip"}
+    ) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        chunks = list(response.iter_raw())
+    body = zlib.decompress(b"".join(chunks), 31).decode("utf-8")
+    events = parse_sse(body)
+    assert "".join(e["data"] for e in events if e["event"] == "message") == "你好，世界"
@@ -0,0 +1,96 @@
+"""可续传流测试 - SSE 的 Last-Event-ID 续传、WebSocket 的 resume 以及非法序号的处理"""
+import pytest
+
+from tests.conftest import parse_sse, receive_until
+
+
+@pytest.fixture
+def slow_stream(fake_llm):
+    """每块间隔足够长，合并窗口内只有一块，每块各占一帧"""
+    fake_llm.stream_chunks = ["甲", "乙", "丙", "丁"]
+    fake_llm.delay = 0.08
+    return fake_llm
+
+
+def test_sse_resume_replays_after_last_event_id(client, project_dir, slow_stream):
+    project_id, _ = project_dir
+    response = client.post("/api/v1/ai/analyze-idea", json={"project_id": project_id, "idea_content": "想法"})
+    assert response.status_code == 200
+    stream_id = response.headers["X-Stream-Id"]
+    events = parse_sse(response.text)
+    frames = [e for e in events if e["event"] == "message"]
+    assert "".join(e["data"] for e in frames) == "甲乙丙丁"
+    assert [e["id"] for e in frames] == list(range(1, len(frames) + 1))
+    assert events[-1]["event"] == "done"
+
+    resumed = client.get(f"/api/v1/ai/streams/{stream_id}", headers={"Last-Event-ID": "1"})
+    resumed_frames = [e for e in parse_sse(resumed.text) if e["event"] == "message"]
+    assert resumed_frames == frames[1:]
+
+    # 请求头优先于查询参数
+    resumed = client.get(
+        f"/api/v1/ai/streams/{stream_id}",
+        params={"last_event_id": 0},
+        headers={"Last-Event-ID": str(frames[-1]["id"])}
+    )
+    assert [e["event"] for e in parse_sse(resumed.text)] == ["done"]
+
+
+def test_sse_resume_unknown_stream(client):
+    assert client.get("/api/v1/ai/streams/missing").status_code == 404
+
+
+def test_ws_resume_on_new_connection(client, project_dir, slow_stream):
+    project_id, _ = project_dir
+    url = f"/api/v1/stream?project_id={project_id}"
+    with client.websocket_connect(url) as ws:
+        ws.send_json({"type": "analyze", "request_id": "a", "idea": "想法"})
+        messages = receive_until(ws, "complete", "a")
+    frames = [m for m in messages if m["type"] == "stream"]
+    stream_id = frames[0]["stream_id"]
+    assert "".join(m["content"] for m in frames) == "甲乙丙丁"
+
+    with client.websocket_connect(url) as ws:
+        ws.send_json({"type": "resume", "request_id": "r", "stream_id": stream_id, "last_seq": 1})
+        resumed = receive_until(ws, "complete", "r")
+    assert resumed[0]["type"] == "stream_started"
+    resumed_text = "".join(m["content"] for m in resumed if m["type"] == "stream")
+    assert resumed_text == "".join(m["content"] for m in frames if m["seq"] > 1)
+
+
+@pytest.mark.parametrize("message", [
+    {"type": "resume", "request_id": "bad", "last_seq": "abc"},
+    {"type": "resume", "request_id": "bad", "last_seq": -1},
+    {"type": "subscribe_tree", "request_id": "bad", "since": "abc"},
+    {"type": "subscribe_tree", "request_id": "bad", "since": [1]},
+])
+def test_ws_invalid_seq_reports_request_error(client, project_dir, slow_stream, message):
+    project_id, _ = project_dir
+    url = f"/api/v1/stream?project_id={project_id}"
+    if message["type"] == "resume":
+        with client.websocket_connect(url) as ws:
+            ws.send_json({"type": "analyze", "request_id": "a", "idea": "想法"})
+            stream_id = receive_until(ws, "complete", "a")[0]["stream_id"]
+        message = {**message, "stream_id": stream_id}
+
+    with client.websocket_connect(url) as ws:
+        ws.send_json(message)
+        error = receive_until(ws, "error", "bad")[-1]
+        assert error["type"] == "error"
+        # 连接仍然可用
+        ws.send_json({"type": "cancel", "request_id": "next"})
+        assert ws.receive_json() == {
+            "type": "error",
+            "request_id": "next",
+            "message": "No in-flight request: next"
+        }
+
+
+def test_ws_non_object_message(client, project_dir):
+    project_id, _ = project_dir
+    with client.websocket_connect(f"/api/v1/stream?project_id={project_id}") as ws:
+        ws.send_json([1, 2])
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"type": "subscribe_tree", "request_id": "t"})
+        changes = receive_until(ws, "tree_changes", "t")[-1]
+        assert changes["type"] == "tree_changes"
@@ -0,0 +1,158 @@
+"""分层摘要测试 - 按内容哈希缓存的章节摘要、逐级汇总、只重新生成变化的章节以及后台刷新"""
+import time
+
+import pytest
+
+from app.config import settings
+from app.core.summary_service import SummaryService
+from app.utils.text_chunks import split_sections
+
+LONG = "这一节详细讨论了实验设置与结果。" * 20  # 超过不调用模型的长度下限
+
+
+def _reply(messages) -> str:
+    """章节摘要取正文前 12 个字，汇总摘要只标明层级"""
+    system, content = messages[0]["content"], messages[-1]["content"]
+    if "同一文件" in system:
+        return "文件汇总"
+    if "同一论文" in system:
+        return "全文汇总"
+    return "摘要：" + content.split("\n", 2)[-1][:12]
+
+
+@pytest.fixture
+def summaries(tmp_path, monkeypatch, fake_llm, project_dir):
+    monkeypatch.setattr(settings, "SUMMARY_ENABLED", True)
+    fake_llm.reply = _reply
+    project_id, path = project_dir
+    (path / "主体").mkdir()
+    (path / "idea").mkdir()
+    (path / "主体" / "main.md").write_text(
+        f"# 引言\n\n{LONG}\n\n# 方法\n\n{LONG.replace('实验', '方法')}\n\n# 结论\n\n短小的结论。",
+        encoding="utf-8"
+    )
+    (path / "idea" / "idea.md").write_text(f"# 想法\n\n{LONG.replace('实验', '想法')}", encoding="utf-8")
+    (path / "代码").mkdir()
+    (path / "代码" / "notes.md").write_text(LONG, encoding="utf-8")
+
+    service = SummaryService(
+        cache_dir=tmp_path / "summaries",
+        folders=["主体", "idea"],
+        section_chars=6000,
+        summary_chars=150,
+        refresh_delay=0
+    )
+    service.project_id, service.path, service.llm = project_id, path, fake_llm
+    return service
+
+
+async def _refresh(service: SummaryService) -> dict:
+    service.get_summaries(service.project_id)
+    task = service._projects[service.project_id].refresh_task
+    if task is not None:
+        await task
+    return service.get_summaries(service.project_id)
+
+
+async def test_builds_hierarchy(summaries):
+    result = await _refresh(summaries)
+    assert set(result["files"]) == {"主体/main.md", "idea/idea.md"}
+    sections = result["files"]["主体/main.md"]["sections"]
+    assert [(s["title"], s["line"]) for s in sections] == [("# 引言", 0), ("# 方法", 4), ("# 结论", 8)]
+    assert sections[0]["summary"] == "摘要：这一节详细讨论了实验设置"
+    # 短章节直接使用原文，不调用模型
+    assert sections[2]["summary"] == "# 结论\n\n短小的结论。"
+    assert result["files"]["主体/main.md"]["summary"] == "文件汇总"
+    # 单节文件直接使用带标题的章节摘要
+    assert result["files"]["idea/idea.md"]["summary"] == "# 想法\n摘要：这一节详细讨论了想法设置"
+    assert result["document"] == "全文汇总"
+    assert result["refreshing"] is False
+    # 引言、方法、想法三节 + 文件汇总 + 全文汇总
+    assert len(summaries.llm.calls) == 5
+
+
+async def test_only_changed_sections_are_regenerated(summaries):
+    await _refresh(summaries)
+    calls = len(summaries.llm.calls)
+
+    # 没有变化：不刷新
+    summaries.get_summaries(summaries.project_id)
+    assert summaries._projects[summaries.project_id].refresh_task is None
+
+    main = summaries.path / "主体" / "main.md"
+    main.write_text(
+        main.read_text(encoding="utf-8").replace("# 方法\n\n这一节", "# 方法\n\n修改后这一节"),
+        encoding="utf-8"
+    )
+    summaries.notify_change(summaries.project_id, main)
+    # 其他目录的修改不触发刷新
+    summaries.notify_change(summaries.project_id, summaries.path / "代码" / "notes.md")
+    await summaries._projects[summaries.project_id].refresh_task
+
+    result = summaries.get_summaries(summaries.project_id)
+    assert result["files"]["主体/main.md"]["sections"][1]["summary"] == "摘要：修改后这一节详细讨论了方"
+    # 只有修改的章节和所在文件的汇总调用模型；文件摘要不变时全文汇总命中缓存
+    assert len(summaries.llm.calls) == calls + 2
+    assert summaries.stats["reused"] == 3
+
+
+async def test_disk_cache_survives_restart(summaries):
+    await _refresh(summaries)
+    calls = len(summaries.llm.calls)
+
+    restarted = SummaryService(
+        cache_dir=summaries.cache_dir, folders=["主体", "idea"],
+        section_chars=6000, summary_chars=150, refresh_delay=0
+    )
+    restarted.project_id = summaries.project_id
+    result = await _refresh(restarted)
+    assert len(summaries.llm.calls) == calls
+    assert result["document"] == "全文汇总"
+
+    content = (summaries.path / "主体" / "main.md").read_text(encoding="utf-8")
+    sections = [section.text for section in split_sections(content)]
+    assert (await restarted.cached_sections(sections))[:2] == [
+        "摘要：这一节详细讨论了实验设置", "摘要：这一节详细讨论了方法设置"
+    ]
+
+
+async def test_failures_keep_project_dirty(summaries):
+    def fail(messages):
+        raise RuntimeError("模型不可用")
+
+    summaries.llm.reply = fail
+    result = await _refresh(summaries)
+    assert result["document"] is None
+    assert summaries.stats["failed"] >= 1
+    assert summaries._projects[summaries.project_id].dirty is True
+
+    summaries.llm.reply = _reply
+    assert (await _refresh(summaries))["document"] == "全文汇总"
+
+
+async def test_disabled_or_unknown_project(summaries, monkeypatch):
+    with pytest.raises(FileNotFoundError):
+        summaries.get_summaries("../etc")
+    assert summaries.document_summary(None) == ""
+    monkeypatch.setattr(settings, "SUMMARY_ENABLED", False)
+    summaries.get_summaries(summaries.project_id)
+    assert summaries._projects[summaries.project_id].refresh_task is None
+
+
+def test_summaries_route_and_logic_check(client, summaries):
+    project_id = summaries.project_id
+    deadline = time.monotonic() + 5
+    while True:
+        result = client.get("/api/v1/ai/summaries", params={"project_id": project_id}).json()
+        if result["document"] or time.monotonic() > deadline:
+            break
+        time.sleep(0.02)
+    assert result["document"] == "全文汇总"
+    assert client.get("/api/v1/ai/summaries", params={"project_id": "不存在"}).status_code == 404
+
+    # 逻辑检查时附带全文摘要
+    response = client.post("/api/v1/ai/check-content", json={
+        "project_id": project_id, "content": "待检查的段落。", "check_type": "logic", "cache": "bypass"
+    })
+    assert response.status_code == 200
+    assert "全文汇总" in summaries.llm.calls[-1][-1]["content"]
@@ -0,0 +1,97 @@
+"""补丁写入：区间编辑、unified diff、基准 ETag 校验和换行符保留"""
+import pytest
+from app.core.file_service import ETagMismatch, FileService
+from app.models.file import TextEdit
+from app.utils.text_patch import PatchConflict, apply_edits, apply_unified_diff
+
+
+def test_apply_edits_in_any_order():
+    text = "hello world"
+    assert apply_edits(text, [(6, 11, "there"), (0, 5, "HELLO")]) == "HELLO there"
+
+
+def test_apply_edits_utf16_offsets_skip_surrogate_pairs():
+    text = "a😀b"
+    # JS 中 😀 占两个码元，b 的偏移量为 3
+    assert apply_edits(text, [(3, 4, "c")]) == "a😀c"
+    assert apply_edits(text, [(2, 3, "c")], unit="codepoint") == "a😀c"
+    with pytest.raises(PatchConflict):
+        apply_edits(text, [(2, 2, "x")])
+
+
+@pytest.mark.parametrize("edits", [[(0, 3, ""), (2, 4, "")], [(5, 2, "")], [(0, 99, "")]])
+def test_apply_edits_rejects_invalid_ranges(edits):
+    with pytest.raises(PatchConflict):
+        apply_edits("hello", edits)
+
+
+def test_unified_diff_applies_hunks():
+    text = "a\nb\nc\nd\n"
+    diff = "--- a\n+++ b\n@@ -2,2 +2,2 @@\n b\n-c\n+C\n"
+    assert apply_unified_diff(text, diff) == "a\nb\nC\nd\n"
+
+
+def test_unified_diff_conflict():
+    with pytest.raises(PatchConflict):
+        apply_unified_diff("a\nb\n", "@@ -1,1 +1,1 @@\n-x\n+y\n")
+
+
+def test_unified_diff_keeps_crlf():
+    text = "a\r\nb\r\nc\r\n"
+    result = apply_unified_diff(text, "@@ -2,1 +2,2 @@\n-b\n+B\n+B2\n")
+    assert result == "a\r\nB\r\nB2\r\nc\r\n"
+
+
+@pytest.fixture
+def service():
+    return FileService(coalesce_window_ms=0, fsync=False)
+
+
+async def test_patch_rejects_stale_base(service, project_dir):
+    project_id, _ = project_dir
+    base = await service.write_file(project_id, "a.txt", "one")
+    current = await service.write_file(project_id, "a.txt", "two")
+    edit = TextEdit.model_validate({"from": 0, "to": 3, "text": "xyz"})
+    with pytest.raises(ETagMismatch) as error:
+        await service.patch_file(project_id, "a.txt", base, edits=[edit])
+    assert error.value.current_etag == current
+
+
+async def test_patch_crlf_file_only_changes_edited_range(service, project_dir):
+    project_id, path = project_dir
+    (path / "crlf.txt").write_bytes(b"line1\r\nline2\r\nline3\r\n")
+    _, stat_result = await service.stat_file(project_id, "crlf.txt")
+    content = await service.read_file(project_id, "crlf.txt")
+    assert content == "line1\r\nline2\r\nline3\r\n"
+
+    start = content.index("line2")
+    edit = TextEdit.model_validate({"from": start, "to": start + 5, "text": "LINE2"})
+    await service.patch_file(project_id, "crlf.txt", service.file_etag(stat_result), edits=[edit])
+    assert (path / "crlf.txt").read_bytes() == b"line1\r\nLINE2\r\nline3\r\n"
+
+
+def test_patch_endpoint_returns_409_with_current_etag(client, project_dir):
+    project_id, _ = project_dir
+    first = client.post("/api/v1/files/write", json={
+        "project_id": project_id, "file_path": "b.txt", "content": "v1"
+    }).json()["etag"]
+    client.post("/api/v1/files/write", json={
+        "project_id": project_id, "file_path": "b.txt", "content": "v2"
+    })
+    response = client.post("/api/v1/files/patch", json={
+        "project_id": project_id,
+        "file_path": "b.txt",
+        "base_etag": first,
+        "edits": [{"from": 0, "to": 2, "text": "v3"}],
+    })
+    assert response.status_code == 409
+    current = response.headers["ETag"]
+
+    response = client.post("/api/v1/files/patch", json={
+        "project_id": project_id,
+        "file_path": "b.txt",
+        "base_etag": current,
+        "edits": [{"from": 0, "to": 2, "text": "v3"}],
+    })
+    assert response.status_code == 200
+    assert response.json()["etag"] != current
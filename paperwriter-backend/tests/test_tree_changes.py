@@ -0,0 +1,137 @@
+"""文件树增量同步测试 - 变更序号、since 查询、reset 条件、重复修改去重以及 WebSocket 订阅"""
+import pytest
+
+from app.core.project_service import PROJECT_FOLDERS
+from app.core.tree_index import ProjectTreeIndex
+from tests.conftest import receive_until
+
+
+@pytest.fixture
+def project(project_dir):
+    project_id, path = project_dir
+    for folder in PROJECT_FOLDERS:
+        (path / folder).mkdir()
+    return project_id, path
+
+
+async def test_changes_get_increasing_sequence_numbers(tmp_path):
+    index = ProjectTreeIndex("p", tmp_path)
+    await index.build()
+
+    (tmp_path / "a.md").write_text("", encoding="utf-8")
+    await index.refresh_path("a.md")
+    await index.refresh_path("a.md", modified=True)
+    (tmp_path / "a.md").unlink()
+    await index.refresh_path("a.md")
+
+    result = index.changes_since(0, index.generation)
+    assert result["reset"] is False
+    assert result["seq"] == 3
+    assert [(c["seq"], c["op"], c["path"]) for c in result["changes"]] == [
+        (1, "added", f"{tmp_path.name}/a.md"),
+        (2, "modified", f"{tmp_path.name}/a.md"),
+        (3, "deleted", f"{tmp_path.name}/a.md"),
+    ]
+    assert result["changes"][0]["node"]["type"] == "file"
+    assert "_at" not in result["changes"][0]
+    assert [c["seq"] for c in index.changes_since(2)["changes"]] == [3]
+    assert index.changes_since(3)["changes"] == []
+
+
+async def test_added_folder_is_one_change_with_subtree(tmp_path):
+    index = ProjectTreeIndex("p", tmp_path)
+    await index.build()
+    (tmp_path / "新目录" / "子目录").mkdir(parents=True)
+    (tmp_path / "新目录" / "子目录" / "x.md").write_text("", encoding="utf-8")
+    await index.rescan()
+
+    changes = index.changes_since(0)["changes"]
+    assert len(changes) == 1
+    node = changes[0]["node"]
+    assert node["children"][0]["children"][0]["path"] == f"{tmp_path.name}/新目录/子目录/x.md"
+
+
+async def test_repeated_modifications_are_deduplicated(tmp_path):
+    (tmp_path / "a.md").write_text("", encoding="utf-8")
+    index = ProjectTreeIndex("p", tmp_path)
+    await index.build()
+    for _ in range(3):
+        await index.refresh_path("a.md", modified=True)
+    assert index.seq == 1
+
+
+async def test_reset_when_client_cannot_catch_up(tmp_path):
+    index = ProjectTreeIndex("p", tmp_path, changelog_size=2)
+    await index.build()
+    for name in ("a", "b", "c"):
+        (tmp_path / name).mkdir()
+        await index.refresh_path(name)
+
+    assert index.changes_since(1)["reset"] is False  # 日志保留 2、3
+    assert index.changes_since(0)["reset"] is True  # 1 已被淘汰
+    assert index.changes_since(4)["reset"] is True  # 序号超前
+    assert index.changes_since(3, "其他代号")["reset"] is True
+    assert index.changes_since(0, "其他代号")["changes"] == []
+
+
+def test_changes_route_follows_file_service_writes(client, project):
+    project_id, path = project
+    opened = client.post("/api/v1/project/open", json={"project_id": project_id}).json()
+    since, generation = opened["seq"], opened["generation"]
+
+    client.post("/api/v1/files/create", json={"project_id": project_id, "file_path": "主体/a.md"})
+    client.post("/api/v1/files/write", json={"project_id": project_id, "file_path": "主体/a.md", "content": "正文"})
+    client.request("DELETE", "/api/v1/files/delete", json={"project_id": project_id, "file_path": "主体/a.md"})
+
+    result = client.get(
+        "/api/v1/project/changes",
+        params={"project_id": project_id, "since": since, "generation": generation}
+    ).json()
+    assert result["reset"] is False
+    assert [c["op"] for c in result["changes"]] == ["added", "modified", "deleted"]
+    assert {c["path"] for c in result["changes"]} == {f"{path.name}/主体/a.md"}
+    assert result["seq"] == since + 3
+
+    result = client.get(
+        "/api/v1/project/changes",
+        params={"project_id": project_id, "since": since, "generation": "旧代号"}
+    ).json()
+    assert result["reset"] is True
+
+
+@pytest.mark.parametrize("file_path", [".", "", "主体/.."])
+def test_project_root_cannot_be_modified(client, project, file_path):
+    project_id, path = project
+    body = {"project_id": project_id, "file_path": file_path}
+    assert client.request("DELETE", "/api/v1/files/delete", json=body).status_code == 400
+    assert client.post("/api/v1/files/write", json={**body, "content": "正文"}).status_code == 400
+    assert client.post("/api/v1/files/create", json=body).status_code == 400
+    assert (path / "主体").is_dir()
+    # 列目录仍可以指向项目根目录
+    assert client.get("/api/v1/files/list", params={"project_id": project_id, "folder_path": "."}).status_code == 200
+
+
+def test_ws_subscribe_sends_backlog_then_live_changes(client, project):
+    project_id, path = project
+    opened = client.post("/api/v1/project/open", json={"project_id": project_id}).json()
+    client.post("/api/v1/files/create", json={"project_id": project_id, "file_path": "idea/a.md"})
+
+    with client.websocket_connect(f"/api/v1/stream?project_id={project_id}") as ws:
+        ws.send_json({
+            "type": "subscribe_tree",
+            "request_id": "t1",
+            "since": opened["seq"],
+            "generation": opened["generation"]
+        })
+        backlog = receive_until(ws, "tree_changes", "t1")[-1]
+        assert backlog["reset"] is False
+        assert [c["path"] for c in backlog["changes"]] == [f"{path.name}/idea/a.md"]
+
+        client.post("/api/v1/files/create", json={"project_id": project_id, "file_path": "idea/b.md"})
+        pushed = ws.receive_json()
+        assert pushed["type"] == "tree_changes"
+        assert pushed["seq"] == backlog["seq"] + 1
+        assert [c["path"] for c in pushed["changes"]] == [f"{path.name}/idea/b.md"]
+
+        ws.send_json({"type": "subscribe_tree", "request_id": "t2", "since": "abc"})
+        assert receive_until(ws, "tree_changes", "t2")[-1]["type"] == "error"
@@ -0,0 +1,157 @@
+"""项目文件树索引测试 - 一次扫描后缓存、ETag 与 304、写入路径和重新扫描的增量更新"""
+from pathlib import Path
+
+import pytest
+
+from app.core.project_service import PROJECT_FOLDERS
+from app.core.tree_index import ProjectTreeIndex
+
+
+@pytest.fixture
+def project(project_dir) -> tuple[str, Path]:
+    """带标准目录的项目"""
+    project_id, path = project_dir
+    for folder in PROJECT_FOLDERS:
+        (path / folder).mkdir()
+    (path / "主体" / "main.md").write_text("# 标题", encoding="utf-8")
+    return project_id, path
+
+
+def _paths(node: dict) -> set[str]:
+    paths = {node["path"]}
+    for child in node["children"]:
+        paths |= _paths(child)
+    return paths
+
+
+async def test_build_skips_hidden_entries(tmp_path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "a" / "b" / "c.tex").write_text("", encoding="utf-8")
+    (tmp_path / ".git").mkdir()
+    (tmp_path / ".hidden.md").write_text("", encoding="utf-8")
+    index = ProjectTreeIndex("p", tmp_path)
+    await index.build()
+
+    root = tmp_path.name
+    assert _paths(index.tree) == {root, f"{root}/a", f"{root}/a/b", f"{root}/a/b/c.tex"}
+    leaf = index.tree["children"][0]["children"][0]["children"][0]
+    assert (leaf["type"], leaf["extension"], leaf["children"]) == ("file", ".tex", [])
+    assert index.tree_json is index.tree_json
+    assert index.missing_folders(["a", "b"]) == ["b"]
+
+
+async def test_refresh_path_updates_only_on_structure_change(tmp_path):
+    index = ProjectTreeIndex("p", tmp_path)
+    await index.build()
+    etag = index.etag
+
+    assert await index.refresh_path("新文件.md") is False
+    assert index.etag == etag
+
+    (tmp_path / "x" / "y").mkdir(parents=True)
+    (tmp_path / "x" / "y" / "z.md").write_text("", encoding="utf-8")
+    # 祖先目录也是新出现的：从最近的已索引目录开始扫描
+    assert await index.refresh_path("x/y/z.md") is True
+    assert index.etag != etag
+    assert f"{tmp_path.name}/x/y/z.md" in _paths(index.tree)
+
+    etag = index.etag
+    assert await index.refresh_path("x/y/z.md", modified=True) is False
+    assert index.etag == etag
+    assert await index.refresh_path(".hidden") is False
+
+
+async def test_rescan_detects_external_changes(tmp_path):
+    (tmp_path / "old.md").write_text("", encoding="utf-8")
+    index = ProjectTreeIndex("p", tmp_path)
+    await index.build()
+    assert await index.rescan() is False
+
+    (tmp_path / "old.md").unlink()
+    (tmp_path / "new.md").write_text("", encoding="utf-8")
+    assert await index.rescan() is True
+    assert _paths(index.tree) == {tmp_path.name, f"{tmp_path.name}/new.md"}
+
+
+async def test_rescan_reports_modified_files(tmp_path):
+    (tmp_path / "章节").mkdir()
+    (tmp_path / "章节" / "a.md").write_text("旧", encoding="utf-8")
+    index = ProjectTreeIndex("p", tmp_path)
+    await index.build()
+    # 首次轮询只记下签名
+    assert await index.rescan() is False
+    assert index.seq == 0
+
+    etag = index.etag
+    (tmp_path / "章节" / "a.md").write_text("新的内容", encoding="utf-8")
+    assert await index.rescan() is False
+    assert index.etag == etag
+    assert [(c["op"], c["path"]) for c in index.changes_since(0)["changes"]] == [
+        ("modified", f"{tmp_path.name}/章节/a.md")
+    ]
+
+    # 未再修改时不重复记录
+    assert await index.rescan() is False
+    assert index.seq == 1
+
+
+def test_structure_etag_and_304(client, project):
+    project_id, path = project
+    opened = client.post("/api/v1/project/open", json={"project_id": project_id})
+    assert opened.status_code == 200
+    body = opened.json()
+    assert f"{path.name}/主体/main.md" in _paths(body["structure"])
+    etag = opened.headers["etag"]
+
+    response = client.get("/api/v1/project/structure", params={"project_id": project_id})
+    assert response.headers["etag"] == etag
+    assert response.json() == body["structure"]
+
+    response = client.get(
+        "/api/v1/project/structure",
+        params={"project_id": project_id},
+        headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_file_service_writes_invalidate_etag(client, project):
+    project_id, path = project
+    etag = client.get("/api/v1/project/structure", params={"project_id": project_id}).headers["etag"]
+
+    response = client.post("/api/v1/files/create", json={"project_id": project_id, "file_path": "主体/new.md"})
+    assert response.status_code == 200
+    response = client.get(
+        "/api/v1/project/structure",
+        params={"project_id": project_id},
+        headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert f"{path.name}/主体/new.md" in _paths(response.json())
+    etag = response.headers["etag"]
+
+    # 只修改内容不改变结构：ETag 不变
+    client.post("/api/v1/files/write", json={"project_id": project_id, "file_path": "主体/new.md", "content": "正文"})
+    response = client.get(
+        "/api/v1/project/structure",
+        params={"project_id": project_id},
+        headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    client.request("DELETE", "/api/v1/files/delete", json={"project_id": project_id, "file_path": "主体/new.md"})
+    response = client.get("/api/v1/project/structure", params={"project_id": project_id})
+    assert response.headers["etag"] != etag
+    assert f"{path.name}/主体/new.md" not in _paths(response.json())
+
+
+def test_open_reports_missing_folders_and_unknown_project(client, project_dir):
+    project_id, path = project_dir
+    (path / "idea").mkdir()
+    response = client.post("/api/v1/project/open", json={"project_id": project_id})
+    assert response.status_code == 400
+    assert "主体" in response.json()["detail"]
+
+    response = client.get("/api/v1/project/structure", params={"project_id": "不存在的项目"})
+    assert response.status_code == 404
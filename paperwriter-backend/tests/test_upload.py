@@ -0,0 +1,149 @@
+"""流式上传测试 - 请求体直接写盘、单文件与项目空间上限、增量空间统计以及 multipart 上传"""
+import pytest
+
+from app.config import settings
+from app.core.file_service import FileTooLarge, file_service
+from app.core.project_quota import project_quota
+
+
+def _usage(client, project_id: str) -> int:
+    return client.get("/api/v1/files/usage", params={"project_id": project_id}).json()["used"]
+
+
+def test_put_upload_writes_file_and_tracks_usage(client, project_dir):
+    project_id, path = project_dir
+    assert _usage(client, project_id) == 0
+
+    data = b"%PDF-1.4\n" + b"x" * 200_000
+
+    def body():
+        for i in range(0, len(data), 65536):
+            yield data[i:i + 65536]
+
+    response = client.put(
+        "/api/v1/files/upload",
+        params={"project_id": project_id, "file_path": "引用/paper.pdf"},
+        content=body()
+    )
+    assert response.status_code == 200
+    assert response.json()["file"]["size"] == len(data)
+    assert (path / "引用" / "paper.pdf").read_bytes() == data
+    assert _usage(client, project_id) == len(data)
+    # 没有遗留临时文件
+    assert [p.name for p in (path / "引用").iterdir()] == ["paper.pdf"]
+
+    # 已存在：不覆盖时 409，覆盖时空间按差值更新
+    response = client.put(
+        "/api/v1/files/upload",
+        params={"project_id": project_id, "file_path": "引用/paper.pdf"},
+        content=b"new"
+    )
+    assert response.status_code == 409
+    response = client.put(
+        "/api/v1/files/upload",
+        params={"project_id": project_id, "file_path": "引用/paper.pdf", "overwrite": True},
+        content=b"new"
+    )
+    assert response.status_code == 200
+    assert _usage(client, project_id) == 3
+
+    client.request("DELETE", "/api/v1/files/delete", json={"project_id": project_id, "file_path": "引用/paper.pdf"})
+    assert _usage(client, project_id) == 0
+
+
+def test_rejects_extension_and_declared_size(client, project_dir, monkeypatch):
+    project_id, _ = project_dir
+    response = client.put(
+        "/api/v1/files/upload",
+        params={"project_id": project_id, "file_path": "a.exe"},
+        content=b"MZ"
+    )
+    assert response.status_code == 415
+
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE_MB", 1)
+    response = client.put(
+        "/api/v1/files/upload",
+        params={"project_id": project_id, "file_path": "big.pdf"},
+        content=b"x" * (1024 * 1024 + 1)
+    )
+    assert response.status_code == 413
+
+
+async def test_oversize_stream_is_aborted_early(project_dir, monkeypatch):
+    project_id, path = project_dir
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE_MB", 1)
+    pulled = 0
+
+    async def chunks():
+        nonlocal pulled
+        for _ in range(100):
+            pulled += 1
+            yield b"x" * (256 * 1024)
+
+    with pytest.raises(FileTooLarge):
+        await file_service.upload_file(project_id, "big.pdf", chunks())
+    # 第 5 块越过 1MB 上限时立即中止，不再读取后续数据
+    assert pulled == 5
+    assert list(path.iterdir()) == []
+    assert await project_quota.usage(project_id, path) == 0
+
+
+async def test_project_quota_is_enforced_incrementally(project_dir, monkeypatch):
+    project_id, path = project_dir
+    (path / "existing.txt").write_bytes(b"x" * 600)
+    monkeypatch.setattr(project_quota, "max_bytes", 1000)
+
+    async def chunks(total: int):
+        for _ in range(total // 100):
+            yield b"y" * 100
+
+    await file_service.upload_file(project_id, "a.txt", chunks(300))
+    assert await project_quota.usage(project_id, path) == 900
+
+    with pytest.raises(FileTooLarge):
+        await file_service.upload_file(project_id, "b.txt", chunks(300))
+    assert not (path / "b.txt").exists()
+    # 失败的上传释放预留的空间
+    assert await project_quota.usage(project_id, path) == 900
+
+
+def test_multipart_upload(client, project_dir):
+    project_id, path = project_dir
+    response = client.post(
+        "/api/v1/files/upload",
+        params={"project_id": project_id, "folder_path": "代码"},
+        files=[
+            ("files", ("main.py", b"print(1)\n", "text/x-python")),
+            ("files", ("../../escape.json", b"{}", "application/json")),
+        ]
+    )
+    assert response.status_code == 200
+    assert [f["path"] for f in response.json()["files"]] == ["代码/main.py", "代码/escape.json"]
+    assert (path / "代码" / "main.py").read_bytes() == b"print(1)\n"
+    assert (path / "代码" / "escape.json").read_bytes() == b"{}"
+
+    response = client.post(
+        "/api/v1/files/upload",
+        params={"project_id": project_id},
+        json={"content": "base64"}
+    )
+    assert response.status_code == 415
+
+
+@pytest.mark.parametrize("body", [
+    # 文件内容中途截断
+    b"--b\r\nContent-Disposition: form-data; name=\"files\"; filename=\"a.txt\"\r\n\r\nhello partial conte",
+    # 分段结束但缺少结束边界
+    b"--b\r\nContent-Disposition: form-data; name=\"files\"; filename=\"a.txt\"\r\n\r\nhello\r\n--b",
+])
+def test_truncated_multipart_body_is_rejected(client, project_dir, body):
+    project_id, path = project_dir
+    response = client.post(
+        "/api/v1/files/upload",
+        params={"project_id": project_id, "folder_path": "idea"},
+        content=body,
+        headers={"Content-Type": "multipart/form-data; boundary=b"}
+    )
+    assert response.status_code == 400
+    assert not (path / "idea" / "a.txt").exists()
+    assert _usage(client, project_id) == 0
@@ -82,7 +82,9 @@ export default function ContextAwareActions() {
               setResult(`错误: ${error.message}`);
               setIsLoading(false);
               setAIProcessing(false);
-            }
+            },
+            // 续传时补发的完整文本，替换已显示的内容
+            (snapshot) => setResult(snapshot)
           );
           break;
 
@@ -107,7 +109,9 @@ export default function ContextAwareActions() {
               setResult(`错误: ${error.message}`);
               setIsLoading(false);
               setAIProcessing(false);
-            }
+            },
+            // 续传时补发的完整文本，替换已显示的内容
+            (snapshot) => setResult(snapshot)
           );
           break;
 
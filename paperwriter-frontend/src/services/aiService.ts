@@ -3,12 +3,144 @@ import api from './api';
 
 // 流式响应处理器类型
 export type StreamHandler = (chunk: string) => void;
+export type StreamSnapshotHandler = (content: string) => void;
 export type StreamCompleteHandler = () => void;
 export type StreamErrorHandler = (error: Error) => void;
 
+interface StreamHandlers {
+  onChunk: StreamHandler;
+  onSnapshot: StreamSnapshotHandler;
+  onComplete: StreamCompleteHandler;
+  onError: StreamErrorHandler;
+}
+
+// 续传位置：流 ID（响应头 X-Stream-Id）与已收到的最后一个事件 ID
+interface StreamPosition {
+  streamId: string | null;
+  lastEventId: number;
+}
+
+// 连接中途断开时的最多续传次数与间隔
+const MAX_RESUME_ATTEMPTS = 3;
+const RESUME_DELAY_MS = 1000;
+
+/**
+ * 读取 SSE 流（text/event-stream）
+ *
+ * 默认事件的多个 data 行按换行拼接为一块新增内容；snapshot 事件是截至当前的完整文本
+ * （续传位置已不在服务端缓冲中时发送），应替换而不是追加；error 事件回调错误，
+ * done 事件表示结束；以冒号开头的心跳注释行忽略。每个事件的 id 记录到 position，供续传使用。
+ *
+ * @returns 是否读到了 done 或 error 事件；false 表示连接在结束前断开
+ */
+async function readEventStream(
+  response: Response,
+  handlers: StreamHandlers,
+  position: StreamPosition
+): Promise<boolean> {
+  const reader = response.body?.getReader();
+  const decoder = new TextDecoder();
+
+  if (!reader) {
+    throw new Error('无法获取响应流');
+  }
+
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+
+    if (done) return false;
+
+    buffer += decoder.decode(value, { stream: true }).replace(/\r\n?/g, '\n');
+
+    const events = buffer.split('\n\n');
+    buffer = events.pop() || '';
+
+    for (const block of events) {
+      let event = 'message';
+      let id: number | null = null;
+      const data: string[] = [];
+
+      for (const line of block.split('\n')) {
+        if (!line || line.startsWith(':')) continue;
+        const colon = line.indexOf(':');
+        const field = colon === -1 ? line : line.slice(0, colon);
+        let value = colon === -1 ? '' : line.slice(colon + 1);
+        if (value.startsWith(' ')) value = value.slice(1);
+
+        if (field === 'event') event = value;
+        else if (field === 'data') data.push(value);
+        else if (field === 'id' && /^\d+$/.test(value)) id = Number(value);
+      }
+
+      if (event === 'done') {
+        handlers.onComplete();
+        return true;
+      }
+
+      if (event === 'error') {
+        handlers.onError(new Error(data.join('\n')));
+        return true;
+      }
+
+      if (event === 'snapshot') {
+        handlers.onSnapshot(data.join('\n'));
+      } else if (data.length > 0) {
+        handlers.onChunk(data.join('\n'));
+      }
+
+      if (id !== null) {
+        position.lastEventId = id;
+      }
+    }
+  }
+}
+
+/**
+ * 发起流式请求，连接中途断开时通过 GET /ai/streams/{id} 携带 Last-Event-ID 续传
+ */
+async function streamWithResume(start: () => Promise<Response>, handlers: StreamHandlers) {
+  const position: StreamPosition = { streamId: null, lastEventId: 0 };
+  let lastError = new Error('连接中断');
+
+  for (let attempt = 0; attempt <= MAX_RESUME_ATTEMPTS; attempt++) {
+    try {
+      let response: Response;
+      if (attempt === 0) {
+        response = await start();
+        position.streamId = response.headers.get('X-Stream-Id');
+      } else {
+        await new Promise((resolve) => setTimeout(resolve, RESUME_DELAY_MS));
+        response = await fetch(`/api/v1/ai/streams/${encodeURIComponent(position.streamId!)}`, {
+          headers: { 'Last-Event-ID': String(position.lastEventId) },
+        });
+      }
+
+      if (!response.ok) {
+        // 请求被拒绝或流已过期，续传也不会成功
+        handlers.onError(new Error(`流式请求失败: HTTP ${response.status}`));
+        return;
+      }
+
+      if (await readEventStream(response, handlers, position)) return;
+      lastError = new Error('连接中断');
+    } catch (error) {
+      lastError = error as Error;
+    }
+
+    // 没有流 ID 时无法续传
+    if (!position.streamId) break;
+  }
+
+  handlers.onError(lastError);
+}
+
 export const aiService = {
   /**
-   * 分析 idea 可行性（流式）
+   * 分析 idea 可行性（流式，断线自动续传）
+   *
+   * onChunk 收到新增文本，应追加；onSnapshot 收到截至当前的完整文本，应替换已显示的内容
    */
   async analyzeIdea(
     projectId: string,
@@ -16,10 +148,11 @@ export const aiService = {
     projectContext = '',
     onChunk: StreamHandler,
     onComplete: StreamCompleteHandler,
-    onError: StreamErrorHandler
+    onError: StreamErrorHandler,
+    onSnapshot: StreamSnapshotHandler
   ) {
-    try {
-      const response = await fetch('/api/v1/ai/analyze-idea', {
+    await streamWithResume(
+      () => fetch('/api/v1/ai/analyze-idea', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -27,50 +160,9 @@ export const aiService = {
           idea_content: ideaContent,
           project_context: projectContext,
         }),
-      });
-
-      const reader = response.body?.getReader();
-      const decoder = new TextDecoder();
-
-      if (!reader) {
-        throw new Error('无法获取响应流');
-      }
-
-      let buffer = '';
-
-      while (true) {
-        const { done, value } = await reader.read();
-
-        if (done) break;
-
-        buffer += decoder.decode(value, { stream: true });
-
-        // 处理 SSE 格式
-        const lines = buffer.split('\n\n');
-        buffer = lines.pop() || '';
-
-        for (const line of lines) {
-          if (line.startsWith('data: ')) {
-            const data = line.slice(6);
-
-            if (data === '[DONE]') {
-              onComplete();
-              return;
-            }
-
-            if (data.startsWith('[ERROR]')) {
-              const errorMsg = data.slice(7);
-              onError(new Error(errorMsg));
-              return;
-            }
-
-            onChunk(data);
-          }
-        }
-      }
-    } catch (error) {
-      onError(error as Error);
-    }
+      }),
+      { onChunk, onSnapshot, onComplete, onError }
+    );
   },
 
   /**
@@ -84,7 +176,7 @@ export const aiService = {
   },
 
   /**
-   * 续写论文内容（流式）
+   * 续写论文内容（流式，断线自动续传；回调含义同 analyzeIdea）
    */
   async continueWriting(
     projectId: string,
@@ -92,10 +184,11 @@ export const aiService = {
     fileContext: string,
     onChunk: StreamHandler,
     onComplete: StreamCompleteHandler,
-    onError: StreamErrorHandler
+    onError: StreamErrorHandler,
+    onSnapshot: StreamSnapshotHandler
   ) {
-    try {
-      const response = await fetch('/api/v1/ai/continue-writing', {
+    await streamWithResume(
+      () => fetch('/api/v1/ai/continue-writing', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -103,49 +196,9 @@ export const aiService = {
           current_content: currentContent,
           file_context: fileContext,
         }),
-      });
-
-      const reader = response.body?.getReader();
-      const decoder = new TextDecoder();
-
-      if (!reader) {
-        throw new Error('无法获取响应流');
-      }
-
-      let buffer = '';
-
-      while (true) {
-        const { done, value } = await reader.read();
-
-        if (done) break;
-
-        buffer += decoder.decode(value, { stream: true });
-
-        const lines = buffer.split('\n\n');
-        buffer = lines.pop() || '';
-
-        for (const line of lines) {
-          if (line.startsWith('data: ')) {
-            const data = line.slice(6);
-
-            if (data === '[DONE]') {
-              onComplete();
-              return;
-            }
-
-            if (data.startsWith('[ERROR]')) {
-              const errorMsg = data.slice(7);
-              onError(new Error(errorMsg));
-              return;
-            }
-
-            onChunk(data);
-          }
-        }
-      }
-    } catch (error) {
-      onError(error as Error);
-    }
+      }),
+      { onChunk, onSnapshot, onComplete, onError }
+    );
   },
 
   /**